@@ -9,7 +9,6 @@ import sys
 import sqlite3
 from datetime import datetime
 from urllib.parse import urlparse
-from functools import wraps
 
 # 条件导入psycopg2，避免在没有PostgreSQL时出错
 try:
@@ -28,7 +27,6 @@ except ImportError as e:
 
 from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 import markdown
 
 # 创建Flask应用实例
@@ -48,8 +46,23 @@ login_manager.login_message = '请先登录'
 # 注册蓝图
 from app_blueprints.permissions import permissions_bp
 from app_blueprints.errors import errors_bp
+from app_blueprints.search import search_bp, search_page, invalidate_search_facets
+from app_blueprints.trigram import TrigramIndex
+from app_blueprints.related import RelatedDocumentsEngine, get_related_documents
+from app_blueprints.fts_maintenance import FTSMaintenanceScheduler
+from app_blueprints.write_behind import WriteBehindBuffer, create_view_counter_schema
+from app_blueprints.bulk_import import BulkImporter, MARKDOWN_EXTENSIONS
+from app_blueprints.jobs import JobRunner, create_jobs_schema, PRIORITY_HIGH, PRIORITY_LOW
+from app_blueprints.render_cache import create_render_cache_schema, get_rendered_html
+from app_blueprints.admission import AdmissionController
+from app_blueprints.principal_cache import PrincipalCache
+from app_blueprints.authz import init_authz, admin_required
+from app_blueprints.passwords import hash_password, verify_password
+from app_blueprints.sanitizer import sanitize_html
+from config.optimization_config import OptimizationConfig
 app.register_blueprint(permissions_bp)
 app.register_blueprint(errors_bp)
+app.register_blueprint(search_bp)
 
 class User(UserMixin):
     # 初始化用户类
@@ -65,37 +78,47 @@ class User(UserMixin):
         # 初始化用户是否被拉黑，默认为False
         self.is_blacklisted = is_blacklisted
 
+def load_user_principal(user_id):
+    """从数据库读取用户主体：(id, username, email, is_admin, is_blacklisted)，用户不存在时返回None"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        placeholder = '%s' if app.config['DATABASE_URL'] and HAS_POSTGRESQL else '?'
+        cursor.execute(f'SELECT id, username, email, is_admin, is_blacklisted FROM users WHERE id = {placeholder}',
+                       (user_id,))
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+def load_user_principals(user_ids):
+    """批量读取用户主体（一次IN查询），返回行列表"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        placeholder = '%s' if app.config['DATABASE_URL'] and HAS_POSTGRESQL else '?'
+        cursor.execute(f'SELECT id, username, email, is_admin, is_blacklisted FROM users '
+                       f'WHERE id IN ({", ".join([placeholder] * len(user_ids))})', [int(i) for i in user_ids])
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+# 用户主体缓存：按用户ID和安全版本号缓存，拉黑、权限变更、资料修改和删除用户时版本号加一，
+# 下一个请求（任何worker）即重新加载
+principal_cache = PrincipalCache(load_user_principal, batch_loader=load_user_principals)
+# 权限判断（admin_required 和 permissions 蓝图共用），目标用户的主体也从上面的缓存读取
+authorizer = init_authz(app, principal_cache)
+
 @login_manager.user_loader
 # 定义一个函数，用于加载用户信息
 def load_user(user_id):
-    # 获取数据库连接
-    conn = get_db_connection()
-    # 创建游标
-    cursor = conn.cursor()
-    # 判断是否使用PostgreSQL数据库
-    use_postgresql = app.config['DATABASE_URL'] and HAS_POSTGRESQL
-    
-    # 如果使用PostgreSQL数据库
-    if use_postgresql:
-        # 执行SQL查询语句，获取用户信息
-        cursor.execute('SELECT * FROM users WHERE id = %s', (user_id,))
-    # 否则
-    else:
-        # 执行SQL查询语句，获取用户信息
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-    # 获取查询结果
-    user = cursor.fetchone()
-    # 关闭数据库连接
-    conn.close()
-    # 如果查询结果不为空
-    if user:
-        # 返回用户信息，包含黑名单状态
-        # 字段顺序: id, username, email, password_hash, is_admin, created_at, is_blacklisted, ...
-        is_admin = user[4] if len(user) > 4 else False
-        is_blacklisted = user[6] if len(user) > 6 else False
-        return User(user[0], user[1], user[2], is_admin, is_blacklisted)
-    # 否则返回None
-    return None
+    try:
+        principal = principal_cache.get(int(user_id))
+    except (TypeError, ValueError):
+        return None
+    # 用户不存在或已被拉黑时返回None，会话按未登录处理
+    if not principal or principal[4]:
+        return None
+    return User(principal[0], principal[1], principal[2], bool(principal[3]), bool(principal[4]))
 
 def get_db_connection():
     """获取数据库连接"""
@@ -109,6 +132,21 @@ def get_db_connection():
             print("Warning: PostgreSQL URL provided but psycopg2 not available, using SQLite")
         return sqlite3.connect(app.config['DATABASE'] or 'ros2_wiki.db')
 
+def index_document_terms(conn, title, content, previous=None):
+    """
+    更新拼写纠错词典（在文档提交之后执行，失败不影响文档保存）
+    previous 为修改/删除前的 (标题, 内容)，旧词条先从词典中减去；删除文档时 title 为None
+    """
+    use_postgresql = bool(app.config['DATABASE_URL'] and HAS_POSTGRESQL)
+    db_key = app.config['DATABASE_URL'] if use_postgresql else (app.config['DATABASE'] or 'ros2_wiki.db')
+    current = (title, content) if title is not None else None
+    try:
+        TrigramIndex(db_key, use_postgresql).update_document(conn, previous, current)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"更新拼写纠错词典失败: {e}")
+
 class DatabaseCompatibility:
     """数据库兼容性工具类
 
@@ -416,6 +454,16 @@ def init_database():
             )
         ''')
 
+    # 相关文档近邻表（由 python -m app_blueprints.related 离线构建）
+    RelatedDocumentsEngine(conn, use_postgresql=bool(use_postgresql)).create_schema()
+
+    # 文档浏览计数表（由写回缓冲批量更新）
+    create_view_counter_schema(cursor, use_postgresql=bool(use_postgresql))
+
+    # 后台任务表和文档渲染缓存
+    create_jobs_schema(cursor, use_postgresql=bool(use_postgresql))
+    create_render_cache_schema(cursor, use_postgresql=bool(use_postgresql))
+
     conn.commit()
 
     # 检查是否需要创建默认数据
@@ -430,7 +478,7 @@ def init_database():
         cloud_admin_password = os.environ.get('ADMIN_PASSWORD', 'Ssss123!')
 
         if os.environ.get('AUTO_CREATE_ADMIN', 'false').lower() == 'true':
-            admin_password_hash = generate_password_hash(cloud_admin_password)
+            admin_password_hash = hash_password(cloud_admin_password)
             if use_postgresql:
                 cursor.execute('''
                     INSERT INTO users (username, email, password_hash, is_admin)
@@ -444,7 +492,7 @@ def init_database():
             print(f"✅ Created cloud admin account: {cloud_admin_username}")
 
         # 创建默认管理员用户（备用）
-        admin_password = generate_password_hash('Admin123!')
+        admin_password = hash_password('Admin123!')
         if use_postgresql:
             cursor.execute('''
                 INSERT INTO users (username, email, password_hash, is_admin)
@@ -457,7 +505,7 @@ def init_database():
             ''', ('ros2_admin', 'admin@ros2wiki.com', admin_password, 1))
 
         # 创建测试用户
-        user_password = generate_password_hash('user123')
+        user_password = hash_password('user123')
         if use_postgresql:
             cursor.execute('''
                 INSERT INTO users (username, email, password_hash, is_admin)
@@ -798,17 +846,6 @@ source ~/ros2_ws/install/setup.bash
 
     conn.close()
 
-def admin_required(f):
-    """管理员权限装饰器"""
-    @wraps(f)
-    @login_required
-    def decorated_function(*args, **kwargs):
-        if not current_user.is_admin:
-            flash('需要管理员权限')
-            return redirect(url_for('index'))
-        return f(*args, **kwargs)
-    return decorated_function
-
 # 统计功能函数
 def get_homepage_stats():
     """获取首页统计数据"""
@@ -1033,9 +1070,9 @@ def admin_delete_document(doc_id):
 
         # 首先检查文档是否存在
         if use_postgresql:
-            cursor.execute('SELECT title FROM documents WHERE id = %s', (doc_id,))
+            cursor.execute('SELECT title, content FROM documents WHERE id = %s', (doc_id,))
         else:
-            cursor.execute('SELECT title FROM documents WHERE id = ?', (doc_id,))
+            cursor.execute('SELECT title, content FROM documents WHERE id = ?', (doc_id,))
 
         document = cursor.fetchone()
         if not document:
@@ -1055,7 +1092,9 @@ def admin_delete_document(doc_id):
             cursor.execute('DELETE FROM documents WHERE id = ?', (doc_id,))
 
         conn.commit()
+        index_document_terms(conn, None, None, previous=(document[0], document[1]))
         conn.close()
+        invalidate_search_facets()
 
         flash(f'文档 "{document[0]}" 删除成功', 'success')
 
@@ -1166,47 +1205,8 @@ def debug_users():
 
 @app.route('/search')
 def search():
-    """搜索功能"""
-    # 获取搜索关键字
-    query = request.args.get('q', '').strip()
-    # 如果没有搜索关键字，则返回空结果
-    if not query:
-        return render_template('search.html', results=[], query='')
-
-    # 获取数据库连接
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    use_postgresql = app.config['DATABASE_URL'] and HAS_POSTGRESQL
-
-    # 使用DatabaseCompatibility工具类构建搜索条件
-    search_condition, search_params = DatabaseCompatibility.build_search_condition(
-        ['d.title', 'd.content'], query, use_postgresql
-    )
-
-    # 构建完整查询
-    base_query = f'''
-        SELECT d.*, u.username
-        FROM documents d
-        LEFT JOIN users u ON d.author_id = u.id
-        WHERE {search_condition}
-        ORDER BY d.created_at DESC
-    '''
-
-    # 添加分页限制
-    final_query, limit_params = DatabaseCompatibility.build_limit_offset_query(
-        base_query, 20, 0, use_postgresql
-    )
-
-    # 执行查询
-    cursor.execute(final_query, search_params + limit_params)
-
-    # 获取查询结果
-    results = cursor.fetchall()
-    # 关闭数据库连接
-    conn.close()
-
-    # 返回搜索结果页面
-    return render_template('search.html', results=results, query=query)
+    """搜索功能（与 /search/ 相同：分面搜索，支持 ?category= 筛选和拼写纠错）"""
+    return search_page()
 
 @app.route('/stats-test')
 def stats_test():
@@ -1279,38 +1279,37 @@ def login():
         # 判断是否使用PostgreSQL数据库
         use_postgresql = app.config['DATABASE_URL'] and HAS_POSTGRESQL
         
+        placeholder = '%s' if use_postgresql else '?'
         # 根据数据库类型执行查询语句
-        if use_postgresql:
-            cursor.execute('SELECT * FROM users WHERE username = %s', (username,))
-        else:
-            cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
+        cursor.execute(f'SELECT id, username, email, password_hash, is_admin, is_blacklisted '
+                       f'FROM users WHERE username = {placeholder}', (username,))
         # 获取查询结果
         user = cursor.fetchone()
+        
+        # 判断用户是否存在且密码正确（哈希参数已变化或是旧格式时顺便用当前参数重新计算）
+        password_ok, new_hash = verify_password(user[3], password) if user else (False, None)
+        if password_ok and new_hash:
+            try:
+                cursor.execute(f'UPDATE users SET password_hash = {placeholder} WHERE id = {placeholder}',
+                               (new_hash, user[0]))
+                conn.commit()
+            except Exception as e:
+                print(f"更新密码哈希失败: {e}")
         # 关闭数据库连接
         conn.close()
         
-        # 判断用户是否存在且密码正确
-        if user and check_password_hash(user[3], password):
+        if password_ok:
             # 检查用户是否被拉黑
-            # 字段顺序: id, username, email, password_hash, is_admin, created_at, is_blacklisted, ...
-            is_blacklisted = user[6] if len(user) > 6 else False
+            is_blacklisted = bool(user[5])
             if is_blacklisted:
                 flash('账户已被禁用，请联系管理员')
                 return render_template('login.html')
 
-            # 更新用户最后登录时间
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            if use_postgresql:
-                cursor.execute('UPDATE users SET last_seen = CURRENT_TIMESTAMP WHERE id = %s', (user[0],))
-            else:
-                cursor.execute("UPDATE users SET last_seen = datetime('now') WHERE id = ?", (user[0],))
-            conn.commit()
-            conn.close()
+            # 更新用户最后登录时间（写回缓冲合并后批量写入）
+            write_behind.touch_user(user[0])
 
             # 创建用户对象
-            is_admin = user[4] if len(user) > 4 else False
-            user_obj = User(user[0], user[1], user[2], is_admin, is_blacklisted)
+            user_obj = User(user[0], user[1], user[2], bool(user[4]), is_blacklisted)
             # 登录用户
             login_user(user_obj)
             # 重定向到首页
@@ -1460,14 +1459,13 @@ def view_document(doc_id):
         'username': document_row[7] if len(document_row) > 7 else '管理员'
     }
 
-    # 渲染Markdown内容
-    import markdown
-    html_content = markdown.markdown(document['content'], extensions=['codehilite', 'fenced_code'])
+    # 渲染Markdown内容（读取渲染缓存，文档保存后由后台任务预渲染）
+    html_content = get_rendered_html(conn, doc_id, document['content'], bool(use_postgresql))
 
-    # 获取评论
+    # 获取评论（按下方字典的顺序列出字段，表中列的顺序与之不同）
     if use_postgresql:
         cursor.execute('''
-            SELECT c.*, u.username
+            SELECT c.id, c.content, c.user_id, c.document_id, c.created_at, u.username
             FROM comments c
             LEFT JOIN users u ON c.user_id = u.id
             WHERE c.document_id = %s
@@ -1475,7 +1473,7 @@ def view_document(doc_id):
         ''', (doc_id,))
     else:
         cursor.execute('''
-            SELECT c.*, u.username
+            SELECT c.id, c.content, c.user_id, c.document_id, c.created_at, u.username
             FROM comments c
             LEFT JOIN users u ON c.user_id = u.id
             WHERE c.document_id = ?
@@ -1488,24 +1486,43 @@ def view_document(doc_id):
     for comment_row in comments_rows:
         comments.append({
             'id': comment_row[0],
-            'content': comment_row[1],
+            # 模板中以 |safe 输出，渲染前按白名单清理（兼容清理功能上线前保存的评论，结果有缓存）
+            'content': sanitize_html(comment_row[1]),
             'user_id': comment_row[2],
             'document_id': comment_row[3],
             'created_at': comment_row[4],
             'username': comment_row[5] if len(comment_row) > 5 else '匿名用户'
         })
 
+    # 相关文档（由离线任务预先计算，单次索引查询）
+    related_documents = get_related_documents(conn, doc_id, use_postgresql=bool(use_postgresql))
+
+    # 浏览计数：本次访问先记入写回缓冲，显示值合并尚未写入的增量
+    write_behind.record_view(doc_id)
+    document['view_count'] = write_behind.get_view_count(conn, doc_id)
+
     conn.close()
 
-    return render_template('document.html', document=document, comments=comments, html_content=html_content)
+    return render_template('document.html', document=document, comments=comments, html_content=html_content,
+                           related_documents=related_documents)
+
+@app.route('/document/<int:doc_id>/related')
+def related_documents_api(doc_id):
+    """相关文档API"""
+    limit = min(request.args.get('limit', 5, type=int), 20)
+    conn = get_db_connection()
+    use_postgresql = app.config['DATABASE_URL'] and HAS_POSTGRESQL
+    related = get_related_documents(conn, doc_id, limit=limit, use_postgresql=bool(use_postgresql))
+    conn.close()
+    return jsonify({'document_id': doc_id, 'related': related})
 
 @app.route('/document/<int:doc_id>/comment', methods=['POST'])
 @login_required
 def add_comment(doc_id):
     """添加评论"""
-    content = request.form.get('content', '').strip()
+    content = sanitize_html(request.form.get('content', '').strip())
 
-    if not content:
+    if not content.strip():
         flash('评论内容不能为空')
         return redirect(url_for('view_document', doc_id=doc_id))
 
@@ -1556,16 +1573,22 @@ def create_document():
             if use_postgresql:
                 cursor.execute('''
                     INSERT INTO documents (title, content, author_id, category)
-                    VALUES (%s, %s, %s, %s)
+                    VALUES (%s, %s, %s, %s) RETURNING id
                 ''', (title, content, current_user.id, category))
+                doc_id = cursor.fetchone()[0]
             else:
                 cursor.execute('''
                     INSERT INTO documents (title, content, author_id, category)
                     VALUES (?, ?, ?, ?)
                 ''', (title, content, current_user.id, category))
+                doc_id = cursor.lastrowid
 
             conn.commit()
+            index_document_terms(conn, title, content)
             conn.close()
+            invalidate_search_facets()
+            enqueue_job('render_document', {'document_id': doc_id}, priority=PRIORITY_HIGH,
+                        dedupe_key=f'render_document:{doc_id}')
 
             flash('文档创建成功！')
             return redirect(url_for('admin_dashboard'))
@@ -1595,6 +1618,13 @@ def edit_document(doc_id):
             return redirect(url_for('edit_document', doc_id=doc_id))
 
         try:
+            # 修改前的标题和内容，用于从拼写纠错词典中减去旧词条
+            if use_postgresql:
+                cursor.execute('SELECT title, content FROM documents WHERE id = %s', (doc_id,))
+            else:
+                cursor.execute('SELECT title, content FROM documents WHERE id = ?', (doc_id,))
+            previous = cursor.fetchone()
+
             if use_postgresql:
                 cursor.execute('''
                     UPDATE documents
@@ -1609,7 +1639,11 @@ def edit_document(doc_id):
                 ''', (title, content, category, doc_id))
 
             conn.commit()
+            index_document_terms(conn, title, content, previous=tuple(previous) if previous else None)
             conn.close()
+            invalidate_search_facets()
+            enqueue_job('render_document', {'document_id': doc_id}, priority=PRIORITY_HIGH,
+                        dedupe_key=f'render_document:{doc_id}')
 
             flash('文档更新成功！')
             return redirect(url_for('view_document', doc_id=doc_id))
@@ -1697,6 +1731,14 @@ def admin_dashboard():
 
         conn.close()
 
+        # 全文索引状态（仅SQLite FTS5）
+        search_index = None
+        if fts_scheduler:
+            try:
+                search_index = fts_scheduler.status()
+            except Exception as e:
+                print(f"获取全文索引状态失败: {e}")
+
         # 转换为字典格式便于模板使用
         users_list = []
         for user in recent_users:
@@ -1724,7 +1766,8 @@ def admin_dashboard():
                              comment_count=comment_count,
                              blacklisted_count=blacklisted_count,
                              recent_users=users_list,
-                             recent_docs=docs_list)
+                             recent_docs=docs_list,
+                             search_index=search_index)
 
     except Exception as e:
         flash(f'管理后台加载失败：{str(e)}')
@@ -1748,14 +1791,14 @@ def init_sample_data():
             admin_password = os.environ.get('ADMIN_PASSWORD', 'Admin123!')
             admin_email = os.environ.get('ADMIN_EMAIL', 'admin@ros2wiki.com')
             
-            admin_hash = generate_password_hash(admin_password)
+            admin_hash = hash_password(admin_password)
             
             if use_postgresql:
                 cursor.execute('INSERT INTO users (username, email, password_hash, is_admin) VALUES (%s, %s, %s, %s)',
                               (admin_username, admin_email, admin_hash, True))
                 # 添加示例用户
                 cursor.execute('INSERT INTO users (username, email, password_hash, is_admin) VALUES (%s, %s, %s, %s)',
-                              ('ros2_user', 'user@ros2wiki.com', generate_password_hash('user123'), False))
+                              ('ros2_user', 'user@ros2wiki.com', hash_password('user123'), False))
 
                 # 获取管理员ID
                 cursor.execute('SELECT id FROM users WHERE is_admin = TRUE LIMIT 1')
@@ -1770,7 +1813,7 @@ def init_sample_data():
                 cursor.execute('INSERT INTO users (username, email, password_hash, is_admin) VALUES (?, ?, ?, ?)',
                               (admin_username, admin_email, admin_hash, 1))
                 cursor.execute('INSERT INTO users (username, email, password_hash, is_admin) VALUES (?, ?, ?, ?)',
-                              ('ros2_user', 'user@ros2wiki.com', generate_password_hash('user123'), 0))
+                              ('ros2_user', 'user@ros2wiki.com', hash_password('user123'), 0))
 
                 # 获取管理员ID
                 cursor.execute('SELECT id FROM users WHERE is_admin = 1 LIMIT 1')
@@ -2514,6 +2557,185 @@ try:
 except Exception as e:
     print(f"初始化错误: {e}")
 
+# 全文索引低峰期维护（仅SQLite FTS5，PostgreSQL不使用documents_fts）
+fts_scheduler = None
+if not (app.config['DATABASE_URL'] and HAS_POSTGRESQL):
+    fts_scheduler = FTSMaintenanceScheduler(app.config['DATABASE'] or 'ros2_wiki.db')
+    if os.environ.get('FTS_MAINTENANCE_ENABLED', 'true').lower() == 'true':
+        fts_scheduler.start()
+
+# 后台任务：耗时操作在请求中只提交任务；JOBS_ENABLED=false 时由独立进程执行
+# （python -m app_blueprints.jobs work）
+_use_postgresql = bool(app.config['DATABASE_URL'] and HAS_POSTGRESQL)
+job_runner = JobRunner(app.config['DATABASE_URL'] if _use_postgresql else (app.config['DATABASE'] or 'ros2_wiki.db'))
+if os.environ.get('JOBS_ENABLED', 'true').lower() == 'true':
+    job_runner.start()
+app.extensions['jobs'] = job_runner
+
+def enqueue_job(kind, payload=None, **options):
+    """提交后台任务，失败时只记录日志（不影响当前请求），返回任务ID或None"""
+    try:
+        return job_runner.enqueue(kind, payload, created_by=getattr(current_user, 'id', None), **options)
+    except Exception as e:
+        print(f"提交后台任务失败 ({kind}): {e}")
+        return None
+
+# 写回缓冲：合并last_seen更新和文档浏览计数，定时批量写入，进程退出时写入剩余增量
+write_behind = WriteBehindBuffer(get_db_connection, use_postgresql=bool(app.config['DATABASE_URL'] and HAS_POSTGRESQL))
+write_behind.start()
+app.extensions['write_behind'] = write_behind
+
+@app.before_request
+def record_request_for_maintenance():
+    """统计请求量，供索引维护判断低峰期"""
+    if fts_scheduler:
+        fts_scheduler.record_request()
+
+# 准入控制：耗时路由（搜索、审计、管理后台、导出）限制并发，过载时快速返回503和Retry-After，
+# 登录、健康检查和文档页面不受限制（配置见 OptimizationConfig.ADMISSION_CONFIG）
+admission = AdmissionController(OptimizationConfig.ADMISSION_CONFIG, app)
+
+@app.route('/admin/admission')
+@admin_required
+def admission_status():
+    """准入控制统计：各类别的并发数、排队数、拒绝数和平均等待时间"""
+    return jsonify(admission.status())
+
+@app.route('/admin/principal-cache')
+@admin_required
+def principal_cache_status():
+    """用户主体缓存统计：命中率、缓存用户数、版本号存储，以及权限判断缓存"""
+    return jsonify(dict(principal_cache.status(), authz=authorizer.status()))
+
+@app.route('/admin/search-index')
+@admin_required
+def search_index_status():
+    """全文索引状态"""
+    if not fts_scheduler:
+        return jsonify({'available': False, 'message': 'PostgreSQL环境不使用FTS5索引'})
+    return jsonify(fts_scheduler.status())
+
+@app.route('/admin/search-index/<action>', methods=['POST'])
+@admin_required
+def search_index_maintenance(action):
+    """手动触发全文索引维护：merge / optimize / integrity-check / rebuild"""
+    if not fts_scheduler:
+        flash('PostgreSQL环境不使用FTS5索引')
+        return redirect(url_for('admin_dashboard'))
+    try:
+        if fts_scheduler.run_now(action):
+            flash(f'索引维护任务已启动：{action}')
+        else:
+            flash('已有索引维护任务正在运行，请稍后再试')
+    except ValueError as e:
+        flash(str(e))
+    return redirect(url_for('admin_dashboard'))
+
+@app.route('/admin/documents/import', methods=['POST'])
+@admin_required
+def bulk_import_documents():
+    """
+    批量导入Markdown文档：上传tar包（archive）或多个Markdown文件（files）
+    tar包默认交给后台任务导入，返回202和任务ID（?wait=1 时在请求中导入）；
+    多个Markdown文件直接导入，返回各阶段吞吐报告
+    """
+    import tempfile
+    use_postgresql = bool(app.config['DATABASE_URL'] and HAS_POSTGRESQL)
+    db_key = app.config['DATABASE_URL'] if use_postgresql else (app.config['DATABASE'] or 'ros2_wiki.db')
+    archive = request.files.get('archive')
+    files = [f for f in request.files.getlist('files') if f.filename.lower().endswith(MARKDOWN_EXTENSIONS)]
+    if not archive and not files:
+        return jsonify({'success': False, 'error': '请上传tar包或Markdown文件'}), 400
+    skip_existing = request.form.get('allow_duplicates') != '1'
+
+    temp_path = None
+    if archive:
+        # tar包先写入临时文件，由导入器按成员读取（不解压到磁盘）
+        with tempfile.NamedTemporaryFile(suffix='.tar', delete=False) as temp:
+            archive.save(temp)
+            temp_path = temp.name
+        if request.args.get('wait') != '1':
+            job_id = enqueue_job('bulk_import', {'path': temp_path, 'author_id': current_user.id,
+                                                 'skip_existing': skip_existing, 'delete_after': True},
+                                 max_attempts=2)
+            if job_id is None:
+                os.remove(temp_path)
+                return jsonify({'success': False, 'error': '提交导入任务失败'}), 500
+            return jsonify({'success': True, 'job_id': job_id,
+                            'status_url': url_for('job_status', job_id=job_id)}), 202
+
+    conn = get_db_connection()
+    try:
+        importer = BulkImporter(conn, use_postgresql=use_postgresql, db_key=db_key, author_id=current_user.id,
+                                skip_existing=skip_existing)
+        if archive:
+            report = importer.import_path(temp_path)
+        else:
+            report = importer.import_items([(f.filename, None, f.read()) for f in files])
+        return jsonify({'success': True, 'report': report})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"批量导入失败: {e}")
+        return jsonify({'success': False, 'error': f'导入失败：{str(e)}'}), 500
+    finally:
+        conn.close()
+        if temp_path:
+            os.remove(temp_path)
+
+# 管理员可以手动提交的维护任务
+ADMIN_JOB_KINDS = {
+    'performance_indexes': PRIORITY_LOW,
+    'related_rebuild': PRIORITY_LOW,
+    'trigram_rebuild': PRIORITY_LOW,
+}
+
+@app.route('/admin/jobs', methods=['GET', 'POST'])
+@admin_required
+def admin_jobs():
+    """GET: 任务队列状态和最近的任务；POST: 提交维护任务（kind=performance_indexes 等）"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or request.form
+        kind = data.get('kind')
+        if kind not in ADMIN_JOB_KINDS:
+            return jsonify({'success': False, 'error': f'不支持的任务类型: {kind}'}), 400
+        payload = {'full': True} if kind == 'related_rebuild' and str(data.get('full')) == '1' else {}
+        job_id = enqueue_job(kind, payload, priority=ADMIN_JOB_KINDS[kind], dedupe_key=kind)
+        if job_id is None:
+            return jsonify({'success': False, 'error': '提交任务失败'}), 500
+        return jsonify({'success': True, 'job_id': job_id,
+                        'status_url': url_for('job_status', job_id=job_id)}), 202
+
+    try:
+        return jsonify({
+            'status': job_runner.status(),
+            'jobs': job_runner.list_jobs(status=request.args.get('status'), kind=request.args.get('kind'),
+                                         limit=min(request.args.get('limit', 50, type=int), 500)),
+        })
+    except Exception as e:
+        print(f"获取任务状态失败: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    """任务状态（提交者或管理员可见）"""
+    job = job_runner.get_job(job_id)
+    if not job or (job['created_by'] != current_user.id and not current_user.is_admin):
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job)
+
+@app.route('/admin/jobs/<int:job_id>/<action>', methods=['POST'])
+@admin_required
+def admin_job_action(job_id, action):
+    """取消排队中的任务（cancel）或重新执行失败的任务（retry）"""
+    if action not in ('cancel', 'retry'):
+        return jsonify({'success': False, 'error': f'未知操作: {action}'}), 400
+    changed = job_runner.cancel(job_id) if action == 'cancel' else job_runner.retry(job_id)
+    if not changed:
+        return jsonify({'success': False, 'error': '任务状态不允许该操作'}), 409
+    return jsonify({'success': True, 'job': job_runner.get_job(job_id)})
+
 @app.route('/debug/compatibility-test')
 def test_database_compatibility():
     """测试DatabaseCompatibility工具类功能"""
@@ -0,0 +1,234 @@
+# 准入控制模块 - 按路由优先级限制并发，过载时快速拒绝
+#
+# 搜索、审计页面、管理后台和CSV导出等耗时路由在流量突增时会占满全部worker线程，
+# 连健康检查和文档页面也跟着超时。这里把路由分成几个优先级类别：
+#   - 每个类别有独立的并发上限和等待队列，超过上限的请求最多排队 queue_timeout 秒
+#   - 队列已满或等待超时立即返回503和Retry-After，不再占用线程
+#   - critical 类别（登录、健康检查、文档页面）不限流，耗时路由的上限之和应小于
+#     每个worker的线程数，为它们留出线程
+# 限制在进程内生效，配合 gunicorn --worker-class gthread --threads N 使用
+# （sync worker每个进程同时只处理一个请求，进程内限流没有意义）。
+# 配置见 config/optimization_config.py 的 ADMISSION_CONFIG。
+
+import math
+import time
+import threading
+from fnmatch import fnmatchcase
+
+from flask import g, request, jsonify, make_response
+
+CRITICAL = 'critical'
+DEFAULT_CLASS = 'default'
+# Retry-After 的上限（秒）
+MAX_RETRY_AFTER = 60
+
+
+class AdmissionClass:
+    """一个优先级类别的并发槽位、等待队列和统计"""
+
+    def __init__(self, name, max_concurrent=None, max_queue=0, queue_timeout=0.0, retry_after=1):
+        self.name = name
+        self.max_concurrent = max_concurrent  # None 表示不限
+        self.max_queue = max_queue or 0
+        self.queue_timeout = float(queue_timeout or 0)
+        self.retry_after = max(1, int(retry_after or 1))
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.stats = {
+            'admitted': 0,
+            'queued': 0,
+            'rejected_queue_full': 0,
+            'rejected_timeout': 0,
+            'peak_in_flight': 0,
+            'peak_waiting': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'service_seconds_total': 0.0,
+            'completed': 0,
+        }
+
+    def acquire(self):
+        """获取一个槽位，成功返回排队时间（秒），被拒绝返回None"""
+        with self._cond:
+            if self.max_concurrent is None or (self.in_flight < self.max_concurrent and not self.waiting):
+                self._admit(0.0)
+                return 0.0
+            if self.waiting >= self.max_queue or self.queue_timeout <= 0:
+                self.stats['rejected_queue_full'] += 1
+                return None
+
+            self.waiting += 1
+            self.stats['queued'] += 1
+            self.stats['peak_waiting'] = max(self.stats['peak_waiting'], self.waiting)
+            started = time.monotonic()
+            deadline = started + self.queue_timeout
+            try:
+                while self.in_flight >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats['rejected_timeout'] += 1
+                        return None
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            waited = time.monotonic() - started
+            self._admit(waited)
+            return waited
+
+    def _admit(self, waited):
+        self.in_flight += 1
+        self.stats['admitted'] += 1
+        self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self.in_flight)
+        self.stats['wait_seconds_total'] += waited
+        self.stats['wait_seconds_max'] = max(self.stats['wait_seconds_max'], waited)
+
+    def release(self, service_seconds):
+        with self._cond:
+            self.in_flight -= 1
+            self.stats['completed'] += 1
+            self.stats['service_seconds_total'] += service_seconds
+            self._cond.notify()
+
+    def estimate_retry_after(self):
+        """按平均处理时间和当前排队长度估计多久后可以重试"""
+        with self._cond:
+            completed = self.stats['completed']
+            if not completed or not self.max_concurrent:
+                return self.retry_after
+            average = self.stats['service_seconds_total'] / completed
+            estimate = math.ceil(average * (self.waiting + self.in_flight) / self.max_concurrent)
+        return min(MAX_RETRY_AFTER, max(self.retry_after, estimate))
+
+    def snapshot(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats.update({
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'queue_timeout': self.queue_timeout,
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+            })
+        rejected = stats['rejected_queue_full'] + stats['rejected_timeout']
+        stats['rejected'] = rejected
+        stats['avg_wait_ms'] = round(stats['wait_seconds_total'] * 1000 / stats['admitted'], 2) if stats['admitted'] else 0
+        stats['avg_service_ms'] = (round(stats['service_seconds_total'] * 1000 / stats['completed'], 2)
+                                   if stats['completed'] else 0)
+        stats['wait_seconds_total'] = round(stats['wait_seconds_total'], 3)
+        stats['wait_seconds_max'] = round(stats['wait_seconds_max'], 3)
+        stats['service_seconds_total'] = round(stats['service_seconds_total'], 3)
+        return stats
+
+
+class AdmissionController:
+    """
+    按endpoint把请求分配到优先级类别，在 before_request 中获取槽位。
+    teardown_request 在流式响应的生成器运行之前就会执行，所以槽位在 after_request 中
+    交给 response.call_on_close，由WSGI服务器关闭响应（生成器结束）时释放；
+    没有生成响应（异常直接抛出）时才在 teardown_request 中释放
+    """
+
+    def __init__(self, config=None, app=None):
+        config = config or {}
+        self.enabled = config.get('ENABLED', True)
+        self.default_class = config.get('DEFAULT_CLASS', DEFAULT_CLASS)
+        self.classes = {}
+        for name, options in (config.get('CLASSES') or {}).items():
+            self.classes[name] = AdmissionClass(name, **options)
+        self.classes.setdefault(CRITICAL, AdmissionClass(CRITICAL))
+        self.classes.setdefault(self.default_class, AdmissionClass(self.default_class))
+
+        # endpoint精确匹配优先，其次按通配模式匹配
+        self._exact = {}
+        self._patterns = []
+        for name, endpoints in (config.get('ROUTES') or {}).items():
+            if name not in self.classes:
+                raise ValueError(f'未定义的准入类别: {name}')
+            for endpoint in endpoints:
+                if any(ch in endpoint for ch in '*?['):
+                    self._patterns.append((endpoint, name))
+                else:
+                    self._exact[endpoint] = name
+        self._resolved = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions['admission'] = self
+
+    def classify(self, endpoint):
+        """返回endpoint所属的类别名（结果按endpoint缓存）"""
+        if endpoint is None:
+            return self.default_class
+        name = self._resolved.get(endpoint)
+        if name is None:
+            name = self._exact.get(endpoint)
+            if name is None:
+                name = next((cls for pattern, cls in self._patterns if fnmatchcase(endpoint, pattern)),
+                            self.default_class)
+            with self._lock:
+                self._resolved[endpoint] = name
+        return name
+
+    def _before_request(self):
+        if not self.enabled:
+            return None
+        admission_class = self.classes[self.classify(request.endpoint)]
+        waited = admission_class.acquire()
+        if waited is None:
+            return self.reject_response(admission_class)
+        g.admission_ticket = (admission_class, time.monotonic())
+        return None
+
+    def _after_request(self, response):
+        ticket = g.pop('admission_ticket', None)
+        if ticket:
+            response.call_on_close(lambda: self._release(ticket))
+        return response
+
+    def _teardown_request(self, exc=None):
+        ticket = g.pop('admission_ticket', None)
+        if ticket:
+            self._release(ticket)
+
+    def _release(self, ticket):
+        admission_class, started = ticket
+        admission_class.release(time.monotonic() - started)
+
+    def reject_response(self, admission_class):
+        """快速503：不查数据库、不渲染模板"""
+        retry_after = admission_class.estimate_retry_after()
+        message = '服务繁忙，请稍后重试'
+        if request.path.startswith('/api/') or request.accept_mimetypes.best == 'application/json':
+            response = jsonify({
+                'error': message,
+                'status_code': 503,
+                'admission_class': admission_class.name,
+                'retry_after': retry_after,
+            })
+        else:
+            response = make_response(f'<h1>503</h1><p>{message}（约 {retry_after} 秒后）</p>')
+            response.mimetype = 'text/html'
+        response.status_code = 503
+        response.headers['Retry-After'] = str(retry_after)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    def status(self):
+        """各类别的并发、排队和拒绝统计"""
+        classes = {name: cls.snapshot() for name, cls in self.classes.items()}
+        return {
+            'enabled': self.enabled,
+            'classes': classes,
+            'totals': {
+                'in_flight': sum(c['in_flight'] for c in classes.values()),
+                'waiting': sum(c['waiting'] for c in classes.values()),
+                'queued': sum(c['queued'] for c in classes.values()),
+                'rejected': sum(c['rejected'] for c in classes.values()),
+            },
+        }
@@ -1,16 +1,31 @@
 """
 RESTful API Blueprint
 """
-from flask import Blueprint, jsonify, request, abort
+from flask import Blueprint, jsonify, request, abort, current_app
 from flask_login import login_required, current_user
 from app.models import Document, Comment, User, db
 from app.utils.decorators import admin_required
+from .write_behind import WriteBehindBuffer
 from datetime import datetime
 import markdown
 
 bp = Blueprint('api', __name__, url_prefix='/api/v1')
 
 
+def get_view_counter():
+    """浏览计数写回缓冲（每个应用一个），增量合并后累加到 documents.view_count"""
+    counter = current_app.extensions.get('api_view_counter')
+    if counter is None:
+        engine = db.engine
+        counter = WriteBehindBuffer(engine.raw_connection,
+                                    use_postgresql=engine.dialect.name == 'postgresql',
+                                    views_column='view_count')
+        counter = current_app.extensions.setdefault('api_view_counter', counter)
+        if not current_app.testing:
+            counter.start()
+    return counter
+
+
 def serialize_document(doc):
     """序列化文档对象"""
     return {
@@ -25,7 +40,7 @@ def serialize_document(doc):
         },
         'created_at': doc.created_at.isoformat(),
         'updated_at': doc.updated_at.isoformat(),
-        'view_count': doc.view_count,
+        'view_count': (doc.view_count or 0) + get_view_counter().pending_views(doc.id),
         'comment_count': doc.comments.count(),
         'url': f'/documents/{doc.id}'
     }
@@ -99,9 +114,8 @@ def get_document(id):
     """获取单个文档"""
     doc = Document.query.get_or_404(id)
     
-    # 增加浏览次数
-    doc.view_count += 1
-    db.session.commit()
+    # 增加浏览次数（写回缓冲合并后批量写入，不在每次读取时提交事务）
+    get_view_counter().record_view(doc.id)
     
     return jsonify({
         'data': serialize_document(doc),
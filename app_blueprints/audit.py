@@ -0,0 +1,309 @@
+# 审计日志流水线 - 有界队列 + 后台批量写入
+#
+# 管理操作日志（user_logs表）和安全审计日志（security_audit.log）不在请求线程中逐条写入：
+# 记录先进入有界内存队列，后台线程每次取出一批，数据库用一次executemany、文件用一次write写入。
+# 文件写入支持fsync策略和按大小轮转；读取最近的记录使用从文件末尾向前的读取器，不读取整个文件。
+
+import os
+import time
+import queue
+import atexit
+import threading
+
+# 队列容量、单批最大条数、后台线程空闲时的唤醒间隔（秒）
+AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 500))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))
+# 队列已满时请求线程最多等待的时间（秒），超时后丢弃该条记录并计数
+AUDIT_ENQUEUE_TIMEOUT = float(os.environ.get('AUDIT_ENQUEUE_TIMEOUT', 0.5))
+# 写入失败时的重试次数
+AUDIT_WRITE_RETRIES = 3
+
+# 文件fsync策略：always 每批写入后fsync；interval 最多每 AUDIT_FSYNC_INTERVAL 秒一次；never 交给操作系统
+AUDIT_FSYNC = os.environ.get('AUDIT_FSYNC', 'interval')
+AUDIT_FSYNC_INTERVAL = float(os.environ.get('AUDIT_FSYNC_INTERVAL', 1.0))
+# 日志文件轮转：超过该大小时重命名为 .1、.2 ...，最多保留 AUDIT_BACKUP_COUNT 个
+AUDIT_MAX_BYTES = int(os.environ.get('AUDIT_MAX_BYTES', 10 * 1024 * 1024))
+AUDIT_BACKUP_COUNT = int(os.environ.get('AUDIT_BACKUP_COUNT', 5))
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+
+class _FlushMarker:
+    """放入队列的标记：后台线程处理到它时，之前的记录都已写入"""
+
+    def __init__(self, stop=False):
+        self.stop = stop
+        self.done = threading.Event()
+
+
+class AuditPipeline:
+    """有界队列 + 单个后台写入线程，sink 负责把一批记录写入目标"""
+
+    def __init__(self, sink, name='audit', max_queue=AUDIT_QUEUE_SIZE, batch_size=AUDIT_BATCH_SIZE,
+                 flush_interval=AUDIT_FLUSH_INTERVAL, enqueue_timeout=AUDIT_ENQUEUE_TIMEOUT):
+        self.sink = sink
+        self.name = name
+        self.queue = queue.Queue(max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.thread = None
+        self.start_lock = threading.Lock()
+        self.stats = {'enqueued': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+
+    def submit(self, record):
+        """提交一条记录；队列持续已满时丢弃并返回False"""
+        self._ensure_started()
+        try:
+            self.queue.put(record, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self.stats['dropped'] += 1
+            if self.stats['dropped'] % 1000 == 1:
+                print(f"审计日志队列已满（{self.name}），已丢弃 {self.stats['dropped']} 条记录")
+            return False
+        self.stats['enqueued'] += 1
+        return True
+
+    def flush(self, timeout=5.0):
+        """等待此前提交的记录全部写入，返回是否在超时前完成"""
+        if self.thread is None:
+            return True
+        marker = _FlushMarker()
+        try:
+            self.queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        """写入剩余记录并停止后台线程（进程退出时自动调用）"""
+        if self.thread is None or not self.thread.is_alive():
+            return
+        marker = _FlushMarker(stop=True)
+        try:
+            self.queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return
+        self.thread.join(timeout)
+
+    def status(self):
+        return dict(self.stats, name=self.name, queued=self.queue.qsize(),
+                    running=bool(self.thread and self.thread.is_alive()))
+
+    def _ensure_started(self):
+        if self.thread is not None:
+            return
+        with self.start_lock:
+            if self.thread is None:
+                thread = threading.Thread(target=self._run, name=f'audit-{self.name}', daemon=True)
+                thread.start()
+                self.thread = thread
+                atexit.register(self.stop)
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self.sink.idle()
+                continue
+
+            # 取出当前可用的记录（最多batch_size条），遇到标记时先写入已取出的部分
+            batch, marker = [], None
+            while True:
+                if isinstance(item, _FlushMarker):
+                    marker = item
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write(batch)
+            if marker is not None:
+                self.sink.sync()
+                marker.done.set()
+                if marker.stop:
+                    self.sink.close()
+                    return
+
+    def _write(self, batch):
+        for attempt in range(AUDIT_WRITE_RETRIES):
+            try:
+                self.sink.write(batch)
+                self.stats['written'] += len(batch)
+                self.stats['batches'] += 1
+                return
+            except Exception as e:
+                if attempt == AUDIT_WRITE_RETRIES - 1:
+                    print(f"审计日志写入失败（{self.name}），丢弃 {len(batch)} 条记录: {e}")
+                    self.stats['failed'] += len(batch)
+                else:
+                    time.sleep(0.1 * (attempt + 1))
+
+
+class DatabaseAuditSink:
+    """批量插入数据库表；每批一个事务"""
+
+    def __init__(self, connect, sql):
+        self.connect = connect
+        self.sql = sql
+
+    def write(self, batch):
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(self.sql, batch)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def idle(self):
+        pass
+
+    def sync(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FileAuditSink:
+    """追加写入文本文件，每条记录一行；支持fsync策略和按大小轮转"""
+
+    def __init__(self, path, fsync=AUDIT_FSYNC, fsync_interval=AUDIT_FSYNC_INTERVAL,
+                 max_bytes=AUDIT_MAX_BYTES, backup_count=AUDIT_BACKUP_COUNT):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"未知的fsync策略: {fsync}")
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.file = None
+        self.dirty = False
+        self.last_sync = time.monotonic()
+
+    def write(self, batch):
+        if self.file is None:
+            self.file = open(self.path, 'ab')
+        self.file.write(''.join(f"{line}\n" for line in batch).encode('utf-8'))
+        self.file.flush()
+        self.dirty = True
+        if self.fsync == 'always' or (
+                self.fsync == 'interval' and time.monotonic() - self.last_sync >= self.fsync_interval):
+            self.sync()
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def idle(self):
+        # interval策略下，写入后没有新记录也要在间隔到期后落盘
+        if self.fsync == 'interval' and self.dirty and time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        if self.file is not None and self.dirty and self.fsync != 'never':
+            os.fsync(self.file.fileno())
+        self.dirty = False
+        self.last_sync = time.monotonic()
+
+    def rotate(self):
+        """security_audit.log -> .1 -> .2 ...，超出保留数量的最旧文件被删除"""
+        self.sync()
+        self.file.close()
+        self.file = None
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+
+# 同一个文件/数据库只使用一个写入线程，多个实例共享同一条流水线
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_file_pipeline(path, **sink_options):
+    """获取写入指定文件的共享流水线"""
+    key = ('file', os.path.abspath(path))
+    with _pipelines_lock:
+        if key not in _pipelines:
+            _pipelines[key] = AuditPipeline(FileAuditSink(path, **sink_options), name=os.path.basename(path))
+        return _pipelines[key]
+
+
+def get_database_pipeline(db_key, connect, sql):
+    """获取写入指定数据库的共享流水线（db_key为数据库路径或URL）"""
+    key = ('db', db_key, sql)
+    with _pipelines_lock:
+        if key not in _pipelines:
+            _pipelines[key] = AuditPipeline(DatabaseAuditSink(connect, sql), name='user_logs')
+        return _pipelines[key]
+
+
+def tail_lines(path, count=100, block_size=8192):
+    """从文件末尾向前按块读取，返回最后count行（不读取整个文件）"""
+    if count <= 0:
+        return []
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b''
+            # 多读一个换行符，保证第一行是完整的
+            while position > 0 and data.count(b'\n') <= count:
+                step = min(block_size, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+    except FileNotFoundError:
+        return []
+
+    lines = data.split(b'\n')
+    if position > 0:
+        lines = lines[1:]
+    if lines and lines[-1] == b'':
+        lines.pop()
+    return [line.decode('utf-8', errors='replace').rstrip('\r') for line in lines[-count:]]
+
+
+# 行数缓存：path -> (inode, 已统计的字节偏移, 行数)，追加写入后只统计新增部分
+_line_counts = {}
+_line_counts_lock = threading.Lock()
+
+
+def count_lines(path, block_size=1024 * 1024):
+    """统计文件行数，只读取上次统计之后追加的部分；文件被轮转或截断时重新统计"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return 0
+    with _line_counts_lock:
+        inode, offset, lines = _line_counts.get(path, (None, 0, 0))
+        if inode != stat.st_ino or stat.st_size < offset:
+            offset, lines = 0, 0
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                chunk = f.read(block_size)
+                if not chunk:
+                    break
+                lines += chunk.count(b'\n')
+                offset += len(chunk)
+        _line_counts[path] = (stat.st_ino, offset, lines)
+        return lines
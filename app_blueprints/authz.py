@@ -0,0 +1,198 @@
+# 统一的权限判断 - admin_required 等装饰器、单个/批量权限检查
+#
+# 判断只依赖用户主体 (id, username, email, is_admin, is_blacklisted)：
+#   - 当前用户的主体来自 load_user（已经过 principal_cache 按版本号缓存），判断时不再查询 users 表
+#   - 目标用户的主体同样从 principal_cache 读取；批量检查时版本号一次读取，未命中的用户一次 IN 查询，
+#     已经查出用户行的列表页可以直接传入行数据，不产生任何查询
+#   - decide() 是纯函数，按 (主体, 权限, 目标主体) 做LRU缓存；主体随版本号变化，缓存自然按用户版本失效
+#   - 同一请求内重复的检查结果保存在 flask.g 中
+# 管理员拥有全部权限，普通用户只有 USER_PERMISSIONS；被拉黑的用户没有任何权限。
+# 对用户的删除、切换管理员、拉黑不能作用于自己。
+
+import os
+import threading
+from functools import wraps, lru_cache
+
+from flask import g, request, jsonify, flash, redirect, url_for, current_app
+from flask_login import current_user
+
+AUTHZ_DECISION_CACHE_SIZE = int(os.environ.get('AUTHZ_DECISION_CACHE_SIZE', 65536))
+
+# 权限名
+ADMIN_ACCESS = 'admin.access'
+USER_VIEW = 'user.view'
+USER_EDIT = 'user.edit'
+USER_DELETE = 'user.delete'
+USER_TOGGLE_ADMIN = 'user.toggle_admin'
+USER_BLACKLIST = 'user.blacklist'
+USER_UNBLACKLIST = 'user.unblacklist'
+DOCUMENT_MANAGE = 'document.manage'
+COMMENT_CREATE = 'comment.create'
+
+ADMIN_PERMISSIONS = frozenset((ADMIN_ACCESS, USER_VIEW, USER_EDIT, USER_DELETE, USER_TOGGLE_ADMIN,
+                               USER_BLACKLIST, USER_UNBLACKLIST, DOCUMENT_MANAGE, COMMENT_CREATE))
+USER_PERMISSIONS = frozenset((COMMENT_CREATE,))
+ROLE_PERMISSIONS = {'admin': ADMIN_PERMISSIONS, 'user': USER_PERMISSIONS}
+# 以用户为对象、不能作用于自己的权限
+NOT_ON_SELF = frozenset((USER_DELETE, USER_TOGGLE_ADMIN, USER_BLACKLIST))
+# 用户列表每一行需要判断的操作
+USER_ROW_PERMISSIONS = (USER_EDIT, USER_DELETE, USER_TOGGLE_ADMIN, USER_BLACKLIST, USER_UNBLACKLIST)
+
+
+def as_principal(user):
+    """把用户对象、用户行（dict）或主体列表转换成可哈希的主体元组"""
+    if user is None:
+        return None
+    if isinstance(user, (tuple, list)):
+        return (user[0], user[1], user[2], bool(user[3]), bool(user[4]))
+    get = user.get if isinstance(user, dict) else lambda name, default=None: getattr(user, name, default)
+    return (get('id'), get('username'), get('email'), bool(get('is_admin', False)), bool(get('is_blacklisted', False)))
+
+
+def role_of(principal):
+    if principal is None or principal[4]:
+        return None
+    return 'admin' if principal[3] else 'user'
+
+
+@lru_cache(maxsize=AUTHZ_DECISION_CACHE_SIZE)
+def decide(actor, permission, target=None):
+    """actor/target 为主体元组；target 为None表示不针对具体用户的检查"""
+    role = role_of(actor)
+    if role is None or permission not in ROLE_PERMISSIONS[role]:
+        return False
+    if target is not None and permission in NOT_ON_SELF and str(target[0]) == str(actor[0]):
+        return False
+    return True
+
+
+class Authorizer:
+    """权限检查入口，principal_cache 用于读取目标用户的主体"""
+
+    def __init__(self, principal_cache=None):
+        self.principal_cache = principal_cache
+        self.stats = {'checks': 0, 'request_hits': 0, 'batch_rows': 0}
+
+    def actor(self, user=None):
+        user = current_user if user is None else user
+        if isinstance(user, (dict, tuple, list)):
+            return as_principal(user)
+        if not getattr(user, 'is_authenticated', False):
+            return None
+        return as_principal(user)
+
+    def target(self, target_id):
+        if self.principal_cache is None:
+            return None
+        return as_principal(self.principal_cache.get(target_id))
+
+    def check(self, permission, target_id=None, user=None):
+        """当前用户（或 user）是否有 permission；指定 target_id 时目标用户必须存在"""
+        self.stats['checks'] += 1
+        memo = None
+        if user is None:
+            memo = g.setdefault('_authz_decisions', {})
+            key = (permission, None if target_id is None else str(target_id))
+            if key in memo:
+                self.stats['request_hits'] += 1
+                return memo[key]
+        actor = self.actor(user)
+        if target_id is None:
+            allowed = decide(actor, permission)
+        else:
+            target = self.target(target_id) if role_of(actor) else None
+            allowed = target is not None and decide(actor, permission, target)
+        if memo is not None:
+            memo[key] = allowed
+        return allowed
+
+    def check_many(self, permissions, targets, user=None):
+        """
+        批量检查：targets 为用户ID或用户行（含 id/is_admin/is_blacklisted 的dict），
+        返回 {str(用户ID): {权限: 是否允许}}；用户ID只在本次调用中批量读取一次主体
+        """
+        if isinstance(permissions, str):
+            permissions = (permissions,)
+        actor = self.actor(user)
+        principals = {}
+        ids = []
+        for target in targets:
+            if isinstance(target, dict):
+                principals[str(target['id'])] = as_principal(target)
+            else:
+                ids.append(target)
+        if ids and role_of(actor) and self.principal_cache is not None:
+            for user_id, principal in self.principal_cache.get_many(ids).items():
+                principals[user_id] = as_principal(principal)
+        for user_id in ids:
+            principals.setdefault(str(user_id), None)
+        self.stats['batch_rows'] += len(principals)
+        return {user_id: {permission: target is not None and decide(actor, permission, target)
+                          for permission in permissions}
+                for user_id, target in principals.items()}
+
+    def status(self):
+        info = decide.cache_info()
+        return dict(self.stats, decision_hits=info.hits, decision_misses=info.misses,
+                    decision_cached=info.currsize)
+
+
+_default_authorizer = None
+_default_lock = threading.Lock()
+
+
+def init_authz(app, principal_cache=None):
+    """为应用创建 Authorizer（目标用户主体从 principal_cache 读取），模板中可使用 can(权限, 用户ID)"""
+    authorizer = Authorizer(principal_cache)
+    app.extensions['authz'] = authorizer
+    app.jinja_env.globals['can'] = can
+    return authorizer
+
+
+def get_authorizer():
+    """当前应用的 Authorizer；应用未初始化时使用不带主体缓存的默认实例（无法检查目标用户）"""
+    global _default_authorizer
+    authorizer = current_app.extensions.get('authz')
+    if authorizer is not None:
+        return authorizer
+    if _default_authorizer is None:
+        with _default_lock:
+            if _default_authorizer is None:
+                _default_authorizer = Authorizer()
+    return _default_authorizer
+
+
+def can(permission, target_id=None):
+    return get_authorizer().check(permission, target_id)
+
+
+def wants_json():
+    return request.is_json or '/api/' in request.path or \
+        request.accept_mimetypes.best == 'application/json'
+
+
+def deny(message='需要管理员权限'):
+    """无权限时的响应：API返回403 JSON，页面提示后回到首页"""
+    if wants_json():
+        return jsonify({'success': False, 'message': message}), 403
+    flash(message, 'error')
+    return redirect(url_for('index'))
+
+
+def permission_required(permission, message='需要管理员权限'):
+    """权限装饰器：未登录时交给 login_manager 处理（跳转登录页），无权限时 deny()"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_user.is_authenticated:
+                return current_app.login_manager.unauthorized()
+            if not get_authorizer().check(permission):
+                return deny(message)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def admin_required(f):
+    """管理员权限装饰器"""
+    return permission_required(ADMIN_ACCESS)(f)
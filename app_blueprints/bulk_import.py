@@ -0,0 +1,437 @@
+# 批量导入模块 - 从目录或tar包导入带front matter的Markdown教程
+#
+# 流程分为四个阶段，每个阶段单独计时并报告吞吐：
+#   discover  遍历目录/tar包，收集Markdown文件
+#   parse     解析front matter并渲染Markdown（命令行和独立任务进程中使用进程池，Web请求内不启动进程池）
+#   insert    一个事务内批量写入：SQLite用executemany，PostgreSQL用COPY；渲染结果同时写入
+#             document_renders 缓存，文档页面首次访问不必再渲染；
+#             SQLite的FTS5同步触发器在导入期间暂停，避免每行都写一次全文索引
+#   index     恢复触发器并一次性重建FTS索引、拼写纠错词典和相关文档
+#
+# 命令行: python -m app_blueprints.bulk_import docs/ --database ros2_wiki.db
+
+import io
+import os
+import re
+import csv
+import time
+import tarfile
+import multiprocessing
+from datetime import datetime, date
+from concurrent.futures import ProcessPoolExecutor
+
+from .render_cache import content_hash, render_markdown, create_render_cache_schema, store_rendered_rows
+
+try:
+    import yaml
+    HAS_YAML = True
+except ImportError:
+    HAS_YAML = False
+
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+DEFAULT_CATEGORY = 'ROS2基础'
+# 每批写入的文档数；每个进程池任务包含的文件数
+INSERT_BATCH_SIZE = 2000
+PARSE_CHUNK_SIZE = 16
+# 文件数少于该值时在当前进程中解析，省去启动进程池的开销
+MIN_FILES_FOR_POOL = 64
+# 命令行和独立任务进程使用的解析进程数（BulkImporter 默认在当前进程中解析）
+PARSE_WORKERS = min(8, os.cpu_count() or 1)
+MAX_REPORTED_ERRORS = 20
+
+FRONT_MATTER_PATTERN = re.compile(r'\A---[ \t]*\r?\n(.*?)\r?\n---[ \t]*(?:\r?\n|\Z)', re.S)
+HEADING_PATTERN = re.compile(r'^#\s+(.+?)\s*#*\s*$', re.M)
+
+
+def parse_front_matter(text):
+    """拆分front matter和正文，返回 (元数据dict, 正文)"""
+    match = FRONT_MATTER_PATTERN.match(text)
+    if not match:
+        return {}, text
+    raw = match.group(1)
+    if HAS_YAML:
+        meta = yaml.safe_load(raw) or {}
+        if not isinstance(meta, dict):
+            raise ValueError('front matter 不是键值对')
+    else:
+        meta = _parse_simple_front_matter(raw)
+    return meta, text[match.end():]
+
+
+def _parse_simple_front_matter(raw):
+    """未安装PyYAML时的简化解析：key: value，支持 [a, b] 形式的列表"""
+    meta = {}
+    for line in raw.splitlines():
+        if not line.strip() or line.lstrip().startswith('#') or ':' not in line:
+            continue
+        key, value = line.split(':', 1)
+        value = value.strip()
+        if value.startswith('[') and value.endswith(']'):
+            value = [item.strip().strip('\'"') for item in value[1:-1].split(',') if item.strip()]
+        else:
+            value = value.strip('\'"')
+        meta[key.strip()] = value
+    return meta
+
+
+def _normalize_timestamp(value):
+    """front matter中的日期统一为 'YYYY-MM-DD HH:MM:SS'，无法识别时返回None"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d 00:00:00')
+    if isinstance(value, str) and value.strip():
+        text = value.strip().replace('T', ' ')
+        for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+            try:
+                return datetime.strptime(text[:19], fmt).strftime('%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                continue
+    return None
+
+
+def parse_document(item, render=True):
+    """
+    进程池任务：解析单个Markdown文件
+    item 为 (来源名称, 文件路径或None, 文件内容bytes或None)
+    """
+    source, path, data = item
+    try:
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        text = data.decode('utf-8-sig')
+        meta, body = parse_front_matter(text)
+        body = body.strip()
+        if not body:
+            raise ValueError('正文为空')
+
+        heading = HEADING_PATTERN.search(body)
+        title = str(meta.get('title') or (heading.group(1) if heading else '') or
+                    os.path.splitext(os.path.basename(source))[0]).strip()
+        # 未指定分类时使用所在目录名（docs/导航/xxx.md -> 导航）
+        parent = os.path.basename(os.path.dirname(source.rstrip('/')))
+        category = str(meta.get('category') or parent or DEFAULT_CATEGORY).strip()
+
+        return {
+            'source': source,
+            'title': title[:500],
+            'content': body,
+            'category': category,
+            'author': meta.get('author'),
+            'created_at': _normalize_timestamp(meta.get('date') or meta.get('created_at')),
+            'updated_at': _normalize_timestamp(meta.get('updated') or meta.get('updated_at')),
+            # 渲染结果导入时写入 document_renders 缓存
+            'render': (content_hash(body), render_markdown(body)) if render else None,
+        }
+    except Exception as e:
+        return {'source': source, 'error': str(e)}
+
+
+def _parse_chunk(items, render=True):
+    return [parse_document(item, render) for item in items]
+
+
+def discover_sources(path):
+    """
+    收集待导入的Markdown文件，返回 [(来源名称, 文件路径或None, 内容或None)]
+    目录：只记录路径，由工作进程读取；tar包：在当前进程中读取成员内容（不解压到磁盘）
+    """
+    if os.path.isdir(path):
+        items = []
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                if name.lower().endswith(MARKDOWN_EXTENSIONS):
+                    full_path = os.path.join(root, name)
+                    items.append((os.path.relpath(full_path, path), full_path, None))
+        return items
+
+    if tarfile.is_tarfile(path):
+        items = []
+        with tarfile.open(path, 'r:*') as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(MARKDOWN_EXTENSIONS):
+                    items.append((member.name, None, archive.extractfile(member).read()))
+        return items
+
+    if path.lower().endswith(MARKDOWN_EXTENSIONS):
+        return [(os.path.basename(path), path, None)]
+    raise ValueError(f"不支持的导入源: {path}（需要目录、tar包或Markdown文件）")
+
+
+class BulkImporter:
+    """批量导入文档"""
+
+    def __init__(self, conn, use_postgresql=False, db_key=None, author_id=None, workers=1,
+                 skip_existing=True, render=True, update_indexes=True, batch_size=INSERT_BATCH_SIZE):
+        self.conn = conn
+        self.use_postgresql = use_postgresql
+        self.db_key = db_key
+        self.author_id = author_id
+        # 大于1时使用spawn进程池解析；只应在命令行或独立任务进程中使用，Web进程中保持1
+        self.workers = workers or 1
+        self.skip_existing = skip_existing
+        self.render = render
+        self.update_indexes = update_indexes
+        self.batch_size = batch_size
+        self.fts_rebuilt = False
+        self.report = {
+            'stages': {},
+            'files': 0, 'imported': 0, 'skipped': 0, 'failed': 0, 'errors': [],
+        }
+
+    def import_path(self, path):
+        """从目录、tar包或单个Markdown文件导入"""
+        started = time.perf_counter()
+        items = discover_sources(path)
+        self._stage('discover', started, len(items))
+        return self.import_items(items)
+
+    def import_items(self, items):
+        """导入 discover_sources 格式的条目，返回导入报告"""
+        self.report['files'] = len(items)
+        if not items:
+            return self.report
+
+        authors = self._load_authors()
+        existing_titles = self._load_existing_titles() if self.skip_existing else set()
+
+        # 先解析全部文件再开始写事务：解析耗时较长，期间不持有数据库写锁
+        parse_started = time.perf_counter()
+        rows = []
+        renders = []
+        for parsed in self._parse_all(items):
+            if 'error' in parsed:
+                self._record_error(parsed['source'], parsed['error'])
+                continue
+            if parsed['title'] in existing_titles:
+                self.report['skipped'] += 1
+                continue
+            existing_titles.add(parsed['title'])
+            rows.append(self._row(parsed, authors))
+            renders.append(parsed['render'])
+        self._stage('parse', parse_started, len(items))
+
+        insert_started = time.perf_counter()
+        cursor = self.conn.cursor()
+        fts = self._begin_import(cursor)
+        try:
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM documents')
+            max_id_before = cursor.fetchone()[0]
+            for start in range(0, len(rows), self.batch_size):
+                self._insert_batch(cursor, rows[start:start + self.batch_size])
+            self._store_renders(cursor, max_id_before, rows, renders)
+            insert_seconds = time.perf_counter() - insert_started
+
+            index_started = time.perf_counter()
+            if fts is not None:
+                # 恢复触发器并一次性重建全文索引，与导入的文档在同一事务中提交
+                fts.resume_triggers()
+                self.fts_rebuilt = True
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        self.report['stages']['insert'] = self._throughput(insert_seconds, self.report['imported'])
+        self._rebuild_indexes(index_started)
+        return self.report
+
+    # ---- 各阶段实现 ----
+
+    def _parse_all(self, items):
+        """按原顺序逐个产出解析结果；文件较多时使用进程池"""
+        if self.workers <= 1 or len(items) < MIN_FILES_FOR_POOL:
+            for item in items:
+                yield parse_document(item, self.render)
+            return
+
+        chunks = [items[i:i + PARSE_CHUNK_SIZE] for i in range(0, len(items), PARSE_CHUNK_SIZE)]
+        # spawn方式启动工作进程：在多线程的Web服务器进程中fork不安全
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as executor:
+            for results in executor.map(_parse_chunk, chunks, [self.render] * len(chunks)):
+                yield from results
+
+    def _begin_import(self, cursor):
+        """开始导入事务；SQLite暂停FTS同步触发器，返回FTSMaintenance（无FTS表时为None）"""
+        if self.use_postgresql:
+            return None
+        from .fts_maintenance import FTSMaintenance
+        # 立即获取写锁，导入期间其他写入排队等待，而不是在提交时失败
+        self.conn.execute('BEGIN IMMEDIATE')
+        fts = FTSMaintenance(self.conn)
+        if not fts.exists():
+            return None
+        fts.suspend_triggers()
+        return fts
+
+    def _row(self, parsed, authors):
+        author_id = authors.get(str(parsed['author'])) if parsed['author'] else None
+        return (parsed['title'], parsed['content'], author_id or self.author_id, parsed['category'],
+                parsed['created_at'], parsed['updated_at'] or parsed['created_at'])
+
+    def _insert_batch(self, cursor, rows):
+        if self.use_postgresql:
+            # COPY：一次往返写入整批数据
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for title, content, author_id, category, created_at, updated_at in rows:
+                writer.writerow([title, content, '' if author_id is None else author_id, category,
+                                 created_at or now, updated_at or now])
+            buffer.seek(0)
+            cursor.copy_expert(
+                "COPY documents (title, content, author_id, category, created_at, updated_at) "
+                "FROM STDIN WITH (FORMAT csv, NULL '')",
+                buffer
+            )
+        else:
+            cursor.executemany('''
+                INSERT INTO documents (title, content, author_id, category, created_at, updated_at)
+                VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))
+            ''', rows)
+        self.report['imported'] += len(rows)
+
+    def _store_renders(self, cursor, max_id_before, rows, renders):
+        """
+        把解析阶段的渲染结果写入 document_renders（与文档在同一事务中）
+        新文档ID按标题对应；缓存按内容哈希校验，即使对应错也只会在访问时重新渲染
+        """
+        if not any(renders):
+            return
+        pending = {}
+        for row, render in zip(rows, renders):
+            if render:
+                pending.setdefault(row[0], []).append(render)
+        p = '%s' if self.use_postgresql else '?'
+        cursor.execute(f'SELECT id, title FROM documents WHERE id > {p} ORDER BY id', (max_id_before,))
+        cached = []
+        for document_id, title in cursor.fetchall():
+            if pending.get(title):
+                digest, html = pending[title].pop(0)
+                cached.append((document_id, digest, html))
+        create_render_cache_schema(cursor, self.use_postgresql)
+        for start in range(0, len(cached), self.batch_size):
+            store_rendered_rows(cursor, cached[start:start + self.batch_size], self.use_postgresql)
+        self.report['rendered'] = len(cached)
+
+    def _rebuild_indexes(self, started):
+        """导入完成后一次性更新派生索引；失败不影响已提交的文档"""
+        rebuilt = []
+        if self.update_indexes and self.report['imported']:
+            try:
+                if self.use_postgresql:
+                    cursor = self.conn.cursor()
+                    cursor.execute('ANALYZE documents')
+                    self.conn.commit()
+                    rebuilt.append('analyze')
+                elif self.fts_rebuilt:
+                    rebuilt.append('fts')
+
+                from .trigram import TrigramIndex
+                index = TrigramIndex(self.db_key, self.use_postgresql)
+                index.create_schema(self.conn)
+                index.rebuild(self.conn)
+                rebuilt.append('trigram')
+
+                from .related import RelatedDocumentsEngine, HAS_NUMPY
+                if HAS_NUMPY:
+                    RelatedDocumentsEngine(self.conn, use_postgresql=self.use_postgresql).update_incremental()
+                    rebuilt.append('related')
+            except Exception as e:
+                self.conn.rollback()
+                print(f"导入后重建索引失败: {e}")
+                self._record_error('index', str(e), count=False)
+        if self.report['imported']:
+            from .search import invalidate_search_facets
+            invalidate_search_facets()
+        self.report['stages']['index'] = self._throughput(time.perf_counter() - started, self.report['imported'])
+        self.report['indexes'] = rebuilt
+
+    # ---- 辅助方法 ----
+
+    def _load_authors(self):
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT id, username FROM users')
+        return {username: user_id for user_id, username in cursor.fetchall()}
+
+    def _load_existing_titles(self):
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT title FROM documents')
+        return {row[0] for row in cursor.fetchall()}
+
+    def _record_error(self, source, message, count=True):
+        if count:
+            self.report['failed'] += 1
+        if len(self.report['errors']) < MAX_REPORTED_ERRORS:
+            self.report['errors'].append({'source': source, 'error': message})
+
+    def _stage(self, name, started, count):
+        self.report['stages'][name] = self._throughput(time.perf_counter() - started, count)
+
+    @staticmethod
+    def _throughput(seconds, count):
+        return {
+            'seconds': round(seconds, 3),
+            'count': count,
+            'per_second': round(count / seconds, 1) if seconds > 0 else None,
+        }
+
+
+def format_report(report):
+    """命令行输出用的报告文本"""
+    lines = [f"文件 {report['files']}，导入 {report['imported']}，"
+             f"跳过 {report['skipped']}（标题已存在），失败 {report['failed']}"]
+    for name, stage in report['stages'].items():
+        rate = f"{stage['per_second']:.0f}/s" if stage['per_second'] else '-'
+        lines.append(f"  {name:<9}{stage['seconds']:>9.2f}s {stage['count']:>9} 项 {rate:>10}")
+    if report.get('indexes'):
+        lines.append(f"  已更新索引: {', '.join(report['indexes'])}")
+    for error in report['errors']:
+        lines.append(f"  ✗ {error['source']}: {error['error']}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    import sqlite3
+
+    parser = argparse.ArgumentParser(description='批量导入Markdown教程')
+    parser.add_argument('source', help='Markdown目录、tar包（.tar/.tar.gz）或单个文件')
+    parser.add_argument('--database', default=os.environ.get('DATABASE_URL') or 'ros2_wiki.db',
+                        help='SQLite文件路径或PostgreSQL URL')
+    parser.add_argument('--author', default=None, help='默认作者用户名（front matter未指定author时使用）')
+    parser.add_argument('--workers', type=int, default=PARSE_WORKERS, help='解析进程数')
+    parser.add_argument('--batch-size', type=int, default=INSERT_BATCH_SIZE)
+    parser.add_argument('--allow-duplicates', action='store_true', help='导入与已有文档同名的文档')
+    parser.add_argument('--no-render', action='store_true', help='跳过Markdown渲染（不预先写入渲染缓存）')
+    parser.add_argument('--no-index', action='store_true', help='不更新拼写纠错词典和相关文档')
+    args = parser.parse_args()
+
+    use_postgresql = args.database.startswith('postgresql')
+    if use_postgresql:
+        import psycopg2
+        connection = psycopg2.connect(args.database)
+    else:
+        connection = sqlite3.connect(args.database, isolation_level=None)
+
+    cur = connection.cursor()
+    if args.author:
+        cur.execute(f"SELECT id FROM users WHERE username = {'%s' if use_postgresql else '?'}", (args.author,))
+        row = cur.fetchone()
+        if not row:
+            parser.error(f"用户不存在: {args.author}")
+    else:
+        # 未指定时使用第一个管理员
+        cur.execute('SELECT id FROM users ORDER BY is_admin DESC, id LIMIT 1')
+        row = cur.fetchone()
+    default_author = row[0] if row else None
+
+    importer = BulkImporter(connection, use_postgresql=use_postgresql, db_key=args.database,
+                            author_id=default_author, workers=args.workers,
+                            skip_existing=not args.allow_duplicates, render=not args.no_render,
+                            update_indexes=not args.no_index, batch_size=args.batch_size)
+    print(format_report(importer.import_path(args.source)))
+    connection.close()
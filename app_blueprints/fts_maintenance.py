@@ -0,0 +1,418 @@
+# 全文索引维护模块 - FTS5段合并、完整性检查和在线重建
+#
+# documents_fts 是外部内容（content='documents'）的FTS5表，每次写入都会产生新的
+# 索引段。段数越多查询越慢，需要定期 merge/optimize；重建时先在影子表中构建，
+# 通过双写触发器保持同步，再在一个短事务中原子替换。
+
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+FTS_TABLE = 'documents_fts'
+SHADOW_TABLE = 'documents_fts_new'
+
+# FTS表和同步触发器定义，{table} 为FTS表名
+FTS_CREATE_SQL = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+    title,
+    content,
+    category,
+    content='documents',
+    content_rowid='id'
+)
+'''
+
+# 每条触发器单独执行（触发器体内含分号，不能按分号拆分整段SQL）
+FTS_TRIGGERS_SQL = (
+    '''
+    CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON documents BEGIN
+        INSERT INTO {table}(rowid, title, content, category)
+        VALUES (new.id, new.title, new.content, new.category);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON documents BEGIN
+        INSERT INTO {table}({table}, rowid, title, content, category)
+        VALUES('delete', old.id, old.title, old.content, old.category);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE ON documents BEGIN
+        INSERT INTO {table}({table}, rowid, title, content, category)
+        VALUES('delete', old.id, old.title, old.content, old.category);
+        INSERT INTO {table}(rowid, title, content, category)
+        VALUES (new.id, new.title, new.content, new.category);
+    END
+    ''',
+)
+
+FTS_TRIGGER_NAMES = ('{table}_insert', '{table}_delete', '{table}_update')
+
+# 段数超过该值时在低峰期执行增量合并
+MERGE_SEGMENT_THRESHOLD = 8
+# 每次增量合并写入的页数上限（控制单次持锁时间）
+MERGE_PAGES = 500
+# 调度器检查间隔（秒）
+CHECK_INTERVAL = 300
+# 每分钟请求数低于该值视为低峰期
+LOW_TRAFFIC_RPM = 30
+# 低峰期完整性检查的最小间隔（秒）
+INTEGRITY_CHECK_INTERVAL = 24 * 3600
+# 状态页展示的维护记录条数
+HISTORY_LIMIT = 10
+
+# FTS5结构记录在 _data 表中的固定rowid
+FTS5_STRUCTURE_ROWID = 10
+FTS5_STRUCTURE_V2 = b'\xff\x00\x00\x01'
+
+
+def _read_varint(data, pos):
+    """读取SQLite格式的varint，返回 (值, 新位置)"""
+    value = 0
+    for i in range(8):
+        byte = data[pos + i]
+        value = (value << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            return value, pos + i + 1
+    return (value << 8) | data[pos + 8], pos + 9
+
+
+def parse_structure(blob):
+    """
+    解析FTS5结构记录，返回 (层数, 段数, 每层段数列表)
+    格式：4字节cookie [+4字节V2标记] varint层数 varint段数 varint写计数 ...
+    """
+    pos = 4
+    v2 = blob[pos:pos + 4] == FTS5_STRUCTURE_V2
+    if v2:
+        pos += 4
+    n_level, pos = _read_varint(blob, pos)
+    n_segment, pos = _read_varint(blob, pos)
+    _, pos = _read_varint(blob, pos)
+
+    per_level = []
+    fields_per_segment = 8 if v2 else 3
+    try:
+        for _ in range(n_level):
+            _, pos = _read_varint(blob, pos)  # nMerge
+            n_seg, pos = _read_varint(blob, pos)
+            per_level.append(n_seg)
+            for _ in range(n_seg * fields_per_segment):
+                _, pos = _read_varint(blob, pos)
+    except IndexError:
+        # 未知的结构版本：只返回头部的总段数
+        pass
+    return n_level, n_segment, per_level
+
+
+class FTSMaintenance:
+    """FTS5索引维护"""
+
+    def __init__(self, conn, table=FTS_TABLE):
+        self.conn = conn
+        self.table = table
+
+    def create_index(self):
+        """创建FTS表和同步触发器；新建时从documents表填充已有数据"""
+        created = not self.exists()
+        self.conn.execute(FTS_CREATE_SQL.format(table=self.table))
+        self._create_triggers(self.table)
+        if created:
+            self.conn.execute(f"INSERT INTO {self.table}({self.table}) VALUES('rebuild')")
+        self._ensure_log_table()
+        self.conn.commit()
+
+    def exists(self, table=None):
+        """检查FTS表是否存在"""
+        cursor = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table or self.table,)
+        )
+        return cursor.fetchone() is not None
+
+    def segment_info(self):
+        """读取当前段结构：{'levels', 'segments', 'per_level'}"""
+        row = self.conn.execute(
+            f"SELECT block FROM {self.table}_data WHERE id = ?", (FTS5_STRUCTURE_ROWID,)
+        ).fetchone()
+        if not row or not row[0]:
+            return {'levels': 0, 'segments': 0, 'per_level': []}
+        levels, segments, per_level = parse_structure(bytes(row[0]))
+        return {'levels': levels, 'segments': segments, 'per_level': per_level}
+
+    def index_size(self):
+        """索引数据大小（字节），不含外部内容表"""
+        data_size = self.conn.execute(
+            f"SELECT COALESCE(SUM(LENGTH(block)), 0) FROM {self.table}_data"
+        ).fetchone()[0]
+        idx_size = self.conn.execute(
+            f"SELECT COALESCE(SUM(LENGTH(term)) + COUNT(*) * 16, 0) FROM {self.table}_idx"
+        ).fetchone()[0]
+        return data_size + idx_size
+
+    def status(self):
+        """汇总索引状态和最近的维护记录"""
+        if not self.exists():
+            return {'available': False}
+        info = self.segment_info()
+        info.update({
+            'available': True,
+            'table': self.table,
+            'size_bytes': self.index_size(),
+            'needs_merge': info['segments'] > MERGE_SEGMENT_THRESHOLD,
+            'history': self.history()
+        })
+        return info
+
+    def merge(self, pages=MERGE_PAGES):
+        """增量合并段（每次最多写入pages页，可重复调用）"""
+        return self._run('merge', f"INSERT INTO {self.table}({self.table}, rank) VALUES('merge', ?)", (pages,))
+
+    def optimize(self):
+        """把所有段合并为一个（开销较大，适合低峰期）"""
+        return self._run('optimize', f"INSERT INTO {self.table}({self.table}) VALUES('optimize')")
+
+    def integrity_check(self):
+        """完整性检查，rank=1 时同时校验外部内容表"""
+        return self._run('integrity-check',
+                         f"INSERT INTO {self.table}({self.table}, rank) VALUES('integrity-check', 1)")
+
+    def rebuild_online(self):
+        """
+        在线重建
+        1. 创建影子FTS表及其双写触发器，之后的写入会同时更新新旧两张表
+        2. 影子表从documents执行 'rebuild'，期间查询仍使用旧表
+        3. 一个事务内删除旧表和旧触发器、重命名影子表、重建标准触发器
+        """
+        started = time.perf_counter()
+        before = self._segment_count()
+        shadow = FTSMaintenance(self.conn, SHADOW_TABLE)
+        try:
+            self._drop_table(SHADOW_TABLE)
+            shadow.create_index()
+
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._drop_table(self.table, commit=False)
+            self._drop_triggers(SHADOW_TABLE)
+            self.conn.execute(f"ALTER TABLE {SHADOW_TABLE} RENAME TO {self.table}")
+            self._create_triggers(self.table)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            self._drop_table(SHADOW_TABLE)
+            self._log('rebuild', started, before, before, f'失败: {e}')
+            return {'action': 'rebuild', 'ok': False, 'error': str(e)}
+
+        after = self._segment_count()
+        self._log('rebuild', started, before, after, 'ok')
+        return {'action': 'rebuild', 'ok': True, 'segments_before': before, 'segments_after': after,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+    def suspend_triggers(self):
+        """批量导入前暂停同步触发器（在调用方的事务中执行，回滚时一并恢复）"""
+        self._drop_triggers(self.table)
+
+    def resume_triggers(self):
+        """恢复同步触发器，并用一次 'rebuild' 补齐暂停期间写入的文档（不提交事务）"""
+        self._create_triggers(self.table)
+        self.conn.execute(f"INSERT INTO {self.table}({self.table}) VALUES('rebuild')")
+
+    def history(self, limit=HISTORY_LIMIT):
+        """最近的维护记录"""
+        if not self.exists('fts_maintenance_log'):
+            return []
+        cursor = self.conn.execute('''
+            SELECT action, started_at, duration_ms, segments_before, segments_after, result
+            FROM fts_maintenance_log ORDER BY id DESC LIMIT ?
+        ''', (limit,))
+        return [{'action': row[0], 'started_at': row[1], 'duration_ms': row[2],
+                 'segments_before': row[3], 'segments_after': row[4], 'result': row[5]}
+                for row in cursor.fetchall()]
+
+    def _run(self, action, sql, params=()):
+        """执行一个FTS5维护命令并记录结果"""
+        started = time.perf_counter()
+        before = self._segment_count()
+        try:
+            self.conn.execute(sql, params)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            self._log(action, started, before, before, f'失败: {e}')
+            return {'action': action, 'ok': False, 'error': str(e)}
+        after = self._segment_count()
+        self._log(action, started, before, after, 'ok')
+        return {'action': action, 'ok': True, 'segments_before': before, 'segments_after': after,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+    def _segment_count(self):
+        try:
+            return self.segment_info()['segments']
+        except (sqlite3.Error, IndexError):
+            return None
+
+    def _ensure_log_table(self):
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS fts_maintenance_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                action TEXT NOT NULL,
+                started_at TEXT NOT NULL,
+                duration_ms REAL,
+                segments_before INTEGER,
+                segments_after INTEGER,
+                result TEXT
+            )
+        ''')
+
+    def _log(self, action, started, before, after, result):
+        """写入维护记录（记录失败不影响维护本身）"""
+        try:
+            self._ensure_log_table()
+            self.conn.execute('''
+                INSERT INTO fts_maintenance_log
+                (action, started_at, duration_ms, segments_before, segments_after, result)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (action, datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                  round((time.perf_counter() - started) * 1000, 1), before, after, result))
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print(f"记录索引维护日志失败: {e}")
+
+    def _create_triggers(self, table):
+        for sql in FTS_TRIGGERS_SQL:
+            self.conn.execute(sql.format(table=table))
+
+    def _drop_triggers(self, table):
+        for name in FTS_TRIGGER_NAMES:
+            self.conn.execute(f"DROP TRIGGER IF EXISTS {name.format(table=table)}")
+
+    def _drop_table(self, table, commit=True):
+        self._drop_triggers(table)
+        self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+        if commit:
+            self.conn.commit()
+
+
+class FTSMaintenanceScheduler:
+    """
+    低峰期维护调度器
+    后台线程定期检查段数，请求量低时执行增量合并和每日完整性检查；
+    管理后台触发的操作也通过这里串行执行。
+    """
+
+    def __init__(self, db_path, check_interval=CHECK_INTERVAL, low_traffic_rpm=LOW_TRAFFIC_RPM):
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self.low_traffic_rpm = low_traffic_rpm
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._requests = 0
+        self._window_started = time.time()
+        self._last_rpm = 0
+        self._last_integrity_check = 0
+        self.running_action = None
+        self.last_result = None
+
+    def record_request(self):
+        """记录一次请求，用于判断是否处于低峰期"""
+        self._requests += 1
+
+    def requests_per_minute(self):
+        """上一个统计窗口的每分钟请求数"""
+        elapsed = time.time() - self._window_started
+        if elapsed >= 60:
+            self._last_rpm = self._requests * 60 / elapsed
+            self._requests = 0
+            self._window_started = time.time()
+        return self._last_rpm
+
+    def start(self):
+        """启动后台调度线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='fts-maintenance', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_now(self, action):
+        """在后台线程中执行一次维护操作；已有操作在运行时返回False"""
+        if action not in ('merge', 'optimize', 'integrity-check', 'rebuild'):
+            raise ValueError(f"未知的维护操作: {action}")
+        if not self._lock.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._execute, args=(action, True), daemon=True).start()
+        return True
+
+    def status(self):
+        """索引状态 + 调度器状态"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            info = FTSMaintenance(conn).status()
+        finally:
+            conn.close()
+        info.update({
+            'running_action': self.running_action,
+            'last_result': self.last_result,
+            'requests_per_minute': round(self.requests_per_minute(), 1),
+            'scheduler_running': bool(self._thread and self._thread.is_alive())
+        })
+        return info
+
+    def _loop(self):
+        while not self._stop.wait(self.check_interval):
+            if self.requests_per_minute() >= self.low_traffic_rpm:
+                continue
+            try:
+                self._maintain()
+            except Exception as e:
+                print(f"全文索引维护失败: {e}")
+
+    def _maintain(self):
+        """低峰期例行维护：段数过多时合并，按间隔做完整性检查"""
+        if not self._lock.acquire(blocking=False):
+            return
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            maintenance = FTSMaintenance(conn)
+            if not maintenance.exists():
+                return
+            if maintenance.segment_info()['segments'] > MERGE_SEGMENT_THRESHOLD:
+                self._set_result(maintenance.merge())
+            if time.time() - self._last_integrity_check > INTEGRITY_CHECK_INTERVAL:
+                self._last_integrity_check = time.time()
+                self._set_result(maintenance.integrity_check())
+        finally:
+            conn.close()
+            self._lock.release()
+
+    def _execute(self, action, locked=False):
+        """执行指定操作（调用方已持有锁时locked=True）"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        self.running_action = action
+        try:
+            maintenance = FTSMaintenance(conn)
+            if action == 'merge':
+                result = maintenance.merge()
+            elif action == 'optimize':
+                result = maintenance.optimize()
+            elif action == 'integrity-check':
+                result = maintenance.integrity_check()
+            else:
+                result = maintenance.rebuild_online()
+            self._set_result(result)
+        except Exception as e:
+            print(f"全文索引维护失败: {e}")
+            self._set_result({'action': action, 'ok': False, 'error': str(e)})
+        finally:
+            self.running_action = None
+            conn.close()
+            if locked:
+                self._lock.release()
+
+    def _set_result(self, result):
+        result['finished_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.last_result = result
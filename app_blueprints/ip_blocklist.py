@@ -0,0 +1,427 @@
+# IP封禁名单模块 - 支持IPv4/IPv6网段（CIDR）的长期封禁
+#
+# 封禁条目有两个来源：
+#   - 威胁情报文件（BLOCKLIST_FILE，每行一个IP或CIDR，# 之后为备注），按修改时间热加载
+#   - 数据库 ip_blocklist 表（管理接口、批量导入写入），各worker定期比较表的版本后重新加载
+# 全部网段按地址族合并成按起始地址排序、互不重叠的整数区间，查询时对起始地址做一次
+# bisect 二分查找，几千条网段下单次判断也只需几微秒，和名单长度基本无关。
+# 重新加载在后台构建新的区间表后整体替换，查询不加锁。
+# 带过期时间的临时封禁（登录失败锁定等）仍由 security_state 负责。
+# 命令行: python -m app_blueprints.ip_blocklist import|export|check|stats --database ros2_wiki.db
+
+import os
+import sys
+import time
+import socket
+import sqlite3
+import argparse
+import ipaddress
+import threading
+from bisect import bisect_right
+
+try:
+    import psycopg2
+    HAS_POSTGRESQL = True
+except ImportError:
+    HAS_POSTGRESQL = False
+
+# 威胁情报文件路径（不存在时视为空名单）
+BLOCKLIST_FILE = os.environ.get('BLOCKLIST_FILE', os.path.join('instance', 'ip_blocklist.txt'))
+# 检查文件和数据库是否有变化的间隔（秒）；本进程的修改立即生效
+BLOCKLIST_RELOAD_INTERVAL = float(os.environ.get('BLOCKLIST_RELOAD_INTERVAL', 5.0))
+# 单次导入的最大条目数
+BLOCKLIST_MAX_IMPORT = int(os.environ.get('BLOCKLIST_MAX_IMPORT', 100000))
+
+SOURCE_FILE = 'file'
+SOURCE_MANUAL = 'manual'
+SOURCE_IMPORT = 'import'
+
+_IPV4_MAPPED_PREFIX = 0xFFFF << 32
+_IPV4_MAPPED_MASK = ((1 << 96) - 1) << 32
+
+
+def parse_network(value):
+    """把IP或CIDR文本解析为网段（主机位非零时按所在网段处理），无效时返回None"""
+    try:
+        network = ipaddress.ip_network(str(value).strip(), strict=False)
+    except ValueError:
+        return None
+    if network.version == 6 and network.prefixlen >= 96 and network.network_address.ipv4_mapped is not None:
+        # ::ffff:a.b.c.d/n 按IPv4网段处理，和查询时的地址转换一致
+        network = ipaddress.ip_network(f'{network.network_address.ipv4_mapped}/{network.prefixlen - 96}')
+    return network
+
+
+def ip_to_int(ip):
+    """IP文本转为 (地址族, 整数)，无效时返回None；inet_pton 比 ipaddress.ip_address 快得多"""
+    if not ip:
+        return None
+    try:
+        if ':' not in ip:
+            return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip.split('%', 1)[0]), 'big')
+    except (OSError, ValueError):
+        return None
+    if value & _IPV4_MAPPED_MASK == _IPV4_MAPPED_PREFIX:
+        return 4, value & 0xFFFFFFFF
+    return 6, value
+
+
+def parse_blocklist_text(text):
+    """
+    解析名单文本：每行一个IP或CIDR，# 之后为备注（作为封禁原因），空行忽略
+    返回 ([(网段, 原因), ...], [无效行, ...])
+    """
+    entries = []
+    invalid = []
+    for line in text.splitlines():
+        value, _, comment = line.partition('#')
+        value = value.strip()
+        if not value:
+            continue
+        # 兼容 "CIDR,原因" 格式（导出的CSV）
+        value, _, reason = value.partition(',')
+        network = parse_network(value)
+        if network is None:
+            invalid.append(line.strip())
+            continue
+        entries.append((network, (reason or comment).strip() or None))
+    return entries, invalid
+
+
+def compile_ranges(networks):
+    """把网段合并成按起始地址排序的不重叠区间，返回 {地址族: (起始列表, 结束列表)}"""
+    ranges = {4: [], 6: []}
+    for network in networks:
+        ranges[network.version].append((int(network.network_address), int(network.broadcast_address)))
+    compiled = {}
+    for version, items in ranges.items():
+        items.sort()
+        starts = []
+        ends = []
+        for start, end in items:
+            if ends and start <= ends[-1] + 1:
+                if end > ends[-1]:
+                    ends[-1] = end
+            else:
+                starts.append(start)
+                ends.append(end)
+        compiled[version] = (starts, ends)
+    return compiled
+
+
+def create_blocklist_schema(cursor, use_postgresql=False):
+    """创建封禁名单表"""
+    id_column = 'id SERIAL PRIMARY KEY' if use_postgresql else 'id INTEGER PRIMARY KEY AUTOINCREMENT'
+    real = 'DOUBLE PRECISION' if use_postgresql else 'REAL'
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS ip_blocklist (
+            {id_column},
+            cidr TEXT NOT NULL UNIQUE,
+            reason TEXT,
+            source TEXT NOT NULL DEFAULT '{SOURCE_MANUAL}',
+            created_by TEXT,
+            updated_at {real} NOT NULL
+        )
+    ''')
+
+
+def default_database():
+    database_url = os.environ.get('DATABASE_URL')
+    if database_url and database_url.startswith('postgresql') and HAS_POSTGRESQL:
+        return database_url
+    return 'ros2_wiki.db'
+
+
+class IPBlocklist:
+    """
+    CIDR封禁名单：文件条目和数据库条目合并后编译成区间表
+    db_path_or_url 为 None 时只使用名单文件
+    """
+
+    def __init__(self, db_path_or_url=None, path=BLOCKLIST_FILE, reload_interval=BLOCKLIST_RELOAD_INTERVAL):
+        self.db_path_or_url = db_path_or_url
+        self.use_postgresql = bool(db_path_or_url and db_path_or_url.startswith('postgresql') and HAS_POSTGRESQL)
+        self.placeholder = '%s' if self.use_postgresql else '?'
+        self.path = path
+        self.reload_interval = reload_interval
+        self._file_entries = {}   # cidr -> 原因
+        self._db_entries = {}     # cidr -> (原因, 来源)
+        self._file_signature = None
+        self._db_signature = None
+        self._ranges = compile_ranges([])
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._schema_ready = False
+        self.stats = {'lookups': 0, 'blocked': 0, 'reloads': 0, 'last_reload': None, 'errors': 0}
+
+    # ---- 查询 ----
+
+    def is_blocked(self, ip):
+        """IP是否落在任一封禁网段内（无效IP视为未封禁）"""
+        if time.monotonic() >= self._next_check:
+            self.reload()
+        parsed = ip_to_int(ip)
+        self.stats['lookups'] += 1
+        if parsed is None:
+            return False
+        starts, ends = self._ranges[parsed[0]]
+        index = bisect_right(starts, parsed[1]) - 1
+        if index >= 0 and parsed[1] <= ends[index]:
+            self.stats['blocked'] += 1
+            return True
+        return False
+
+    def match(self, ip):
+        """列出包含该IP的全部条目（用于管理接口说明封禁原因，逐条比较，不在请求路径上使用）"""
+        parsed = ip_to_int(ip)
+        if parsed is None:
+            return []
+        version, value = parsed
+        matches = []
+        for cidr, reason, source in self._iter_entries():
+            network = ipaddress.ip_network(cidr)
+            if network.version == version and int(network.network_address) <= value <= int(network.broadcast_address):
+                matches.append({'cidr': cidr, 'reason': reason, 'source': source})
+        return matches
+
+    def _iter_entries(self):
+        for cidr, reason in self._file_entries.items():
+            yield cidr, reason, SOURCE_FILE
+        for cidr, (reason, source) in self._db_entries.items():
+            yield cidr, reason, source
+
+    # ---- 加载 ----
+
+    def reload(self, force=False):
+        """
+        检查名单文件和数据库是否有变化，有变化时重新编译区间表（其他线程正在加载时直接返回）；
+        force=True 时等待加锁并重新读取数据库（本进程写入数据库后调用）
+        """
+        if not self._reload_lock.acquire(blocking=force):
+            return False
+        try:
+            self._next_check = time.monotonic() + self.reload_interval
+            changed = self._load_file()
+            changed = self._load_database(force) or changed
+            if changed or force:
+                self._rebuild()
+            return changed
+        finally:
+            self._reload_lock.release()
+
+    def _load_file(self):
+        if not self.path:
+            return False
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if signature == self._file_signature:
+            return False
+        self._file_signature = signature
+        entries = {}
+        if signature is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    networks, invalid = parse_blocklist_text(f.read())
+                for network, reason in networks:
+                    entries[str(network)] = reason
+                if invalid:
+                    print(f"封禁名单文件 {self.path} 中有 {len(invalid)} 行无效，已忽略")
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"读取封禁名单文件失败: {e}")
+                return False
+        self._file_entries = entries
+        return True
+
+    def _connect(self):
+        if self.use_postgresql:
+            return psycopg2.connect(self.db_path_or_url)
+        return sqlite3.connect(self.db_path_or_url, timeout=10)
+
+    def _ensure_schema(self, conn):
+        if not self._schema_ready:
+            cursor = conn.cursor()
+            create_blocklist_schema(cursor, self.use_postgresql)
+            conn.commit()
+            self._schema_ready = True
+
+    def _load_database(self, force):
+        if not self.db_path_or_url:
+            return False
+        conn = None
+        try:
+            conn = self._connect()
+            self._ensure_schema(conn)
+            cursor = conn.cursor()
+            # 任何写入都会更新 updated_at，删除会改变行数，两者都不变说明表没有变化
+            cursor.execute('SELECT COUNT(*), MAX(updated_at) FROM ip_blocklist')
+            signature = tuple(cursor.fetchone())
+            if signature == self._db_signature and not force:
+                return False
+            cursor.execute('SELECT cidr, reason, source FROM ip_blocklist')
+            entries = {}
+            for cidr, reason, source in cursor.fetchall():
+                network = parse_network(cidr)
+                if network is not None:
+                    entries[str(network)] = (reason, source)
+            self._db_entries = entries
+            self._db_signature = signature
+            return True
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"加载封禁名单失败: {e}")
+            return False
+        finally:
+            if conn:
+                conn.close()
+
+    def _rebuild(self):
+        networks = [ipaddress.ip_network(cidr) for cidr, _, _ in self._iter_entries()]
+        self._ranges = compile_ranges(networks)
+        self.stats['reloads'] += 1
+        self.stats['last_reload'] = time.time()
+
+    # ---- 修改（写入数据库） ----
+
+    def add(self, cidr, reason=None, source=SOURCE_MANUAL, created_by=None):
+        """添加一个IP或网段，返回规范化后的CIDR；无效时抛出 ValueError"""
+        result = self.import_entries([(cidr, reason)], source=source, created_by=created_by)
+        if result['invalid']:
+            raise ValueError(f'无效的IP或网段: {cidr}')
+        return result['entries'][0]
+
+    def import_text(self, text, source=SOURCE_IMPORT, replace=False, created_by=None):
+        """批量导入名单文本（格式同名单文件）"""
+        networks, invalid = parse_blocklist_text(text)
+        result = self.import_entries(networks, source=source, replace=replace, created_by=created_by)
+        result['invalid'] = invalid + result['invalid']
+        return result
+
+    def import_entries(self, entries, source=SOURCE_IMPORT, replace=False, created_by=None):
+        """
+        批量写入 [(IP/CIDR或网段对象, 原因), ...]，已存在的条目更新原因和来源
+        replace=True 时先删除同一来源的全部旧条目（用于整体替换某个情报源）
+        """
+        if not self.db_path_or_url:
+            raise RuntimeError('未配置数据库，封禁名单只能通过名单文件修改')
+        valid = {}
+        invalid = []
+        for value, reason in entries:
+            network = value if isinstance(value, (ipaddress.IPv4Network, ipaddress.IPv6Network)) else parse_network(value)
+            if network is None:
+                invalid.append(str(value))
+            else:
+                valid[str(network)] = reason
+        if len(valid) > BLOCKLIST_MAX_IMPORT:
+            raise ValueError(f'单次最多导入 {BLOCKLIST_MAX_IMPORT} 条')
+
+        now = time.time()
+        p = self.placeholder
+        conn = self._connect()
+        try:
+            self._ensure_schema(conn)
+            cursor = conn.cursor()
+            removed = 0
+            if replace:
+                cursor.execute(f'DELETE FROM ip_blocklist WHERE source = {p}', (source,))
+                removed = cursor.rowcount
+            cursor.executemany(f'''
+                INSERT INTO ip_blocklist (cidr, reason, source, created_by, updated_at)
+                VALUES ({p}, {p}, {p}, {p}, {p})
+                ON CONFLICT (cidr) DO UPDATE SET reason = excluded.reason, source = excluded.source,
+                    created_by = excluded.created_by, updated_at = excluded.updated_at
+            ''', [(cidr, reason, source, created_by, now) for cidr, reason in valid.items()])
+            conn.commit()
+        finally:
+            conn.close()
+
+        self.reload(force=True)
+        return {'imported': len(valid), 'removed': removed, 'invalid': invalid, 'entries': list(valid)}
+
+    def remove(self, cidr):
+        """删除数据库中的条目（名单文件中的条目需修改文件），返回是否删除"""
+        network = parse_network(cidr)
+        if network is None or not self.db_path_or_url:
+            return False
+        conn = self._connect()
+        try:
+            self._ensure_schema(conn)
+            cursor = conn.cursor()
+            cursor.execute(f'DELETE FROM ip_blocklist WHERE cidr = {self.placeholder}', (str(network),))
+            removed = cursor.rowcount > 0
+            conn.commit()
+        finally:
+            conn.close()
+        if removed:
+            self.reload(force=True)
+        return removed
+
+    # ---- 导出和统计 ----
+
+    def export(self, source=None):
+        """导出全部条目 [{'cidr', 'reason', 'source'}, ...]，可按来源过滤"""
+        self.reload()
+        return [{'cidr': cidr, 'reason': reason, 'source': entry_source}
+                for cidr, reason, entry_source in self._iter_entries()
+                if source is None or entry_source == source]
+
+    def export_text(self, source=None):
+        """导出为名单文件格式，可直接作为 BLOCKLIST_FILE 或再次导入"""
+        lines = [f"{entry['cidr']}  # {entry['reason']}" if entry['reason'] else entry['cidr']
+                 for entry in self.export(source)]
+        return '\n'.join(lines) + ('\n' if lines else '')
+
+    def status(self):
+        starts4 = self._ranges[4][0]
+        starts6 = self._ranges[6][0]
+        return dict(self.stats, file=self.path, file_entries=len(self._file_entries),
+                    db_entries=len(self._db_entries), ipv4_ranges=len(starts4), ipv6_ranges=len(starts6))
+
+
+_default_blocklist = None
+_default_lock = threading.Lock()
+
+
+def get_ip_blocklist():
+    """进程内共享的默认封禁名单（应用数据库 + BLOCKLIST_FILE）"""
+    global _default_blocklist
+    if _default_blocklist is None:
+        with _default_lock:
+            if _default_blocklist is None:
+                _default_blocklist = IPBlocklist(default_database())
+    return _default_blocklist
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='IP封禁名单管理')
+    parser.add_argument('command', choices=['import', 'export', 'check', 'stats'])
+    parser.add_argument('value', nargs='?', help='import: 名单文件（- 为标准输入）；check: IP地址')
+    parser.add_argument('--database', default=default_database())
+    parser.add_argument('--source', default=None, help='导入/导出的来源标记')
+    parser.add_argument('--replace', action='store_true', help='导入前删除同一来源的旧条目')
+    args = parser.parse_args(argv)
+
+    blocklist = IPBlocklist(args.database)
+    if args.command == 'import':
+        text = sys.stdin.read() if args.value in (None, '-') else open(args.value, encoding='utf-8').read()
+        result = blocklist.import_text(text, source=args.source or SOURCE_IMPORT, replace=args.replace)
+        print(f"导入 {result['imported']} 条，删除旧条目 {result['removed']} 条，无效 {len(result['invalid'])} 行")
+    elif args.command == 'export':
+        sys.stdout.write(blocklist.export_text(args.source))
+    elif args.command == 'check':
+        blocked = blocklist.is_blocked(args.value)
+        print(f"{args.value}: {'已封禁' if blocked else '未封禁'}")
+        for entry in blocklist.match(args.value):
+            print(f"  {entry['cidr']} ({entry['source']}) {entry['reason'] or ''}")
+    else:
+        blocklist.reload(force=True)
+        for key, value in blocklist.status().items():
+            print(f"{key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
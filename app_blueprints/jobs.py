@@ -0,0 +1,685 @@
+# 后台任务模块 - 把耗时操作移出请求路径
+#
+# 任务持久化在应用数据库的 jobs 表中（不依赖Redis等外部组件），请求只插入一行就返回。
+# 调度线程按优先级领取到期任务，交给线程池（或进程池）执行：
+#   - 领取用一条 UPDATE ... RETURNING 完成，多个进程同时运行调度器也不会重复领取
+#   - 执行中的任务持有租约并定期续期，进程崩溃后租约过期，任务重新排队
+#   - 失败按指数退避重试，超过 max_attempts 后标记为 failed
+# 命令行: python -m app_blueprints.jobs status|work --database ros2_wiki.db
+
+import os
+import json
+import time
+import random
+import atexit
+import sqlite3
+import hashlib
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, BrokenExecutor
+
+try:
+    import psycopg2
+    HAS_POSTGRESQL = True
+except ImportError:
+    HAS_POSTGRESQL = False
+
+# 并发执行的任务数；执行器 thread / process（CPU密集的渲染任务较多时使用process）
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_EXECUTOR = os.environ.get('JOB_EXECUTOR', 'thread')
+# 没有新任务通知时的轮询间隔（秒）
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 2.0))
+# 租约时长（秒）：执行中的任务每次轮询续期，进程退出后最迟在租约到期时重新排队
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 60))
+# 重试退避：第n次失败后等待 base * 2^(n-1) 秒（带抖动），不超过上限
+JOB_RETRY_BASE = float(os.environ.get('JOB_RETRY_BASE', 5))
+JOB_RETRY_MAX = float(os.environ.get('JOB_RETRY_MAX', 600))
+DEFAULT_MAX_ATTEMPTS = 3
+# 已完成任务的保留时间（天）
+JOB_RETENTION_DAYS = float(os.environ.get('JOB_RETENTION_DAYS', 7))
+# 导出文件目录
+JOB_EXPORT_DIR = os.environ.get('JOB_EXPORT_DIR', os.path.join('instance', 'exports'))
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+# 常用优先级（数值越大越先执行）
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+# 任务类型 -> 处理函数；处理函数签名 handler(context, payload)，返回值需可JSON序列化
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    """注册任务处理函数（需定义在模块顶层，进程池模式下按引用传给子进程）"""
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def is_postgresql_url(db_key):
+    return bool(db_key) and db_key.startswith('postgresql') and HAS_POSTGRESQL
+
+
+def connect_database(db_key):
+    """按数据库路径或URL创建连接（任务在独立线程/进程中执行，各自建立连接）"""
+    if is_postgresql_url(db_key):
+        return psycopg2.connect(db_key)
+    return sqlite3.connect(db_key or 'ros2_wiki.db', timeout=30)
+
+
+def create_jobs_schema(cursor, use_postgresql=False):
+    """创建任务表"""
+    id_column = 'id SERIAL PRIMARY KEY' if use_postgresql else 'id INTEGER PRIMARY KEY AUTOINCREMENT'
+    real = 'DOUBLE PRECISION' if use_postgresql else 'REAL'
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS jobs (
+            {id_column},
+            kind TEXT NOT NULL,
+            payload TEXT,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT {DEFAULT_MAX_ATTEMPTS},
+            run_at {real} NOT NULL,
+            lease_until {real},
+            dedupe_key TEXT,
+            created_by INTEGER,
+            created_at {real} NOT NULL,
+            started_at {real},
+            finished_at {real},
+            result TEXT,
+            error TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, priority DESC, run_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs(dedupe_key)')
+
+
+class JobContext:
+    """传给处理函数的执行信息（可在进程间传递）"""
+
+    def __init__(self, db_key, job_id, attempt, max_attempts, standalone=False):
+        self.db_key = db_key
+        self.use_postgresql = is_postgresql_url(db_key)
+        self.job_id = job_id
+        self.attempt = attempt
+        self.max_attempts = max_attempts
+        # 是否在独立工作进程（命令行 work/run-once）中执行；Web进程中为False，处理函数不应再启动进程池
+        self.standalone = standalone
+
+    @property
+    def placeholder(self):
+        return '%s' if self.use_postgresql else '?'
+
+    @property
+    def last_attempt(self):
+        return self.attempt >= self.max_attempts
+
+    def connect(self):
+        return connect_database(self.db_key)
+
+
+def execute_handler(handler, context, payload):
+    """执行器入口（线程池和进程池共用）"""
+    return handler(context, payload)
+
+
+class JobRunner:
+    """任务队列与调度器"""
+
+    def __init__(self, db_key, workers=JOB_WORKERS, executor=JOB_EXECUTOR,
+                 poll_interval=JOB_POLL_INTERVAL, lease_seconds=JOB_LEASE_SECONDS, standalone=False):
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"未知的任务执行器: {executor}")
+        self.db_key = db_key
+        self.use_postgresql = is_postgresql_url(db_key)
+        self.placeholder = '%s' if self.use_postgresql else '?'
+        self.workers = workers
+        self.executor_kind = executor
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.standalone = standalone
+
+        self.lock = threading.Lock()
+        self.running = {}
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread = None
+        self.executor = None
+        self.executor_broken = False
+        self.schema_ready = False
+        self.last_purge = 0.0
+        self.stats = {'claimed': 0, 'succeeded': 0, 'failed': 0, 'retried': 0, 'recovered': 0}
+
+    def connect(self):
+        return connect_database(self.db_key)
+
+    def ensure_schema(self):
+        if self.schema_ready:
+            return
+        conn = self.connect()
+        try:
+            create_jobs_schema(conn.cursor(), self.use_postgresql)
+            conn.commit()
+            self.schema_ready = True
+        finally:
+            conn.close()
+
+    # ---- 提交与查询 ----
+
+    def enqueue(self, kind, payload=None, priority=PRIORITY_NORMAL, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                delay=0, dedupe_key=None, created_by=None):
+        """
+        提交任务并立即返回任务ID
+        dedupe_key: 已有相同键的任务在排队时不重复提交，返回已排队任务的ID
+        """
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"未知的任务类型: {kind}")
+        self.ensure_schema()
+        p = self.placeholder
+        now = time.time()
+        values = (kind, json.dumps(payload or {}, ensure_ascii=False), priority, max_attempts, now + delay,
+                  dedupe_key, created_by, now)
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            if dedupe_key is None:
+                cursor.execute(f'''
+                    INSERT INTO jobs (kind, payload, priority, max_attempts, run_at, dedupe_key, created_by, created_at)
+                    VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p}, {p}) RETURNING id
+                ''', values)
+            else:
+                cursor.execute(f'''
+                    INSERT INTO jobs (kind, payload, priority, max_attempts, run_at, dedupe_key, created_by, created_at)
+                    SELECT {p}, {p}, {p}, {p}, {p}, {p}, {p}, {p}
+                    WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE dedupe_key = {p} AND status = 'queued')
+                    RETURNING id
+                ''', values + (dedupe_key,))
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute(f"SELECT id FROM jobs WHERE dedupe_key = {p} AND status = 'queued' "
+                               f"ORDER BY id LIMIT 1", (dedupe_key,))
+                row = cursor.fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+        self.wakeup.set()
+        return row[0] if row else None
+
+    def get_job(self, job_id):
+        self.ensure_schema()
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT {self._columns()} FROM jobs WHERE id = {self.placeholder}', (job_id,))
+            row = cursor.fetchone()
+            return self._row_to_dict(row) if row else None
+        finally:
+            conn.close()
+
+    def list_jobs(self, status=None, kind=None, limit=50):
+        self.ensure_schema()
+        p = self.placeholder
+        conditions, params = [], []
+        if status:
+            conditions.append(f'status = {p}')
+            params.append(status)
+        if kind:
+            conditions.append(f'kind = {p}')
+            params.append(kind)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT {self._columns()} FROM jobs {where} ORDER BY id DESC LIMIT {p}',
+                           params + [limit])
+            return [self._row_to_dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def counts(self):
+        self.ensure_schema()
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status')
+            counts = {status: 0 for status in JOB_STATUSES}
+            counts.update(dict(cursor.fetchall()))
+            return counts
+        finally:
+            conn.close()
+
+    def cancel(self, job_id):
+        """取消排队中的任务（执行中的任务不能取消），返回是否成功"""
+        return self._update_status(job_id, 'cancelled', "status = 'queued'")
+
+    def retry(self, job_id):
+        """把失败或已取消的任务重新排队"""
+        return self._update_status(job_id, 'queued', "status IN ('failed', 'cancelled')", reset=True)
+
+    def status(self):
+        with self.lock:
+            running = [{'id': job_id, 'kind': job['kind']} for job_id, job in self.running.items()]
+        return {
+            'workers': self.workers,
+            'executor': self.executor_kind,
+            'active': bool(self.thread and self.thread.is_alive()),
+            'running': running,
+            'counts': self.counts(),
+            'stats': dict(self.stats),
+        }
+
+    # ---- 调度 ----
+
+    def start(self):
+        """启动调度线程，进程退出时等待执行中的任务完成"""
+        if self.thread is not None:
+            return
+        self.ensure_schema()
+        self.executor = self._create_executor()
+        self.thread = threading.Thread(target=self._run, name='job-dispatcher', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, wait=True):
+        self.stopping = True
+        self.wakeup.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=10)
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+
+    def _create_executor(self):
+        if self.executor_kind == 'process':
+            # spawn方式启动子进程：在多线程的Web服务器进程中fork不安全
+            return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job-worker')
+
+    def run_pending(self, limit=None):
+        """在当前线程中执行到期的任务（命令行和脚本使用），返回执行的任务数"""
+        self.ensure_schema()
+        self._recover_expired()
+        done = 0
+        while limit is None or done < limit:
+            job = self._claim()
+            if job is None:
+                break
+            try:
+                result = execute_handler(JOB_HANDLERS[job['kind']], self._context(job), job['payload'])
+            except Exception as e:
+                self._complete(job, error=e)
+            else:
+                self._complete(job, result=result)
+            done += 1
+        return done
+
+    def _run(self):
+        while not self.stopping:
+            try:
+                self._recover_expired()
+                self._renew_leases()
+                self._purge_finished()
+                if self.executor_broken:
+                    # 进程池中的子进程异常退出后整个进程池不可用，重新创建
+                    self.executor.shutdown(wait=False)
+                    self.executor = self._create_executor()
+                    self.executor_broken = False
+                while not self.stopping and len(self.running) < self.workers:
+                    job = self._claim()
+                    if job is None:
+                        break
+                    self._submit(job)
+            except Exception as e:
+                print(f"任务调度失败: {e}")
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+
+    def _submit(self, job):
+        handler = JOB_HANDLERS.get(job['kind'])
+        if handler is None:
+            self._complete(job, error=ValueError(f"未知的任务类型: {job['kind']}"), final=True)
+            return
+        with self.lock:
+            self.running[job['id']] = job
+        try:
+            future = self.executor.submit(execute_handler, handler, self._context(job), job['payload'])
+        except Exception as e:
+            with self.lock:
+                self.running.pop(job['id'], None)
+            self.executor_broken = isinstance(e, BrokenExecutor)
+            self._complete(job, error=e)
+            return
+        future.add_done_callback(lambda f, job=job: self._on_done(job, f))
+
+    def _on_done(self, job, future):
+        try:
+            error = future.exception()
+            if isinstance(error, BrokenExecutor):
+                self.executor_broken = True
+            if error is None:
+                self._complete(job, result=future.result())
+            else:
+                self._complete(job, error=error)
+        except Exception as e:
+            print(f"记录任务结果失败 (#{job['id']}): {e}")
+        finally:
+            with self.lock:
+                self.running.pop(job['id'], None)
+            self.wakeup.set()
+
+    def _context(self, job):
+        return JobContext(self.db_key, job['id'], job['attempts'], job['max_attempts'], self.standalone)
+
+    def _claim(self):
+        """领取一个到期的最高优先级任务，没有时返回None"""
+        p = self.placeholder
+        now = time.time()
+        # PostgreSQL跳过其他进程正在领取的行；SQLite的写事务本身是串行的
+        skip_locked = 'FOR UPDATE SKIP LOCKED' if self.use_postgresql else ''
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                       started_at = {p}, lease_until = {p}
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE status = 'queued' AND run_at <= {p}
+                    ORDER BY priority DESC, run_at, id
+                    LIMIT 1 {skip_locked}
+                )
+                RETURNING id, kind, payload, attempts, max_attempts
+            ''', (now, now + self.lease_seconds, now))
+            row = cursor.fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        self.stats['claimed'] += 1
+        return {'id': row[0], 'kind': row[1], 'payload': json.loads(row[2] or '{}'),
+                'attempts': row[3], 'max_attempts': row[4]}
+
+    def _complete(self, job, result=None, error=None, final=False):
+        p = self.placeholder
+        now = time.time()
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            if error is None:
+                cursor.execute(f'''
+                    UPDATE jobs SET status = 'succeeded', finished_at = {p}, lease_until = NULL,
+                           result = {p}, error = NULL
+                    WHERE id = {p}
+                ''', (now, json.dumps(result, ensure_ascii=False, default=str), job['id']))
+                self.stats['succeeded'] += 1
+            elif final or job['attempts'] >= job['max_attempts']:
+                cursor.execute(f'''
+                    UPDATE jobs SET status = 'failed', finished_at = {p}, lease_until = NULL, error = {p}
+                    WHERE id = {p}
+                ''', (now, f"{type(error).__name__}: {error}", job['id']))
+                self.stats['failed'] += 1
+                print(f"后台任务失败 #{job['id']} {job['kind']}: {error}")
+            else:
+                delay = min(JOB_RETRY_MAX, JOB_RETRY_BASE * 2 ** (job['attempts'] - 1))
+                delay *= random.uniform(0.8, 1.2)
+                cursor.execute(f'''
+                    UPDATE jobs SET status = 'queued', run_at = {p}, lease_until = NULL, error = {p}
+                    WHERE id = {p}
+                ''', (now + delay, f"{type(error).__name__}: {error}", job['id']))
+                self.stats['retried'] += 1
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _renew_leases(self):
+        with self.lock:
+            job_ids = list(self.running)
+        if not job_ids:
+            return
+        p = self.placeholder
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(f"UPDATE jobs SET lease_until = {p} WHERE id = {p} AND status = 'running'",
+                               [(time.time() + self.lease_seconds, job_id) for job_id in job_ids])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _recover_expired(self):
+        """租约过期的执行中任务（所在进程已退出）重新排队；重试次数用尽的标记为失败"""
+        p = self.placeholder
+        now = time.time()
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                UPDATE jobs SET status = 'failed', finished_at = {p}, lease_until = NULL,
+                       error = '执行进程退出，租约过期'
+                WHERE status = 'running' AND lease_until < {p} AND attempts >= max_attempts
+            ''', (now, now))
+            cursor.execute(f'''
+                UPDATE jobs SET status = 'queued', run_at = {p}, lease_until = NULL
+                WHERE status = 'running' AND lease_until < {p}
+            ''', (now, now))
+            recovered = cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        if recovered and recovered > 0:
+            self.stats['recovered'] += recovered
+            print(f"已重新排队 {recovered} 个租约过期的任务")
+
+    def _purge_finished(self):
+        """每小时清理一次超过保留期的已完成任务，导出任务生成的文件一并删除"""
+        now = time.time()
+        if now - self.last_purge < 3600:
+            return
+        self.last_purge = now
+        p = self.placeholder
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM jobs WHERE status IN ('succeeded', 'cancelled') AND finished_at < {p} "
+                           f"RETURNING kind, result", (now - JOB_RETENTION_DAYS * 86400,))
+            purged = cursor.fetchall()
+            conn.commit()
+        finally:
+            conn.close()
+        for kind, result in purged:
+            if kind == 'audit_export' and result:
+                path = json.loads(result).get('path')
+                try:
+                    if path:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"删除过期导出文件失败 ({path}): {e}")
+
+    def _update_status(self, job_id, status, condition, reset=False):
+        self.ensure_schema()
+        p = self.placeholder
+        now = time.time()
+        extra = ', attempts = 0, error = NULL, result = NULL, finished_at = NULL' if reset else ''
+        timestamp = 'run_at' if status == 'queued' else 'finished_at'
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'UPDATE jobs SET status = {p}{extra}, {timestamp} = {p} '
+                           f'WHERE id = {p} AND {condition}', (status, now, job_id))
+            changed = cursor.rowcount > 0
+            conn.commit()
+        finally:
+            conn.close()
+        if changed:
+            self.wakeup.set()
+        return changed
+
+    @staticmethod
+    def _columns():
+        return ('id, kind, payload, priority, status, attempts, max_attempts, run_at, created_by, '
+                'created_at, started_at, finished_at, result, error')
+
+    @staticmethod
+    def _row_to_dict(row):
+        def fmt(ts):
+            return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S') if ts else None
+        job = dict(zip(('id', 'kind', 'payload', 'priority', 'status', 'attempts', 'max_attempts', 'run_at',
+                        'created_by', 'created_at', 'started_at', 'finished_at', 'result', 'error'), row))
+        job['payload'] = json.loads(job['payload'] or '{}')
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        for key in ('run_at', 'created_at', 'started_at', 'finished_at'):
+            job[key] = fmt(job[key])
+        return job
+
+
+# ---- 内置任务 ----
+
+@job_handler('render_document')
+def render_document_job(context, payload):
+    """预渲染文档Markdown并写入渲染缓存，文档页面直接读取"""
+    from .render_cache import store_rendered_html
+    conn = context.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT content FROM documents WHERE id = {context.placeholder}',
+                       (payload['document_id'],))
+        row = cursor.fetchone()
+        if not row:
+            return {'document_id': payload['document_id'], 'rendered': False}
+        store_rendered_html(conn, payload['document_id'], row[0], context.use_postgresql)
+        conn.commit()
+        return {'document_id': payload['document_id'], 'rendered': True}
+    finally:
+        conn.close()
+
+
+@job_handler('bulk_import')
+def bulk_import_job(context, payload):
+    """
+    批量导入上传的tar包；成功或最后一次重试后删除临时文件
+    只有独立工作进程使用进程池解析，Web进程内的调度器在当前线程中解析
+    """
+    from .bulk_import import BulkImporter, PARSE_WORKERS
+    conn = context.connect()
+    succeeded = False
+    try:
+        importer = BulkImporter(conn, use_postgresql=context.use_postgresql, db_key=context.db_key,
+                                author_id=payload.get('author_id'),
+                                workers=PARSE_WORKERS if context.standalone else 1,
+                                skip_existing=payload.get('skip_existing', True))
+        report = importer.import_path(payload['path'])
+        succeeded = True
+        return report
+    finally:
+        conn.close()
+        if payload.get('delete_after') and (succeeded or context.last_attempt):
+            try:
+                os.remove(payload['path'])
+            except OSError:
+                pass
+
+
+@job_handler('audit_export')
+def audit_export_job(context, payload):
+    """把操作日志导出为文件，完成后通过任务结果中的路径下载"""
+    from .permissions import UserManager
+    os.makedirs(JOB_EXPORT_DIR, exist_ok=True)
+    compress = payload.get('compress', True)
+    path = os.path.join(JOB_EXPORT_DIR, f"audit_logs_job{context.job_id}.csv" + ('.gz' if compress else ''))
+    manager = UserManager(context.db_key)
+    size = 0
+    with open(path, 'wb') as f:
+        for chunk in manager.iter_logs_csv(payload.get('filters'), payload.get('after_id', 0),
+                                           payload.get('until_id'), compress):
+            f.write(chunk)
+            size += len(chunk)
+    return {'path': path, 'bytes': size, 'until_id': payload.get('until_id')}
+
+
+@job_handler('performance_indexes')
+def performance_indexes_job(context, payload):
+    """创建性能索引和FTS索引（SQLite）"""
+    if context.use_postgresql:
+        return {'skipped': 'PostgreSQL环境的索引在应用启动时创建'}
+    from database_optimization import DatabaseOptimizer
+    DatabaseOptimizer(context.db_key).create_performance_indexes()
+    return {'database': context.db_key}
+
+
+@job_handler('related_rebuild')
+def related_rebuild_job(context, payload):
+    """增量（或全量）更新相关文档近邻表"""
+    from .related import RelatedDocumentsEngine
+    conn = context.connect()
+    try:
+        engine = RelatedDocumentsEngine(conn, use_postgresql=context.use_postgresql)
+        return engine.rebuild() if payload.get('full') else engine.update_incremental()
+    finally:
+        conn.close()
+
+
+@job_handler('trigram_rebuild')
+def trigram_rebuild_job(context, payload):
+    """全量重建拼写纠错词典"""
+    from .trigram import TrigramIndex
+    conn = context.connect()
+    try:
+        index = TrigramIndex(context.db_key, context.use_postgresql)
+        index.create_schema(conn)
+        return {'terms': index.rebuild(conn)}
+    finally:
+        conn.close()
+
+
+@job_handler('file_hash')
+def file_hash_job(context, payload):
+    """分块计算上传文件的MD5并写入 files 表"""
+    digest = hashlib.md5()
+    with open(payload['path'], 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    conn = context.connect()
+    try:
+        p = context.placeholder
+        conn.cursor().execute(f'UPDATE files SET file_hash = {p} WHERE id = {p}',
+                              (digest.hexdigest(), payload['file_id']))
+        conn.commit()
+    finally:
+        conn.close()
+    return {'file_id': payload['file_id'], 'md5': digest.hexdigest()}
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='后台任务队列')
+    parser.add_argument('command', choices=['status', 'work', 'run-once'],
+                        help='status: 查看队列；work: 作为独立工作进程持续执行；run-once: 执行到期任务后退出')
+    parser.add_argument('--database', default=os.environ.get('DATABASE_URL') or 'ros2_wiki.db',
+                        help='SQLite文件路径或PostgreSQL URL')
+    parser.add_argument('--workers', type=int, default=JOB_WORKERS)
+    parser.add_argument('--executor', choices=['thread', 'process'], default=JOB_EXECUTOR)
+    args = parser.parse_args()
+
+    runner = JobRunner(args.database, workers=args.workers, executor=args.executor, standalone=True)
+    if args.command == 'status':
+        print(json.dumps(runner.counts(), ensure_ascii=False))
+        for job in runner.list_jobs(limit=20):
+            print(f"#{job['id']:<6} {job['kind']:<20} {job['status']:<10} 尝试 {job['attempts']}/"
+                  f"{job['max_attempts']}  {job['created_at']}  {job['error'] or ''}")
+    elif args.command == 'run-once':
+        print(f"已执行 {runner.run_pending()} 个任务")
+    else:
+        runner.start()
+        print(f"任务工作进程已启动（{args.workers} 个{args.executor}工作者），Ctrl+C 退出")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            runner.stop()
@@ -0,0 +1,235 @@
+# 密码哈希服务 - 可配置算法和参数、启动时按目标耗时校准、登录时透明升级旧哈希
+#
+# 生成的哈希格式与 werkzeug.security 完全一致，双方可以互相验证：
+#   pbkdf2:sha256:迭代次数$salt$hex   /   scrypt:n:r:p$salt$hex
+# 只依赖标准库（hashlib.pbkdf2_hmac / hashlib.scrypt），enhanced_server 也可以使用。
+# 同时能验证 enhanced_server 旧的 sha256(password + 'salt') 十六进制哈希，验证通过后需要升级。
+#
+# 配置（环境变量）：
+#   PASSWORD_HASH_METHOD        scrypt（默认，与werkzeug 3的generate_password_hash相同）/ pbkdf2
+#   PASSWORD_HASH_TARGET_MS     每次哈希的目标耗时（毫秒），大于0时在进程首次使用时校准参数
+#   PASSWORD_PBKDF2_ITERATIONS  未校准时的pbkdf2迭代次数（默认与werkzeug相同）
+#   PASSWORD_PBKDF2_MIN_ITERATIONS  校准结果的下限
+#   PASSWORD_SCRYPT_N / _R / _P 未校准时的scrypt参数（默认与werkzeug相同）
+# 登录验证通过后，若已保存哈希的算法不同，或成本与当前参数相差超过约1.4倍（log2差值大于0.5），
+# 用当前参数重新计算并写回（verify_and_update）；各worker校准结果略有差异时不会来回重算。
+
+import os
+import hmac
+import math
+import time
+import string
+import hashlib
+import secrets
+import threading
+
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+PASSWORD_HASH_TARGET_MS = float(os.environ.get('PASSWORD_HASH_TARGET_MS', 0))
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 600000))
+PASSWORD_PBKDF2_MIN_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_MIN_ITERATIONS', 100000))
+PASSWORD_SCRYPT_N = int(os.environ.get('PASSWORD_SCRYPT_N', 2 ** 15))
+PASSWORD_SCRYPT_R = int(os.environ.get('PASSWORD_SCRYPT_R', 8))
+PASSWORD_SCRYPT_P = int(os.environ.get('PASSWORD_SCRYPT_P', 1))
+PASSWORD_SCRYPT_MIN_N = 2 ** 14
+PASSWORD_SCRYPT_MAX_N = 2 ** 20
+
+SALT_CHARS = string.ascii_letters + string.digits
+SALT_LENGTH = 16
+PBKDF2_DIGEST = 'sha256'
+SCRYPT_DKLEN = 64
+# 旧的 enhanced_server 哈希：sha256(password + LEGACY_SALT)
+LEGACY_SALT = 'salt'
+# 已保存哈希的成本与当前参数的log2差值超过该值时重新计算
+REHASH_COST_TOLERANCE = 0.5
+
+
+def gen_salt(length=SALT_LENGTH):
+    return ''.join(secrets.choice(SALT_CHARS) for _ in range(length))
+
+
+def scrypt_maxmem(n, r, p):
+    # 与werkzeug相同：128*n*r*p 再留出余量，避免OpenSSL默认的32MB上限拒绝较大的n
+    return 132 * n * r * p
+
+
+def parse_hash(stored):
+    """
+    解析已保存的哈希，返回 (算法, 参数, salt, 哈希值)：
+      ('pbkdf2', (摘要算法, 迭代次数), salt, hex) / ('scrypt', (n, r, p), salt, hex) /
+      ('legacy', None, None, hex)；无法识别时返回None
+    """
+    if not stored:
+        return None
+    if '$' not in stored:
+        if len(stored) == 64 and all(c in string.hexdigits for c in stored):
+            return 'legacy', None, None, stored.lower()
+        return None
+    try:
+        method, salt, value = stored.split('$', 2)
+        parts = method.split(':')
+        if parts[0] == 'pbkdf2':
+            digest = parts[1] if len(parts) > 1 else PBKDF2_DIGEST
+            iterations = int(parts[2]) if len(parts) > 2 else PASSWORD_PBKDF2_ITERATIONS
+            return 'pbkdf2', (digest, iterations), salt, value
+        if parts[0] == 'scrypt':
+            n, r, p = (int(parts[1]), int(parts[2]), int(parts[3])) if len(parts) > 3 else (2 ** 15, 8, 1)
+            return 'scrypt', (n, r, p), salt, value
+    except (ValueError, IndexError):
+        return None
+    return None
+
+
+def pbkdf2_hex(password, salt, digest, iterations):
+    return hashlib.pbkdf2_hmac(digest, password.encode('utf-8'), salt.encode('utf-8'), iterations).hex()
+
+
+def scrypt_hex(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt.encode('utf-8'), n=n, r=r, p=p,
+                          maxmem=scrypt_maxmem(n, r, p), dklen=SCRYPT_DKLEN).hex()
+
+
+class PasswordHasher:
+    """密码哈希：hash / verify / needs_rehash / verify_and_update，参数可在创建后用 calibrate 调整"""
+
+    def __init__(self, method=PASSWORD_HASH_METHOD, iterations=PASSWORD_PBKDF2_ITERATIONS,
+                 scrypt_n=PASSWORD_SCRYPT_N, scrypt_r=PASSWORD_SCRYPT_R, scrypt_p=PASSWORD_SCRYPT_P):
+        if method not in ('pbkdf2', 'scrypt'):
+            raise ValueError(f'不支持的密码哈希算法: {method}')
+        if method == 'scrypt' and not hasattr(hashlib, 'scrypt'):
+            print("当前Python的hashlib不支持scrypt，改用pbkdf2")
+            method = 'pbkdf2'
+        self.method = method
+        self.iterations = int(iterations)
+        self.scrypt_params = (int(scrypt_n), int(scrypt_r), int(scrypt_p))
+        self.calibrated_ms = None
+
+    @property
+    def method_string(self):
+        if self.method == 'scrypt':
+            return 'scrypt:%d:%d:%d' % self.scrypt_params
+        return f'pbkdf2:{PBKDF2_DIGEST}:{self.iterations}'
+
+    def hash(self, password):
+        """计算新哈希（werkzeug格式）"""
+        salt = gen_salt()
+        if self.method == 'scrypt':
+            value = scrypt_hex(password, salt, *self.scrypt_params)
+        else:
+            value = pbkdf2_hex(password, salt, PBKDF2_DIGEST, self.iterations)
+        return f'{self.method_string}${salt}${value}'
+
+    def verify(self, stored, password):
+        """验证密码（按已保存哈希自身的算法和参数计算，常数时间比较）"""
+        parsed = parse_hash(stored)
+        if parsed is None or password is None:
+            return False
+        method, params, salt, expected = parsed
+        try:
+            if method == 'legacy':
+                actual = hashlib.sha256((password + LEGACY_SALT).encode('utf-8')).hexdigest()
+            elif method == 'pbkdf2':
+                actual = pbkdf2_hex(password, salt, params[0], params[1])
+            else:
+                actual = scrypt_hex(password, salt, *params)
+        except (ValueError, MemoryError) as e:
+            print(f"密码哈希参数无效: {e}")
+            return False
+        return hmac.compare_digest(actual, expected)
+
+    def needs_rehash(self, stored):
+        """已保存的哈希是否应该按当前参数重新计算"""
+        parsed = parse_hash(stored)
+        if parsed is None or parsed[0] != self.method:
+            return True
+        if self.method == 'pbkdf2':
+            digest, iterations = parsed[1]
+            return digest != PBKDF2_DIGEST or abs(math.log2(max(1, iterations) / self.iterations)) > REHASH_COST_TOLERANCE
+        n, r, p = parsed[1]
+        current_n, current_r, current_p = self.scrypt_params
+        return (r, p) != (current_r, current_p) or abs(math.log2(n / current_n)) > REHASH_COST_TOLERANCE
+
+    def verify_and_update(self, stored, password):
+        """验证密码，返回 (是否通过, 新哈希或None)；通过且需要升级时调用方应保存新哈希"""
+        if not self.verify(stored, password):
+            return False, None
+        if self.needs_rehash(stored):
+            return True, self.hash(password)
+        return True, None
+
+    def time_hash(self, rounds=3):
+        """当前参数下每次哈希的耗时（毫秒，取最小值）"""
+        best = None
+        for _ in range(rounds):
+            started = time.perf_counter()
+            self.hash('calibration-password')
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def calibrate(self, target_ms, min_iterations=PASSWORD_PBKDF2_MIN_ITERATIONS):
+        """
+        调整参数使每次哈希约耗时 target_ms 毫秒：
+        pbkdf2 按试算耗时线性换算迭代次数（取整到1万，不低于 min_iterations）；
+        scrypt 的n只能取2的幂，选最接近目标的值（r、p不变）
+        """
+        if self.method == 'pbkdf2':
+            probe = 50000
+            started = time.perf_counter()
+            for _ in range(2):
+                pbkdf2_hex('calibration-password', 'calibration-salt', PBKDF2_DIGEST, probe)
+            per_iteration = (time.perf_counter() - started) * 1000 / (2 * probe)
+            iterations = int(round(target_ms / per_iteration / 10000.0)) * 10000
+            self.iterations = max(min_iterations, iterations)
+        else:
+            _, r, p = self.scrypt_params
+            n = PASSWORD_SCRYPT_MIN_N
+            best = None
+            while n <= PASSWORD_SCRYPT_MAX_N:
+                started = time.perf_counter()
+                scrypt_hex('calibration-password', 'calibration-salt', n, r, p)
+                elapsed = (time.perf_counter() - started) * 1000
+                if best is None or abs(math.log2(elapsed / target_ms)) < abs(math.log2(best[1] / target_ms)):
+                    best = (n, elapsed)
+                if elapsed >= target_ms:
+                    break
+                n *= 2
+            self.scrypt_params = (best[0], r, p)
+        self.calibrated_ms = self.time_hash(rounds=1)
+        return self.method_string
+
+    def describe(self):
+        return {
+            'method': self.method_string,
+            'target_ms': PASSWORD_HASH_TARGET_MS or None,
+            'measured_ms': round(self.calibrated_ms, 2) if self.calibrated_ms else None,
+        }
+
+
+_default_hasher = None
+_default_lock = threading.Lock()
+
+
+def get_password_hasher():
+    """进程内共享的密码哈希服务（首次使用时创建，配置了目标耗时时在此校准）"""
+    global _default_hasher
+    if _default_hasher is None:
+        with _default_lock:
+            if _default_hasher is None:
+                hasher = PasswordHasher()
+                if PASSWORD_HASH_TARGET_MS > 0:
+                    try:
+                        hasher.calibrate(PASSWORD_HASH_TARGET_MS)
+                        print(f"密码哈希参数已校准: {hasher.method_string}（约 {hasher.calibrated_ms:.1f} ms/次）")
+                    except Exception as e:
+                        print(f"密码哈希参数校准失败，使用默认参数: {e}")
+                _default_hasher = hasher
+    return _default_hasher
+
+
+def hash_password(password):
+    return get_password_hasher().hash(password)
+
+
+def verify_password(stored, password):
+    """返回 (是否通过, 需要保存的新哈希或None)"""
+    return get_password_hasher().verify_and_update(stored, password)
@@ -1,10 +1,13 @@
 # 用户权限管理模块
 
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, make_response
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, make_response, current_app, Response, send_file
 from flask_login import login_required, current_user
-from werkzeug.security import generate_password_hash
 import sqlite3
 import os
+import io
+import csv
+import json
+import zlib
 from datetime import datetime
 
 # PostgreSQL支持
@@ -17,23 +20,14 @@ except ImportError:
 
 # 导入安全验证模块
 from .security import PasswordValidator, InputValidator
+from .audit import get_database_pipeline
+from .principal_cache import invalidate_principals
+from .passwords import hash_password
+from .authz import admin_required, get_authorizer, USER_TOGGLE_ADMIN, USER_ROW_PERMISSIONS
 
 # 安全装饰器定义
 from functools import wraps
 
-def admin_required(f):
-    """管理员权限验证装饰器"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated:
-            flash('请先登录', 'error')
-            return redirect(url_for('login'))
-        if not current_user.is_admin:
-            flash('需要管理员权限', 'error')
-            return redirect(url_for('index'))
-        return f(*args, **kwargs)
-    return decorated_function
-
 def validate_csrf_token(f):
     """CSRF令牌验证装饰器"""
     @wraps(f)
@@ -44,6 +38,18 @@ def validate_csrf_token(f):
 
 permissions_bp = Blueprint('permissions', __name__, url_prefix='/admin/users')
 
+# 流式导出：每次从数据库读取的行数（也是每个输出块包含的行数）
+EXPORT_CHUNK_ROWS = 2000
+EXPORT_COLUMNS = ['日志ID', '时间', '操作类型', '管理员', '目标用户', '原因/备注', '管理员邮箱', '目标用户邮箱']
+
+# 批量用户操作：操作名 -> (操作日志类型, 提示文字)
+BULK_OPERATIONS = {
+    'blacklist': ('BATCH_BLACKLIST', '拉黑'),
+    'unblacklist': ('BATCH_UNBLACKLIST', '解除拉黑'),
+    'delete': ('BATCH_DELETE', '删除'),
+    'toggle_admin': ('BATCH_TOGGLE_ADMIN', '切换管理员权限'),
+}
+
 class UserManager:
     """用户管理器"""
 
@@ -57,6 +63,8 @@ class UserManager:
             # 如果是SQLite URL格式，提取路径
             if db_path_or_url and db_path_or_url.startswith('sqlite:///'):
                 self.db_path_or_url = db_path_or_url[10:]
+        # 当前操作中待写入的操作日志，事务提交后交给审计流水线
+        self.pending_audit_records = []
 
     def get_db_connection(self):
         """获取数据库连接"""
@@ -67,6 +75,18 @@ class UserManager:
             conn = sqlite3.connect(self.db_path_or_url)
             conn.row_factory = sqlite3.Row
             return conn
+
+    def _dict_cursor(self, conn):
+        """按列名读取结果的游标：PostgreSQL使用RealDictCursor，SQLite连接已设置 sqlite3.Row"""
+        if self.use_postgresql:
+            return conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        return conn.cursor()
+
+    def _since_days_sql(self, days):
+        """最近 days 天的起始时间表达式"""
+        if self.use_postgresql:
+            return f"CURRENT_TIMESTAMP - INTERVAL '{int(days)} days'"
+        return f"datetime('now', '-{int(days)} days')"
     
     def get_all_users(self, page=1, per_page=10, search=None):
         """获取所有用户列表"""
@@ -171,7 +191,7 @@ class UserManager:
                 return False, "用户名或邮箱已存在"
 
             # 创建用户
-            password_hash = generate_password_hash(password)
+            password_hash = hash_password(password)
 
             if self.use_postgresql:
                 cursor.execute("""
@@ -234,6 +254,7 @@ class UserManager:
             conn.commit()
             affected_rows = cursor.rowcount
             conn.close()
+            invalidate_principals(user_id)
             
             return affected_rows > 0, "更新成功" if affected_rows > 0 else "用户不存在"
             
@@ -255,7 +276,7 @@ class UserManager:
             # 根据数据库类型选择占位符
             placeholder = "%s" if self.use_postgresql else "?"
             
-            password_hash = generate_password_hash(new_password)
+            password_hash = hash_password(new_password)
             cursor.execute(f"""
             UPDATE users 
             SET password_hash = {placeholder}
@@ -279,14 +300,16 @@ class UserManager:
             if user_id == current_user.id:
                 return False, "不能删除当前登录的用户"
             
+            # 先写入尚未落库的操作日志，之后统一解除对该用户的引用
+            self.flush_audit_log()
             conn = self.get_db_connection()
             cursor = conn.cursor()
             
             # 根据数据库类型选择占位符
             placeholder = "%s" if self.use_postgresql else "?"
             
-            # 删除用户相关的评论
-            cursor.execute(f"DELETE FROM comments WHERE user_id = {placeholder}", [user_id])
+            # 删除用户相关的评论，解除文档和操作日志对用户的引用
+            self._detach_user_rows(cursor, [user_id])
             
             # 删除用户
             cursor.execute(f"DELETE FROM users WHERE id = {placeholder}", [user_id])
@@ -294,6 +317,7 @@ class UserManager:
             conn.commit()
             affected_rows = cursor.rowcount
             conn.close()
+            invalidate_principals(user_id)
             
             return affected_rows > 0, "删除成功" if affected_rows > 0 else "用户不存在"
             
@@ -301,8 +325,12 @@ class UserManager:
             print(f"删除用户错误: {e}")
             return False, str(e)
     
-    def toggle_admin_status(self, user_id):
-        """切换用户管理员状态"""
+    def toggle_admin_status(self, user_id, current_status=None):
+        """
+        切换用户管理员状态
+        current_status: 调用方已知的当前状态（来自主体缓存），更新时作为条件；
+        状态已被其他请求改变时再查询一次
+        """
         try:
             # 防止取消当前登录管理员的权限
             if user_id == current_user.id:
@@ -314,20 +342,29 @@ class UserManager:
             # 根据数据库类型选择占位符
             placeholder = "%s" if self.use_postgresql else "?"
             
-            # 获取当前状态
-            cursor.execute(f"SELECT is_admin FROM users WHERE id = {placeholder}", [user_id])
-            result = cursor.fetchone()
-            
-            if not result:
-                conn.close()
-                return False, "用户不存在"
+            updated = False
+            if current_status is not None:
+                new_status = not current_status
+                cursor.execute(f"UPDATE users SET is_admin = {placeholder} WHERE id = {placeholder} AND is_admin = {placeholder}",
+                               [new_status, user_id, bool(current_status)])
+                updated = cursor.rowcount > 0
             
-            # 切换状态
-            new_status = not result[0]
-            cursor.execute(f"UPDATE users SET is_admin = {placeholder} WHERE id = {placeholder}", [new_status, user_id])
+            if not updated:
+                # 获取当前状态
+                cursor.execute(f"SELECT is_admin FROM users WHERE id = {placeholder}", [user_id])
+                result = cursor.fetchone()
+                
+                if not result:
+                    conn.close()
+                    return False, "用户不存在"
+                
+                # 切换状态
+                new_status = not result[0]
+                cursor.execute(f"UPDATE users SET is_admin = {placeholder} WHERE id = {placeholder}", [new_status, user_id])
             
             conn.commit()
             conn.close()
+            invalidate_principals(user_id)
             
             status_text = "管理员" if new_status else "普通用户"
             return True, f"用户权限已更新为{status_text}"
@@ -339,22 +376,23 @@ class UserManager:
     def get_user_statistics(self, user_id):
         """获取用户统计信息"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.get_db_connection()
             cursor = conn.cursor()
+            placeholder = "%s" if self.use_postgresql else "?"
             
             # 用户发表的评论数
-            cursor.execute("SELECT COUNT(*) FROM comments WHERE user_id = ?", [user_id])
+            cursor.execute(f"SELECT COUNT(*) FROM comments WHERE user_id = {placeholder}", [user_id])
             comment_count = cursor.fetchone()[0]
             
             # 用户创建的文档数（如果有author_id字段）
-            cursor.execute("SELECT COUNT(*) FROM documents WHERE author_id = ?", [user_id])
+            cursor.execute(f"SELECT COUNT(*) FROM documents WHERE author_id = {placeholder}", [user_id])
             document_count = cursor.fetchone()[0]
             
             # 最近活动
-            cursor.execute("""
+            cursor.execute(f"""
             SELECT content, created_at 
             FROM comments 
-            WHERE user_id = ?
+            WHERE user_id = {placeholder}
             ORDER BY created_at DESC 
             LIMIT 5
             """, [user_id])
@@ -419,6 +457,8 @@ class UserManager:
 
             conn.commit()
             conn.close()
+            invalidate_principals(user_id)
+            self.publish_audit_records()
 
             return True, f"用户 {user[1]} 已被拉黑"
 
@@ -429,11 +469,13 @@ class UserManager:
     def unblacklist_user(self, user_id, admin_id):
         """解除用户拉黑"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.get_db_connection()
             cursor = conn.cursor()
+            placeholder = "%s" if self.use_postgresql else "?"
+            false = 'FALSE' if self.use_postgresql else '0'
 
             # 检查用户是否存在且被拉黑
-            cursor.execute("SELECT id, username, is_blacklisted FROM users WHERE id = ?", [user_id])
+            cursor.execute(f"SELECT id, username, is_blacklisted FROM users WHERE id = {placeholder}", [user_id])
             user = cursor.fetchone()
             if not user:
                 conn.close()
@@ -444,12 +486,12 @@ class UserManager:
                 return False, "用户未被拉黑"
 
             # 解除拉黑状态
-            cursor.execute("""
+            cursor.execute(f"""
                 UPDATE users
-                SET is_blacklisted = 0,
+                SET is_blacklisted = {false},
                     blacklisted_at = NULL,
                     blacklist_reason = NULL
-                WHERE id = ?
+                WHERE id = {placeholder}
             """, [user_id])
 
             # 记录操作日志
@@ -457,6 +499,8 @@ class UserManager:
 
             conn.commit()
             conn.close()
+            invalidate_principals(user_id)
+            self.publish_audit_records()
 
             return True, f"用户 {user[1]} 已解除拉黑"
 
@@ -526,34 +570,57 @@ class UserManager:
             return {'users': [], 'total': 0, 'page': 1, 'per_page': per_page, 'total_pages': 0}
 
     def log_user_action(self, cursor, admin_id, target_user_id, action, reason):
-        """记录用户操作日志"""
+        """记录用户操作日志
+
+        不再在管理操作的事务中逐条插入：记录先暂存，事务提交后由 publish_audit_records()
+        交给审计流水线，后台线程批量写入 user_logs。事务回滚时暂存的记录不会写入。
+        cursor 参数保留以兼容原有调用。
+        """
+        now = datetime.utcnow().replace(microsecond=0)
+        created_at = now if self.use_postgresql else now.strftime('%Y-%m-%d %H:%M:%S')
+        self.pending_audit_records.append((admin_id, target_user_id, action, reason, created_at))
+
+    @property
+    def audit_pipeline(self):
+        placeholder = "%s" if self.use_postgresql else "?"
+        sql = (f"INSERT INTO user_logs (admin_id, target_user_id, action, reason, created_at) "
+               f"VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})")
+        return get_database_pipeline(self.db_path_or_url, self.get_db_connection, sql)
+
+    def publish_audit_records(self):
+        """事务提交后把暂存的操作日志交给审计流水线"""
+        records, self.pending_audit_records = self.pending_audit_records, []
+        if records:
+            pipeline = self.audit_pipeline
+            for record in records:
+                pipeline.submit(record)
+
+    def flush_audit_log(self, timeout=2.0):
+        """读取操作日志前等待已提交的记录写入"""
         try:
-            cursor.execute("""
-                INSERT INTO user_logs (admin_id, target_user_id, action, reason, created_at)
-                VALUES (?, ?, ?, ?, datetime('now'))
-            """, [admin_id, target_user_id, action, reason])
-
+            self.audit_pipeline.flush(timeout)
         except Exception as e:
-            print(f"记录操作日志错误: {e}")
+            print(f"等待操作日志写入错误: {e}")
 
     def get_user_logs(self, user_id=None, page=1, per_page=20):
         """获取用户操作日志"""
+        self.flush_audit_log()
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            conn = self.get_db_connection()
+            cursor = self._dict_cursor(conn)
+            placeholder = "%s" if self.use_postgresql else "?"
 
             # 构建查询条件
             where_clause = ""
             params = []
             if user_id:
-                where_clause = "WHERE ul.target_user_id = ?"
+                where_clause = f"WHERE ul.target_user_id = {placeholder}"
                 params.append(user_id)
 
             # 计算总数
-            count_query = f"SELECT COUNT(*) FROM user_logs ul {where_clause}"
+            count_query = f"SELECT COUNT(*) AS total FROM user_logs ul {where_clause}"
             cursor.execute(count_query, params)
-            total = cursor.fetchone()[0]
+            total = cursor.fetchone()['total']
 
             # 分页查询
             offset = (page - 1) * per_page
@@ -566,7 +633,7 @@ class UserManager:
                 LEFT JOIN users u2 ON ul.target_user_id = u2.id
                 {where_clause}
                 ORDER BY ul.created_at DESC
-                LIMIT ? OFFSET ?
+                LIMIT {placeholder} OFFSET {placeholder}
             """
 
             cursor.execute(query, params + [per_page, offset])
@@ -587,87 +654,164 @@ class UserManager:
 
     def batch_blacklist_users(self, user_ids, reason, admin_id):
         """批量拉黑用户"""
-        try:
-            if not user_ids:
-                return False, "未选择用户"
+        success, message, _ = self.bulk_user_operation('blacklist', user_ids, admin_id, reason)
+        return success, message
 
-            # 防止拉黑当前登录的管理员
-            if current_user.id in user_ids:
-                return False, "不能拉黑当前登录的用户"
+    def _id_set_clause(self, column):
+        """批量ID条件：PostgreSQL使用 = ANY(数组)，SQLite用json_each展开一个JSON参数（不受变量个数限制）"""
+        if self.use_postgresql:
+            return f"{column} = ANY(%s)"
+        return f"{column} IN (SELECT value FROM json_each(?))"
+
+    def _id_set_param(self, ids):
+        return list(ids) if self.use_postgresql else json.dumps(list(ids))
+
+    def _detach_user_rows(self, cursor, ids):
+        """
+        删除用户前处理引用这些用户的行（PostgreSQL外键）：评论随用户删除，文档保留但作者置空，
+        操作日志保留，管理员/目标用户的ID置空之前把用户名和ID追加到日志备注中，审计记录仍能看出是谁做的
+        """
+        id_param = self._id_set_param(ids)
+        cursor.execute(f"DELETE FROM comments WHERE {self._id_set_clause('user_id')}", [id_param])
+        cursor.execute(f"UPDATE documents SET author_id = NULL WHERE {self._id_set_clause('author_id')}", [id_param])
+        for column, label in (('admin_id', '操作人'), ('target_user_id', '目标用户')):
+            cursor.execute(f"""
+                UPDATE user_logs
+                SET reason = COALESCE(reason, '') || '（{label}：' ||
+                             COALESCE((SELECT username FROM users WHERE users.id = user_logs.{column}), '') ||
+                             '，ID ' || CAST({column} AS TEXT) || '）',
+                    {column} = NULL
+                WHERE {self._id_set_clause(column)}
+            """, [id_param])
+
+    def bulk_user_operation(self, operation, user_ids, admin_id, reason=None):
+        """
+        批量用户操作：blacklist / unblacklist / delete / toggle_admin
+
+        每种操作是一条集合语句（WHERE id = ANY / IN json_each ... RETURNING），
+        操作日志用executemany写入，全部在同一个事务中完成。
+        只有状态实际发生变化的用户会被计入结果和日志（如已拉黑的用户不会被重复拉黑）。
+        返回 (success, message, affected_ids)
+        """
+        if operation not in BULK_OPERATIONS:
+            return False, f"未知的批量操作: {operation}", []
+        action, label = BULK_OPERATIONS[operation]
 
-            conn = sqlite3.connect(self.db_path)
+        try:
+            ids = sorted({int(uid) for uid in user_ids or []})
+        except (ValueError, TypeError):
+            return False, "无效的用户ID", []
+        if not ids:
+            return False, "未选择用户", []
+        # 防止对当前登录的管理员执行批量操作
+        if current_user.id in ids:
+            return False, f"不能{label}当前登录的用户", []
+
+        placeholder = "%s" if self.use_postgresql else "?"
+        true, false = ('TRUE', 'FALSE') if self.use_postgresql else ('1', '0')
+        now_sql = 'CURRENT_TIMESTAMP' if self.use_postgresql else "datetime('now')"
+        id_clause = self._id_set_clause('id')
+        id_param = self._id_set_param(ids)
+
+        if operation == 'delete':
+            # 先写入审计流水线中尚未落库的日志，避免它们在用户删除后再引用这些用户
+            self.flush_audit_log()
+
+        conn = self.get_db_connection()
+        try:
             cursor = conn.cursor()
-
-            success_count = 0
-            for user_id in user_ids:
-                try:
-                    # 检查用户是否存在且未被拉黑
-                    cursor.execute("SELECT id, is_blacklisted FROM users WHERE id = ?", [user_id])
-                    user = cursor.fetchone()
-
-                    if user and not user[1]:  # 用户存在且未被拉黑
-                        cursor.execute("""
-                            UPDATE users
-                            SET is_blacklisted = 1,
-                                blacklisted_at = datetime('now'),
-                                blacklist_reason = ?
-                            WHERE id = ?
-                        """, [reason, user_id])
-
-                        # 记录操作日志
-                        self.log_user_action(cursor, admin_id, user_id, 'BATCH_BLACKLIST', reason)
-                        success_count += 1
-
-                except Exception as e:
-                    print(f"批量拉黑用户 {user_id} 错误: {e}")
-                    continue
-
+            if operation == 'blacklist':
+                cursor.execute(f"""
+                    UPDATE users
+                    SET is_blacklisted = {true}, blacklisted_at = {now_sql}, blacklist_reason = {placeholder}
+                    WHERE {id_clause} AND (is_blacklisted IS NULL OR is_blacklisted = {false})
+                    RETURNING id, username
+                """, [reason, id_param])
+                rows = [(row[0], reason) for row in cursor.fetchall()]
+            elif operation == 'unblacklist':
+                cursor.execute(f"""
+                    UPDATE users
+                    SET is_blacklisted = {false}, blacklisted_at = NULL, blacklist_reason = NULL
+                    WHERE {id_clause} AND is_blacklisted = {true}
+                    RETURNING id, username
+                """, [id_param])
+                rows = [(row[0], reason or '批量解除拉黑') for row in cursor.fetchall()]
+            elif operation == 'toggle_admin':
+                cursor.execute(f"""
+                    UPDATE users
+                    SET is_admin = CASE WHEN is_admin THEN {false} ELSE {true} END
+                    WHERE {id_clause}
+                    RETURNING id, username, is_admin
+                """, [id_param])
+                rows = [(row[0], '设为管理员' if row[2] else '取消管理员') for row in cursor.fetchall()]
+            else:
+                self._detach_user_rows(cursor, ids)
+                cursor.execute(f"DELETE FROM users WHERE {id_clause} RETURNING id, username", [id_param])
+                # 用户已删除，日志中不再引用其ID（PostgreSQL外键），改为在备注中记录用户名和ID
+                rows = [(None, f"{reason or '批量删除'}：{row[1]} (ID {row[0]})", row[0])
+                        for row in cursor.fetchall()]
+
+            now = datetime.utcnow().replace(microsecond=0)
+            created_at = now if self.use_postgresql else now.strftime('%Y-%m-%d %H:%M:%S')
+            cursor.executemany(
+                f"INSERT INTO user_logs (admin_id, target_user_id, action, reason, created_at) "
+                f"VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})",
+                [(admin_id, row[0], action, row[1], created_at) for row in rows]
+            )
             conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"批量{label}错误: {e}")
+            return False, str(e), []
+        finally:
             conn.close()
 
-            return True, f"成功拉黑 {success_count} 个用户"
-
-        except Exception as e:
-            print(f"批量拉黑错误: {e}")
-            return False, str(e)
+        affected_ids = sorted(row[-1] if operation == 'delete' else row[0] for row in rows)
+        invalidate_principals(*affected_ids)
+        message = f"成功{label} {len(affected_ids)} 个用户"
+        skipped = len(ids) - len(affected_ids)
+        if skipped:
+            message += f"（{skipped} 个用户不存在或无需变更）"
+        return True, message, affected_ids
 
     def get_operation_logs(self, page=1, per_page=20, user_id=None, admin_id=None, action=None, date_from=None, date_to=None):
         """获取操作日志 - 支持多条件筛选"""
+        self.flush_audit_log()
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            conn = self.get_db_connection()
+            cursor = self._dict_cursor(conn)
+            placeholder = "%s" if self.use_postgresql else "?"
 
             # 构建查询条件
             where_conditions = []
             params = []
 
             if user_id:
-                where_conditions.append("ul.target_user_id = ?")
+                where_conditions.append(f"ul.target_user_id = {placeholder}")
                 params.append(user_id)
 
             if admin_id:
-                where_conditions.append("ul.admin_id = ?")
+                where_conditions.append(f"ul.admin_id = {placeholder}")
                 params.append(admin_id)
 
             if action:
-                where_conditions.append("ul.action = ?")
+                where_conditions.append(f"ul.action = {placeholder}")
                 params.append(action)
 
             if date_from:
-                where_conditions.append("ul.created_at >= ?")
+                where_conditions.append(f"ul.created_at >= {placeholder}")
                 params.append(date_from)
 
             if date_to:
-                where_conditions.append("ul.created_at <= ?")
+                where_conditions.append(f"ul.created_at <= {placeholder}")
                 params.append(date_to)
 
             where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
 
             # 计算总数
-            count_query = f"SELECT COUNT(*) FROM user_logs ul {where_clause}"
+            count_query = f"SELECT COUNT(*) AS total FROM user_logs ul {where_clause}"
             cursor.execute(count_query, params)
-            total = cursor.fetchone()[0]
+            total = cursor.fetchone()['total']
 
             # 分页查询
             offset = (page - 1) * per_page
@@ -682,7 +826,7 @@ class UserManager:
                 LEFT JOIN users u2 ON ul.target_user_id = u2.id
                 {where_clause}
                 ORDER BY ul.created_at DESC
-                LIMIT ? OFFSET ?
+                LIMIT {placeholder} OFFSET {placeholder}
             """
 
             cursor.execute(query, params + [per_page, offset])
@@ -704,16 +848,17 @@ class UserManager:
     def get_admin_activity_summary(self, admin_id=None, days=30):
         """获取管理员活动摘要"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            conn = self.get_db_connection()
+            cursor = self._dict_cursor(conn)
+            placeholder = "%s" if self.use_postgresql else "?"
+            since = self._since_days_sql(days)
 
             # 构建查询条件
-            where_clause = "WHERE ul.created_at >= datetime('now', '-{} days')".format(days)
+            where_clause = f"WHERE ul.created_at >= {since}"
             params = []
 
             if admin_id:
-                where_clause += " AND ul.admin_id = ?"
+                where_clause += f" AND ul.admin_id = {placeholder}"
                 params.append(admin_id)
 
             # 获取操作统计
@@ -736,7 +881,7 @@ class UserManager:
                 SELECT u.username, u.email, COUNT(*) as total_actions
                 FROM user_logs ul
                 LEFT JOIN users u ON ul.admin_id = u.id
-                WHERE ul.created_at >= datetime('now', '-{days} days')
+                WHERE ul.created_at >= {since}
                 GROUP BY ul.admin_id, u.username, u.email
                 ORDER BY total_actions DESC
                 LIMIT 10
@@ -759,21 +904,22 @@ class UserManager:
 
     def get_user_action_timeline(self, user_id, limit=50):
         """获取特定用户的操作时间线"""
+        self.flush_audit_log()
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            conn = self.get_db_connection()
+            cursor = self._dict_cursor(conn)
+            placeholder = "%s" if self.use_postgresql else "?"
 
-            query = """
+            query = f"""
                 SELECT ul.*,
                        u1.username as admin_name,
                        u2.username as target_name
                 FROM user_logs ul
                 LEFT JOIN users u1 ON ul.admin_id = u1.id
                 LEFT JOIN users u2 ON ul.target_user_id = u2.id
-                WHERE ul.target_user_id = ?
+                WHERE ul.target_user_id = {placeholder}
                 ORDER BY ul.created_at DESC
-                LIMIT ?
+                LIMIT {placeholder}
             """
 
             cursor.execute(query, [user_id, limit])
@@ -787,73 +933,141 @@ class UserManager:
             return []
 
     def export_logs_to_csv(self, filters=None):
-        """导出日志到CSV格式"""
+        """导出日志到CSV格式（一次性返回字符串，仅适合小量数据；大量导出使用 iter_logs_csv）"""
         try:
-            import csv
-            import io
-            from datetime import datetime
-
-            # 获取日志数据
-            logs_data = self.get_operation_logs(
-                page=1,
-                per_page=10000,  # 大量数据导出
-                user_id=filters.get('user_id') if filters else None,
-                admin_id=filters.get('admin_id') if filters else None,
-                action=filters.get('action') if filters else None,
-                date_from=filters.get('date_from') if filters else None,
-                date_to=filters.get('date_to') if filters else None
-            )
-
-            # 创建CSV内容
-            output = io.StringIO()
-            writer = csv.writer(output)
-
-            # 写入标题行
-            writer.writerow([
-                '时间', '操作类型', '管理员', '目标用户', '原因/备注', '管理员邮箱', '目标用户邮箱'
-            ])
-
-            # 写入数据行
-            for log in logs_data['logs']:
-                writer.writerow([
-                    log.get('created_at', ''),
-                    log.get('action', ''),
-                    log.get('admin_name', ''),
-                    log.get('target_name', ''),
-                    log.get('reason', ''),
-                    log.get('admin_email', ''),
-                    log.get('target_email', '')
-                ])
-
-            csv_content = output.getvalue()
-            output.close()
-
-            return csv_content
-
+            self.flush_audit_log()
+            return b''.join(self.iter_logs_csv(filters, until_id=self.get_max_log_id())).decode('utf-8')
         except Exception as e:
             print(f"导出日志错误: {e}")
             return None
 
+    def get_max_log_id(self):
+        """当前最大日志ID，作为一次导出的上界（导出期间新增的日志不会混入）"""
+        try:
+            conn = self.get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM user_logs")
+            max_id = cursor.fetchone()[0]
+            conn.close()
+            return max_id
+        except Exception as e:
+            print(f"获取日志ID范围错误: {e}")
+            return None
+
+    def iter_logs_csv(self, filters=None, after_id=0, until_id=None, compress=False):
+        """
+        流式导出操作日志，逐块生成CSV字节（compress=True 时为gzip字节流）
+
+        按日志ID升序输出 after_id < id <= until_id 的记录，中断后可以用已收到的最后一个
+        日志ID作为 after_id 继续导出。内存占用与日志总量无关：
+        PostgreSQL使用服务器端命名游标；SQLite按ID分段查询，每段用 fetchmany 读取，
+        不会在整个导出期间持有读事务而阻塞日志写入。
+        """
+        filters = filters or {}
+        placeholder = "%s" if self.use_postgresql else "?"
+        conditions = [f"ul.id > {placeholder}"]
+        params = [after_id or 0]
+        if until_id is not None:
+            conditions.append(f"ul.id <= {placeholder}")
+            params.append(until_id)
+        for key, condition in (('user_id', 'ul.target_user_id = {}'), ('admin_id', 'ul.admin_id = {}'),
+                               ('action', 'ul.action = {}'), ('date_from', 'ul.created_at >= {}'),
+                               ('date_to', 'ul.created_at <= {}')):
+            if filters.get(key):
+                conditions.append(condition.format(placeholder))
+                params.append(filters[key])
+
+        query = f"""
+            SELECT ul.id, ul.created_at, ul.action, u1.username, u2.username,
+                   ul.reason, u1.email, u2.email
+            FROM user_logs ul
+            LEFT JOIN users u1 ON ul.admin_id = u1.id
+            LEFT JOIN users u2 ON ul.target_user_id = u2.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY ul.id
+        """
+
+        # gzip格式（wbits=31），与 .csv.gz 文件兼容
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def take():
+            data = buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            return compressor.compress(data) if compressor else data
+
+        writer.writerow(EXPORT_COLUMNS)
+        yield take()
+        try:
+            for rows in self._iter_log_rows(query, params):
+                writer.writerows(rows)
+                chunk = take()
+                if chunk:
+                    yield chunk
+        except Exception as e:
+            # 响应头已经发出，只能终止输出；客户端可以用最后收到的日志ID续传
+            print(f"流式导出日志错误: {e}")
+        if compressor:
+            yield compressor.flush()
+
+    def _iter_log_rows(self, query, params):
+        """按块读取导出查询的结果"""
+        conn = self.get_db_connection()
+        try:
+            if self.use_postgresql:
+                # 命名游标：结果保留在服务器端，每次fetchmany只传输一块
+                cursor = conn.cursor(name='audit_log_export')
+                cursor.itersize = EXPORT_CHUNK_ROWS
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+                    if not rows:
+                        break
+                    yield rows
+                cursor.close()
+            else:
+                conn.row_factory = None
+                paged_query = f"{query} LIMIT {EXPORT_CHUNK_ROWS}"
+                last_id = params[0]
+                while True:
+                    cursor = conn.execute(paged_query, [last_id] + params[1:])
+                    rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+                    cursor.close()
+                    if not rows:
+                        break
+                    yield rows
+                    if len(rows) < EXPORT_CHUNK_ROWS:
+                        break
+                    last_id = rows[-1][0]
+        finally:
+            conn.close()
+
     def get_security_alerts(self, days=7):
         """获取安全警报 - 检测异常操作模式"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            conn = self.get_db_connection()
+            cursor = self._dict_cursor(conn)
+            since = self._since_days_sql(days)
+            if self.use_postgresql:
+                night_hours = "(EXTRACT(HOUR FROM ul.created_at) < 6 OR EXTRACT(HOUR FROM ul.created_at) > 22)"
+            else:
+                night_hours = "(strftime('%H', ul.created_at) < '06' OR strftime('%H', ul.created_at) > '22')"
 
             alerts = []
 
             # 1. 检测频繁拉黑操作
-            cursor.execute("""
+            cursor.execute(f"""
                 SELECT u.username, COUNT(*) as blacklist_count
                 FROM user_logs ul
                 LEFT JOIN users u ON ul.admin_id = u.id
                 WHERE ul.action IN ('BLACKLIST', 'BATCH_BLACKLIST')
-                AND ul.created_at >= datetime('now', '-{} days')
+                AND ul.created_at >= {since}
                 GROUP BY ul.admin_id, u.username
                 HAVING COUNT(*) > 10
                 ORDER BY blacklist_count DESC
-            """.format(days))
+            """)
 
             frequent_blacklists = cursor.fetchall()
             for admin in frequent_blacklists:
@@ -866,16 +1080,16 @@ class UserManager:
                 })
 
             # 2. 检测批量操作
-            cursor.execute("""
+            cursor.execute(f"""
                 SELECT u.username, COUNT(*) as batch_count
                 FROM user_logs ul
                 LEFT JOIN users u ON ul.admin_id = u.id
                 WHERE ul.action LIKE '%BATCH%'
-                AND ul.created_at >= datetime('now', '-{} days')
+                AND ul.created_at >= {since}
                 GROUP BY ul.admin_id, u.username
                 HAVING COUNT(*) > 5
                 ORDER BY batch_count DESC
-            """.format(days))
+            """)
 
             frequent_batch = cursor.fetchall()
             for admin in frequent_batch:
@@ -888,16 +1102,16 @@ class UserManager:
                 })
 
             # 3. 检测深夜操作
-            cursor.execute("""
+            cursor.execute(f"""
                 SELECT u.username, COUNT(*) as night_count
                 FROM user_logs ul
                 LEFT JOIN users u ON ul.admin_id = u.id
-                WHERE (strftime('%H', ul.created_at) < '06' OR strftime('%H', ul.created_at) > '22')
-                AND ul.created_at >= datetime('now', '-{} days')
+                WHERE {night_hours}
+                AND ul.created_at >= {since}
                 GROUP BY ul.admin_id, u.username
                 HAVING COUNT(*) > 5
                 ORDER BY night_count DESC
-            """.format(days))
+            """)
 
             night_operations = cursor.fetchall()
             for admin in night_operations:
@@ -917,6 +1131,13 @@ class UserManager:
             return []
 
 # 获取用户管理器实例
+def merge_pending_last_seen(users):
+    """合并写回缓冲中尚未写入数据库的最后登录时间"""
+    write_behind = current_app.extensions.get('write_behind')
+    if write_behind:
+        write_behind.merge_last_seen(users)
+    return users
+
 def get_user_manager():
     """获取用户管理器实例"""
     # 优先使用PostgreSQL URL，回退到SQLite
@@ -946,6 +1167,12 @@ def users():
     
     um = get_user_manager()
     data = um.get_all_users(page, per_page, search)
+    merge_pending_last_seen(data['users'])
+
+    # 每一行可执行的操作：直接用已查出的用户行判断，不再逐行查询
+    allowed = get_authorizer().check_many(USER_ROW_PERMISSIONS, data['users'])
+    for user in data['users']:
+        user['permissions'] = allowed[str(user['id'])]
     
     return render_template('admin/users.html',
                          users=data['users'],
@@ -971,6 +1198,8 @@ def edit_user(user_id):
         flash('用户不存在', 'error')
         return redirect(url_for('permissions.users'))
     
+    merge_pending_last_seen(user)
+
     # 获取用户统计信息
     stats = um.get_user_statistics(user_id)
     user.update(stats)
@@ -1039,8 +1268,14 @@ def delete_user(user_id):
 @validate_csrf_token
 def toggle_admin(user_id):
     """切换用户管理员权限"""
+    # 目标用户的当前状态来自主体缓存，更新时带上该状态作为条件，不必先查询
+    authorizer = get_authorizer()
+    if not authorizer.check(USER_TOGGLE_ADMIN, user_id):
+        flash('操作失败: 用户不存在或不能修改当前登录用户的管理员权限', 'error')
+        return redirect(url_for('permissions.users'))
+    target = authorizer.target(user_id)
     um = get_user_manager()
-    success, message = um.toggle_admin_status(user_id)
+    success, message = um.toggle_admin_status(user_id, current_status=target[3] if target else None)
     
     if success:
         flash(message, 'success')
@@ -1208,8 +1443,9 @@ def api_unblacklist_user(user_id):
 def api_user_status(user_id):
     """API: 获取用户状态"""
     try:
+        # 响应需要拉黑时间、原因等主体中没有的字段，只查询一次用户详情（不存在时返回404）
         um = get_user_manager()
-        user = um.get_user(user_id)
+        user = merge_pending_last_seen(um.get_user(user_id))
 
         if not user:
             return jsonify({
@@ -1278,6 +1514,44 @@ def api_batch_blacklist():
             'message': str(e)
         }), 500
 
+@permissions_bp.route('/batch/<operation>', methods=['POST'])
+@login_required
+@admin_required
+@validate_csrf_token
+def batch_operation(operation):
+    """批量用户操作：blacklist / unblacklist / delete / toggle-admin"""
+    operation = operation.replace('-', '_')
+    reason = request.form.get('reason', '批量管理操作').strip() or '批量管理操作'
+
+    um = get_user_manager()
+    success, message, _ = um.bulk_user_operation(operation, request.form.getlist('user_ids'),
+                                                 current_user.id, reason)
+    if success:
+        flash(message, 'success')
+    else:
+        flash(f'批量操作失败: {message}', 'error')
+
+    return redirect(url_for('permissions.users'))
+
+@permissions_bp.route('/api/batch/<operation>', methods=['POST'])
+@login_required
+@admin_required
+@validate_csrf_token
+def api_batch_operation(operation):
+    """API: 批量用户操作，请求体 {"user_ids": [...], "reason": "..."}"""
+    data = request.get_json() or {}
+    reason = (data.get('reason') or '批量管理操作').strip() or '批量管理操作'
+
+    um = get_user_manager()
+    success, message, affected_ids = um.bulk_user_operation(operation.replace('-', '_'),
+                                                            data.get('user_ids', []),
+                                                            current_user.id, reason)
+    return jsonify({
+        'success': success,
+        'message': message,
+        'affected_ids': affected_ids
+    }), 200 if success else 400
+
 # 审计和日志管理路由
 @permissions_bp.route('/audit/logs')
 @login_required
@@ -1374,21 +1648,60 @@ def export_audit_logs():
     filters = {k: int(v) if k in ['user_id', 'admin_id'] and v else v
               for k, v in filters.items() if v}
 
-    um = get_user_manager()
-    csv_content = um.export_logs_to_csv(filters)
-
-    if csv_content:
-        from datetime import datetime
-        filename = f"audit_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    # 续传范围：after_id 为已收到的最后一个日志ID，until_id 为首次导出时返回的上界
+    after_id = request.args.get('after_id', 0, type=int)
+    until_id = request.args.get('until_id', type=int)
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
 
-        response = make_response(csv_content)
-        response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-        return response
-    else:
+    um = get_user_manager()
+    um.flush_audit_log()
+    if until_id is None:
+        until_id = um.get_max_log_id()
+    if until_id is None:
         flash('导出失败', 'error')
         return redirect(url_for('permissions.audit_logs'))
 
+    # ?background=1：交给后台任务写入文件，完成后从 /audit/export/job/<任务ID> 下载
+    jobs = current_app.extensions.get('jobs')
+    if request.args.get('background') == '1' and jobs is not None:
+        try:
+            job_id = jobs.enqueue('audit_export', {'filters': filters, 'after_id': after_id, 'until_id': until_id,
+                                                   'compress': compress}, created_by=current_user.id)
+        except Exception as e:
+            return jsonify({'success': False, 'message': f'提交导出任务失败: {e}'}), 500
+        return jsonify({'success': True, 'job_id': job_id,
+                        'download_url': url_for('permissions.download_audit_export', job_id=job_id)}), 202
+
+    filename = f"audit_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    if compress:
+        filename += '.gz'
+    response = Response(um.iter_logs_csv(filters, after_id, until_id, compress),
+                        mimetype='application/gzip' if compress else 'text/csv')
+    if not compress:
+        response.headers['Content-Type'] = 'text/csv; charset=utf-8'
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['X-Export-Until-Id'] = str(until_id)
+    # 关闭反向代理缓冲，边生成边发送
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@permissions_bp.route('/audit/export/job/<int:job_id>')
+@login_required
+@admin_required
+def download_audit_export(job_id):
+    """下载后台任务生成的审计日志导出文件；任务未完成时返回任务状态"""
+    jobs = current_app.extensions.get('jobs')
+    job = jobs.get_job(job_id) if jobs is not None else None
+    if not job or job['kind'] != 'audit_export':
+        return jsonify({'success': False, 'message': '导出任务不存在'}), 404
+    if job['status'] != 'succeeded':
+        return jsonify({'success': job['status'] not in ('failed', 'cancelled'), 'job': job}), 202
+    path = job['result']['path']
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'message': '导出文件已被清理'}), 410
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=os.path.basename(path),
+                     mimetype='application/gzip' if path.endswith('.gz') else 'text/csv')
+
 @permissions_bp.route('/api/audit/timeline/<int:user_id>')
 @login_required
 @admin_required
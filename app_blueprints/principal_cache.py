@@ -0,0 +1,312 @@
+# 用户主体缓存 - 已登录请求不再每次都在 load_user 中查询 users 表
+#
+# 每个用户有一个安全版本号，保存在各worker共享的存储中；拉黑/解除拉黑、切换管理员、
+# 修改资料、删除用户后版本号加一（在数据库事务提交之后）。
+# 请求时只读一次版本号，与本进程LRU中缓存的版本一致就直接使用缓存的主体，
+# 不一致或未缓存时才查询数据库。因此权限变更在下一个请求就生效，包括其他worker。
+# 存储（PRINCIPAL_CACHE_STORAGE，默认与 RATE_LIMIT_STORAGE 相同）：
+#   memory:// 仅单进程 / sqlite:///path 同主机worker共享 / redis://... 多主机共享，
+#   使用Redis时主体本身也缓存在Redis中，各worker的LRU未命中时不必查数据库
+# PRINCIPAL_CACHE_TTL 为缓存主体的最长使用时间，兜底直接修改数据库等未经过失效接口的变更。
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from app_blueprints.ratelimit import RATE_LIMIT_STORAGE, HAS_REDIS
+
+if HAS_REDIS:
+    import redis
+
+PRINCIPAL_CACHE_STORAGE = os.environ.get('PRINCIPAL_CACHE_STORAGE', RATE_LIMIT_STORAGE)
+# 本进程LRU最多缓存的用户数
+PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', 10000))
+# 缓存主体的最长使用时间（秒）
+PRINCIPAL_CACHE_TTL = float(os.environ.get('PRINCIPAL_CACHE_TTL', 300))
+
+# 主体字段（load_user 按此顺序查询列）
+PRINCIPAL_COLUMNS = ('id', 'username', 'email', 'is_admin', 'is_blacklisted')
+# 批量读取时每条 IN 查询最多包含的用户数
+BATCH_SIZE = 500
+
+
+class MemoryVersionStore:
+    """进程内版本号（单进程或测试使用）"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        return self._versions.get(user_id, 0)
+
+    def get_many(self, user_ids):
+        return {user_id: self._versions.get(user_id, 0) for user_id in user_ids}
+
+    def bump(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+
+class SQLiteVersionStore:
+    """SQLite文件中的版本号表：同一主机的worker共享，按主键读取一行"""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute('''
+            CREATE TABLE IF NOT EXISTS principal_versions (
+                user_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, user_id):
+        row = self._connection().execute(
+            'SELECT version FROM principal_versions WHERE user_id = ?', (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def get_many(self, user_ids):
+        versions = dict.fromkeys(user_ids, 0)
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            chunk = user_ids[start:start + BATCH_SIZE]
+            rows = self._connection().execute(
+                f"SELECT user_id, version FROM principal_versions WHERE user_id IN ({','.join('?' * len(chunk))})",
+                chunk).fetchall()
+            versions.update(rows)
+        return versions
+
+    def bump(self, user_ids):
+        self._connection().executemany('''
+            INSERT INTO principal_versions (user_id, version) VALUES (?, 1)
+            ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+        ''', [(user_id,) for user_id in user_ids])
+
+
+class RedisVersionStore:
+    """Redis中的版本号，同时作为主体的二级缓存（按用户ID和版本号存取，带过期时间）"""
+
+    name = 'redis'
+
+    def __init__(self, url, prefix='ros2_wiki:principal:'):
+        if not HAS_REDIS:
+            raise RuntimeError('未安装redis模块，无法使用Redis主体缓存')
+        self.client = redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def get(self, user_id):
+        value = self.client.get(f'{self.prefix}v:{user_id}')
+        return int(value) if value else 0
+
+    def get_many(self, user_ids):
+        if not user_ids:
+            return {}
+        values = self.client.mget([f'{self.prefix}v:{user_id}' for user_id in user_ids])
+        return {user_id: int(value) if value else 0 for user_id, value in zip(user_ids, values)}
+
+    def bump(self, user_ids):
+        pipe = self.client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.incr(f'{self.prefix}v:{user_id}')
+        pipe.execute()
+
+    def load(self, user_id, version):
+        """返回 (是否命中, 主体)"""
+        value = self.client.get(f'{self.prefix}p:{user_id}:{version}')
+        if value is None:
+            return False, None
+        return True, json.loads(value)
+
+    def store(self, user_id, version, principal, ttl):
+        self.client.set(f'{self.prefix}p:{user_id}:{version}', json.dumps(principal), ex=max(1, int(ttl)))
+
+
+def create_version_store(uri=None):
+    uri = uri or PRINCIPAL_CACHE_STORAGE
+    if uri.startswith('memory'):
+        return MemoryVersionStore()
+    if uri.startswith('sqlite:///'):
+        return SQLiteVersionStore(uri[len('sqlite:///'):])
+    if uri.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisVersionStore(uri)
+    raise ValueError(f'不支持的主体缓存存储: {uri}')
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_version_store():
+    """进程内共享的版本号存储（首次使用时按 PRINCIPAL_CACHE_STORAGE 创建）"""
+    global _default_store
+    if _default_store is None:
+        with _default_lock:
+            if _default_store is None:
+                try:
+                    _default_store = create_version_store()
+                except Exception as e:
+                    print(f"创建主体缓存存储失败，改用进程内存储: {e}")
+                    _default_store = MemoryVersionStore()
+    return _default_store
+
+
+def invalidate_principals(*user_ids):
+    """用户的权限或资料发生变化后调用（数据库提交之后），各worker在下一个请求重新加载"""
+    user_ids = [str(user_id) for user_id in user_ids if user_id is not None]
+    if not user_ids:
+        return
+    try:
+        get_version_store().bump(user_ids)
+    except Exception as e:
+        print(f"更新用户主体版本失败: {e}")
+
+
+class PrincipalCache:
+    """
+    loader(user_id) 从数据库读取主体，返回 PRINCIPAL_COLUMNS 顺序的元组/列表，用户不存在时返回None；
+    batch_loader(user_ids) 可选，一次查询多个用户，返回主体的可迭代对象（第一列为id）；
+    get(user_id) 返回主体（不存在的用户也会缓存，避免失效会话反复查库）；
+    get_many(user_ids) 批量读取，版本号一次读取，未命中的用户一次查询
+    """
+
+    def __init__(self, loader, store=None, max_entries=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL,
+                 batch_loader=None):
+        self.loader = loader
+        self.batch_loader = batch_loader
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (版本号, 缓存时间, 主体)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'stale': 0, 'errors': 0}
+
+    def get(self, user_id):
+        store = self.store or get_version_store()
+        user_id = str(user_id)
+        try:
+            version = store.get(user_id)
+        except Exception as e:
+            # 读不到版本号时无法确认缓存是否有效，直接查数据库
+            self.stats['errors'] += 1
+            print(f"读取用户主体版本失败: {e}")
+            return self.loader(user_id)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == version and now - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.stats['hits'] += 1
+                return entry[2]
+            if entry is not None:
+                self.stats['stale'] += 1
+
+        principal = None
+        found = False
+        if isinstance(store, RedisVersionStore):
+            try:
+                found, principal = store.load(user_id, version)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"读取Redis用户主体失败: {e}")
+        if found:
+            self.stats['shared_hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            principal = self.loader(user_id)
+            principal = list(principal) if principal is not None else None
+            if isinstance(store, RedisVersionStore):
+                try:
+                    store.store(user_id, version, principal, self.ttl)
+                except Exception as e:
+                    print(f"写入Redis用户主体失败: {e}")
+
+        with self._lock:
+            self._remember(user_id, version, now, principal)
+        return principal
+
+    def _remember(self, user_id, version, now, principal):
+        # 调用方持有 self._lock
+        self._entries[user_id] = (version, now, principal)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, user_ids):
+        """批量读取主体，返回 {user_id(str): 主体或None}"""
+        store = self.store or get_version_store()
+        user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+        try:
+            versions = store.get_many(user_ids)
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"批量读取用户主体版本失败: {e}")
+            versions = None
+
+        result = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if (versions is not None and entry is not None and entry[0] == versions[user_id]
+                        and now - entry[1] < self.ttl):
+                    self._entries.move_to_end(user_id)
+                    self.stats['hits'] += 1
+                    result[user_id] = entry[2]
+                else:
+                    if entry is not None:
+                        self.stats['stale'] += 1
+                    missing.append(user_id)
+        if not missing:
+            return result
+
+        self.stats['misses'] += len(missing)
+        if self.batch_loader is not None:
+            loaded = {}
+            for start in range(0, len(missing), BATCH_SIZE):
+                for row in self.batch_loader(missing[start:start + BATCH_SIZE]):
+                    loaded[str(row[0])] = list(row)
+        else:
+            loaded = {}
+            for user_id in missing:
+                principal = self.loader(user_id)
+                loaded[user_id] = list(principal) if principal is not None else None
+        with self._lock:
+            for user_id in missing:
+                principal = loaded.get(user_id)
+                result[user_id] = principal
+                if versions is not None:
+                    self._remember(user_id, versions[user_id], now, principal)
+        return result
+
+    def invalidate(self, *user_ids):
+        """清除本进程缓存并使其他worker的缓存失效"""
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(str(user_id), None)
+        invalidate_principals(*user_ids)
+
+    def status(self):
+        store = self.store or get_version_store()
+        lookups = self.stats['hits'] + self.stats['shared_hits'] + self.stats['misses']
+        return dict(self.stats, storage=store.name, cached=len(self._entries), max_entries=self.max_entries,
+                    ttl=self.ttl, hit_rate=round(self.stats['hits'] / lookups, 4) if lookups else 0)
@@ -0,0 +1,324 @@
+# 速率限制模块 - GCRA（通用信元速率算法，等价于令牌桶）
+#
+# 每个key只保存一个浮点数TAT（理论到达时间），判断和更新都是O(1)：
+#   - 每个请求把TAT推后一个发放间隔 T = period / rate
+#   - TAT 超前当前时间超过 burst * T 时拒绝，Retry-After 就是超出的部分
+#   - TAT 早于当前时间的key等同于空桶，可以随时淘汰（TTL = TAT - now）
+# 存储后端可替换：
+#   - memory://                     进程内，LRU + 过期淘汰，key数量有上限
+#   - sqlite:///path/ratelimit.db   同一主机上的gunicorn worker共享，单条UPSERT原子更新
+#   - redis://host:6379/0           多主机共享，Lua脚本原子更新，key带过期时间
+# 存储出错时放行请求（fail open），只记录日志。
+# 配置: RATE_LIMIT_STORAGE（默认临时目录下的SQLite文件）、RATE_LIMIT_MAX_KEYS
+
+import os
+import math
+import time
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import request, jsonify
+
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+RATE_LIMIT_STORAGE = os.environ.get(
+    'RATE_LIMIT_STORAGE', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'ros2_wiki_ratelimit.db'))
+# 进程内存储最多保存的key数量，超过时淘汰最久未访问的key
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 200000))
+# SQLite存储每处理多少次请求清理一次过期key
+SQLITE_SWEEP_EVERY = 5000
+
+# allowed: 是否放行；remaining: 还能立即发出的请求数；
+# retry_after: 被拒绝时需要等待的秒数；reset_after: 桶完全恢复需要的秒数
+RateLimitResult = namedtuple('RateLimitResult', 'allowed limit remaining retry_after reset_after')
+
+
+def gcra(tat, now, interval, burst):
+    """GCRA判断：返回 (是否放行, 新TAT)；tat为None表示新key"""
+    tat = now if tat is None or tat < now else tat
+    new_tat = tat + interval
+    if new_tat - burst * interval > now:
+        return False, tat
+    return True, new_tat
+
+
+def make_result(allowed, tat, now, interval, burst):
+    """由更新后的TAT计算剩余次数和等待时间"""
+    if allowed:
+        remaining = int((now + burst * interval - tat) // interval)
+        retry_after = 0.0
+    else:
+        remaining = 0
+        retry_after = tat + interval - burst * interval - now
+    return RateLimitResult(allowed, burst, max(0, remaining), max(0.0, retry_after), max(0.0, tat - now))
+
+
+class MemoryStorage:
+    """进程内存储：OrderedDict按访问顺序排列，每次访问顺带淘汰队首的过期key"""
+
+    name = 'memory'
+
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def hit(self, key, now, interval, burst):
+        with self._lock:
+            data = self._data
+            allowed, tat = gcra(data.get(key), now, interval, burst)
+            data[key] = tat
+            data.move_to_end(key)
+            # 队首是最久未访问的key：过期的直接删除，超出上限的也删除（相当于提前清空它的桶）
+            for _ in range(2):
+                if not data:
+                    break
+                oldest_key = next(iter(data))
+                if data[oldest_key] > now and len(data) <= self.max_keys:
+                    break
+                del data[oldest_key]
+                self.evicted += 1
+        return allowed, tat
+
+    def reset(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def sweep(self, now=None):
+        """删除全部过期key，返回删除数量"""
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [key for key, tat in self._data.items() if tat <= now]
+            for key in expired:
+                del self._data[key]
+        return len(expired)
+
+    def key_count(self):
+        return len(self._data)
+
+
+class SQLiteStorage:
+    """
+    SQLite文件存储：同一主机上的多个worker进程共享限流状态。
+    一条 INSERT ... ON CONFLICT DO UPDATE ... RETURNING 完成判断和更新，不需要显式事务；
+    限流状态可丢失，使用WAL且关闭同步写盘。
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                tat REAL NOT NULL,
+                allowed INTEGER NOT NULL DEFAULT 1
+            ) WITHOUT ROWID
+        ''')
+
+    def _connection(self):
+        # 每个线程一个连接；fork出的worker进程不能沿用父进程的连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def hit(self, key, now, interval, burst):
+        conn = self._connection()
+        # SET中的列引用都是旧值：放行时TAT推后一个间隔，拒绝时保持不变
+        tat, allowed = conn.execute('''
+            INSERT INTO rate_limits (key, tat, allowed) VALUES (?4, ?5, 1)
+            ON CONFLICT (key) DO UPDATE SET
+                tat = CASE WHEN max(tat, ?1) + ?2 - ?3 <= ?1 THEN max(tat, ?1) + ?2 ELSE tat END,
+                allowed = max(tat, ?1) + ?2 - ?3 <= ?1
+            RETURNING tat, allowed
+        ''', (now, interval, burst * interval, key, now + interval)).fetchone()
+        self._calls += 1
+        if self._calls % SQLITE_SWEEP_EVERY == 0:
+            self.sweep(now)
+        return bool(allowed), tat
+
+    def reset(self, key):
+        self._connection().execute('DELETE FROM rate_limits WHERE key = ?', (key,))
+
+    def sweep(self, now=None):
+        now = time.time() if now is None else now
+        try:
+            return self._connection().execute('DELETE FROM rate_limits WHERE tat <= ?', (now,)).rowcount
+        except sqlite3.OperationalError as e:
+            print(f"清理限流状态失败: {e}")
+            return 0
+
+    def key_count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM rate_limits').fetchone()[0]
+
+
+# KEYS[1]=key；ARGV: now, interval, burst。返回 {放行1/0, TAT字符串}
+GCRA_LUA = '''
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval
+if new_tat - burst * interval > now then
+    return {0, tostring(tat)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, tostring(new_tat)}
+'''
+
+
+class RedisStorage:
+    """Redis存储：多主机共享，Lua脚本保证原子性，key随TAT过期自动删除"""
+
+    name = 'redis'
+
+    def __init__(self, url, prefix='ros2_wiki:rl:'):
+        if not HAS_REDIS:
+            raise RuntimeError('未安装redis模块，无法使用Redis限流存储')
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(GCRA_LUA)
+
+    def hit(self, key, now, interval, burst):
+        allowed, tat = self._script(keys=[self.prefix + key], args=[repr(now), repr(interval), burst])
+        return bool(int(allowed)), float(tat)
+
+    def reset(self, key):
+        self.client.delete(self.prefix + key)
+
+    def sweep(self, now=None):
+        return 0  # 由Redis过期机制清理
+
+    def key_count(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + '*', count=1000))
+
+
+def create_storage(uri=None):
+    """按URI创建存储：memory:// / sqlite:///path / redis://..."""
+    uri = uri or RATE_LIMIT_STORAGE
+    if uri.startswith('memory'):
+        return MemoryStorage()
+    if uri.startswith('sqlite:///'):
+        return SQLiteStorage(uri[len('sqlite:///'):])
+    if uri.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStorage(uri)
+    raise ValueError(f'不支持的限流存储: {uri}')
+
+
+class RateLimiter:
+    """限流引擎：hit(key, rate, period) 在 period 秒内最多放行 rate 次（允许一次性突发 burst 次）"""
+
+    def __init__(self, storage=None):
+        self.storage = storage if storage is not None else create_storage()
+        self.stats = {'allowed': 0, 'rejected': 0, 'errors': 0}
+
+    def _check(self, key, now, interval, burst):
+        try:
+            allowed, tat = self.storage.hit(key, now, interval, burst)
+        except Exception as e:
+            # 存储不可用时放行，避免限流组件拖垮整个站点
+            self.stats['errors'] += 1
+            print(f"限流存储出错，放行请求: {e}")
+            return True, None
+        self.stats['allowed' if allowed else 'rejected'] += 1
+        return allowed, tat
+
+    def hit(self, key, rate, period, burst=None):
+        """判断并计数，返回 RateLimitResult（用于生成 X-RateLimit-* 响应头）"""
+        interval = period / rate
+        burst = burst or rate
+        now = time.time()
+        allowed, tat = self._check(key, now, interval, burst)
+        if tat is None:
+            return RateLimitResult(True, burst, burst, 0.0, 0.0)
+        return make_result(allowed, tat, now, interval, burst)
+
+    def is_allowed(self, key, rate, period, burst=None):
+        """只返回是否放行（不构造结果对象）"""
+        return self._check(key, time.time(), period / rate, burst or rate)[0]
+
+    def reset(self, key):
+        self.storage.reset(key)
+
+    def status(self):
+        return {'storage': self.storage.name, 'keys': self.storage.key_count(), **self.stats}
+
+
+_default_limiter = None
+_default_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """进程内共享的默认限流引擎（首次使用时按 RATE_LIMIT_STORAGE 创建）"""
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_lock:
+            if _default_limiter is None:
+                try:
+                    _default_limiter = RateLimiter()
+                except Exception as e:
+                    print(f"创建限流存储失败，改用进程内存储: {e}")
+                    _default_limiter = RateLimiter(MemoryStorage())
+    return _default_limiter
+
+
+def get_client_ip():
+    """客户端IP：取 X-Forwarded-For 的第一个地址"""
+    forwarded = request.headers.get('X-Forwarded-For')
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return request.headers.get('X-Real-IP') or request.remote_addr or 'unknown'
+
+
+def apply_rate_limit_headers(response, result):
+    response.headers['X-RateLimit-Limit'] = str(result.limit)
+    response.headers['X-RateLimit-Remaining'] = str(result.remaining)
+    response.headers['X-RateLimit-Reset'] = str(math.ceil(result.reset_after))
+    if not result.allowed:
+        response.headers['Retry-After'] = str(max(1, math.ceil(result.retry_after)))
+    return response
+
+
+def rate_limit_response(result, message='请求过于频繁，请稍后再试'):
+    """429响应，带 Retry-After 和 X-RateLimit-* 头"""
+    response = jsonify({'error': message, 'status_code': 429,
+                        'retry_after': max(1, math.ceil(result.retry_after))})
+    response.status_code = 429
+    return apply_rate_limit_headers(response, result)
+
+
+def rate_limit(max_requests=10, window=60, key_func=None, scope=None, burst=None, limiter=None):
+    """
+    速率限制装饰器：每个客户端（默认按IP）在 window 秒内最多 max_requests 次
+    scope 默认为视图函数名，不同视图各自计数
+    """
+    def decorator(f):
+        limit_scope = scope or f.__name__
+
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            engine = limiter or get_rate_limiter()
+            client_key = key_func() if key_func else get_client_ip()
+            result = engine.hit(f'{limit_scope}:{client_key}', max_requests, window, burst)
+            if not result.allowed:
+                return rate_limit_response(result)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
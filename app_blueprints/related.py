@@ -0,0 +1,365 @@
+# 相关文档模块 - 基于TF-IDF余弦相似度的离线近邻计算
+#
+# 构建任务把所有文档向量化为稀疏TF-IDF矩阵，分批做稀疏矩阵乘法求每篇文档的
+# top-k 近邻，结果写入 document_neighbors 表；页面和API只需一次索引查询。
+
+import re
+import math
+import time
+import heapq
+from collections import Counter
+
+# NumPy/SciPy为可选依赖，仅构建任务需要；读取近邻不依赖它们
+try:
+    import numpy as np
+    import scipy.sparse as sp
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# 每篇文档保存的近邻数量
+DEFAULT_TOP_K = 10
+# 每批参与矩阵乘法的文档行数，控制峰值内存
+DEFAULT_BATCH_SIZE = 512
+# 词项出现的最少文档数 / 最大文档比例（过滤噪声词和停用词）
+MIN_DF = 2
+MAX_DF_RATIO = 0.5
+# 词表上限，按文档频率保留
+MAX_FEATURES = 100000
+# 每篇文档只保留权重最高的词项，稀疏度决定相似度计算的开销
+MAX_TERMS_PER_DOC = 32
+# 标题词权重（标题词重复计入的次数）
+TITLE_WEIGHT = 3
+# 读取文档和写入近邻的批大小
+FETCH_BATCH_SIZE = 1000
+
+WORD_PATTERN = re.compile(r'[a-z][a-z0-9_]+')
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]+')
+
+
+def tokenize(text):
+    """分词：英文/标识符按单词，中文按相邻二字组"""
+    text = (text or '').lower()
+    tokens = WORD_PATTERN.findall(text)
+    for run in CJK_PATTERN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class RelatedDocumentsEngine:
+    """相关文档引擎"""
+
+    def __init__(self, conn, use_postgresql=False, top_k=DEFAULT_TOP_K,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        self.conn = conn
+        self.use_postgresql = use_postgresql
+        self.placeholder = '%s' if use_postgresql else '?'
+        self.top_k = top_k
+        self.batch_size = batch_size
+
+    def create_schema(self):
+        """创建近邻表和构建状态表"""
+        cursor = self.conn.cursor()
+        without_rowid = '' if self.use_postgresql else ' WITHOUT ROWID'
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS document_neighbors (
+                document_id INTEGER NOT NULL,
+                rank INTEGER NOT NULL,
+                neighbor_id INTEGER NOT NULL,
+                score REAL NOT NULL,
+                PRIMARY KEY (document_id, rank)
+            ){without_rowid}
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS document_neighbors_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        self.conn.commit()
+
+    def rebuild(self):
+        """
+        全量重建所有文档的近邻列表
+        返回各阶段耗时统计
+        """
+        if not HAS_NUMPY:
+            raise RuntimeError("重建相关文档需要安装 numpy 和 scipy")
+        self.create_schema()
+        stats = {}
+
+        started = time.perf_counter()
+        doc_ids, matrix = self._build_matrix()
+        stats['vectorize_seconds'] = time.perf_counter() - started
+        stats['documents'] = len(doc_ids)
+        stats['features'] = matrix.shape[1]
+
+        started = time.perf_counter()
+        rows = list(self._iter_top_k(doc_ids, matrix, range(len(doc_ids))))
+        stats['similarity_seconds'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM document_neighbors")
+        self._write_neighbors(cursor, rows)
+        self._save_watermark(cursor)
+        self.conn.commit()
+        stats['write_seconds'] = time.perf_counter() - started
+        stats['neighbors'] = len(rows)
+        return stats
+
+    def update_incremental(self):
+        """
+        增量更新：只重算自上次构建后新增/修改的文档，
+        以及近邻列表可能受其影响的文档；已删除文档的近邻行一并清除。
+        词表和IDF仍按全量重新计算（向量化远快于相似度计算）。
+        """
+        if not HAS_NUMPY:
+            raise RuntimeError("更新相关文档需要安装 numpy 和 scipy")
+        self.create_schema()
+        watermark = self._load_watermark()
+        if watermark is None:
+            return self.rebuild()
+
+        changed_ids = self._changed_document_ids(watermark)
+        deleted_ids = self._deleted_document_ids()
+        if not changed_ids and not deleted_ids:
+            return {'documents': 0, 'changed': 0, 'deleted': 0, 'recomputed': 0}
+
+        doc_ids, matrix = self._build_matrix()
+        position = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+        changed_rows = [position[d] for d in changed_ids if d in position]
+
+        cursor = self.conn.cursor()
+        p = self.placeholder
+        # 已删除文档自身的近邻列表直接删除
+        for start in range(0, len(deleted_ids), FETCH_BATCH_SIZE):
+            chunk = deleted_ids[start:start + FETCH_BATCH_SIZE]
+            cursor.execute(
+                f"DELETE FROM document_neighbors WHERE document_id IN ({', '.join([p] * len(chunk))})",
+                chunk
+            )
+        # 原近邻列表中包含已变更或已删除文档的，需要重算
+        affected = set()
+        stale_ids = list(changed_ids) + deleted_ids
+        for start in range(0, len(stale_ids), FETCH_BATCH_SIZE):
+            chunk = stale_ids[start:start + FETCH_BATCH_SIZE]
+            cursor.execute(
+                f"SELECT DISTINCT document_id FROM document_neighbors "
+                f"WHERE neighbor_id IN ({', '.join([p] * len(chunk))})",
+                chunk
+            )
+            affected.update(position[row[0]] for row in cursor.fetchall() if row[0] in position)
+        affected.update(changed_rows)
+
+        # 已变更文档与其他文档的新相似度超过对方当前第k名分数的，也需要重算
+        cursor.execute('''
+            SELECT document_id, MIN(score), COUNT(*) FROM document_neighbors GROUP BY document_id
+        ''')
+        thresholds = np.zeros(len(doc_ids))
+        for document_id, min_score, count in cursor.fetchall():
+            if document_id in position and count >= self.top_k:
+                thresholds[position[document_id]] = min_score
+        if changed_rows:
+            similarities = (matrix[changed_rows] @ matrix.T).tocsc().max(axis=0).toarray().ravel()
+            affected.update(np.nonzero(similarities > thresholds)[0].tolist())
+
+        rows = list(self._iter_top_k(doc_ids, matrix, sorted(affected)))
+        recomputed_ids = [doc_ids[i] for i in sorted(affected)]
+        for start in range(0, len(recomputed_ids), FETCH_BATCH_SIZE):
+            chunk = recomputed_ids[start:start + FETCH_BATCH_SIZE]
+            cursor.execute(
+                f"DELETE FROM document_neighbors WHERE document_id IN ({', '.join([p] * len(chunk))})",
+                chunk
+            )
+        self._write_neighbors(cursor, rows)
+        self._save_watermark(cursor)
+        self.conn.commit()
+        return {'documents': len(doc_ids), 'changed': len(changed_ids),
+                'deleted': len(deleted_ids), 'recomputed': len(recomputed_ids)}
+
+    def _build_matrix(self):
+        """读取所有文档并构建L2归一化的TF-IDF稀疏矩阵（CSR）"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id, title, content FROM documents ORDER BY id")
+
+        doc_ids = []
+        doc_counts = []
+        doc_freq = Counter()
+        while True:
+            batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not batch:
+                break
+            for doc_id, title, content in batch:
+                counts = Counter(tokenize(content))
+                for token in tokenize(title):
+                    counts[token] += TITLE_WEIGHT
+                doc_ids.append(doc_id)
+                doc_counts.append(counts)
+                doc_freq.update(counts.keys())
+
+        n_docs = len(doc_ids)
+        max_df = max(MIN_DF, int(n_docs * MAX_DF_RATIO))
+        candidates = [(df, token) for token, df in doc_freq.items() if MIN_DF <= df <= max_df]
+        candidates.sort(reverse=True)
+        vocabulary = {}
+        for col, (df, token) in enumerate(candidates[:MAX_FEATURES]):
+            vocabulary[token] = (col, math.log((1 + n_docs) / (1 + df)) + 1)
+
+        indptr = [0]
+        indices = []
+        data = []
+        for counts in doc_counts:
+            # 亚线性TF × IDF，只保留权重最高的 MAX_TERMS_PER_DOC 个词项
+            weights = []
+            for token, count in counts.items():
+                entry = vocabulary.get(token)
+                if entry is not None:
+                    weights.append(((1 + math.log(count)) * entry[1], entry[0]))
+            if len(weights) > MAX_TERMS_PER_DOC:
+                weights = heapq.nlargest(MAX_TERMS_PER_DOC, weights)
+            for weight, col in weights:
+                indices.append(col)
+                data.append(weight)
+            indptr.append(len(indices))
+
+        matrix = sp.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32),
+             np.asarray(indptr, dtype=np.int64)),
+            shape=(n_docs, len(vocabulary))
+        )
+        # 按行L2归一化，点积即余弦相似度
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        matrix = sp.diags(1 / norms).dot(matrix).tocsr()
+        return doc_ids, matrix
+
+    def _iter_top_k(self, doc_ids, matrix, row_positions):
+        """分批计算相似度并产出 (document_id, rank, neighbor_id, score)"""
+        row_positions = list(row_positions)
+        matrix_t = matrix.T.tocsr()
+        for start in range(0, len(row_positions), self.batch_size):
+            batch = row_positions[start:start + self.batch_size]
+            similarities = (matrix[batch] @ matrix_t).tocsr()
+            for offset, row in enumerate(batch):
+                lo, hi = similarities.indptr[offset], similarities.indptr[offset + 1]
+                cols = similarities.indices[lo:hi]
+                scores = similarities.data[lo:hi]
+                keep = cols != row
+                cols, scores = cols[keep], scores[keep]
+                if len(scores) > self.top_k:
+                    top = np.argpartition(-scores, self.top_k)[:self.top_k]
+                    cols, scores = cols[top], scores[top]
+                order = np.argsort(-scores, kind='stable')
+                for rank, idx in enumerate(order, 1):
+                    if scores[idx] <= 0:
+                        break
+                    yield (doc_ids[row], rank, doc_ids[cols[idx]], round(float(scores[idx]), 6))
+
+    def _write_neighbors(self, cursor, rows):
+        """分批写入近邻行"""
+        p = self.placeholder
+        sql = f"INSERT INTO document_neighbors (document_id, rank, neighbor_id, score) VALUES ({p}, {p}, {p}, {p})"
+        for start in range(0, len(rows), FETCH_BATCH_SIZE * 10):
+            cursor.executemany(sql, rows[start:start + FETCH_BATCH_SIZE * 10])
+
+    def _changed_document_ids(self, watermark):
+        """返回水位线之后新增或修改的文档ID"""
+        cursor = self.conn.cursor()
+        p = self.placeholder
+        max_updated_at = watermark.get('max_updated_at') or None
+        if max_updated_at is None:
+            # 上次构建时所有文档都没有修改时间：之后出现修改时间的都算变更
+            # （不能绑定空字符串，与时间戳比较在PostgreSQL中会报错）
+            cursor.execute(f"SELECT id FROM documents WHERE id > {p} OR updated_at IS NOT NULL",
+                           [int(watermark['max_id'])])
+        else:
+            cursor.execute(f"SELECT id FROM documents WHERE id > {p} OR updated_at > {p}",
+                           [int(watermark['max_id']), max_updated_at])
+        return [row[0] for row in cursor.fetchall()]
+
+    def _deleted_document_ids(self):
+        """返回近邻表中出现、但已从documents表删除的文档ID"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT n.document_id FROM document_neighbors n
+            LEFT JOIN documents d ON d.id = n.document_id WHERE d.id IS NULL
+            UNION
+            SELECT n.neighbor_id FROM document_neighbors n
+            LEFT JOIN documents d ON d.id = n.neighbor_id WHERE d.id IS NULL
+        ''')
+        return [row[0] for row in cursor.fetchall()]
+
+    def _load_watermark(self):
+        """读取上次构建时的文档水位线"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT key, value FROM document_neighbors_meta")
+        meta = dict(cursor.fetchall())
+        if 'max_id' not in meta:
+            return None
+        return meta
+
+    def _save_watermark(self, cursor):
+        """记录本次构建时的最大文档ID和最新修改时间"""
+        cursor.execute("SELECT COALESCE(MAX(id), 0), MAX(updated_at) FROM documents")
+        max_id, max_updated_at = cursor.fetchone()
+        p = self.placeholder
+        cursor.execute("DELETE FROM document_neighbors_meta")
+        cursor.executemany(
+            f"INSERT INTO document_neighbors_meta (key, value) VALUES ({p}, {p})",
+            [('max_id', str(max_id)), ('max_updated_at', str(max_updated_at or '')),
+             ('built_at', time.strftime('%Y-%m-%d %H:%M:%S'))]
+        )
+
+
+def get_related_documents(conn, doc_id, limit=5, use_postgresql=False):
+    """
+    读取文档的相关文档列表（单次索引查询）
+    近邻表尚未构建时返回空列表
+    """
+    p = '%s' if use_postgresql else '?'
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f'''
+            SELECT d.id, d.title, d.category, n.score
+            FROM document_neighbors n
+            JOIN documents d ON d.id = n.neighbor_id
+            WHERE n.document_id = {p}
+            ORDER BY n.rank
+            LIMIT {p}
+        ''', (doc_id, limit))
+    except Exception as e:
+        if use_postgresql:
+            conn.rollback()
+        print(f"获取相关文档失败: {e}")
+        return []
+    return [{'id': row[0], 'title': row[1], 'category': row[2], 'score': round(float(row[3]), 3)}
+            for row in cursor.fetchall()]
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    import sqlite3
+
+    parser = argparse.ArgumentParser(description='构建相关文档近邻表')
+    parser.add_argument('--database', default=os.environ.get('DATABASE_URL') or 'ros2_wiki.db',
+                        help='SQLite文件路径或PostgreSQL URL')
+    parser.add_argument('--incremental', action='store_true', help='只更新变更过的文档')
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    args = parser.parse_args()
+
+    if args.database.startswith('postgresql'):
+        import psycopg2
+        connection = psycopg2.connect(args.database)
+        engine = RelatedDocumentsEngine(connection, use_postgresql=True, top_k=args.top_k)
+    else:
+        connection = sqlite3.connect(args.database)
+        engine = RelatedDocumentsEngine(connection, top_k=args.top_k)
+
+    result = engine.update_incremental() if args.incremental else engine.rebuild()
+    print(f"相关文档构建完成: {result}")
+    connection.close()
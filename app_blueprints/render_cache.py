@@ -0,0 +1,70 @@
+# 文档渲染缓存 - 保存Markdown渲染结果（含Pygments代码高亮）
+#
+# 文档保存后由后台任务（jobs.render_document）预渲染，文档页面按内容哈希读取缓存；
+# 内容已变化或尚未渲染时在请求中渲染一次并写入缓存。
+
+import hashlib
+
+import markdown
+
+MARKDOWN_EXTENSIONS = ['codehilite', 'fenced_code']
+
+
+def create_render_cache_schema(cursor, use_postgresql=False):
+    """创建渲染缓存表"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_renders (
+            document_id INTEGER PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            html TEXT NOT NULL,
+            rendered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def content_hash(content):
+    return hashlib.sha1((content or '').encode('utf-8')).hexdigest()
+
+
+def render_markdown(content):
+    return markdown.markdown(content or '', extensions=MARKDOWN_EXTENSIONS)
+
+
+def store_rendered_rows(cursor, rows, use_postgresql=False):
+    """批量写入已渲染的结果（不提交事务），rows 为 (document_id, content_hash, html)"""
+    p = '%s' if use_postgresql else '?'
+    cursor.executemany(f'''
+        INSERT INTO document_renders (document_id, content_hash, html, rendered_at)
+        VALUES ({p}, {p}, {p}, CURRENT_TIMESTAMP)
+        ON CONFLICT (document_id) DO UPDATE
+        SET content_hash = excluded.content_hash, html = excluded.html, rendered_at = excluded.rendered_at
+    ''', rows)
+
+
+def store_rendered_html(conn, document_id, content, use_postgresql=False):
+    """渲染并写入缓存（不提交事务），返回HTML"""
+    html = render_markdown(content)
+    store_rendered_rows(conn.cursor(), [(document_id, content_hash(content), html)], use_postgresql)
+    return html
+
+
+def get_rendered_html(conn, document_id, content, use_postgresql=False):
+    """读取与当前内容一致的渲染结果，没有时渲染并写入缓存"""
+    p = '%s' if use_postgresql else '?'
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT html FROM document_renders WHERE document_id = {p} AND content_hash = {p}',
+                       (document_id, content_hash(content)))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+        html = store_rendered_html(conn, document_id, content, use_postgresql)
+        conn.commit()
+        return html
+    except Exception as e:
+        print(f"读取渲染缓存失败: {e}")
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return render_markdown(content)
@@ -0,0 +1,231 @@
+# HTML白名单清理 - 文档内容、CMS预览和评论共用，只依赖标准库
+#
+# 基于 html.parser 流式处理：标签和属性白名单在创建时编译成 frozenset / dict，
+# 解析器每遇到一个标签只做一次集合查找，输出写入列表最后拼接，整体是线性时间：
+#   - 不在白名单中的标签去掉，保留其中的文字（与 bleach 的 strip=True 相同）；script/style 连同内容一起去掉
+#   - 属性只保留该标签允许的，值重新转义；href/src 只允许相对地址和 http/https/mailto 协议
+#   - 注释、<!DOCTYPE>、处理指令全部去掉；未闭合的标签在末尾补齐，多余的结束标签丢弃
+#   - 文字中的 < 和 & 转义（> 保留，Markdown 的引用语法在清理后仍然有效）
+# 清理结果按内容哈希（blake2b）缓存在进程内LRU中，按输出字符数限制总大小，
+# 同一条评论或文档重复渲染时只计算一次哈希。
+# 配置: SANITIZER_CACHE_CHARS（缓存的最大总字符数）、SANITIZER_CACHE_MAX_ITEM（超过该长度的结果不缓存）
+
+import os
+import re
+import html
+import hashlib
+import threading
+from collections import OrderedDict
+from html.entities import html5
+from html.parser import HTMLParser
+
+SANITIZER_CACHE_CHARS = int(os.environ.get('SANITIZER_CACHE_CHARS', 32 * 1024 * 1024))
+SANITIZER_CACHE_MAX_ITEM = int(os.environ.get('SANITIZER_CACHE_MAX_ITEM', 2 * 1024 * 1024))
+# 流式处理时每次送入解析器的字符数
+CHUNK_SIZE = 64 * 1024
+
+ALLOWED_TAGS = (
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'p', 'br', 'strong', 'em', 'u', 'strike',
+    'ul', 'ol', 'li', 'blockquote', 'pre', 'code',
+    'a', 'img', 'table', 'thead', 'tbody', 'tr', 'th', 'td'
+)
+
+ALLOWED_ATTRIBUTES = {
+    'a': ('href', 'title'),
+    'img': ('src', 'alt', 'title', 'width', 'height'),
+    'table': ('class',),
+    'td': ('colspan', 'rowspan'),
+    'th': ('colspan', 'rowspan')
+}
+
+ALLOWED_PROTOCOLS = ('http', 'https', 'mailto')
+URL_ATTRIBUTES = frozenset(('href', 'src', 'action', 'formaction', 'cite', 'background', 'poster'))
+VOID_TAGS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+                       'source', 'track', 'wbr'))
+# 连同内容一起去掉的标签（html.parser 把这两个标签的内容当作原始文本，不会解析出其中的标签）
+DROP_CONTENT_TAGS = frozenset(('script', 'style'))
+
+# 浏览器解析URL时忽略的空白和控制字符（"java\tscript:" 也会被当作 javascript:）
+_URL_IGNORED = re.compile(r'[\x00-\x20\x7f]+')
+_URL_SCHEME = re.compile(r'([a-zA-Z][a-zA-Z0-9+.\-]*):')
+_TEXT_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;'})
+
+
+class _SanitizingParser(HTMLParser):
+    """把允许的部分写入 out 列表，由 HTMLSanitizer 创建，每次清理使用一个新实例"""
+
+    def __init__(self, sanitizer):
+        super().__init__(convert_charrefs=False)
+        self.tags = sanitizer.tags
+        self.attributes = sanitizer.attributes
+        self.protocols = sanitizer.protocols
+        self.out = []
+        self.stack = []
+        self.open_counts = {}
+        self.dropping = 0
+
+    def _url_allowed(self, value):
+        match = _URL_SCHEME.match(_URL_IGNORED.sub('', value))
+        return match is None or match.group(1).lower() in self.protocols
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping or tag not in self.tags:
+            return
+        allowed = self.attributes.get(tag)
+        parts = [tag]
+        if allowed:
+            seen = set()
+            for name, value in attrs:
+                if name not in allowed or name in seen:
+                    continue
+                value = value or ''
+                if name in URL_ATTRIBUTES and not self._url_allowed(value):
+                    continue
+                seen.add(name)
+                parts.append(f'{name}="{html.escape(value, quote=True)}"')
+        self.out.append('<' + ' '.join(parts) + '>')
+        if tag not in VOID_TAGS:
+            self.stack.append(tag)
+            self.open_counts[tag] = self.open_counts.get(tag, 0) + 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and tag not in DROP_CONTENT_TAGS:
+            self.handle_endtag(tag)
+        elif tag in DROP_CONTENT_TAGS:
+            self.dropping -= 1
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping = max(0, self.dropping - 1)
+            return
+        if self.dropping or not self.open_counts.get(tag):
+            return
+        # 关闭到匹配的开始标签为止（中间未闭合的标签一并关闭），每个标签只入栈出栈一次
+        while self.stack:
+            open_tag = self.stack.pop()
+            self.open_counts[open_tag] -= 1
+            self.out.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.out.append(data.translate(_TEXT_ESCAPES))
+
+    def handle_entityref(self, name):
+        if not self.dropping:
+            self.out.append(f'&{name};' if name + ';' in html5 else f'&amp;{name};')
+
+    def handle_charref(self, name):
+        if self.dropping:
+            return
+        try:
+            code = int(name[1:], 16) if name[:1] in ('x', 'X') else int(name)
+            valid = 0 < code <= 0x10FFFF
+        except ValueError:
+            valid = False
+        self.out.append(f'&#{name};' if valid else f'&amp;#{name};')
+
+    def take(self):
+        """取出目前为止的输出"""
+        out, self.out = self.out, []
+        return ''.join(out)
+
+    def finish(self):
+        self.close()
+        while self.stack:
+            self.out.append(f'</{self.stack.pop()}>')
+        return self.take()
+
+
+class HTMLSanitizer:
+    """HTML白名单清理器：sanitize(content) 带缓存，iter_sanitize(chunks) 流式处理"""
+
+    def __init__(self, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, protocols=ALLOWED_PROTOCOLS,
+                 cache_chars=SANITIZER_CACHE_CHARS, max_item=SANITIZER_CACHE_MAX_ITEM):
+        self.tags = frozenset(tag.lower() for tag in tags)
+        self.attributes = {tag.lower(): frozenset(name.lower() for name in names)
+                           for tag, names in attributes.items()}
+        self.protocols = frozenset(protocol.lower() for protocol in protocols)
+        self.cache_chars = cache_chars
+        self.max_item = max_item
+        self._cache = OrderedDict()  # 内容哈希 -> 清理结果
+        self._cached_chars = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def iter_sanitize(self, chunks):
+        """逐块清理（chunks 为字符串的可迭代对象），每送入一块就产出已确定的输出"""
+        parser = _SanitizingParser(self)
+        for chunk in chunks:
+            parser.feed(chunk)
+            output = parser.take()
+            if output:
+                yield output
+        output = parser.finish()
+        if output:
+            yield output
+
+    def sanitize_uncached(self, content):
+        if not content:
+            return ''
+        if '<' not in content and '&' not in content:
+            # 纯文本（多数评论）不需要解析，原样返回
+            return content
+        return ''.join(self.iter_sanitize(content[i:i + CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE)))
+
+    def sanitize(self, content):
+        if not content:
+            return ''
+        key = hashlib.blake2b(content.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+                return cached
+        self.stats['misses'] += 1
+        result = self.sanitize_uncached(content)
+        if len(result) <= self.max_item:
+            with self._lock:
+                if key not in self._cache:
+                    self._cache[key] = result
+                    self._cached_chars += len(result)
+                    while self._cached_chars > self.cache_chars and self._cache:
+                        _, evicted = self._cache.popitem(last=False)
+                        self._cached_chars -= len(evicted)
+                        self.stats['evictions'] += 1
+        return result
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+            self._cached_chars = 0
+
+    def status(self):
+        with self._lock:
+            entries, chars = len(self._cache), self._cached_chars
+        return dict(self.stats, entries=entries, cached_chars=chars, cache_chars=self.cache_chars)
+
+
+_default_sanitizer = None
+_default_lock = threading.Lock()
+
+
+def get_sanitizer():
+    """进程内共享的默认清理器（首次使用时创建）"""
+    global _default_sanitizer
+    if _default_sanitizer is None:
+        with _default_lock:
+            if _default_sanitizer is None:
+                _default_sanitizer = HTMLSanitizer()
+    return _default_sanitizer
+
+
+def sanitize_html(content):
+    return get_sanitizer().sanitize(content)
@@ -1,101 +1,436 @@
 # 搜索功能模块
 
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, request, jsonify, render_template, current_app, has_app_context
 from flask_login import login_required
 import sqlite3
+import hashlib
+import html
 import re
-from app.security import InputValidator, DatabaseSecurity
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .security import InputValidator, DatabaseSecurity
+from .trigram import TrigramIndex, AUTOCORRECT_THRESHOLD
+from .jobs import PRIORITY_LOW
 import os
 
+# PostgreSQL支持
+try:
+    import psycopg2
+    HAS_POSTGRESQL = True
+except ImportError:
+    HAS_POSTGRESQL = False
+
+# 分面缓存（Redis或内存，依赖optimizations.cache_manager）
+try:
+    from optimizations.cache_manager import cache_manager
+    HAS_CACHE = True
+except ImportError:
+    cache_manager = None
+    HAS_CACHE = False
+
 search_bp = Blueprint('search', __name__, url_prefix='/search')
 
+# 分面缓存时间，与SEARCH_CONFIG['SEARCH_CACHE_TTL']保持一致
+FACET_CACHE_TTL = 900
+
+# 单次请求最多可选的分类筛选数量
+MAX_CATEGORY_FILTERS = 10
+
+# 批量搜索：单次请求最多查询数、PostgreSQL并行线程数
+MAX_BATCH_QUERIES = 20
+BATCH_SEARCH_WORKERS = 4
+
+# 包含中日韩字符的查询无法使用FTS5默认分词器，需回退到LIKE
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]')
+# 与FTS5 unicode61分词器一致：字母数字为词，其余字符（包括下划线和点号）为分隔符
+FTS_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+# documents_fts是否存在的检查结果缓存时间（秒），之后创建的全文索引在此时间内开始使用
+FTS_CHECK_TTL = 60
+
 class SearchEngine:
     """搜索引擎类"""
     
-    def __init__(self, db_path):
-        self.db_path = db_path
+    # FTS表是否存在的缓存：db_path -> (是否存在, 检查时间)
+    _fts_available = {}
+    
+    def __init__(self, db_path_or_url):
+        self.db_path = db_path_or_url
+        # 检测数据库类型
+        if db_path_or_url and 'postgresql' in db_path_or_url and HAS_POSTGRESQL:
+            self.use_postgresql = True
+        else:
+            self.use_postgresql = False
+            if db_path_or_url and db_path_or_url.startswith('sqlite:///'):
+                self.db_path = db_path_or_url[10:]
+        self.placeholder = '%s' if self.use_postgresql else '?'
+        self.trigram_index = TrigramIndex(self.db_path, self.use_postgresql,
+                                          request_rebuild=self._request_trigram_rebuild)
+    
+    def get_db_connection(self):
+        """获取数据库连接"""
+        if self.use_postgresql:
+            return psycopg2.connect(self.db_path)
+        return sqlite3.connect(self.db_path)
+    
+    def _request_trigram_rebuild(self):
+        """拼写纠错词典未就绪：提交后台重建任务（在应用外或没有任务队列时跳过），本次搜索不给出建议"""
+        jobs = current_app.extensions.get('jobs') if has_app_context() else None
+        if jobs is None:
+            return None
+        try:
+            return jobs.enqueue('trigram_rebuild', priority=PRIORITY_LOW, dedupe_key='trigram_rebuild')
+        except Exception as e:
+            print(f"提交拼写纠错词典重建任务失败: {e}")
+            return None
     
     def full_text_search(self, query, limit=20, offset=0):
         """
         全文搜索功能
-        支持标题、内容、分类搜索
+        支持标题、内容、分类搜索；结果、总数和分类计数在同一条语句中返回
+        """
+        return self.faceted_search(query, limit=limit, offset=offset)
+    
+    def faceted_search(self, query, categories=None, limit=20, offset=0):
+        """
+        分面搜索
+        一次往返同时返回当前页结果、各分类命中数和总数。
+        categories为分类筛选列表，分类计数始终基于未筛选的命中集合，
+        以便页面展示其他可选分类。
         """
         if not query or len(query.strip()) < 2:
-            return {'results': [], 'total': 0, 'query': query}
+            return {'results': [], 'total': 0, 'query': query, 'facets': []}
         
         # 清理和验证搜索查询
         clean_query = InputValidator.sanitize_html(query.strip(), allow_tags=False)
-        safe_query = DatabaseSecurity.escape_sql_like(clean_query)
+        categories = [c for c in (categories or []) if c][:MAX_CATEGORY_FILTERS]
         
+        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # 构建搜索SQL - 支持标题、内容、分类搜索
-            search_sql = """
-            SELECT 
-                id, title, content, category, created_at,
-                CASE 
-                    WHEN title LIKE ? THEN 10
-                    WHEN category LIKE ? THEN 5
-                    WHEN content LIKE ? THEN 1
-                    ELSE 0
-                END as relevance_score
-            FROM documents 
-            WHERE title LIKE ? OR content LIKE ? OR category LIKE ?
-            ORDER BY relevance_score DESC, created_at DESC
-            LIMIT ? OFFSET ?
-            """
-            
-            search_pattern = f"%{safe_query}%"
-            search_params = [
-                search_pattern, search_pattern, search_pattern,  # 用于计算相关性
-                search_pattern, search_pattern, search_pattern,  # 用于WHERE条件
-                limit, offset
-            ]
+            conn = self.get_db_connection()
+            return self._search_on_connection(conn, clean_query, categories, limit, offset)
             
-            cursor.execute(search_sql, search_params)
-            results = cursor.fetchall()
+        except Exception as e:
+            print(f"搜索错误: {e}")
+            return {'results': [], 'total': 0, 'query': query, 'facets': [], 'error': str(e)}
+        finally:
+            if conn:
+                conn.close()
+    
+    def batch_search(self, queries):
+        """
+        批量搜索
+        queries为 {'q', 'categories', 'limit', 'offset'} 列表；相同查询只执行一次。
+        SQLite在同一连接上顺序执行，PostgreSQL使用线程池、每个线程一个连接并行执行。
+        返回与输入顺序一致的结果列表，每项附带执行耗时。
+        """
+        started = time.perf_counter()
+        
+        # 规范化并去重
+        keys = []
+        unique = {}
+        for spec in queries:
+            query = (spec.get('q') or '').strip()
+            clean_query = InputValidator.sanitize_html(query, allow_tags=False) if query else ''
+            categories = tuple(sorted({c for c in (spec.get('categories') or []) if c}))[:MAX_CATEGORY_FILTERS]
+            key = (clean_query, categories, spec['limit'], spec['offset'])
+            keys.append(key)
+            unique.setdefault(key, None)
+        
+        if self.use_postgresql and len(unique) > 1:
+            local = threading.local()
+            connections = []
+            lock = threading.Lock()
             
-            # 获取总数
-            count_sql = """
-            SELECT COUNT(*) as total 
-            FROM documents 
-            WHERE title LIKE ? OR content LIKE ? OR category LIKE ?
-            """
-            cursor.execute(count_sql, [search_pattern, search_pattern, search_pattern])
-            total = cursor.fetchone()['total']
+            def run(key):
+                if not hasattr(local, 'conn'):
+                    local.conn = self.get_db_connection()
+                    with lock:
+                        connections.append(local.conn)
+                return self._timed_search(local.conn, key)
             
-            # 处理搜索结果
-            formatted_results = []
-            for row in results:
-                # 生成摘要，高亮搜索关键词
-                snippet = self._generate_snippet(row['content'], clean_query)
-                highlighted_title = self._highlight_text(row['title'], clean_query)
-                
-                formatted_results.append({
-                    'id': row['id'],
-                    'title': highlighted_title,
-                    'snippet': snippet,
-                    'category': row['category'],
-                    'created_at': row['created_at'],
-                    'relevance_score': row['relevance_score']
-                })
-            
-            conn.close()
+            try:
+                with ThreadPoolExecutor(max_workers=min(BATCH_SEARCH_WORKERS, len(unique))) as executor:
+                    for key, result in zip(list(unique), executor.map(run, list(unique))):
+                        unique[key] = result
+            finally:
+                for conn in connections:
+                    conn.close()
+        else:
+            conn = self.get_db_connection()
+            try:
+                for key in unique:
+                    unique[key] = self._timed_search(conn, key)
+            finally:
+                conn.close()
+        
+        results = []
+        seen = set()
+        for index, key in enumerate(keys):
+            result = dict(unique[key], index=index, deduplicated=key in seen)
+            seen.add(key)
+            results.append(result)
+        
+        return {
+            'results': results,
+            'unique_queries': len(unique),
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+    
+    def _timed_search(self, conn, key):
+        """执行单个批量查询并记录耗时，单个查询失败不影响其他查询"""
+        clean_query, categories, limit, offset = key
+        started = time.perf_counter()
+        if len(clean_query) < 2:
+            result = {'results': [], 'total': 0, 'query': clean_query, 'facets': []}
+        else:
+            try:
+                result = self._search_on_connection(conn, clean_query, list(categories), limit, offset)
+            except Exception as e:
+                print(f"批量搜索错误: {e}")
+                if self.use_postgresql:
+                    conn.rollback()
+                result = {'results': [], 'total': 0, 'query': clean_query, 'facets': [], 'error': str(e)}
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+    
+    def _search_on_connection(self, conn, clean_query, categories, limit, offset):
+        """在给定连接上执行完整搜索：分面查询、零结果纠错和结果格式化"""
+        result = self._run_faceted_search(conn, clean_query, categories, limit, offset)
+        
+        # 零结果时尝试拼写纠错
+        highlight_query = clean_query
+        if result['total'] == 0 and result.get('total_unfiltered', 0) == 0:
+            highlight_query = self._apply_fuzzy_fallback(
+                conn, result, clean_query, categories, limit, offset) or clean_query
+        
+        # 处理搜索结果
+        result['results'] = [self._format_result(row, highlight_query) for row in result['results']]
+        result.update({
+            'query': clean_query,
+            'categories': categories,
+            'page': offset // limit + 1,
+            'per_page': limit
+        })
+        return result
+    
+    def _run_faceted_search(self, conn, clean_query, categories, limit, offset, allow_fts=True):
+        """在给定连接上执行分面搜索，返回原始行和分面统计"""
+        try:
+            return self._query_facets(conn, clean_query, categories, limit, offset, allow_fts)
+        except sqlite3.OperationalError as e:
+            # 全文索引在线重建时可能被删除或改名：清除检查结果（下次重新检测），本次改用LIKE
+            if not allow_fts or not SearchEngine._fts_available.pop(self.db_path, (False, 0))[0]:
+                raise
+            print(f"全文索引查询失败，改用LIKE搜索: {e}")
+            return self._run_faceted_search(conn, clean_query, categories, limit, offset, allow_fts=False)
+    
+    def _query_facets(self, conn, clean_query, categories, limit, offset, allow_fts):
+        """
+        执行分面查询
+        FTS前缀匹配没有命中时（如API名称中间的一段）回退到LIKE子串匹配，
+        分面缓存记录使用的方式，缓存命中时当前页用同一方式查询，结果与总数保持一致
+        """
+        cursor = conn.cursor()
+        cached_facets = self._get_cached_facets(clean_query)
+        use_fts = allow_fts and self._can_use_fts(conn, clean_query)
+        if cached_facets is not None:
+            if cached_facets.get('like'):
+                use_fts = False
+            elif not use_fts:
+                cached_facets = None
+        matched_sql, matched_params = self._build_matched_cte(clean_query, use_fts)
+        
+        category_filter = ""
+        category_params = []
+        if categories:
+            marks = ", ".join([self.placeholder] * len(categories))
+            category_filter = f"WHERE category IN ({marks})"
+            category_params = list(categories)
+        
+        if cached_facets is not None:
+            # 分面已缓存：只取当前页
+            cursor.execute(f"""
+            {matched_sql}
+            SELECT id, title, content, category, created_at, relevance_score
+            FROM matched
+            {category_filter}
+            ORDER BY relevance_score DESC, created_at DESC
+            LIMIT {self.placeholder} OFFSET {self.placeholder}
+            """, matched_params + category_params + [limit, offset])
+            rows = cursor.fetchall()
+            facets = cached_facets['facets']
+            total_unfiltered = cached_facets['total']
+            facets_cached = True
+        else:
+            cursor.execute(f"""
+            {matched_sql},
+            facet_counts AS (
+                {self._facet_counts_sql()}
+            ),
+            page AS (
+                SELECT id, title, content, category, created_at, relevance_score,
+                       ROW_NUMBER() OVER (ORDER BY relevance_score DESC, created_at DESC) AS rn
+                FROM matched
+                {category_filter}
+                ORDER BY relevance_score DESC, created_at DESC
+                LIMIT {self.placeholder} OFFSET {self.placeholder}
+            )
+            SELECT row_kind, NULL, NULL, NULL, category, NULL, doc_count, NULL, 0 FROM facet_counts
+            UNION ALL
+            SELECT 'hit', id, title, content, category, created_at, NULL, relevance_score, rn FROM page
+            ORDER BY 1, 9
+            """, matched_params + category_params + [limit, offset])
             
-            return {
-                'results': formatted_results,
-                'total': total,
-                'query': clean_query,
-                'page': offset // limit + 1,
-                'per_page': limit
-            }
+            rows = []
+            facets = []
+            total_unfiltered = None
+            for row in cursor.fetchall():
+                if row[0] == 'hit':
+                    rows.append((row[1], row[2], row[3], row[4], row[5], row[7]))
+                elif row[0] == 'total':
+                    total_unfiltered = row[6]
+                else:
+                    facets.append({'category': row[4], 'count': row[6]})
             
+            facets.sort(key=lambda f: (-f['count'], f['category'] or ''))
+            if total_unfiltered is None:
+                total_unfiltered = sum(f['count'] for f in facets)
+            if use_fts and total_unfiltered == 0:
+                return self._run_faceted_search(conn, clean_query, categories, limit, offset, allow_fts=False)
+            self._set_cached_facets(clean_query, facets, total_unfiltered, like=not use_fts)
+            facets_cached = False
+        
+        if categories:
+            total = sum(f['count'] for f in facets if f['category'] in categories)
+        else:
+            total = total_unfiltered
+        
+        return {
+            'results': rows,
+            'total': total,
+            'total_unfiltered': total_unfiltered,
+            'facets': [dict(f, selected=f['category'] in categories) for f in facets],
+            'facets_cached': facets_cached
+        }
+    
+    def _apply_fuzzy_fallback(self, conn, result, clean_query, categories, limit, offset):
+        """
+        零结果回退：计算"您是不是要找"建议，
+        最佳建议足够相似时直接返回纠正后查询的结果，返回纠正后的查询
+        """
+        try:
+            suggestions = self.trigram_index.did_you_mean(conn, clean_query)
         except Exception as e:
-            print(f"搜索错误: {e}")
-            return {'results': [], 'total': 0, 'query': query, 'error': str(e)}
+            print(f"拼写纠错错误: {e}")
+            return None
+        
+        result['did_you_mean'] = suggestions
+        if not suggestions or suggestions[0]['score'] < AUTOCORRECT_THRESHOLD:
+            return None
+        
+        corrected = suggestions[0]['text']
+        corrected_result = self._run_faceted_search(conn, corrected, categories, limit, offset)
+        if corrected_result['total_unfiltered'] == 0:
+            return None
+        result.update(corrected_result)
+        result['corrected_query'] = corrected
+        return corrected
+    
+    def _can_use_fts(self, conn, clean_query):
+        """SQLite存在documents_fts且查询含可分词、不含中日韩字符时可以使用FTS5"""
+        return (not self.use_postgresql and not CJK_PATTERN.search(clean_query)
+                and bool(FTS_TOKEN_PATTERN.search(clean_query)) and self._has_fts(conn))
+    
+    def _build_matched_cte(self, clean_query, use_fts=False):
+        """
+        构建命中集合CTE（matched）
+        use_fts时使用FTS5 MATCH，每个词按前缀匹配（timer 也命中 timers），相关度取bm25辅助函数；
+        否则使用LIKE子串匹配和加权CASE评分。
+        """
+        if use_fts:
+            # 每个词单独加引号后按前缀匹配，避免用户输入被解析为FTS5查询语法
+            fts_query = ' '.join(f'"{token}"*' for token in FTS_TOKEN_PATTERN.findall(clean_query))
+            sql = """
+            WITH matched AS (
+                SELECT d.id, d.title, d.content, d.category, d.created_at,
+                       -bm25(documents_fts, 10.0, 1.0, 5.0) AS relevance_score
+                FROM documents_fts
+                JOIN documents d ON d.id = documents_fts.rowid
+                WHERE documents_fts MATCH ?
+            )"""
+            return sql, [fts_query]
+        
+        like = 'ILIKE' if self.use_postgresql else 'LIKE'
+        p = self.placeholder
+        sql = f"""
+            WITH matched AS (
+                SELECT id, title, content, category, created_at,
+                       CASE
+                           WHEN title {like} {p} ESCAPE '\\' THEN 10
+                           WHEN category {like} {p} ESCAPE '\\' THEN 5
+                           WHEN content {like} {p} ESCAPE '\\' THEN 1
+                           ELSE 0
+                       END AS relevance_score
+                FROM documents
+                WHERE title {like} {p} ESCAPE '\\'
+                   OR content {like} {p} ESCAPE '\\'
+                   OR category {like} {p} ESCAPE '\\'
+            )"""
+        search_pattern = f"%{DatabaseSecurity.escape_sql_like(clean_query)}%"
+        return sql, [search_pattern] * 6
+    
+    def _facet_counts_sql(self):
+        """分类计数SQL：PostgreSQL用GROUPING SETS同时得到总数，SQLite直接分组"""
+        if self.use_postgresql:
+            return """SELECT CASE WHEN GROUPING(category) = 1 THEN 'total' ELSE 'facet' END AS row_kind,
+                       category, COUNT(*) AS doc_count
+                FROM matched
+                GROUP BY GROUPING SETS ((category), ())"""
+        return """SELECT 'facet' AS row_kind, category, COUNT(*) AS doc_count
+                FROM matched
+                GROUP BY category"""
+    
+    def _has_fts(self, conn):
+        """检查documents_fts是否存在（按数据库缓存 FTS_CHECK_TTL 秒）"""
+        now = time.monotonic()
+        cached = SearchEngine._fts_available.get(self.db_path)
+        if cached is None or now - cached[1] >= FTS_CHECK_TTL:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'documents_fts'")
+            cached = (cursor.fetchone() is not None, now)
+            SearchEngine._fts_available[self.db_path] = cached
+        return cached[0]
+    
+    def _facet_cache_key(self, clean_query):
+        """分面缓存key，按规范化后的查询词区分"""
+        normalized = ' '.join(clean_query.lower().split())
+        digest = hashlib.md5(f"{self.db_path}|{normalized}".encode('utf-8')).hexdigest()
+        return f"search:facets:{digest}"
+    
+    def _get_cached_facets(self, clean_query):
+        """读取缓存的分面统计"""
+        if not HAS_CACHE:
+            return None
+        return cache_manager.get(self._facet_cache_key(clean_query))
+    
+    def _set_cached_facets(self, clean_query, facets, total, like=True):
+        """缓存分面统计（like 记录命中集合是否来自LIKE匹配）"""
+        if HAS_CACHE:
+            cache_manager.set(self._facet_cache_key(clean_query),
+                              {'facets': facets, 'total': total, 'like': like}, FACET_CACHE_TTL)
+    
+    def _format_result(self, row, clean_query):
+        """格式化结果行：(id, title, content, category, created_at, relevance_score)"""
+        # 生成摘要，高亮搜索关键词
+        return {
+            'id': row[0],
+            'title': self._highlight_text(row[1], clean_query),
+            'snippet': self._generate_snippet(row[2], clean_query),
+            'category': row[3],
+            'created_at': row[4],
+            'relevance_score': row[5]
+        }
     
     def _generate_snippet(self, content, query, max_length=200):
         """
@@ -137,7 +472,9 @@ class SearchEngine:
     def _highlight_text(self, text, query):
         """
         在文本中高亮显示搜索关键词
+        文本先做HTML转义，结果可以直接输出到页面；query 是已转义的查询
         """
+        text = html.escape(text or '')
         if not query:
             return text
         
@@ -162,27 +499,33 @@ class SearchEngine:
         safe_query = DatabaseSecurity.escape_sql_like(clean_query)
         
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.get_db_connection()
             cursor = conn.cursor()
             
             # 从标题和分类中获取建议
-            suggestions_sql = """
+            p = self.placeholder
+            suggestions_sql = f"""
             SELECT DISTINCT title as suggestion, 'title' as type FROM documents 
-            WHERE title LIKE ? 
+            WHERE title LIKE {p} 
             UNION
             SELECT DISTINCT category as suggestion, 'category' as type FROM documents 
-            WHERE category LIKE ?
+            WHERE category LIKE {p}
             ORDER BY suggestion
-            LIMIT ?
+            LIMIT {p}
             """
             
             search_pattern = f"%{safe_query}%"
             cursor.execute(suggestions_sql, [search_pattern, search_pattern, limit])
-            suggestions = cursor.fetchall()
+            suggestions = [{'text': row[0], 'type': row[1]} for row in cursor.fetchall()]
+            
+            # 没有前缀/子串匹配时回退到模糊建议
+            if not suggestions:
+                suggestions = [{'text': item['text'], 'type': 'fuzzy'}
+                               for item in self.trigram_index.did_you_mean(conn, clean_query, limit)]
             
             conn.close()
             
-            return [{'text': row[0], 'type': row[1]} for row in suggestions]
+            return suggestions
             
         except Exception as e:
             print(f"获取搜索建议错误: {e}")
@@ -193,13 +536,13 @@ class SearchEngine:
         获取热门搜索词（这里简化为最新文档的标题关键词）
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.get_db_connection()
             cursor = conn.cursor()
             
-            cursor.execute("""
+            cursor.execute(f"""
             SELECT title, category FROM documents 
             ORDER BY created_at DESC 
-            LIMIT ?
+            LIMIT {self.placeholder}
             """, [limit])
             
             results = cursor.fetchall()
@@ -224,12 +567,31 @@ class SearchEngine:
 
 # 初始化搜索引擎
 def get_search_engine():
-    """获取搜索引擎实例"""
-    db_path = os.environ.get('SQLITE_DATABASE_URL', 'sqlite:///ros2_wiki.db')
+    """获取搜索引擎实例（在应用中使用应用配置的数据库）"""
+    config = current_app.config if has_app_context() else {}
+    # 优先使用PostgreSQL URL，回退到SQLite
+    db_url = config.get('DATABASE_URL') or os.environ.get('DATABASE_URL')
+    if db_url and 'postgresql' in db_url and HAS_POSTGRESQL:
+        return SearchEngine(db_url)
+    db_path = config.get('DATABASE') or os.environ.get('SQLITE_DATABASE_URL', 'sqlite:///ros2_wiki.db')
     if db_path.startswith('sqlite:///'):
         db_path = db_path[10:]  # 移除 'sqlite:///' 前缀
     return SearchEngine(db_path)
 
+def invalidate_search_facets():
+    """文档新增、修改或删除后清除分面缓存（分类计数和总数），否则要等到缓存过期才会更新"""
+    if not HAS_CACHE:
+        return
+    try:
+        cache_manager.clear_pattern('search:facets*')
+    except Exception as e:
+        print(f"清除分面缓存失败: {e}")
+
+def get_category_filters():
+    """从请求参数中读取分类筛选（支持 ?category=a&category=b）"""
+    categories = [c.strip() for c in request.args.getlist('category')]
+    return [c for c in categories if c][:MAX_CATEGORY_FILTERS]
+
 # 路由定义
 @search_bp.route('/')
 def search_page():
@@ -237,13 +599,15 @@ def search_page():
     query = request.args.get('q', '').strip()
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
+    categories = get_category_filters()
     
     if query:
         search_engine = get_search_engine()
         offset = (page - 1) * per_page
-        results = search_engine.full_text_search(query, limit=per_page, offset=offset)
+        results = search_engine.faceted_search(query, categories=categories,
+                                               limit=per_page, offset=offset)
     else:
-        results = {'results': [], 'total': 0, 'query': ''}
+        results = {'results': [], 'total': 0, 'query': '', 'facets': [], 'categories': categories}
     
     return render_template('search/results.html', **results)
 
@@ -253,16 +617,54 @@ def search_api():
     query = request.args.get('q', '').strip()
     page = int(request.args.get('page', 1))
     per_page = min(int(request.args.get('per_page', 10)), 50)  # 限制每页最大数量
+    categories = get_category_filters()
     
     if not query:
         return jsonify({'error': '搜索查询不能为空'}), 400
     
     search_engine = get_search_engine()
     offset = (page - 1) * per_page
-    results = search_engine.full_text_search(query, limit=per_page, offset=offset)
+    results = search_engine.faceted_search(query, categories=categories,
+                                           limit=per_page, offset=offset)
     
     return jsonify(results)
 
+@search_bp.route('/batch', methods=['POST'])
+def batch_search_api():
+    """
+    批量搜索API
+    请求体: {"queries": [{"q": "...", "categories": [...], "per_page": 10, "page": 1}, ...]}
+    """
+    data = request.get_json(silent=True) or {}
+    queries = data.get('queries')
+    
+    if not isinstance(queries, list) or not queries:
+        return jsonify({'error': 'queries必须是非空列表'}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({'error': f'单次最多{MAX_BATCH_QUERIES}个查询'}), 400
+    
+    specs = []
+    for item in queries:
+        if not isinstance(item, dict):
+            return jsonify({'error': '每个查询必须是对象'}), 400
+        try:
+            page = max(int(item.get('page', 1)), 1)
+            per_page = max(min(int(item.get('per_page', 10)), 50), 1)  # 限制每页最大数量
+        except (TypeError, ValueError):
+            return jsonify({'error': 'page和per_page必须是整数'}), 400
+        categories = item.get('categories') or []
+        if isinstance(categories, str):
+            categories = [categories]
+        specs.append({
+            'q': str(item.get('q', '')),
+            'categories': [str(c).strip() for c in categories][:MAX_CATEGORY_FILTERS],
+            'limit': per_page,
+            'offset': (page - 1) * per_page
+        })
+    
+    search_engine = get_search_engine()
+    return jsonify(search_engine.batch_search(specs))
+
 @search_bp.route('/suggestions')
 def search_suggestions():
     """搜索建议API"""
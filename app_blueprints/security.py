@@ -7,12 +7,10 @@ from flask import request, abort
 from functools import wraps
 import os
 
-# 条件导入bleach
-try:
-    import bleach
-    HAS_BLEACH = True
-except ImportError:
-    HAS_BLEACH = False
+from app_blueprints.ratelimit import rate_limit as shared_rate_limit
+from app_blueprints.sanitizer import ALLOWED_TAGS, ALLOWED_ATTRIBUTES, get_sanitizer
+# 管理员权限验证装饰器统一定义在 app_blueprints/authz.py，这里保留原来的导入位置
+from app_blueprints.authz import admin_required
 
 # 密码强度验证
 class PasswordValidator:
@@ -61,41 +59,22 @@ class PasswordValidator:
 class InputValidator:
     """输入验证和清理工具"""
     
-    # 允许的HTML标签（用于文档内容）
-    ALLOWED_TAGS = [
-        'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
-        'p', 'br', 'strong', 'em', 'u', 'strike',
-        'ul', 'ol', 'li', 'blockquote', 'pre', 'code',
-        'a', 'img', 'table', 'thead', 'tbody', 'tr', 'th', 'td'
-    ]
-    
-    # 允许的HTML属性
-    ALLOWED_ATTRIBUTES = {
-        'a': ['href', 'title'],
-        'img': ['src', 'alt', 'title', 'width', 'height'],
-        'table': ['class'],
-        'td': ['colspan', 'rowspan'],
-        'th': ['colspan', 'rowspan']
-    }
+    # 允许的HTML标签和属性（用于文档内容，白名单定义在 app_blueprints/sanitizer.py）
+    ALLOWED_TAGS = list(ALLOWED_TAGS)
+    ALLOWED_ATTRIBUTES = {tag: list(names) for tag, names in ALLOWED_ATTRIBUTES.items()}
     
     @staticmethod
     def sanitize_html(content, allow_tags=True):
         """
         清理HTML内容，防止XSS攻击
+        allow_tags=True 时按白名单保留安全的标签（结果按内容哈希缓存），否则完全转义
         """
         if not content:
             return ""
         
-        if allow_tags and HAS_BLEACH:
-            # 允许安全的HTML标签（需要bleach模块）
-            return bleach.clean(
-                content,
-                tags=InputValidator.ALLOWED_TAGS,
-                attributes=InputValidator.ALLOWED_ATTRIBUTES,
-                strip=True
-            )
+        if allow_tags:
+            return get_sanitizer().sanitize(content)
         else:
-            # 完全转义HTML（回退方案）
             return html.escape(content)
     
     @staticmethod
@@ -143,33 +122,12 @@ class InputValidator:
 # 安全装饰器
 def rate_limit(max_requests=5, window=60):
     """
-    简单的请求限制装饰器
+    请求限制装饰器（按客户端IP计数，超过限制返回429和Retry-After）
     max_requests: 时间窗口内最大请求数
     window: 时间窗口（秒）
+    计数保存在 app_blueprints/ratelimit.py 的共享存储中，多个worker共用同一限额
     """
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            # 这里可以实现更复杂的速率限制逻辑
-            # 简单示例：检查请求频率
-            client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
-            
-            # 在实际应用中，应该使用Redis或内存缓存来存储请求计数
-            # 这里只是一个示例框架
-            
-            return f(*args, **kwargs)
-        return decorated_function
-    return decorator
-
-def admin_required(f):
-    """管理员权限验证装饰器"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        from flask_login import current_user
-        if not current_user.is_authenticated or not current_user.is_admin:
-            abort(403)  # Forbidden
-        return f(*args, **kwargs)
-    return decorated_function
+    return shared_rate_limit(max_requests, window)
 
 def validate_csrf_token(f):
     """CSRF令牌验证装饰器"""
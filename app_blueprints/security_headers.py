@@ -0,0 +1,264 @@
+# 统一的安全响应头和CSRF令牌 - SecurityMiddleware 和 SecurityManager 共用这一层
+#
+# 响应头在安装时按路由一次性计算好（默认策略 + SECURITY_ROUTE_POLICIES 中按端点或蓝图名覆盖的策略），
+# 每个响应只按端点查表，再把预先生成的 (名称, 值) 加到响应上；视图自己设置的同名头不会被覆盖。
+# CSP 按指令字典描述，编译成字符串时在 script-src/style-src 留出 nonce 的位置并拆成几段：
+# 模板调用 csp_nonce() 时本次请求才生成 nonce，发送时只需把 nonce 拼进预先拆好的片段，不重建整个策略。
+# 注意：CSP 中出现 nonce 后浏览器会忽略 'unsafe-inline'，使用 csp_nonce() 的页面中所有内联脚本都要带上 nonce。
+#
+# CSRF 令牌格式为 时间戳:随机数:HMAC-SHA256签名，签名用预先装好密钥的 hmac 对象 copy() 计算，
+# 验证时用 hmac.compare_digest 常数时间比较（与会话中的令牌、以及签名）。
+# 配置（app.config）：
+#   SECURITY_HEADERS         覆盖默认响应头（值为None时删除该头），其中的 Content-Security-Policy 按指令合并
+#   SECURITY_ROUTE_POLICIES  {端点或蓝图名: {'csp': {指令: 来源列表或None}, 'headers': {...}}}
+#   SECURITY_HSTS            是否发送 Strict-Transport-Security（默认仅 FLASK_ENV=production 时发送）
+#   SECURITY_CSP_REPORT_ONLY 为True时使用 Content-Security-Policy-Report-Only
+#   CSRF_SECRET_KEY          CSRF签名密钥（默认使用SECRET_KEY，保证多个worker签发的令牌可以互相验证）
+
+import os
+import hmac
+import time
+import hashlib
+import secrets
+
+from flask import g, request
+
+CSRF_TOKEN_MAX_AGE = int(os.environ.get('CSRF_TOKEN_MAX_AGE', 3600))
+CLOCK_SKEW = 60
+
+DEFAULT_CSP = {
+    'default-src': ["'self'"],
+    'script-src': ["'self'", "'unsafe-inline'", 'https://cdn.jsdelivr.net', 'https://cdnjs.cloudflare.com'],
+    'style-src': ["'self'", "'unsafe-inline'", 'https://cdn.jsdelivr.net', 'https://cdnjs.cloudflare.com',
+                  'https://fonts.googleapis.com'],
+    'font-src': ["'self'", 'https:', 'data:'],
+    'img-src': ["'self'", 'data:', 'https:'],
+    'connect-src': ["'self'"],
+    'frame-ancestors': ["'none'"],
+    'base-uri': ["'self'"],
+    'form-action': ["'self'"],
+}
+
+DEFAULT_HEADERS = {
+    'X-Content-Type-Options': 'nosniff',
+    'X-Frame-Options': 'DENY',
+    'X-XSS-Protection': '1; mode=block',
+    'Referrer-Policy': 'strict-origin-when-cross-origin',
+    'Permissions-Policy': 'camera=(), microphone=(), geolocation=(), payment=(), usb=(), '
+                          'magnetometer=(), accelerometer=()',
+}
+
+HSTS_VALUE = 'max-age=31536000; includeSubDomains'
+# 生成 nonce 时插入的指令
+NONCE_DIRECTIVES = ('script-src', 'style-src')
+# 编译CSP时 nonce 的占位符（不会出现在合法的CSP来源中）
+NONCE_MARK = '\0'
+
+
+def parse_csp(policy):
+    """把CSP字符串解析成 {指令: [来源, ...]}"""
+    directives = {}
+    for part in (policy or '').split(';'):
+        tokens = part.split()
+        if tokens:
+            directives[tokens[0].lower()] = tokens[1:]
+    return directives
+
+
+def build_csp(directives, nonce=None):
+    """把指令字典编译成CSP字符串；nonce 不为None时加到 NONCE_DIRECTIVES 中"""
+    parts = []
+    for name, sources in directives.items():
+        sources = list(sources or [])
+        if nonce is not None and name in NONCE_DIRECTIVES:
+            sources.append(f"'nonce-{nonce}'")
+        parts.append(' '.join([name] + sources))
+    return '; '.join(parts)
+
+
+def merge_csp(base, overrides):
+    merged = {name: list(sources) for name, sources in base.items()}
+    for name, sources in (overrides or {}).items():
+        if sources is None:
+            merged.pop(name, None)
+        else:
+            merged[name] = list(sources)
+    return merged
+
+
+class HeaderPolicy:
+    """一个路由（或默认）的预计算响应头"""
+
+    __slots__ = ('headers', 'csp_header', 'csp', 'csp_parts')
+
+    def __init__(self, headers, csp, report_only=False):
+        # (名称, 小写名称, 值)，小写名称用于判断视图是否已经设置了同名头
+        self.headers = tuple((name, name.lower(), value) for name, value in headers.items() if value is not None)
+        self.csp_header = 'Content-Security-Policy-Report-Only' if report_only else 'Content-Security-Policy'
+        self.csp = build_csp(csp) if csp else None
+        # 带nonce的版本拆成片段，发送时 nonce.join(csp_parts)
+        self.csp_parts = tuple(build_csp(csp, NONCE_MARK).split(NONCE_MARK)) if csp else None
+
+    def csp_value(self, nonce=None):
+        if self.csp is None:
+            return None
+        return nonce.join(self.csp_parts) if nonce else self.csp
+
+
+class SecurityHeaders:
+    """按路由预计算的安全响应头，after_request 只做查表和赋值"""
+
+    def __init__(self, app=None, headers=None, csp=None, route_policies=None, hsts=None, report_only=None):
+        self.headers_overrides = headers
+        self.csp_overrides = csp
+        self.route_policy_options = dict(route_policies or {})
+        self.hsts = hsts
+        self.report_only = report_only
+        self.default = None
+        self.route_policies = {}
+        self._resolved = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        configured = dict(config.get('SECURITY_HEADERS') or {})
+        configured_csp = configured.pop('Content-Security-Policy', None)
+        production = config.get('FLASK_ENV', os.environ.get('FLASK_ENV')) == 'production'
+        hsts = self.hsts if self.hsts is not None else config.get('SECURITY_HSTS', production)
+        report_only = self.report_only if self.report_only is not None else config.get('SECURITY_CSP_REPORT_ONLY', False)
+
+        self.base_headers = dict(DEFAULT_HEADERS)
+        self.base_headers['Strict-Transport-Security'] = HSTS_VALUE if hsts else None
+        self.base_headers.update(configured)
+        self.base_headers.update(self.headers_overrides or {})
+        self.base_csp = merge_csp(DEFAULT_CSP, parse_csp(configured_csp) if configured_csp else None)
+        self.base_csp = merge_csp(self.base_csp, self.csp_overrides)
+        if production:
+            self.base_csp.setdefault('upgrade-insecure-requests', [])
+        self.report_only = report_only
+
+        self.default = HeaderPolicy(self.base_headers, self.base_csp, report_only)
+        self.route_policy_options.update(config.get('SECURITY_ROUTE_POLICIES') or {})
+        for name, options in self.route_policy_options.items():
+            self.add_route_policy(name, **options)
+
+        app.after_request(self.apply)
+        app.jinja_env.globals['csp_nonce'] = csp_nonce
+        app.extensions['security_headers'] = self
+
+    def add_route_policy(self, name, csp=None, headers=None):
+        """为端点（如 'admin.index'）或蓝图（如 'admin'）单独设置策略，在默认策略上覆盖"""
+        merged_headers = dict(self.base_headers)
+        merged_headers.update(headers or {})
+        self.route_policies[name] = HeaderPolicy(merged_headers, merge_csp(self.base_csp, csp), self.report_only)
+        self.route_policy_options[name] = {'csp': csp, 'headers': headers}
+        self._resolved.clear()
+
+    def policy_for(self, endpoint):
+        """端点对应的策略：先按端点，再按蓝图名，最后是默认策略（结果按端点缓存）"""
+        policy = self._resolved.get(endpoint)
+        if policy is None:
+            policy = self.route_policies.get(endpoint)
+            if policy is None and endpoint and '.' in endpoint:
+                policy = self.route_policies.get(endpoint.rsplit('.', 1)[0])
+            policy = policy or self.default
+            self._resolved[endpoint] = policy
+        return policy
+
+    def apply(self, response):
+        policy = self.policy_for(request.endpoint)
+        headers = response.headers
+        # 先取一次已有头的名称，再逐个 add；比逐个 setdefault（每次都扫描整个头列表）快得多
+        present = {name.lower() for name in headers.keys()}
+        for name, key, value in policy.headers:
+            if key not in present:
+                headers.add(name, value)
+        if policy.csp is not None and policy.csp_header.lower() not in present:
+            headers.add(policy.csp_header, policy.csp_value(g.get('_csp_nonce')))
+        return response
+
+    def describe(self):
+        return {
+            'default': dict([(name, value) for name, _, value in self.default.headers],
+                            **{self.default.csp_header: self.default.csp}),
+            'route_policies': sorted(self.route_policies),
+        }
+
+
+def install_security_headers(app, **options):
+    """安装统一的安全响应头（同一个应用只安装一次，重复调用返回已安装的实例）"""
+    installed = app.extensions.get('security_headers')
+    if installed is None:
+        installed = SecurityHeaders(app, **options)
+    return installed
+
+
+def csp_nonce():
+    """本次请求的CSP nonce（模板中 <script nonce="{{ csp_nonce() }}">），首次调用时生成"""
+    nonce = g.get('_csp_nonce')
+    if nonce is None:
+        nonce = g._csp_nonce = secrets.token_urlsafe(16)
+    return nonce
+
+
+class CSRFSigner:
+    """CSRF令牌签发和验证（HMAC-SHA256，密钥只装载一次）"""
+
+    def __init__(self, secret, max_age=CSRF_TOKEN_MAX_AGE):
+        if isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        self._base = hmac.new(secret, digestmod=hashlib.sha256)
+        self.max_age = max_age
+
+    def _sign(self, message):
+        mac = self._base.copy()
+        mac.update(message.encode('ascii'))
+        return mac.hexdigest()
+
+    def generate(self):
+        message = f'{int(time.time())}:{secrets.token_hex(16)}'
+        return f'{message}:{self._sign(message)}'
+
+    def verify(self, token, expected=None, max_age=None):
+        """
+        验证令牌：格式、签名、时效；指定 expected（会话中的令牌）时还要求两者相同。
+        比较都使用 hmac.compare_digest（按字节比较），含非ASCII字符等格式错误的令牌返回False
+        """
+        if not token or not isinstance(token, str):
+            return False
+        try:
+            token_bytes = token.encode('ascii')
+            if expected is not None and not hmac.compare_digest(token_bytes, expected.encode('ascii')):
+                return False
+            message, _, signature = token_bytes.rpartition(b':')
+            timestamp = int(message.split(b':', 1)[0])
+            if not self.is_fresh(timestamp, max_age):
+                return False
+            return hmac.compare_digest(self._sign(message.decode('ascii')).encode('ascii'), signature)
+        except (ValueError, AttributeError):
+            # UnicodeEncodeError 是 ValueError 的子类；expected 不是字符串时为 AttributeError
+            return False
+
+    def is_fresh(self, timestamp, max_age=None):
+        max_age = self.max_age if max_age is None else max_age
+        # 允许各worker之间少量的时钟偏差
+        return -CLOCK_SKEW <= time.time() - timestamp <= max_age
+
+    def expired(self, token, max_age=None):
+        """会话中保存的令牌是否已过期（需要重新签发）"""
+        try:
+            return not self.is_fresh(int(token.split(':', 1)[0]), max_age)
+        except (AttributeError, ValueError):
+            return True
+
+
+def get_csrf_signer(app):
+    """应用共享的CSRF签名器，密钥取 CSRF_SECRET_KEY，其次 SECRET_KEY"""
+    signer = app.extensions.get('csrf_signer')
+    if signer is None:
+        secret = app.config.get('CSRF_SECRET_KEY') or app.config.get('SECRET_KEY')
+        if not secret:
+            secret = app.config['CSRF_SECRET_KEY'] = secrets.token_hex(32)
+        signer = app.extensions['csrf_signer'] = CSRFSigner(secret)
+    return signer
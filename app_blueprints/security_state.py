@@ -0,0 +1,479 @@
+# 安全状态存储 - 登录失败计数、IP封禁和威胁分数（多worker共享，自动衰减）
+#
+# 计数器使用滑动窗口近似（两个对齐的固定窗口加权）：
+#   每个key只保存 (窗口起点, 本窗口计数, 上一窗口计数)，
+#   估计值 = 本窗口计数 + 上一窗口计数 * (1 - 本窗口已过去的比例)
+# 计数随时间自动衰减，两个窗口后整个key过期；读写都是按主键的一次查找。
+# 封禁保存到期时间，过期自动失效。
+# 存储后端与限流模块一致（SECURITY_STATE_STORAGE，默认与 RATE_LIMIT_STORAGE 相同）：
+#   memory:// 进程内（key数量有上限） / sqlite:///path 同主机worker共享 / redis://... 多主机共享
+
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from app_blueprints.ratelimit import RATE_LIMIT_STORAGE, HAS_REDIS
+
+if HAS_REDIS:
+    import redis
+
+SECURITY_STATE_STORAGE = os.environ.get('SECURITY_STATE_STORAGE', RATE_LIMIT_STORAGE)
+# 进程内存储最多保存的计数器/封禁数量
+SECURITY_STATE_MAX_KEYS = int(os.environ.get('SECURITY_STATE_MAX_KEYS', 100000))
+# SQLite存储每写入多少次清理一次过期数据
+SQLITE_SWEEP_EVERY = 2000
+# 共享存储的本地读缓存时间（秒）：封禁状态和计数的读取结果在本进程内复用，
+# 其他worker的写入最迟在这段时间后可见；本进程的写入立即生效
+SECURITY_STATE_CACHE_TTL = float(os.environ.get('SECURITY_STATE_CACHE_TTL', 1.0))
+LOCAL_CACHE_MAX_ENTRIES = 10000
+# 不指定时长的封禁（手动封禁）按100年处理
+PERMANENT_BLOCK_SECONDS = 100 * 365 * 86400
+
+# 常用计数器命名空间
+FAILED_LOGINS = 'failed_login'
+THREAT_SCORES = 'threat'
+
+
+def window_start(now, window):
+    """当前窗口的对齐起点（整数秒，所有worker一致）"""
+    return int(now // window) * window
+
+
+def roll_window(state, now, window):
+    """按当前时间滚动窗口：返回 (窗口起点, 本窗口计数, 上一窗口计数)"""
+    start = window_start(now, window)
+    if state is None:
+        return start, 0.0, 0.0
+    stored_start, current, previous = state
+    if stored_start == start:
+        return start, current, previous
+    if stored_start == start - window:
+        return start, 0.0, current
+    return start, 0.0, 0.0
+
+
+def estimate(start, current, previous, now, window):
+    return current + previous * (1.0 - (now - start) / window)
+
+
+class MemoryStateStorage:
+    """进程内存储：按访问顺序淘汰，超过上限或已过期的key在访问时顺带删除"""
+
+    name = 'memory'
+
+    def __init__(self, max_keys=SECURITY_STATE_MAX_KEYS):
+        self.max_keys = max_keys
+        self._counters = OrderedDict()  # (namespace, key) -> (窗口起点, 本窗口, 上一窗口, 过期时间)
+        self._blocks = {}  # key -> (到期时间, 原因)
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        counters = self._counters
+        for _ in range(2):
+            if not counters:
+                break
+            oldest = next(iter(counters))
+            if counters[oldest][3] > now and len(counters) <= self.max_keys:
+                break
+            del counters[oldest]
+
+    def incr(self, namespace, key, amount, window, now):
+        with self._lock:
+            state = self._counters.get((namespace, key))
+            start, current, previous = roll_window(state and state[:3], now, window)
+            current += amount
+            self._counters[(namespace, key)] = (start, current, previous, start + 2 * window)
+            self._counters.move_to_end((namespace, key))
+            self._evict(now)
+        return estimate(start, current, previous, now, window)
+
+    def count(self, namespace, key, window, now):
+        state = self._counters.get((namespace, key))
+        if state is None:
+            return 0.0
+        start, current, previous = roll_window(state[:3], now, window)
+        return estimate(start, current, previous, now, window)
+
+    def reset(self, namespace, key):
+        with self._lock:
+            self._counters.pop((namespace, key), None)
+
+    def block(self, key, expires_at, reason):
+        with self._lock:
+            if len(self._blocks) >= self.max_keys:
+                self._sweep(time.time())
+            self._blocks[key] = (expires_at, reason)
+
+    def unblock(self, key):
+        with self._lock:
+            return self._blocks.pop(key, None) is not None
+
+    def blocked_until(self, key, now):
+        entry = self._blocks.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            self._blocks.pop(key, None)
+            return None
+        return entry[0]
+
+    def list_blocks(self, now, limit):
+        items = sorted((k, v) for k, v in self._blocks.items() if v[0] > now)
+        return [{'key': k, 'expires_at': v[0], 'reason': v[1]} for k, v in items[:limit]]
+
+    def sweep(self, now):
+        with self._lock:
+            return self._sweep(now)
+
+    def _sweep(self, now):
+        """删除过期数据（调用方持有锁）"""
+        expired = [k for k, v in self._counters.items() if v[3] <= now]
+        for k in expired:
+            del self._counters[k]
+        expired_blocks = [k for k, v in self._blocks.items() if v[0] <= now]
+        for k in expired_blocks:
+            del self._blocks[k]
+        return len(expired) + len(expired_blocks)
+
+    def stats(self, now):
+        namespaces = {}
+        for (namespace, _), state in list(self._counters.items()):
+            if state[3] > now:
+                namespaces[namespace] = namespaces.get(namespace, 0) + 1
+        blocked = sum(1 for v in list(self._blocks.values()) if v[0] > now)
+        return {'counters': namespaces, 'blocked': blocked}
+
+
+class SQLiteStateStorage:
+    """SQLite文件存储：计数用一条UPSERT ... RETURNING原子更新，多个worker共享"""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS security_counters (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                window_start INTEGER NOT NULL,
+                current REAL NOT NULL,
+                previous REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS security_blocks (
+                key TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL,
+                reason TEXT
+            ) WITHOUT ROWID
+        ''')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _after_write(self, now):
+        self._writes += 1
+        if self._writes % SQLITE_SWEEP_EVERY == 0:
+            self.sweep(now)
+
+    def incr(self, namespace, key, amount, window, now):
+        start = window_start(now, window)
+        # SET中引用的都是旧值：同一窗口累加；相邻窗口时旧的本窗口计数变为上一窗口；更早的清零
+        current, previous = self._connection().execute('''
+            INSERT INTO security_counters (namespace, key, window_start, current, previous, expires_at)
+            VALUES (?1, ?2, ?3, ?5, 0, ?3 + 2 * ?4)
+            ON CONFLICT (namespace, key) DO UPDATE SET
+                previous = CASE WHEN window_start = ?3 THEN previous
+                                WHEN window_start = ?3 - ?4 THEN current ELSE 0 END,
+                current = CASE WHEN window_start = ?3 THEN current + ?5 ELSE ?5 END,
+                window_start = ?3,
+                expires_at = ?3 + 2 * ?4
+            RETURNING current, previous
+        ''', (namespace, key, start, window, amount)).fetchone()
+        self._after_write(now)
+        return estimate(start, current, previous, now, window)
+
+    def count(self, namespace, key, window, now):
+        row = self._connection().execute(
+            'SELECT window_start, current, previous FROM security_counters WHERE namespace = ? AND key = ?',
+            (namespace, key)).fetchone()
+        if row is None:
+            return 0.0
+        start, current, previous = roll_window(row, now, window)
+        return estimate(start, current, previous, now, window)
+
+    def reset(self, namespace, key):
+        self._connection().execute('DELETE FROM security_counters WHERE namespace = ? AND key = ?', (namespace, key))
+
+    def block(self, key, expires_at, reason):
+        self._connection().execute('''
+            INSERT INTO security_blocks (key, expires_at, reason) VALUES (?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET expires_at = excluded.expires_at, reason = excluded.reason
+        ''', (key, expires_at, reason))
+        self._after_write(time.time())
+
+    def unblock(self, key):
+        return self._connection().execute('DELETE FROM security_blocks WHERE key = ?', (key,)).rowcount > 0
+
+    def blocked_until(self, key, now):
+        row = self._connection().execute(
+            'SELECT expires_at FROM security_blocks WHERE key = ? AND expires_at > ?', (key, now)).fetchone()
+        return row[0] if row else None
+
+    def list_blocks(self, now, limit):
+        rows = self._connection().execute(
+            'SELECT key, expires_at, reason FROM security_blocks WHERE expires_at > ? ORDER BY key LIMIT ?',
+            (now, limit)).fetchall()
+        return [{'key': k, 'expires_at': e, 'reason': r} for k, e, r in rows]
+
+    def sweep(self, now):
+        try:
+            conn = self._connection()
+            removed = conn.execute('DELETE FROM security_counters WHERE expires_at <= ?', (now,)).rowcount
+            return removed + conn.execute('DELETE FROM security_blocks WHERE expires_at <= ?', (now,)).rowcount
+        except sqlite3.OperationalError as e:
+            print(f"清理安全状态失败: {e}")
+            return 0
+
+    def stats(self, now):
+        conn = self._connection()
+        rows = conn.execute('SELECT namespace, COUNT(*) FROM security_counters WHERE expires_at > ? GROUP BY namespace',
+                            (now,)).fetchall()
+        blocked = conn.execute('SELECT COUNT(*) FROM security_blocks WHERE expires_at > ?', (now,)).fetchone()[0]
+        return {'counters': dict(rows), 'blocked': blocked}
+
+
+# KEYS[1]=计数器key；ARGV: 窗口起点, 窗口秒数, 增量。返回 {本窗口计数, 上一窗口计数}
+SLIDING_WINDOW_LUA = '''
+local start = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 's', 'c', 'p')
+local stored = tonumber(state[1])
+local current = tonumber(state[2]) or 0
+local previous = tonumber(state[3]) or 0
+if stored ~= start then
+    if stored == start - window then previous = current else previous = 0 end
+    current = 0
+end
+current = current + tonumber(ARGV[3])
+redis.call('HSET', KEYS[1], 's', start, 'c', tostring(current), 'p', tostring(previous))
+redis.call('EXPIREAT', KEYS[1], start + 2 * window)
+return {tostring(current), tostring(previous)}
+'''
+
+
+class RedisStateStorage:
+    """Redis存储：计数器为带过期时间的hash，封禁为带过期时间的字符串key"""
+
+    name = 'redis'
+
+    def __init__(self, url, prefix='ros2_wiki:sec:'):
+        if not HAS_REDIS:
+            raise RuntimeError('未安装redis模块，无法使用Redis安全状态存储')
+        self.client = redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._incr = self.client.register_script(SLIDING_WINDOW_LUA)
+
+    def _counter_key(self, namespace, key):
+        return f'{self.prefix}c:{namespace}:{key}'
+
+    def incr(self, namespace, key, amount, window, now):
+        start = window_start(now, window)
+        current, previous = self._incr(keys=[self._counter_key(namespace, key)], args=[start, window, amount])
+        return estimate(start, float(current), float(previous), now, window)
+
+    def count(self, namespace, key, window, now):
+        state = self.client.hmget(self._counter_key(namespace, key), 's', 'c', 'p')
+        if state[0] is None:
+            return 0.0
+        start, current, previous = roll_window((int(state[0]), float(state[1]), float(state[2])), now, window)
+        return estimate(start, current, previous, now, window)
+
+    def reset(self, namespace, key):
+        self.client.delete(self._counter_key(namespace, key))
+
+    def block(self, key, expires_at, reason):
+        self.client.set(f'{self.prefix}b:{key}', f'{expires_at}|{reason or ""}', exat=int(expires_at) + 1)
+
+    def unblock(self, key):
+        return self.client.delete(f'{self.prefix}b:{key}') > 0
+
+    def blocked_until(self, key, now):
+        value = self.client.get(f'{self.prefix}b:{key}')
+        if value is None:
+            return None
+        expires_at = float(value.split('|', 1)[0])
+        return expires_at if expires_at > now else None
+
+    def list_blocks(self, now, limit):
+        blocks = []
+        for redis_key in self.client.scan_iter(match=f'{self.prefix}b:*', count=1000):
+            value = self.client.get(redis_key)
+            if value is None:
+                continue
+            expires_at, reason = value.split('|', 1)
+            if float(expires_at) > now:
+                blocks.append({'key': redis_key[len(self.prefix) + 2:], 'expires_at': float(expires_at),
+                               'reason': reason or None})
+            if len(blocks) >= limit:
+                break
+        return sorted(blocks, key=lambda b: b['key'])
+
+    def sweep(self, now):
+        return 0  # 由Redis过期机制清理
+
+    def stats(self, now):
+        namespaces = {}
+        for redis_key in self.client.scan_iter(match=f'{self.prefix}c:*', count=1000):
+            namespace = redis_key[len(self.prefix) + 2:].split(':', 1)[0]
+            namespaces[namespace] = namespaces.get(namespace, 0) + 1
+        blocked = sum(1 for _ in self.client.scan_iter(match=f'{self.prefix}b:*', count=1000))
+        return {'counters': namespaces, 'blocked': blocked}
+
+
+def create_state_storage(uri=None):
+    uri = uri or SECURITY_STATE_STORAGE
+    if uri.startswith('memory'):
+        return MemoryStateStorage()
+    if uri.startswith('sqlite:///'):
+        return SQLiteStateStorage(uri[len('sqlite:///'):])
+    if uri.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStateStorage(uri)
+    raise ValueError(f'不支持的安全状态存储: {uri}')
+
+
+class SecurityState:
+    """
+    安全状态：
+      incr/count       - 滑动窗口计数（登录失败次数、威胁分数等），随时间衰减
+      block/is_blocked - 带到期时间的封禁
+    存储出错时按"未封禁、计数为0"处理并记录日志，不影响正常请求。
+    共享存储的读取结果在本进程缓存 cache_ttl 秒（进程内存储不缓存）。
+    """
+
+    def __init__(self, storage=None, cache_ttl=SECURITY_STATE_CACHE_TTL):
+        self.storage = storage if storage is not None else create_state_storage()
+        self.cache_ttl = 0 if self.storage.name == 'memory' else cache_ttl
+        self._cache = {}  # (类型, namespace, key) -> (缓存到期时间, 值)
+
+    def _cached(self, cache_key, now):
+        entry = self._cache.get(cache_key)
+        if entry is not None and entry[0] > now:
+            return entry
+        return None
+
+    def _remember(self, cache_key, value, now, valid_until=None):
+        if not self.cache_ttl:
+            return
+        if len(self._cache) >= LOCAL_CACHE_MAX_ENTRIES:
+            self._cache.clear()
+        expires = now + self.cache_ttl
+        self._cache[cache_key] = (min(expires, valid_until) if valid_until else expires, value)
+
+    def incr(self, namespace, key, amount=1, window=1800):
+        """累加计数并返回当前窗口内的估计值"""
+        now = time.time()
+        try:
+            value = self.storage.incr(namespace, key, amount, int(window), now)
+        except Exception as e:
+            print(f"更新安全计数失败 ({namespace}): {e}")
+            return 0.0
+        self._remember(('count', namespace, key), value, now)
+        return value
+
+    def count(self, namespace, key, window=1800):
+        now = time.time()
+        entry = self._cached(('count', namespace, key), now)
+        if entry:
+            return entry[1]
+        try:
+            value = self.storage.count(namespace, key, int(window), now)
+        except Exception as e:
+            print(f"读取安全计数失败 ({namespace}): {e}")
+            return 0.0
+        self._remember(('count', namespace, key), value, now)
+        return value
+
+    def reset(self, namespace, key):
+        self._cache.pop(('count', namespace, key), None)
+        try:
+            self.storage.reset(namespace, key)
+        except Exception as e:
+            print(f"重置安全计数失败 ({namespace}): {e}")
+
+    def block(self, key, seconds=None, reason=None):
+        """封禁key（通常是IP）；seconds为None时视为永久封禁"""
+        seconds = PERMANENT_BLOCK_SECONDS if seconds is None else seconds
+        now = time.time()
+        try:
+            self.storage.block(key, now + seconds, reason)
+        except Exception as e:
+            print(f"保存封禁失败: {e}")
+            return
+        self._remember(('block', None, key), now + seconds, now, now + seconds)
+
+    def unblock(self, key):
+        self._cache.pop(('block', None, key), None)
+        try:
+            return self.storage.unblock(key)
+        except Exception as e:
+            print(f"解除封禁失败: {e}")
+            return False
+
+    def is_blocked(self, key):
+        return self.blocked_until(key) is not None
+
+    def blocked_until(self, key):
+        """封禁到期时间，未封禁返回None"""
+        now = time.time()
+        entry = self._cached(('block', None, key), now)
+        if entry:
+            return entry[1]
+        try:
+            expires_at = self.storage.blocked_until(key, now)
+        except Exception as e:
+            print(f"读取封禁状态失败: {e}")
+            return None
+        self._remember(('block', None, key), expires_at, now, expires_at)
+        return expires_at
+
+    def list_blocks(self, limit=100):
+        return self.storage.list_blocks(time.time(), limit)
+
+    def sweep(self):
+        return self.storage.sweep(time.time())
+
+    def stats(self):
+        return {'storage': self.storage.name, **self.storage.stats(time.time())}
+
+
+_default_state = None
+_default_lock = threading.Lock()
+
+
+def get_security_state():
+    """进程内共享的默认安全状态（首次使用时按 SECURITY_STATE_STORAGE 创建）"""
+    global _default_state
+    if _default_state is None:
+        with _default_lock:
+            if _default_state is None:
+                try:
+                    _default_state = SecurityState()
+                except Exception as e:
+                    print(f"创建安全状态存储失败，改用进程内存储: {e}")
+                    _default_state = SecurityState(MemoryStateStorage())
+    return _default_state
@@ -0,0 +1,220 @@
+# 服务端会话存储 - 供标准库服务器（enhanced_server / async_server）使用，只依赖标准库
+#
+# 会话保存在SQLite的 sessions 表中（默认与应用数据库同一文件），同一主机上的多个服务器进程
+# （例如nginx后面按端口分发的多个实例）共享登录状态，重启后会话仍然有效。
+# 每个进程另有一层LRU内存缓存：
+#   - 读取命中且缓存未超过 SESSION_CACHE_SECONDS 时不访问数据库；本进程的登出立即生效，
+#     其他进程的登出最迟在这段时间后生效
+#   - 滑动过期：空闲超过 SESSION_IDLE_TTL 秒失效；访问时延长有效期，但同一会话最多每
+#     SESSION_TOUCH_INTERVAL 秒写一次数据库；另有 SESSION_MAX_LIFETIME 绝对上限
+#   - 每隔 SESSION_PURGE_INTERVAL 秒顺带删除一次过期会话
+# Set-Cookie 用 http.cookies.SimpleCookie 生成（HttpOnly、SameSite=Lax，可选Secure）；
+# 读取时按 ; 逐项查找会话Cookie，不受请求头中其他格式不规范的Cookie影响。
+
+import os
+import re
+import json
+import time
+import sqlite3
+import secrets
+import threading
+from collections import OrderedDict
+from http.cookies import SimpleCookie
+
+SESSION_COOKIE_NAME = os.environ.get('SESSION_COOKIE_NAME', 'session_id')
+SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', '').lower() in ('1', 'true', 'yes')
+# 空闲超时（秒）、绝对有效期（秒）
+SESSION_IDLE_TTL = float(os.environ.get('SESSION_IDLE_TTL', 3600))
+SESSION_MAX_LIFETIME = float(os.environ.get('SESSION_MAX_LIFETIME', 7 * 86400))
+# 滑动续期写数据库的最小间隔、本地缓存的有效时间、清理过期会话的间隔（秒）
+SESSION_TOUCH_INTERVAL = float(os.environ.get('SESSION_TOUCH_INTERVAL', 60))
+SESSION_CACHE_SECONDS = float(os.environ.get('SESSION_CACHE_SECONDS', 1.0))
+SESSION_PURGE_INTERVAL = float(os.environ.get('SESSION_PURGE_INTERVAL', 300))
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', 10000))
+# 会话ID由 secrets.token_urlsafe 生成，只含URL安全的Base64字符
+SESSION_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,128}')
+
+
+def read_session_id(cookie_header, name=SESSION_COOKIE_NAME):
+    """
+    从Cookie请求头中取出会话ID（同名Cookie取第一个），没有或格式错误时返回None。
+    不使用 SimpleCookie.load：请求头中任何一项不合规（例如其他脚本写入的含空格或JSON的值）
+    它都会丢弃整个请求头，会话Cookie也随之丢失
+    """
+    if not cookie_header:
+        return None
+    for part in cookie_header.split(';'):
+        key, sep, value = part.partition('=')
+        if sep and key.strip() == name:
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] == '"':
+                value = value[1:-1]
+            return value if SESSION_ID_PATTERN.fullmatch(value) else None
+    return None
+
+
+def session_cookie_header(session_id, max_age=None, name=SESSION_COOKIE_NAME, secure=SESSION_COOKIE_SECURE):
+    """生成 Set-Cookie 的值；session_id 为None时生成删除Cookie的值"""
+    cookie = SimpleCookie()
+    cookie[name] = session_id or ''
+    morsel = cookie[name]
+    morsel['path'] = '/'
+    morsel['httponly'] = True
+    morsel['samesite'] = 'Lax'
+    if secure:
+        morsel['secure'] = True
+    morsel['max-age'] = 0 if session_id is None else int(max_age if max_age is not None else SESSION_MAX_LIFETIME)
+    return morsel.OutputString()
+
+
+class SessionStore:
+    """SQLite会话表 + 进程内LRU缓存"""
+
+    def __init__(self, db_path, idle_ttl=SESSION_IDLE_TTL, max_lifetime=SESSION_MAX_LIFETIME,
+                 touch_interval=SESSION_TOUCH_INTERVAL, cache_seconds=SESSION_CACHE_SECONDS,
+                 purge_interval=SESSION_PURGE_INTERVAL, cache_size=SESSION_CACHE_SIZE):
+        self.db_path = db_path
+        self.idle_ttl = idle_ttl
+        self.max_lifetime = max_lifetime
+        self.touch_interval = touch_interval
+        self.cache_seconds = cache_seconds
+        self.purge_interval = purge_interval
+        self.cache_size = cache_size
+        self._local = threading.local()
+        # session_id -> [数据, 用户名, 创建时间, 过期时间, 上次写库时间, 缓存时间]
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_purge = time.time() + purge_interval
+        self.stats = {'created': 0, 'hits': 0, 'db_reads': 0, 'touches': 0, 'expired': 0, 'purged': 0}
+        self._connection().execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                data TEXT,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        self._connection().execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)')
+        self._connection().execute('CREATE INDEX IF NOT EXISTS idx_sessions_username ON sessions(username)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _expiry(self, created_at, now):
+        return min(now + self.idle_ttl, created_at + self.max_lifetime)
+
+    def _remember(self, session_id, entry):
+        with self._lock:
+            self._cache[session_id] = entry
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _forget(self, session_id):
+        with self._lock:
+            self._cache.pop(session_id, None)
+
+    def create(self, username, data=None):
+        """创建会话，返回会话ID（256位随机数）"""
+        session_id = secrets.token_urlsafe(32)
+        now = time.time()
+        expires_at = self._expiry(now, now)
+        self._connection().execute(
+            'INSERT INTO sessions (session_id, username, data, created_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+            (session_id, username, json.dumps(data or {}), now, expires_at))
+        self._remember(session_id, [dict(data or {}), username, now, expires_at, now, time.monotonic()])
+        self.stats['created'] += 1
+        self._maybe_purge(now)
+        return session_id
+
+    def get(self, session_id):
+        """返回 {'username': ..., **data}；会话不存在或已过期时返回None。访问会延长空闲有效期"""
+        if not session_id:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(session_id)
+            if entry is not None:
+                self._cache.move_to_end(session_id)
+        fresh = entry is not None and time.monotonic() - entry[5] < self.cache_seconds
+        if fresh:
+            self.stats['hits'] += 1
+        else:
+            row = self._connection().execute(
+                'SELECT username, data, created_at, expires_at FROM sessions WHERE session_id = ?',
+                (session_id,)).fetchone()
+            self.stats['db_reads'] += 1
+            if row is None:
+                self._forget(session_id)
+                return None
+            last_touch = entry[4] if entry is not None else row[3] - self.idle_ttl
+            entry = [json.loads(row[1] or '{}'), row[0], row[2], row[3], last_touch, time.monotonic()]
+            self._remember(session_id, entry)
+
+        data, username, created_at, expires_at, last_touch = entry[:5]
+        if expires_at <= now:
+            self.stats['expired'] += 1
+            self.delete(session_id)
+            return None
+        if now - last_touch >= self.touch_interval:
+            entry[3] = self._expiry(created_at, now)
+            entry[4] = now
+            self._connection().execute('UPDATE sessions SET expires_at = ? WHERE session_id = ?',
+                                       (entry[3], session_id))
+            self.stats['touches'] += 1
+        self._maybe_purge(now)
+        return dict(data, username=username)
+
+    def username(self, session_id):
+        session = self.get(session_id)
+        return session['username'] if session else None
+
+    def delete(self, session_id):
+        """登出：删除会话"""
+        if not session_id:
+            return False
+        self._forget(session_id)
+        return self._connection().execute('DELETE FROM sessions WHERE session_id = ?', (session_id,)).rowcount > 0
+
+    def delete_user(self, username):
+        """删除某个用户的全部会话（修改密码、禁用账号时使用）"""
+        with self._lock:
+            for session_id in [sid for sid, entry in self._cache.items() if entry[1] == username]:
+                del self._cache[session_id]
+        return self._connection().execute('DELETE FROM sessions WHERE username = ?', (username,)).rowcount
+
+    def _maybe_purge(self, now):
+        if now >= self._next_purge:
+            self._next_purge = now + self.purge_interval
+            self.purge(now)
+
+    def purge(self, now=None):
+        """删除过期会话，返回删除数量"""
+        now = now or time.time()
+        try:
+            removed = self._connection().execute('DELETE FROM sessions WHERE expires_at <= ?', (now,)).rowcount
+        except sqlite3.OperationalError as e:
+            print(f"清理过期会话失败: {e}")
+            return 0
+        with self._lock:
+            for session_id in [sid for sid, entry in self._cache.items() if entry[3] <= now]:
+                del self._cache[session_id]
+        self.stats['purged'] += removed
+        return removed
+
+    def count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM sessions WHERE expires_at > ?',
+                                          (time.time(),)).fetchone()[0]
+
+    def status(self):
+        with self._lock:
+            cached = len(self._cache)
+        return dict(self.stats, active=self.count(), cached=cached, idle_ttl=self.idle_ttl,
+                    max_lifetime=self.max_lifetime)
@@ -0,0 +1,302 @@
+# 拼写纠错模块 - 基于三元组（trigram）索引的模糊匹配
+#
+# 词典来自文档标题和正文中的API名称（如 rclpy.spin、create_subscription）。
+# PostgreSQL使用pg_trgm的GIN索引；SQLite维护 search_term_trigrams 影子表，
+# 两者使用相同的三元组规则，相似度均为 共享三元组数 / 并集三元组数。
+
+import re
+import time
+from collections import Counter
+
+# API名称/标识符：字母或下划线开头，允许点号分隔（rclpy.spin）
+TERM_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*')
+# 与pg_trgm一致：非字母数字字符作为单词分隔符
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+MIN_TERM_LENGTH = 3
+MAX_TERM_LENGTH = 64
+# pg_trgm.similarity_threshold 默认值
+SIMILARITY_THRESHOLD = 0.3
+# 相似度达到该值时直接使用纠正后的查询返回结果
+AUTOCORRECT_THRESHOLD = 0.45
+# 重建词典时每批读取的文档数
+REBUILD_BATCH_SIZE = 500
+# 词典未就绪时，同一进程提交后台重建任务的最小间隔（秒）
+REBUILD_REQUEST_INTERVAL = 300
+
+
+def trigrams(text):
+    """按pg_trgm规则生成三元组集合：每个单词前补两个空格、后补一个空格"""
+    grams = set()
+    for word in WORD_PATTERN.findall(text.lower()):
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def extract_terms(title, content):
+    """从文档中提取词典条目，返回 {term: kind}"""
+    terms = {}
+    for match in TERM_PATTERN.findall(f"{title or ''}\n{content or ''}"):
+        term = match.lower()
+        # 复合名称同时收录各组成部分，便于纠正单个单词（subscibtion -> subscription）
+        for part in [term] + re.split(r'[._]+', term):
+            if MIN_TERM_LENGTH <= len(part) <= MAX_TERM_LENGTH:
+                terms[part] = 'term'
+    title_term = (title or '').strip().lower()
+    if MIN_TERM_LENGTH <= len(title_term) <= MAX_TERM_LENGTH:
+        terms[title_term] = 'title'
+    return terms
+
+
+class TrigramIndex:
+    """三元组词典索引"""
+
+    # 词典表是否已就绪的缓存：db_key -> bool
+    _ready = {}
+    # 上次提交重建任务的时间：db_key -> monotonic秒
+    _rebuild_requested = {}
+
+    def __init__(self, db_key, use_postgresql=False, request_rebuild=None):
+        """request_rebuild: 词典未就绪时调用（提交 trigram_rebuild 后台任务），为None时只返回无建议"""
+        self.db_key = db_key
+        self.use_postgresql = use_postgresql
+        self.placeholder = '%s' if use_postgresql else '?'
+        self.request_rebuild = request_rebuild
+
+    def create_schema(self, conn):
+        """创建词典表和三元组索引"""
+        cursor = conn.cursor()
+        if self.use_postgresql:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS search_terms (
+                    id SERIAL PRIMARY KEY,
+                    term TEXT UNIQUE NOT NULL,
+                    kind TEXT NOT NULL DEFAULT 'term',
+                    doc_freq INTEGER NOT NULL DEFAULT 0,
+                    trigram_count INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_search_terms_trgm "
+                           "ON search_terms USING gin (term gin_trgm_ops)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_title_trgm "
+                           "ON documents USING gin (title gin_trgm_ops)")
+        else:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS search_terms (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    term TEXT UNIQUE NOT NULL,
+                    kind TEXT NOT NULL DEFAULT 'term',
+                    doc_freq INTEGER NOT NULL DEFAULT 0,
+                    trigram_count INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS search_term_trigrams (
+                    trigram TEXT NOT NULL,
+                    term_id INTEGER NOT NULL,
+                    PRIMARY KEY (trigram, term_id)
+                ) WITHOUT ROWID
+            ''')
+        conn.commit()
+
+    def ensure_ready(self, conn):
+        """
+        词典是否存在且已填充。全量构建要扫描所有文档，不在请求中执行：
+        未就绪时提交后台重建任务（每个进程每 REBUILD_REQUEST_INTERVAL 秒最多一次）并返回False
+        """
+        if TrigramIndex._ready.get(self.db_key):
+            return True
+        if self._tables_exist(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM search_terms LIMIT 1")
+            if cursor.fetchone() is not None:
+                TrigramIndex._ready[self.db_key] = True
+                return True
+        now = time.monotonic()
+        requested = TrigramIndex._rebuild_requested.get(self.db_key)
+        if self.request_rebuild is not None and (requested is None or now - requested >= REBUILD_REQUEST_INTERVAL):
+            TrigramIndex._rebuild_requested[self.db_key] = now
+            self.request_rebuild()
+        return False
+
+    def rebuild(self, conn):
+        """从documents表全量重建词典，返回词条数"""
+        cursor = conn.cursor()
+        cursor.execute("SELECT title, content FROM documents")
+        doc_freq = Counter()
+        kinds = {}
+        while True:
+            rows = cursor.fetchmany(REBUILD_BATCH_SIZE)
+            if not rows:
+                break
+            for title, content in rows:
+                for term, kind in extract_terms(title, content).items():
+                    doc_freq[term] += 1
+                    if kinds.get(term) != 'title':
+                        kinds[term] = kind
+
+        p = self.placeholder
+        cursor.execute("DELETE FROM search_terms")
+        if not self.use_postgresql:
+            cursor.execute("DELETE FROM search_term_trigrams")
+        cursor.executemany(
+            f"INSERT INTO search_terms (term, kind, doc_freq, trigram_count) VALUES ({p}, {p}, {p}, {p})",
+            [(term, kinds[term], freq, len(trigrams(term))) for term, freq in doc_freq.items()]
+        )
+        if not self.use_postgresql:
+            cursor.execute("SELECT id, term FROM search_terms")
+            term_rows = cursor.fetchall()
+            cursor.executemany(
+                "INSERT OR IGNORE INTO search_term_trigrams (trigram, term_id) VALUES (?, ?)",
+                [(gram, term_id) for term_id, term in term_rows for gram in trigrams(term)]
+            )
+        conn.commit()
+        TrigramIndex._ready[self.db_key] = True
+        return len(doc_freq)
+
+    def index_document(self, conn, title, content):
+        """增量加入单篇文档的词条（由调用方提交事务）；词典尚未构建时跳过"""
+        if not self._tables_exist(conn):
+            return 0
+        return self._add_terms(conn, extract_terms(title, content))
+
+    def update_document(self, conn, previous, current):
+        """
+        文档修改或删除后更新词典（由调用方提交事务）；词典尚未构建时跳过
+        previous/current 为 (标题, 内容)，新建时 previous 为None，删除时 current 为None。
+        只有新旧内容之间变化的词条才会调整 doc_freq，重复保存不会让词频增长
+        """
+        if not self._tables_exist(conn):
+            return 0
+        old_terms = extract_terms(*previous) if previous else {}
+        new_terms = extract_terms(*current) if current else {}
+        removed = [term for term in old_terms if term not in new_terms]
+        added = {term: kind for term, kind in new_terms.items() if term not in old_terms}
+        self._remove_terms(conn, removed)
+        self._add_terms(conn, added)
+        return len(removed) + len(added)
+
+    def _add_terms(self, conn, terms):
+        """词条的 doc_freq 加一，新词条同时写入三元组"""
+        if not terms:
+            return 0
+        cursor = conn.cursor()
+        p = self.placeholder
+        cursor.executemany(f'''
+            INSERT INTO search_terms (term, kind, doc_freq, trigram_count)
+            VALUES ({p}, {p}, 1, {p})
+            ON CONFLICT (term) DO UPDATE SET doc_freq = search_terms.doc_freq + 1
+        ''', [(term, kind, len(trigrams(term))) for term, kind in terms.items()])
+        if not self.use_postgresql:
+            marks = ", ".join(["?"] * len(terms))
+            cursor.execute(f"SELECT id, term FROM search_terms WHERE term IN ({marks})", list(terms))
+            cursor.executemany(
+                "INSERT OR IGNORE INTO search_term_trigrams (trigram, term_id) VALUES (?, ?)",
+                [(gram, term_id) for term_id, term in cursor.fetchall() for gram in trigrams(term)]
+            )
+        return len(terms)
+
+    def _remove_terms(self, conn, terms):
+        """词条的 doc_freq 减一，不再出现在任何文档中的词条连同三元组一起删除"""
+        if not terms:
+            return 0
+        cursor = conn.cursor()
+        p = self.placeholder
+        cursor.executemany(f"UPDATE search_terms SET doc_freq = doc_freq - 1 WHERE term = {p}",
+                           [(term,) for term in terms])
+        marks = ", ".join([p] * len(terms))
+        if not self.use_postgresql:
+            cursor.execute(f'''
+                DELETE FROM search_term_trigrams WHERE term_id IN (
+                    SELECT id FROM search_terms WHERE doc_freq <= 0 AND term IN ({marks})
+                )
+            ''', list(terms))
+        cursor.execute(f"DELETE FROM search_terms WHERE doc_freq <= 0 AND term IN ({marks})", list(terms))
+        return len(terms)
+
+    def suggest(self, conn, text, limit=5, threshold=SIMILARITY_THRESHOLD):
+        """返回与text相似的词条：[{'text', 'kind', 'score'}]，按相似度降序"""
+        text = (text or '').strip().lower()
+        grams = trigrams(text)
+        if len(text) < MIN_TERM_LENGTH or not grams or not self.ensure_ready(conn):
+            return []
+        cursor = conn.cursor()
+
+        if self.use_postgresql:
+            # term % q 走GIN索引；显式阈值过滤保证与SQLite结果一致
+            cursor.execute('''
+                SELECT term, kind, similarity(term, %s) AS score
+                FROM search_terms
+                WHERE term %% %s AND term <> %s AND similarity(term, %s) >= %s
+                ORDER BY score DESC, doc_freq DESC
+                LIMIT %s
+            ''', [text, text, text, text, threshold, limit])
+        else:
+            marks = ", ".join(["?"] * len(grams))
+            cursor.execute(f'''
+                SELECT t.term, t.kind,
+                       CAST(COUNT(*) AS REAL) / (? + t.trigram_count - COUNT(*)) AS score
+                FROM search_term_trigrams g
+                JOIN search_terms t ON t.id = g.term_id
+                WHERE g.trigram IN ({marks})
+                GROUP BY g.term_id
+                HAVING score >= ? AND t.term <> ?
+                ORDER BY score DESC, t.doc_freq DESC
+                LIMIT ?
+            ''', [len(grams)] + list(grams) + [threshold, text, limit])
+
+        return [{'text': row[0], 'kind': row[1], 'score': round(float(row[2]), 3)}
+                for row in cursor.fetchall()]
+
+    def did_you_mean(self, conn, query, limit=5):
+        """
+        生成"您是不是要找"建议
+        先逐词纠正词典中不存在的API名称，再补充与整句相似的标题/词条
+        """
+        query = (query or '').strip().lower()
+        suggestions = []
+        if not self.ensure_ready(conn):
+            return suggestions
+
+        tokens = [t for t in TERM_PATTERN.findall(query) if len(t) >= MIN_TERM_LENGTH]
+        if tokens:
+            known = self._known_terms(conn, tokens)
+            corrected = query
+            scores = []
+            for token in tokens:
+                if token in known:
+                    continue
+                best = self.suggest(conn, token, limit=1)
+                if best:
+                    corrected = corrected.replace(token, best[0]['text'])
+                    scores.append(best[0]['score'])
+            if scores and corrected != query:
+                suggestions.append({'text': corrected, 'kind': 'correction', 'score': min(scores)})
+
+        for item in self.suggest(conn, query, limit=limit):
+            if all(item['text'] != s['text'] for s in suggestions):
+                suggestions.append(item)
+
+        suggestions.sort(key=lambda s: -s['score'])
+        return suggestions[:limit]
+
+    def _known_terms(self, conn, tokens):
+        """返回tokens中已存在于词典的词条"""
+        cursor = conn.cursor()
+        marks = ", ".join([self.placeholder] * len(tokens))
+        cursor.execute(f"SELECT term FROM search_terms WHERE term IN ({marks})", list(tokens))
+        return {row[0] for row in cursor.fetchall()}
+
+    def _tables_exist(self, conn):
+        """检查词典表是否存在"""
+        if TrigramIndex._ready.get(self.db_key):
+            return True
+        cursor = conn.cursor()
+        if self.use_postgresql:
+            cursor.execute("SELECT to_regclass('search_terms') IS NOT NULL")
+            return bool(cursor.fetchone()[0])
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_term_trigrams'")
+        return cursor.fetchone() is not None
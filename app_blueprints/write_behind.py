@@ -0,0 +1,243 @@
+# 写回缓冲模块 - 合并高频小写入后批量提交
+#
+# 登录时的 last_seen 更新和文档浏览计数都是"每次请求一个写事务"，
+# 在SQLite上会在写锁上排队。这里先在进程内合并：同一用户只保留最新的登录时间，
+# 同一文档的浏览次数累加为一个增量，每隔 flush_interval 秒或累计 max_events 次事件
+# 在一个事务中写入，进程退出时再写一次。读取方通过 pending_* 方法合并尚未写入的增量。
+
+import os
+import atexit
+import threading
+import time
+from datetime import datetime
+
+# 定时写入间隔（秒）和触发提前写入的事件数
+FLUSH_INTERVAL = float(os.environ.get('WRITE_BEHIND_INTERVAL', 5))
+MAX_PENDING_EVENTS = int(os.environ.get('WRITE_BEHIND_MAX_EVENTS', 200))
+
+
+def create_view_counter_schema(cursor, use_postgresql=False):
+    """主应用的文档浏览计数表（documents表本身没有view_count列）"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_views (
+            document_id INTEGER PRIMARY KEY,
+            view_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+class WriteBehindBuffer:
+    """
+    进程内写回缓冲
+
+    connect: 返回数据库连接的函数（每次写入时调用，用完关闭）
+    views_column: 为None时浏览数写入 document_views 表；
+                  否则直接累加到 documents 表的该列（SQLAlchemy模型的 view_count）
+    """
+
+    def __init__(self, connect, use_postgresql=False, flush_interval=FLUSH_INTERVAL,
+                 max_events=MAX_PENDING_EVENTS, views_column=None):
+        self.connect = connect
+        self.use_postgresql = use_postgresql
+        self.placeholder = '%s' if use_postgresql else '?'
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self.views_column = views_column
+
+        self.lock = threading.Lock()
+        # 串行化写入，避免定时线程与手动flush交错提交同一批增量
+        self.flush_lock = threading.Lock()
+        self.last_seen = {}
+        self.views = {}
+        # 正在写入（已取出但尚未提交）的增量，读取时同样需要合并
+        self.flushing_last_seen = {}
+        self.flushing_views = {}
+        self.pending_events = 0
+
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread = None
+        self.stats = {'flushes': 0, 'rows_written': 0, 'events': 0, 'errors': 0, 'last_flush_ms': 0.0}
+
+    # ---- 写入接口 ----
+
+    def touch_user(self, user_id):
+        """记录用户活动时间（替代 UPDATE users SET last_seen = now）"""
+        now = self._now()
+        with self.lock:
+            previous = self.last_seen.get(user_id)
+            if previous is None or now > previous:
+                self.last_seen[user_id] = now
+            flush_now = self._count_event()
+        if flush_now:
+            self.flush()
+
+    def record_view(self, document_id, count=1):
+        """记录文档浏览次数"""
+        with self.lock:
+            self.views[document_id] = self.views.get(document_id, 0) + count
+            flush_now = self._count_event()
+        if flush_now:
+            self.flush()
+
+    def _count_event(self):
+        """累计事件数，返回是否需要由调用方立即写入（调用方已持有 self.lock）"""
+        self.pending_events += 1
+        self.stats['events'] += 1
+        if self.pending_events < self.max_events:
+            return False
+        if self.thread is not None:
+            self.wakeup.set()
+            return False
+        # 没有后台线程（脚本/测试环境）时由当前线程写入
+        return True
+
+    # ---- 读取时合并 ----
+
+    def pending_views(self, document_id):
+        with self.lock:
+            return self.views.get(document_id, 0) + self.flushing_views.get(document_id, 0)
+
+    def pending_last_seen(self, user_id):
+        with self.lock:
+            return self.last_seen.get(user_id) or self.flushing_last_seen.get(user_id)
+
+    def merge_last_seen(self, users):
+        """把尚未写入的登录时间合并到用户字典（或字典列表）中"""
+        if not users:
+            return users
+        with self.lock:
+            for user in users if isinstance(users, list) else [users]:
+                pending = self.last_seen.get(user.get('id')) or self.flushing_last_seen.get(user.get('id'))
+                if pending is not None:
+                    user['last_seen'] = pending
+        return users
+
+    def get_view_count(self, conn, document_id):
+        """读取文档浏览数（已写入的部分 + 缓冲中的增量）"""
+        stored = 0
+        try:
+            cursor = conn.cursor()
+            if self.views_column:
+                cursor.execute(f'SELECT {self.views_column} FROM documents WHERE id = {self.placeholder}',
+                               (document_id,))
+            else:
+                cursor.execute(f'SELECT view_count FROM document_views WHERE document_id = {self.placeholder}',
+                               (document_id,))
+            row = cursor.fetchone()
+            stored = (row[0] or 0) if row else 0
+        except Exception as e:
+            print(f"读取浏览次数失败: {e}")
+        return stored + self.pending_views(document_id)
+
+    # ---- 批量写入 ----
+
+    def flush(self):
+        """把当前缓冲的增量在一个事务中写入，返回写入的行数"""
+        with self.flush_lock:
+            with self.lock:
+                last_seen, self.last_seen = self.last_seen, {}
+                views, self.views = self.views, {}
+                self.flushing_last_seen, self.flushing_views = last_seen, views
+                self.pending_events = 0
+            if not last_seen and not views:
+                return 0
+
+            started = time.perf_counter()
+            conn = None
+            try:
+                conn = self.connect()
+                cursor = conn.cursor()
+                p = self.placeholder
+                if last_seen:
+                    # 多进程部署时各进程独立缓冲，只允许时间向后推进
+                    cursor.executemany(
+                        f'UPDATE users SET last_seen = {p} '
+                        f'WHERE id = {p} AND (last_seen IS NULL OR last_seen < {p})',
+                        [(seen, user_id, seen) for user_id, seen in last_seen.items()]
+                    )
+                if views:
+                    if self.views_column:
+                        column = self.views_column
+                        cursor.executemany(
+                            f'UPDATE documents SET {column} = COALESCE({column}, 0) + {p} WHERE id = {p}',
+                            [(count, doc_id) for doc_id, count in views.items()]
+                        )
+                    else:
+                        cursor.executemany(
+                            f'INSERT INTO document_views (document_id, view_count) VALUES ({p}, {p}) '
+                            f'ON CONFLICT (document_id) DO UPDATE '
+                            f'SET view_count = document_views.view_count + excluded.view_count',
+                            list(views.items())
+                        )
+                conn.commit()
+            except Exception as e:
+                print(f"写回缓冲写入失败，增量保留到下次写入: {e}")
+                self.stats['errors'] += 1
+                if conn is not None:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        pass
+                self._restore(last_seen, views)
+                return 0
+            finally:
+                if conn is not None:
+                    conn.close()
+                with self.lock:
+                    self.flushing_last_seen, self.flushing_views = {}, {}
+
+            rows = len(last_seen) + len(views)
+            self.stats['flushes'] += 1
+            self.stats['rows_written'] += rows
+            self.stats['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            return rows
+
+    def _restore(self, last_seen, views):
+        """写入失败时把增量合并回缓冲"""
+        with self.lock:
+            for user_id, seen in last_seen.items():
+                current = self.last_seen.get(user_id)
+                if current is None or seen > current:
+                    self.last_seen[user_id] = seen
+            for doc_id, count in views.items():
+                self.views[doc_id] = self.views.get(doc_id, 0) + count
+            self.pending_events += len(last_seen) + len(views)
+            self.flushing_last_seen, self.flushing_views = {}, {}
+
+    # ---- 后台线程 ----
+
+    def start(self):
+        """启动定时写入线程，并在进程退出时写入剩余增量"""
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """停止后台线程并写入剩余增量"""
+        self.stopping = True
+        self.wakeup.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=10)
+        self.flush()
+
+    def _run(self):
+        while not self.stopping:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            if self.stopping:
+                break
+            self.flush()
+
+    def status(self):
+        with self.lock:
+            pending = {'pending_users': len(self.last_seen), 'pending_documents': len(self.views),
+                       'pending_events': self.pending_events}
+        return dict(self.stats, **pending)
+
+    def _now(self):
+        # 与原来的写入保持一致：SQLite为 datetime('now') 格式的UTC字符串，PostgreSQL为时间戳
+        now = datetime.utcnow().replace(microsecond=0)
+        return now if self.use_postgresql else now.strftime('%Y-%m-%d %H:%M:%S')
@@ -14,6 +14,7 @@ from flask_login import LoginManager, login_required, current_user
 
 # 优化模块导入
 from optimizations.integration import enhance_flask_app
+from app_blueprints.ratelimit import get_rate_limiter
 from optimizations import (
     DocumentCache, 
     SearchCache, 
@@ -325,10 +326,11 @@ def admin_security():
         return redirect(url_for('index'))
     
     try:
+        state_stats = security_manager.security_stats()
         security_stats = {
-            'blocked_ips': list(security_manager.blocked_ips),
-            'failed_attempts': len(security_manager.failed_attempts),
-            'threat_scores': len(security_manager.threat_detector.threat_scores)
+            'blocked_ips': [block['key'] for block in security_manager.state.list_blocks()],
+            'failed_attempts': state_stats['failed_attempts'],
+            'threat_scores': state_stats['threat_scores']
         }
         
         return render_template('admin/security.html', security_stats=security_stats)
@@ -406,9 +408,8 @@ def get_admin_stats():
         
         # 安全统计
         security_stats = {
-            'blocked_ips': len(security_manager.blocked_ips),
-            'failed_attempts': len(security_manager.failed_attempts),
-            'rate_limited_ips': len(security_manager.rate_limits)
+            **security_manager.security_stats(),
+            'rate_limited_ips': get_rate_limiter().status()['keys']
         }
         
         return {
@@ -89,7 +89,7 @@ def init_db():
 
 def create_default_admin(cursor, conn):
     """创建默认管理员账户"""
-    from werkzeug.security import generate_password_hash
+    from app_blueprints.passwords import hash_password
     
     # 检查是否已存在管理员
     cursor.execute("SELECT COUNT(*) FROM users WHERE is_admin = 1")
@@ -100,7 +100,7 @@ def create_default_admin(cursor, conn):
         admin_password = os.environ.get('ADMIN_PASSWORD', 'DevPassword123!@#')
         admin_email = f"{admin_username}@ros2wiki.com"
         
-        password_hash = generate_password_hash(admin_password)
+        password_hash = hash_password(admin_password)
         
         cursor.execute('''
             INSERT INTO users (username, email, password_hash, is_admin)
@@ -4,7 +4,7 @@
 """
 
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from app_blueprints.passwords import hash_password, verify_password
 from .database import get_db_connection
 
 class User(UserMixin):
@@ -19,12 +19,21 @@ class User(UserMixin):
         self.created_at = created_at
     
     def check_password(self, password):
-        """验证密码"""
-        return check_password_hash(self.password_hash, password)
+        """验证密码（哈希参数已变化或是旧格式时，用当前参数重新计算并保存）"""
+        password_ok, new_hash = verify_password(self.password_hash, password)
+        if password_ok and new_hash:
+            self.password_hash = new_hash
+            try:
+                conn = get_db_connection()
+                conn.execute('UPDATE users SET password_hash = ? WHERE id = ?', (new_hash, self.id))
+                conn.commit()
+            except Exception as e:
+                print(f"更新密码哈希失败: {e}")
+        return password_ok
     
     def set_password(self, password):
         """设置密码"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     @staticmethod
     def get(user_id):
@@ -80,7 +89,7 @@ class User(UserMixin):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        password_hash = generate_password_hash(password)
+        password_hash = hash_password(password)
         
         try:
             cursor.execute('''
@@ -23,6 +23,10 @@ def login():
             flash('用户名和密码不能为空', 'error')
             return render_template('login.html')
         
+        if auth_service.is_ip_blocked(request.remote_addr):
+            flash('登录失败次数过多，请稍后再试', 'error')
+            return render_template('login.html'), 429
+        
         user = User.get_by_username(username)
         
         if user and user.check_password(password):
@@ -40,6 +44,7 @@ def login():
             else:
                 return redirect(url_for('main.index'))
         else:
+            auth_service.log_failed_login(username, request.remote_addr)
             flash('用户名或密码错误', 'error')
     
     return render_template('login.html')
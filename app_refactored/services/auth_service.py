@@ -5,6 +5,10 @@
 
 from datetime import datetime
 from ..models.database import get_db_connection
+from app_blueprints.security_state import get_security_state, FAILED_LOGINS
+
+# 登录失败计数的滑动窗口（分钟）
+FAILED_LOGIN_WINDOW_MINUTES = 30
 
 class AuthService:
     """认证相关业务逻辑"""
@@ -54,18 +58,25 @@ class AuthService:
         
         return cursor.fetchall()
     
-    def get_failed_login_attempts(self, ip_address, since_minutes=30):
-        """获取指定IP的失败登录尝试次数"""
+    def get_failed_login_attempts(self, ip_address, since_minutes=FAILED_LOGIN_WINDOW_MINUTES):
+        """
+        获取指定IP的失败登录尝试次数
+        默认窗口读取共享的滑动窗口计数（一次主键查找，各worker一致）；
+        其他时间范围才查询 failed_logins 表
+        """
+        if since_minutes == FAILED_LOGIN_WINDOW_MINUTES:
+            count = get_security_state().count(FAILED_LOGINS, ip_address, window=since_minutes * 60)
+            return int(round(count))
+        
         conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
             SELECT COUNT(*)
-            FROM user_logs
+            FROM failed_logins
             WHERE ip_address = ? 
-            AND action = 'login_failed'
             AND timestamp > datetime('now', '-{} minutes')
-        '''.format(since_minutes), (ip_address,))
+        '''.format(int(since_minutes)), (ip_address,))
         
         result = cursor.fetchone()
         return result[0] if result else 0
@@ -76,7 +87,9 @@ class AuthService:
         return failed_attempts >= max_attempts
     
     def log_failed_login(self, username, ip_address):
-        """记录失败的登录尝试"""
+        """记录失败的登录尝试（累加共享计数，并写入失败登录表备查）"""
+        get_security_state().incr(FAILED_LOGINS, ip_address, 1, window=FAILED_LOGIN_WINDOW_MINUTES * 60)
+        
         conn = get_db_connection()
         cursor = conn.cursor()
         
@@ -16,6 +16,7 @@ from flask import Flask, render_template, request, redirect, url_for, flash, jso
 from flask_login import LoginManager, login_required, current_user, login_user, logout_user, UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from app_blueprints.jobs import JobRunner
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -91,10 +92,13 @@ class FileManager:
                filename.rsplit('.', 1)[1].lower() in self.allowed_extensions
     
     def get_file_hash(self, file_path):
-        """获取文件哈希值"""
+        """获取文件哈希值（分块读取，不把整个文件读入内存）"""
         try:
+            digest = hashlib.md5()
             with open(file_path, 'rb') as f:
-                return hashlib.md5(f.read()).hexdigest()
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+            return digest.hexdigest()
         except Exception as e:
             logger.error(f"获取文件哈希失败: {e}")
             return None
@@ -120,7 +124,6 @@ class FileManager:
             
             # 获取文件信息
             file_size = os.path.getsize(file_path)
-            file_hash = self.get_file_hash(file_path)
             mime_type = mimetypes.guess_type(filename)[0]
             
             # 检查文件大小
@@ -135,13 +138,14 @@ class FileManager:
                 'safe_filename': safe_filename,
                 'file_path': file_path,
                 'file_size': file_size,
-                'file_hash': file_hash,
+                'file_hash': None,  # 保存后由后台任务计算
                 'mime_type': mime_type,
                 'user_id': user_id,
                 'upload_time': datetime.now()
             }
             
             if self.save_file_to_db(file_info):
+                self.schedule_file_hash(file_info)
                 return file_info, "文件上传成功"
             else:
                 os.remove(file_path)
@@ -151,6 +155,24 @@ class FileManager:
             logger.error(f"文件保存失败: {e}")
             return None, f"文件保存失败: {str(e)}"
     
+    def schedule_file_hash(self, file_info):
+        """提交计算MD5的后台任务；无法提交时在当前请求中计算并写入"""
+        try:
+            job_runner.enqueue('file_hash', {'file_id': file_info['id'], 'path': file_info['file_path']})
+            return
+        except Exception as e:
+            logger.warning(f"提交文件哈希任务失败，改为同步计算: {e}")
+        file_info['file_hash'] = self.get_file_hash(file_info['file_path'])
+        try:
+            conn = get_db_connection()
+            placeholder = DatabaseCompatibility.get_placeholder(is_postgresql())
+            conn.cursor().execute(f"UPDATE files SET file_hash = {placeholder} WHERE id = {placeholder}",
+                                  (file_info['file_hash'], file_info['id']))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"文件哈希保存失败: {e}")
+
     def save_file_to_db(self, file_info):
         """将文件信息保存到数据库"""
         try:
@@ -352,6 +374,14 @@ app.config.update({
     'UPLOAD_FOLDER': '/tmp/uploads',  # 上传目录
 })
 
+# 后台任务（上传文件的哈希计算等），任务表与应用使用同一个数据库
+job_runner = JobRunner(app.config['DATABASE_URL'] if is_postgresql() else 'ros2_wiki.db')
+if os.environ.get('JOBS_ENABLED', 'true').lower() == 'true':
+    try:
+        job_runner.start()
+    except Exception as e:
+        logger.warning(f"后台任务启动失败: {e}")
+
 # 初始化Login Manager
 login_manager = LoginManager()
 login_manager.init_app(app)
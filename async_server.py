@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+ROS2 Wiki 异步服务器模式 - 面向大量空闲长连接的单进程部署
+连接管理、请求解析、超时控制和响应发送都在asyncio事件循环中完成，
+空闲的长连接只占用一个协程和少量缓冲区，不占用线程；
+路由和页面渲染直接复用 enhanced_server.WikiHandler，放到小线程池中执行（SQLite查询是阻塞调用）。
+使用方法: SERVER_MODE=async python enhanced_server.py  或  python async_server.py
+"""
+import os
+import io
+import signal
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from enhanced_server import WikiHandler, init_db, release_db, add_content_length
+
+# 执行WikiHandler（含SQLite查询）的线程数，保持较小即可
+ASYNC_WORKERS = int(os.environ.get('ASYNC_WORKERS', 4))
+# 同时保持的连接上限，超出时直接返回503
+MAX_CONNECTIONS = int(os.environ.get('ASYNC_MAX_CONNECTIONS', 10000))
+# 超时（秒）：长连接等待下一个请求、读取请求头、读取请求体、发送响应
+IDLE_TIMEOUT = float(os.environ.get('ASYNC_IDLE_TIMEOUT', 75))
+HEADER_TIMEOUT = float(os.environ.get('ASYNC_HEADER_TIMEOUT', 10))
+BODY_TIMEOUT = float(os.environ.get('ASYNC_BODY_TIMEOUT', 30))
+WRITE_TIMEOUT = float(os.environ.get('ASYNC_WRITE_TIMEOUT', 30))
+# 优雅退出时等待进行中请求完成的最长时间
+SHUTDOWN_GRACE = float(os.environ.get('ASYNC_SHUTDOWN_GRACE', 10))
+
+MAX_LINE_BYTES = 65536
+MAX_HEADER_BYTES = 64 * 1024
+MAX_HEADERS = 100
+MAX_BODY_BYTES = int(os.environ.get('ASYNC_MAX_BODY', 1024 * 1024))
+# 大响应按块写出，每块之后等待发送缓冲区排空，慢客户端不会让缓冲区无限增长
+STREAM_CHUNK_SIZE = 64 * 1024
+
+class RequestError(Exception):
+    """请求不合法，返回给定状态码后关闭连接"""
+    def __init__(self, status, reason):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+def error_response(status, reason):
+    """事件循环直接生成的错误响应（不经过WikiHandler）"""
+    body = f'{status} {reason}\n'.encode('utf-8')
+    return (f'HTTP/1.1 {status} {reason}\r\n'
+            f'Content-Type: text/plain; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: close\r\n\r\n').encode('latin-1') + body
+
+class BufferedWikiHandler(WikiHandler):
+    """
+    在工作线程中处理一个已完整读取的请求
+    请求由事件循环读取后放入内存缓冲区，响应同样写入缓冲区，再交回事件循环发送。
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def __init__(self, raw_request, client_address):
+        # 不调用BaseRequestHandler.__init__：这里没有socket，也不在构造时处理请求
+        self.rfile = io.BytesIO(raw_request)
+        self.wfile = io.BytesIO()
+        self.client_address = client_address
+        self.request = self.connection = self.server = None
+        self.directory = os.getcwd()
+        self.close_connection = True
+
+    def handle_expect_100(self):
+        # 100 Continue 已由事件循环在读取请求体之前发送
+        return True
+
+def handle_request(raw_request, client_address, force_close):
+    """工作线程入口：执行WikiHandler，返回 (响应字节, 是否关闭连接)"""
+    handler = BufferedWikiHandler(raw_request, client_address)
+    try:
+        handler.handle_one_request()
+    except Exception as e:
+        print(f"❌ 请求处理失败: {e}")
+        return error_response(500, 'Internal Server Error'), True
+    finally:
+        release_db()
+    response = handler.wfile.getvalue()
+    if not response:
+        return b'', True
+    close_connection = handler.close_connection or force_close
+    return add_content_length(response, close_connection), close_connection
+
+class AsyncWikiServer:
+    """asyncio streams 服务器：每个连接一个协程，请求处理交给线程池"""
+
+    def __init__(self, workers=ASYNC_WORKERS, max_connections=MAX_CONNECTIONS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='wiki-async')
+        self.max_connections = max_connections
+        # 限制同时排队等待线程池的请求数，请求洪峰时在事件循环中等待而不是堆积在线程池队列里
+        self.handler_slots = asyncio.Semaphore(workers * 4)
+        self.connections = {}
+        self.idle = set()
+        self.shutting_down = False
+        self.server = None
+        self.stopped = None
+
+    async def serve(self, host, port):
+        loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        self.server = await asyncio.start_server(
+            self.handle_connection, host, port,
+            limit=MAX_LINE_BYTES, backlog=1024, reuse_address=True
+        )
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.begin_shutdown)
+            except (NotImplementedError, RuntimeError):
+                pass
+        print(f"✅ 服务器启动成功（异步模式，{self.executor._max_workers} 个工作线程，"
+              f"最多 {self.max_connections} 个连接），监听端口 {port}")
+        await self.stopped.wait()
+        await self.shutdown()
+
+    def begin_shutdown(self):
+        if self.shutting_down:
+            return
+        print("\n🛑 收到停止信号，等待进行中的请求完成...")
+        self.shutting_down = True
+        self.stopped.set()
+
+    async def shutdown(self):
+        """停止接受新连接，关闭空闲连接，等待进行中的请求完成"""
+        self.server.close()
+        for writer in list(self.idle):
+            writer.close()
+        pending = list(self.connections.values())
+        if pending:
+            done, still_running = await asyncio.wait(pending, timeout=SHUTDOWN_GRACE)
+            for task in still_running:
+                task.cancel()
+            if still_running:
+                print(f"⚠️ {len(still_running)} 个连接未在 {SHUTDOWN_GRACE}s 内完成，已强制关闭")
+                await asyncio.wait(still_running)
+        await self.server.wait_closed()
+        await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown, True)
+        print("✅ ROS2 Wiki 服务器已停止")
+
+    async def handle_connection(self, reader, writer):
+        if len(self.connections) >= self.max_connections or self.shutting_down:
+            writer.write(error_response(503, 'Service Unavailable'))
+            await self.close_writer(writer)
+            return
+
+        self.connections[writer] = asyncio.current_task()
+        # 降低发送缓冲区高水位，drain() 能及时对慢客户端施加背压
+        writer.transport.set_write_buffer_limits(high=STREAM_CHUNK_SIZE * 2)
+        peer = writer.get_extra_info('peername') or ('', 0)
+        try:
+            while not self.shutting_down:
+                self.idle.add(writer)
+                try:
+                    raw_request = await self.read_request(reader, writer)
+                except RequestError as e:
+                    await self.send(writer, error_response(e.status, e.reason))
+                    break
+                finally:
+                    self.idle.discard(writer)
+                if raw_request is None:
+                    break
+
+                async with self.handler_slots:
+                    response, close_connection = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, handle_request, raw_request, peer[:2], self.shutting_down
+                    )
+                if response:
+                    await self.send(writer, response)
+                if close_connection:
+                    break
+        except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"❌ 连接处理异常: {e}")
+        finally:
+            self.connections.pop(writer, None)
+            await self.close_writer(writer)
+
+    async def read_request(self, reader, writer):
+        """
+        读取一个完整请求（请求行、请求头和请求体），返回原始字节
+        连接在空闲期间被关闭或超时返回None；请求不合法抛出RequestError
+        """
+        # 长连接等待下一个请求，超时后静默关闭
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+            # 请求之间允许出现多余的空行
+            while request_line in (b'\r\n', b'\n'):
+                request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+        except (asyncio.TimeoutError, ConnectionError):
+            return None
+        except ValueError:
+            raise RequestError(414, 'Request-URI Too Long')
+        if not request_line:
+            return None
+        self.idle.discard(writer)
+
+        # 请求头必须在HEADER_TIMEOUT内完整到达，防止慢速发送占用连接
+        header_lines = []
+        header_bytes = 0
+        try:
+            async with asyncio.timeout(HEADER_TIMEOUT):
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        raise ConnectionError('请求头未完整到达')
+                    if line in (b'\r\n', b'\n'):
+                        break
+                    header_bytes += len(line)
+                    header_lines.append(line)
+                    if header_bytes > MAX_HEADER_BYTES or len(header_lines) > MAX_HEADERS:
+                        raise RequestError(431, 'Request Header Fields Too Large')
+        except asyncio.TimeoutError:
+            raise RequestError(408, 'Request Timeout')
+        except ValueError:
+            raise RequestError(431, 'Request Header Fields Too Large')
+
+        content_length = 0
+        expect_continue = False
+        for line in header_lines:
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            value = value.strip()
+            if name == 'content-length':
+                if not value.isdigit():
+                    raise RequestError(400, 'Bad Request')
+                content_length = int(value)
+            elif name == 'transfer-encoding':
+                # WikiHandler只按Content-Length读取请求体
+                raise RequestError(411, 'Length Required')
+            elif name == 'expect' and value.lower() == '100-continue':
+                expect_continue = True
+        if content_length > MAX_BODY_BYTES:
+            raise RequestError(413, 'Payload Too Large')
+
+        body = b''
+        if content_length:
+            if expect_continue and request_line.rstrip().endswith(b'HTTP/1.1'):
+                await self.send(writer, b'HTTP/1.1 100 Continue\r\n\r\n')
+            try:
+                body = await asyncio.wait_for(reader.readexactly(content_length), BODY_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise RequestError(408, 'Request Timeout')
+
+        return request_line + b''.join(header_lines) + b'\r\n' + body
+
+    async def send(self, writer, response):
+        """分块写出响应，每块之后等待发送缓冲区排空"""
+        view = memoryview(response)
+        for start in range(0, len(view), STREAM_CHUNK_SIZE):
+            writer.write(view[start:start + STREAM_CHUNK_SIZE])
+            await asyncio.wait_for(writer.drain(), WRITE_TIMEOUT)
+
+    async def close_writer(self, writer):
+        try:
+            writer.close()
+            await asyncio.wait_for(writer.wait_closed(), 1)
+        except Exception:
+            pass
+
+def serve_async(port, host='0.0.0.0'):
+    """异步模式入口：SIGTERM/Ctrl+C时优雅退出"""
+    async def run():
+        await AsyncWikiServer().serve(host, port)
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n🛑 正在停止服务器...")
+
+def main():
+    init_db()
+    port = int(os.environ.get('PORT', 8000))
+    print("🚀 ROS2 Wiki 异步服务器启动中...")
+    print(f"📱 本地访问: http://localhost:{port}")
+    print("-" * 60)
+    serve_async(port)
+
+if __name__ == "__main__":
+    main()
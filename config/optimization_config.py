@@ -56,6 +56,39 @@ class OptimizationConfig:
         'CDN_DOMAIN': os.environ.get('CDN_DOMAIN', '')
     }
     
+    # 准入控制配置（app_blueprints/admission.py）
+    # 每个类别: max_concurrent 并发上限（None不限）、max_queue 最多排队数、
+    # queue_timeout 排队等待秒数、retry_after 拒绝时Retry-After的最小秒数。
+    # 耗时类别的并发上限之和应小于每个worker的线程数，为critical类别留出线程
+    ADMISSION_CONFIG = {
+        'ENABLED': os.environ.get('ADMISSION_CONTROL_ENABLED', 'true').lower() == 'true',
+        'DEFAULT_CLASS': 'default',
+        'CLASSES': {
+            'critical': {'max_concurrent': None},
+            'expensive': {
+                'max_concurrent': int(os.environ.get('ADMISSION_EXPENSIVE_CONCURRENCY', 2)),
+                'max_queue': int(os.environ.get('ADMISSION_EXPENSIVE_QUEUE', 2)),
+                'queue_timeout': float(os.environ.get('ADMISSION_EXPENSIVE_QUEUE_TIMEOUT', 2.0)),
+                'retry_after': 5
+            },
+            'default': {
+                'max_concurrent': int(os.environ.get('ADMISSION_DEFAULT_CONCURRENCY', 4)),
+                'max_queue': int(os.environ.get('ADMISSION_DEFAULT_QUEUE', 4)),
+                'queue_timeout': float(os.environ.get('ADMISSION_DEFAULT_QUEUE_TIMEOUT', 1.0)),
+                'retry_after': 2
+            }
+        },
+        # 按Flask endpoint分类（支持通配符），未列出的endpoint属于DEFAULT_CLASS
+        'ROUTES': {
+            'critical': ['login', 'logout', 'health', 'index', 'view_document', 'static'],
+            'expensive': [
+                'search', 'search.*', 'admin_dashboard',
+                'permissions.audit_logs', 'permissions.admin_activity',
+                'permissions.export_audit_logs', 'permissions.api_user_timeline'
+            ]
+        }
+    }
+    
     # 监控配置
     MONITORING_CONFIG = {
         'ENABLE_METRICS': True,
@@ -145,6 +178,7 @@ class OptimizationConfig:
             'CACHE': cls.CACHE_CONFIG,
             'SEARCH': cls.SEARCH_CONFIG,
             'PERFORMANCE': cls.PERFORMANCE_CONFIG,
+            'ADMISSION': cls.ADMISSION_CONFIG,
             'MONITORING': cls.MONITORING_CONFIG,
             'OAUTH': cls.OAUTH_CONFIG,
             'DOCUMENT': cls.DOCUMENT_CONFIG,
@@ -7,6 +7,7 @@
 import sqlite3
 import os
 from datetime import datetime
+from app_blueprints.fts_maintenance import FTSMaintenance
 
 class DatabaseOptimizer:
     """数据库优化器"""
@@ -44,33 +45,6 @@ class DatabaseOptimizer:
         CREATE INDEX IF NOT EXISTS idx_documents_category_created ON documents(category, created_at DESC);
         CREATE INDEX IF NOT EXISTS idx_documents_author_created ON documents(author_id, created_at DESC);
         
-        -- 全文搜索索引 (SQLite FTS)
-        CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
-            title, 
-            content, 
-            category,
-            content='documents',
-            content_rowid='id'
-        );
-        
-        -- FTS索引触发器
-        CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents BEGIN
-            INSERT INTO documents_fts(rowid, title, content, category) 
-            VALUES (new.id, new.title, new.content, new.category);
-        END;
-        
-        CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents BEGIN
-            INSERT INTO documents_fts(documents_fts, rowid, title, content, category) 
-            VALUES('delete', old.id, old.title, old.content, old.category);
-        END;
-        
-        CREATE TRIGGER IF NOT EXISTS documents_fts_update AFTER UPDATE ON documents BEGIN
-            INSERT INTO documents_fts(documents_fts, rowid, title, content, category) 
-            VALUES('delete', old.id, old.title, old.content, old.category);
-            INSERT INTO documents_fts(rowid, title, content, category) 
-            VALUES (new.id, new.title, new.content, new.category);
-        END;
-        
         -- 评论表索引（如果存在）
         CREATE INDEX IF NOT EXISTS idx_comments_document_id ON comments(document_id);
         CREATE INDEX IF NOT EXISTS idx_comments_user_id ON comments(user_id);
@@ -110,6 +84,13 @@ class DatabaseOptimizer:
                     except sqlite3.Error as e:
                         print(f"警告: {e}")
             
+            # 全文搜索索引 (SQLite FTS5) 及同步触发器
+            try:
+                FTSMaintenance(conn).create_index()
+                print("全文索引及触发器创建完成")
+            except sqlite3.Error as e:
+                print(f"警告: {e}")
+            
             conn.commit()
             print("索引创建完成！")
             
@@ -219,6 +200,26 @@ class DatabaseOptimizer:
             if conn:
                 conn.close()
 
+    def check_search_index(self):
+        """检查全文索引段数和大小"""
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_path)
+            status = FTSMaintenance(conn).status()
+            if not status['available']:
+                print("全文索引不存在")
+                return status
+            print(f"全文索引段数: {status['segments']} (层数 {status['levels']})")
+            print(f"全文索引大小: {status['size_bytes'] / 1024:.1f} KB")
+            if status['needs_merge']:
+                print("段数过多，建议执行增量合并")
+            return status
+        except sqlite3.Error as e:
+            print(f"检查全文索引失败: {e}")
+        finally:
+            if conn:
+                conn.close()
+
 def main():
     """主执行函数"""
     print("SuperClaude数据库优化工具启动...")
@@ -239,6 +240,7 @@ def main():
     
     # 检查索引状态
     optimizer.check_index_usage()
+    optimizer.check_search_index()
     
     print("数据库优化完成！")
 
@@ -11,15 +11,53 @@ import sqlite3
 import hashlib
 import os
 import re
+import io
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from http.cookies import SimpleCookie
 
-# 全局会话存储
-sessions = {}
+from app_blueprints.passwords import hash_password, verify_password
+from app_blueprints.session_store import SessionStore, read_session_id, session_cookie_header
+
+DB_PATH = 'simple_wiki.db'
+
+# 并发模式配置：工作线程数、等待队列长度、长连接空闲超时（秒）
+WORKER_THREADS = int(os.environ.get('SERVER_WORKERS', 16))
+MAX_PENDING_CONNECTIONS = int(os.environ.get('SERVER_MAX_PENDING', 64))
+KEEPALIVE_TIMEOUT = float(os.environ.get('KEEPALIVE_TIMEOUT', 5))
+
+_db_local = threading.local()
+_session_store = None
+_session_lock = threading.Lock()
+
+class ThreadLocalConnection(sqlite3.Connection):
+    """线程内复用的SQLite连接：close() 只回滚未提交的事务，不真正关闭"""
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+def get_db():
+    """获取当前线程的数据库连接（每个工作线程一个，跨请求复用）"""
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=30, factory=ThreadLocalConnection)
+        # WAL模式下读写互不阻塞，适合多线程并发
+        conn.execute('PRAGMA journal_mode=WAL')
+        _db_local.conn = conn
+    return conn
+
+def release_db():
+    """请求结束时调用，丢弃处理函数遗留的未提交事务"""
+    conn = getattr(_db_local, 'conn', None)
+    if conn is not None:
+        conn.close()
 
 def init_db():
     """初始化数据库"""
-    conn = sqlite3.connect('simple_wiki.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # 检查并更新现有表结构
@@ -41,8 +79,8 @@ def init_db():
     # 添加默认用户（如果不存在）
     cursor.execute('SELECT COUNT(*) FROM users WHERE username = "admin"')
     if cursor.fetchone()[0] == 0:
-        admin_hash = hashlib.sha256(('admin123' + 'salt').encode()).hexdigest()
-        user_hash = hashlib.sha256(('user123' + 'salt').encode()).hexdigest()
+        admin_hash = hash_password('admin123')
+        user_hash = hash_password('user123')
         
         cursor.execute('INSERT INTO users (username, email, password_hash, is_admin) VALUES (?, ?, ?, ?)',
                       ('admin', 'admin@ros2wiki.com', admin_hash, 1))
@@ -52,20 +90,26 @@ def init_db():
     conn.commit()
     conn.close()
 
+def get_session_store():
+    """会话存储（保存在 DB_PATH 的 sessions 表中，多个服务器进程共享），首次使用时创建"""
+    global _session_store
+    if _session_store is None:
+        with _session_lock:
+            if _session_store is None:
+                _session_store = SessionStore(DB_PATH)
+    return _session_store
+
 def get_session_user(handler):
     """获取当前会话用户"""
-    cookie_header = handler.headers.get('Cookie', '')
-    if 'session_id=' in cookie_header:
-        session_id = cookie_header.split('session_id=')[1].split(';')[0]
-        return sessions.get(session_id, {}).get('username')
-    return None
+    session_id = read_session_id(handler.headers.get('Cookie'))
+    return get_session_store().username(session_id) if session_id else None
 
 def is_admin_user(username):
     """检查用户是否为管理员"""
     if not username:
         return False
     
-    conn = sqlite3.connect('simple_wiki.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('SELECT is_admin FROM users WHERE username = ?', (username,))
     result = cursor.fetchone()
@@ -534,7 +578,7 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
         """检查数据库状态"""
         start_time = datetime.now()
         try:
-            conn = sqlite3.connect('simple_wiki.db')
+            conn = get_db()
             cursor = conn.cursor()
             
             # 检查连接
@@ -570,7 +614,7 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
     def get_system_stats(self):
         """获取系统统计数据"""
         try:
-            conn = sqlite3.connect('simple_wiki.db')
+            conn = get_db()
             cursor = conn.cursor()
             
             # 基础统计
@@ -625,14 +669,17 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
         
         # 检查数据库连接
         try:
-            conn = sqlite3.connect('simple_wiki.db')
+            conn = get_db()
             conn.close()
             features['数据库连接'] = True
         except:
             features['数据库连接'] = False
         
         # 检查会话管理
-        features['会话管理'] = len(sessions) >= 0
+        try:
+            features['会话管理'] = get_session_store().count() >= 0
+        except Exception:
+            features['会话管理'] = False
         
         # 检查Markdown渲染
         try:
@@ -705,7 +752,7 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
         comment_content = data.get('content', [''])[0]
         
         if comment_content:
-            conn = sqlite3.connect('simple_wiki.db')
+            conn = get_db()
             cursor = conn.cursor()
             cursor.execute('INSERT INTO comments (document_id, username, content) VALUES (?, ?, ?)',
                           (doc_id, current_user, comment_content))
@@ -721,7 +768,7 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
         """首页"""
         current_user = get_session_user(self)
         
-        conn = sqlite3.connect('simple_wiki.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT id, title, created_at FROM documents ORDER BY id DESC LIMIT 10')
         docs = cursor.fetchall()
@@ -965,7 +1012,7 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
         """文档详情页"""
         try:
             doc_id = int(doc_id)
-            conn = sqlite3.connect('simple_wiki.db')
+            conn = get_db()
             cursor = conn.cursor()
             cursor.execute('SELECT title, content, created_at FROM documents WHERE id = ?', (doc_id,))
             doc = cursor.fetchone()
@@ -1206,7 +1253,7 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
         
         documents = []
         if query:
-            conn = sqlite3.connect('simple_wiki.db')
+            conn = get_db()
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT id, title, content, created_at 
@@ -1421,22 +1468,26 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
         password = data.get('password', [''])[0]
         
         # 验证用户
-        conn = sqlite3.connect('simple_wiki.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT username, password_hash FROM users WHERE username = ?', (username,))
         user = cursor.fetchone()
+        
+        # 验证密码；旧的 sha256+固定salt 哈希或参数已变化的哈希在登录成功后升级
+        password_ok, new_hash = verify_password(user[1], password) if user else (False, None)
+        if password_ok and new_hash:
+            cursor.execute('UPDATE users SET password_hash = ? WHERE username = ?', (new_hash, username))
+            conn.commit()
         conn.close()
         
-        if user and hashlib.sha256((password + 'salt').encode()).hexdigest() == user[1]:
+        if password_ok:
             # 创建会话
-            import uuid
-            session_id = str(uuid.uuid4())
-            sessions[session_id] = {'username': username}
+            session_id = get_session_store().create(username)
             
             # 设置cookie并重定向
             self.send_response(302)
             self.send_header('Location', '/')
-            self.send_header('Set-Cookie', f'session_id={session_id}; Path=/; Max-Age=3600')
+            self.send_header('Set-Cookie', session_cookie_header(session_id))
             self.end_headers()
         else:
             # 登录失败，返回错误页面
@@ -1451,15 +1502,11 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
     
     def serve_logout(self):
         """登出处理"""
-        cookie_header = self.headers.get('Cookie', '')
-        if 'session_id=' in cookie_header:
-            session_id = cookie_header.split('session_id=')[1].split(';')[0]
-            if session_id in sessions:
-                del sessions[session_id]
+        get_session_store().delete(read_session_id(self.headers.get('Cookie')))
         
         self.send_response(302)
         self.send_header('Location', '/')
-        self.send_header('Set-Cookie', 'session_id=; Path=/; Max-Age=0')
+        self.send_header('Set-Cookie', session_cookie_header(None))
         self.end_headers()
     
     def serve_admin(self):
@@ -1471,7 +1518,7 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
             self.end_headers()
             return
         
-        conn = sqlite3.connect('simple_wiki.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         # 获取统计数据
@@ -1949,7 +1996,7 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
             return
         
         # 检查用户名是否存在
-        conn = sqlite3.connect('simple_wiki.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT COUNT(*) FROM users WHERE username = ?', (username,))
         if cursor.fetchone()[0] > 0:
@@ -1966,7 +2013,7 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
             return
         
         # 创建新用户
-        password_hash = hashlib.sha256((password + 'salt').encode()).hexdigest()
+        password_hash = hash_password(password)
         cursor.execute('INSERT INTO users (username, email, password_hash, is_admin) VALUES (?, ?, ?, ?)',
                       (username, email, password_hash, 0))
         conn.commit()
@@ -1993,7 +2040,7 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
         category = data.get('category', ['ROS2基础'])[0]
         
         if title and content:
-            conn = sqlite3.connect('simple_wiki.db')
+            conn = get_db()
             cursor = conn.cursor()
             cursor.execute('INSERT INTO documents (title, content, category) VALUES (?, ?, ?)',
                           (title, content, category))
@@ -2019,7 +2066,7 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
         comment_content = data.get('content', [''])[0]
         
         if comment_content:
-            conn = sqlite3.connect('simple_wiki.db')
+            conn = get_db()
             cursor = conn.cursor()
             cursor.execute('INSERT INTO comments (document_id, username, content) VALUES (?, ?, ?)',
                           (doc_id, current_user, comment_content))
@@ -2031,8 +2078,145 @@ class WikiHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Location', f'/doc/{doc_id}')
         self.end_headers()
 
+def add_content_length(response, close_connection):
+    """为缺少Content-Length的响应补齐该头（线程池模式与异步模式共用）"""
+    head, sep, body = response.partition(b'\r\n\r\n')
+    if not sep or b'\r\ncontent-length:' in head.lower():
+        return response
+    extra = f'\r\nContent-Length: {len(body)}'.encode('latin-1')
+    if close_connection:
+        extra += b'\r\nConnection: close'
+    return head + extra + sep + body
+
+class KeepAliveWikiHandler(WikiHandler):
+    """
+    HTTP/1.1长连接处理器
+    WikiHandler的响应大多不带Content-Length，这里把每个响应先写入缓冲区，
+    结束后补齐Content-Length再一次性发送，使同一连接可以继续处理后续请求。
+    """
+    protocol_version = 'HTTP/1.1'
+    # 连接空闲超过该时间即关闭，避免空闲长连接长期占用工作线程
+    timeout = KEEPALIVE_TIMEOUT
+
+    def setup(self):
+        super().setup()
+        self._socket_wfile = self.wfile
+
+    def handle_one_request(self):
+        # 等待下一个请求期间视为空闲连接，优雅退出时可以直接关闭
+        self.server.mark_idle(self.connection, True)
+        if self.server.shutting_down:
+            # 先登记再检查标志，与graceful_shutdown的顺序相反，两者必有一方能看到对方
+            self.server.mark_idle(self.connection, False)
+            self.close_connection = True
+            return
+        self.wfile = io.BytesIO()
+        try:
+            super().handle_one_request()
+        finally:
+            response = self.wfile.getvalue()
+            self.wfile = self._socket_wfile
+            release_db()
+            self.server.mark_idle(self.connection, False)
+        if self.server.shutting_down:
+            self.close_connection = True
+        if response:
+            self._socket_wfile.write(add_content_length(response, self.close_connection))
+            self._socket_wfile.flush()
+
+    def parse_request(self):
+        # 已读到请求行，连接不再空闲
+        self.server.mark_idle(self.connection, False)
+        return super().parse_request()
+
+class ThreadPoolHTTPServer(socketserver.TCPServer):
+    """
+    有界线程池HTTP服务器
+    连接交给固定数量的工作线程处理；排队连接超过上限时直接返回503，
+    避免无限制创建线程。shutdown后等待进行中的请求处理完毕。
+    """
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, max_workers=WORKER_THREADS,
+                 max_pending=MAX_PENDING_CONNECTIONS):
+        super().__init__(server_address, handler_class)
+        self.shutting_down = False
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='wiki-worker')
+        self.slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self.idle_connections = set()
+        self.idle_lock = threading.Lock()
+
+    def mark_idle(self, connection, idle):
+        """记录正在等待下一个请求的长连接"""
+        with self.idle_lock:
+            if idle:
+                self.idle_connections.add(connection)
+            else:
+                self.idle_connections.discard(connection)
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            self._reject(request)
+            return
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def _reject(self, request):
+        try:
+            request.sendall(b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n'
+                            b'Retry-After: 1\r\nConnection: close\r\n\r\n')
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def graceful_shutdown(self):
+        """停止接受新连接，已有长连接处理完当前请求后关闭"""
+        self.shutting_down = True
+        self.shutdown()
+        with self.idle_lock:
+            for connection in list(self.idle_connections):
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+def serve_threaded(port):
+    """并发模式：线程池 + HTTP/1.1长连接，SIGTERM/Ctrl+C时优雅退出"""
+    httpd = ThreadPoolHTTPServer(("0.0.0.0", port), KeepAliveWikiHandler)
+
+    def handle_sigterm(signum, frame):
+        print("\n🛑 收到停止信号，等待进行中的请求完成...")
+        # shutdown() 会阻塞到serve_forever退出，必须在其他线程中调用
+        threading.Thread(target=httpd.graceful_shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    print(f"✅ 服务器启动成功（并发模式，{WORKER_THREADS} 个工作线程），监听端口 {port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 正在停止服务器...")
+        httpd.shutting_down = True
+    finally:
+        httpd.server_close()
+        print("✅ ROS2 Wiki 服务器已停止")
+
 def main():
     init_db()
+    # 会话保存在数据库中，可以在nginx后面按不同PORT启动多个进程共享登录状态
+    get_session_store().purge()
     # 支持Render等云平台的环境变量端口
     PORT = int(os.environ.get('PORT', 8000))
     
@@ -2045,6 +2229,17 @@ def main():
     print(f"🛑 按 Ctrl+C 停止服务")
     print("-" * 60)
     
+    # 默认使用并发模式；SERVER_MODE=single 时使用原来的单线程服务器，
+    # SERVER_MODE=async 时使用asyncio服务器（适合大量空闲长连接）
+    server_mode = os.environ.get('SERVER_MODE', 'threaded')
+    if server_mode == 'async':
+        from async_server import serve_async
+        serve_async(PORT)
+        return
+    if server_mode != 'single':
+        serve_threaded(PORT)
+        return
+    
     # 创建服务器并设置端口重用
     class ReusableTCPServer(socketserver.TCPServer):
         allow_reuse_address = True
@@ -5,18 +5,25 @@
 """
 
 import os
+import re
 import json
 import hashlib
 import secrets
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
-from functools import wraps
+from functools import wraps, lru_cache
 from flask import request, jsonify, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import requests
 
+from app_blueprints.audit import get_file_pipeline, tail_lines, count_lines
+from app_blueprints.ratelimit import get_rate_limiter
+from app_blueprints.security_state import get_security_state, FAILED_LOGINS, THREAT_SCORES
+from app_blueprints.ip_blocklist import get_ip_blocklist, parse_network
+from app_blueprints.security_headers import install_security_headers
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,9 +33,10 @@ class SecurityManager:
     
     def __init__(self, app=None):
         self.app = app
-        self.failed_attempts = {}  # IP -> {'count': int, 'last_attempt': datetime}
-        self.blocked_ips = set()
-        self.rate_limits = {}  # IP -> {'requests': int, 'window_start': datetime}
+        # 登录失败计数和IP封禁保存在共享的安全状态存储中（各worker一致，自动过期）
+        self.state = get_security_state()
+        # 长期封禁的IP和网段（CIDR名单，来自情报文件和数据库）
+        self.blocklist = get_ip_blocklist()
         
         # 安全配置
         self.max_failed_attempts = 5
@@ -43,82 +51,70 @@ class SecurityManager:
         """初始化应用"""
         self.app = app
         
-        # 设置安全头
-        @app.after_request
-        def add_security_headers(response):
-            response.headers['X-Content-Type-Options'] = 'nosniff'
-            response.headers['X-Frame-Options'] = 'DENY'
-            response.headers['X-XSS-Protection'] = '1; mode=block'
-            response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
-            response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
-            response.headers['Content-Security-Policy'] = (
-                "default-src 'self'; "
-                "script-src 'self' 'unsafe-inline' https://cdnjs.cloudflare.com; "
-                "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
-                "font-src 'self' https://fonts.gstatic.com; "
-                "img-src 'self' data: https:; "
-                "connect-src 'self';"
-            )
-            return response
+        # 设置安全头（按路由预计算，与 SecurityMiddleware 共用同一实例）
+        self.security_headers = install_security_headers(app)
     
     def get_client_ip(self) -> str:
-        """获取客户端IP地址"""
-        if request.headers.get('X-Forwarded-For'):
-            return request.headers['X-Forwarded-For'].split(',')[0].strip()
-        elif request.headers.get('X-Real-IP'):
-            return request.headers['X-Real-IP']
-        else:
-            return request.remote_addr
+        """获取客户端IP地址（直接读WSGI environ，比逐个查找请求头快）"""
+        environ = request.environ
+        forwarded = environ.get('HTTP_X_FORWARDED_FOR')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+        return environ.get('HTTP_X_REAL_IP') or environ.get('REMOTE_ADDR')
     
     def is_ip_blocked(self, ip: str) -> bool:
-        """检查IP是否被封禁"""
-        if ip in self.blocked_ips:
-            return True
-        
-        # 检查失败尝试次数
-        if ip in self.failed_attempts:
-            attempt_data = self.failed_attempts[ip]
-            if attempt_data['count'] >= self.max_failed_attempts:
-                time_diff = datetime.now() - attempt_data['last_attempt']
-                if time_diff < self.lockout_duration:
-                    return True
-                else:
-                    # 解锁
-                    del self.failed_attempts[ip]
-        
-        return False
+        """检查IP是否被封禁：落在封禁名单的网段内，或有未到期的临时封禁（登录失败锁定等）"""
+        return self.blocklist.is_blocked(ip) or self.state.is_blocked(ip)
     
     def record_failed_attempt(self, ip: str):
-        """记录失败尝试"""
-        if ip not in self.failed_attempts:
-            self.failed_attempts[ip] = {'count': 0, 'last_attempt': datetime.now()}
-        
-        self.failed_attempts[ip]['count'] += 1
-        self.failed_attempts[ip]['last_attempt'] = datetime.now()
-        
-        logger.warning(f"登录失败记录: IP {ip}, 失败次数: {self.failed_attempts[ip]['count']}")
+        """记录失败尝试，锁定时间窗口内失败次数达到上限时封禁该IP"""
+        lockout_seconds = self.lockout_duration.total_seconds()
+        failures = self.state.incr(FAILED_LOGINS, ip, 1, window=lockout_seconds)
+        
+        logger.warning(f"登录失败记录: IP {ip}, 失败次数: {failures:.1f}")
+        if failures >= self.max_failed_attempts:
+            self.state.block(ip, lockout_seconds, reason='登录失败次数过多')
+            logger.warning(f"封禁IP: {ip}, 原因: 登录失败次数过多")
+    
+    def block_ip(self, ip: str, seconds: float = None, reason: str = None, created_by: str = None) -> str:
+        """
+        封禁IP或网段：指定seconds时为单个IP的临时封禁（到期自动解除），
+        否则写入封禁名单长期生效；返回规范化后的IP/CIDR，无效时抛出 ValueError
+        """
+        network = parse_network(ip)
+        if network is None:
+            raise ValueError(f'无效的IP或网段: {ip}')
+        if seconds is None:
+            cidr = self.blocklist.add(network, reason, created_by=created_by)
+        else:
+            if network.num_addresses != 1:
+                raise ValueError('临时封禁只支持单个IP，网段请使用长期封禁')
+            cidr = str(network.network_address)
+            self.state.block(cidr, seconds, reason)
+        logger.warning(f"封禁IP: {cidr}, 原因: {reason}")
+        return cidr
+    
+    def unblock_ip(self, ip: str) -> bool:
+        """解除临时封禁和名单中的同名条目，并清空登录失败计数"""
+        self.state.reset(FAILED_LOGINS, ip)
+        unblocked = self.state.unblock(ip)
+        return self.blocklist.remove(ip) or unblocked
+    
+    def security_stats(self) -> Dict:
+        """封禁数量和各类计数器数量"""
+        stats = self.state.stats()
+        return {
+            'blocked_ips': stats['blocked'],
+            'failed_attempts': stats['counters'].get(FAILED_LOGINS, 0),
+            'threat_scores': stats['counters'].get(THREAT_SCORES, 0),
+            'storage': stats['storage'],
+            'blocklist': self.blocklist.status()
+        }
     
     def check_rate_limit(self, ip: str) -> bool:
-        """检查速率限制"""
-        now = datetime.now()
-        
-        if ip not in self.rate_limits:
-            self.rate_limits[ip] = {'requests': 1, 'window_start': now}
-            return True
-        
-        rate_data = self.rate_limits[ip]
-        time_diff = now - rate_data['window_start']
-        
-        if time_diff >= self.rate_limit_window:
-            # 重置窗口
-            self.rate_limits[ip] = {'requests': 1, 'window_start': now}
-            return True
-        
-        if rate_data['requests'] >= self.max_requests_per_minute:
-            return False
-        
-        rate_data['requests'] += 1
-        return True
+        """检查速率限制（GCRA，计数保存在共享的限流引擎中，各worker共用同一限额）"""
+        return get_rate_limiter().is_allowed(
+            f'global:{ip}', self.max_requests_per_minute, self.rate_limit_window.total_seconds())
     
     def generate_secure_token(self, payload: Dict, expires_delta: timedelta = None) -> str:
         """生成安全Token"""
@@ -145,93 +141,154 @@ class SecurityManager:
             logger.warning("无效Token")
             return None
 
+# 威胁检测规则：(规则名, 正则, 必须出现的小写字面量)。
+# 字面量用于预筛选：值中不含任何字面量时不需要执行正则（绝大多数正常请求）
+THREAT_RULES = [
+    ('xss', r'<script[^>]*>.*?</script>', '<script'),
+    ('sql_union', r'union.*select', 'union'),
+    ('sql_drop', r'drop\s+table', 'drop'),
+    ('sql_insert', r'insert\s+into', 'insert'),
+    ('sql_update', r'update.*set', 'update'),
+    ('path_traversal', r'\.\.[/\\]\.\.[/\\]\.\.[/\\]', '..'),
+    ('code_eval', r'eval\s*\(', 'eval'),
+    ('code_exec', r'exec\s*\(', 'exec'),
+]
+SUSPICIOUS_AGENTS = ['python-requests', 'curl', 'wget', 'scanner', 'bot', 'crawler']
+
+# 威胁分数的衰减窗口（秒）：分数按滑动窗口累计，窗口过后逐渐清零
+THREAT_SCORE_WINDOW = int(os.environ.get('THREAT_SCORE_WINDOW', 3600))
+# 每个请求最多扫描的字符数（参数、表单、JSON字符串合计），超出部分不扫描
+THREAT_SCAN_BUDGET = int(os.environ.get('THREAT_SCAN_BUDGET', 8192))
+# 扫描结果缓存条数（重复出现的相同值直接返回结果）
+THREAT_SCAN_CACHE_SIZE = int(os.environ.get('THREAT_SCAN_CACHE_SIZE', 8192))
+# 只缓存不超过该长度的值：重复出现的多是短参数，长值每次直接扫描，
+# 缓存不会保存攻击者构造的大字符串（最多占用 缓存条数 × 该长度）
+THREAT_SCAN_CACHE_MAX_LENGTH = int(os.environ.get('THREAT_SCAN_CACHE_MAX_LENGTH', 256))
+
+# 所有规则编译为一个带命名分组的交替正则，一次扫描得到命中的规则
+_THREAT_REGEX = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern, _ in THREAT_RULES), re.IGNORECASE)
+_THREAT_LITERALS = tuple(literal for _, _, literal in THREAT_RULES)
+_AGENT_REGEX = re.compile('|'.join(re.escape(agent) for agent in SUSPICIOUS_AGENTS), re.IGNORECASE)
+
+
+def _scan_value(text: str) -> Optional[str]:
+    lowered = text.lower()
+    if not any(literal in lowered for literal in _THREAT_LITERALS):
+        return None
+    match = _THREAT_REGEX.search(text)
+    return match.lastgroup if match else None
+
+
+_scan_short_value = lru_cache(maxsize=THREAT_SCAN_CACHE_SIZE)(_scan_value)
+
+
+def scan_threat_value(text: str) -> Optional[str]:
+    """扫描单个值，返回命中的规则名或None（调用方负责按预算截断；只有短值使用缓存）"""
+    if len(text) <= THREAT_SCAN_CACHE_MAX_LENGTH:
+        return _scan_short_value(text)
+    return _scan_value(text)
+
+
+scan_threat_value.cache_info = _scan_short_value.cache_info
+scan_threat_value.cache_clear = _scan_short_value.cache_clear
+
+
+@lru_cache(maxsize=1024)
+def is_suspicious_agent(user_agent: str) -> bool:
+    return _AGENT_REGEX.search(user_agent) is not None
+
+
+def iter_json_strings(data):
+    """按深度优先顺序产生JSON中的字符串（含对象的键），不序列化整个请求体"""
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            yield item
+        elif isinstance(item, dict):
+            for key, value in item.items():
+                yield str(key)
+                stack.append(value)
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+
+
 class ThreatDetector:
     """威胁检测器"""
     
-    def __init__(self):
-        self.suspicious_patterns = [
-            r'<script[^>]*>.*?</script>',  # XSS
-            r'union.*select',  # SQL注入
-            r'drop\s+table',  # SQL删除
-            r'insert\s+into',  # SQL插入
-            r'update.*set',  # SQL更新
-            r'../../../',  # 路径遍历
-            r'eval\s*\(',  # 代码注入
-            r'exec\s*\(',  # 命令注入
-        ]
-        
-        self.threat_scores = {}  # IP -> score
+    def __init__(self, scan_budget: int = None):
+        self.suspicious_patterns = [pattern for _, pattern, _ in THREAT_RULES]
+        self.scan_budget = THREAT_SCAN_BUDGET if scan_budget is None else scan_budget
+        # IP的累计威胁分数保存在共享的安全状态存储中，按 THREAT_SCORE_WINDOW 衰减
+        self.state = get_security_state()
         
     def analyze_request(self, ip: str) -> Dict[str, any]:
-        """分析请求威胁"""
+        """分析请求威胁（参数、表单和JSON共享同一个扫描预算）"""
         threat_score = 0
         threats = []
+        budget = self.scan_budget
+        # 取出实际的请求对象，避免每次访问都经过上下文代理
+        req = request._get_current_object()
         
         # 检查请求参数
-        for param_name, param_value in request.args.items():
-            if self._contains_suspicious_pattern(param_value):
+        for param_name, param_value in req.args.items(multi=True):
+            if budget <= 0:
+                break
+            if scan_threat_value(param_value[:budget]):
                 threat_score += 50
                 threats.append(f"可疑参数: {param_name}")
+            budget -= len(param_value)
         
         # 检查POST数据
-        if request.method == 'POST':
+        if req.method == 'POST' and budget > 0:
             try:
-                if request.is_json:
-                    data = request.get_json()
-                    if data:
-                        data_str = json.dumps(data)
-                        if self._contains_suspicious_pattern(data_str):
+                if req.is_json:
+                    data = req.get_json(silent=True)
+                    for value in iter_json_strings(data):
+                        if budget <= 0:
+                            break
+                        if scan_threat_value(value[:budget]):
                             threat_score += 60
                             threats.append("可疑JSON数据")
+                            break
+                        budget -= len(value)
                 else:
-                    for field_name, field_value in request.form.items():
-                        if self._contains_suspicious_pattern(field_value):
+                    for field_name, field_value in req.form.items(multi=True):
+                        if budget <= 0:
+                            break
+                        if scan_threat_value(field_value[:budget]):
                             threat_score += 40
                             threats.append(f"可疑表单字段: {field_name}")
+                        budget -= len(field_value)
             except Exception as e:
                 logger.error(f"分析POST数据失败: {e}")
         
         # 检查User-Agent
-        user_agent = request.headers.get('User-Agent', '')
+        user_agent = req.environ.get('HTTP_USER_AGENT', '')
         if self._is_suspicious_user_agent(user_agent):
             threat_score += 30
             threats.append("可疑User-Agent")
         
-        # 更新威胁分数
-        if ip not in self.threat_scores:
-            self.threat_scores[ip] = 0
-        self.threat_scores[ip] += threat_score
+        # 更新威胁分数（正常请求只读取，不产生写入）
+        if threat_score:
+            total_score = self.state.incr(THREAT_SCORES, ip, threat_score, window=THREAT_SCORE_WINDOW)
+        else:
+            total_score = self.state.count(THREAT_SCORES, ip, window=THREAT_SCORE_WINDOW)
         
         return {
             'threat_score': threat_score,
-            'total_score': self.threat_scores[ip],
+            'total_score': round(total_score, 1),
             'threats': threats,
             'risk_level': self._get_risk_level(threat_score)
         }
     
     def _contains_suspicious_pattern(self, text: str) -> bool:
         """检查文本是否包含可疑模式"""
-        import re
-        text_lower = text.lower()
-        
-        for pattern in self.suspicious_patterns:
-            if re.search(pattern, text_lower, re.IGNORECASE):
-                return True
-        return False
+        return scan_threat_value(text[:self.scan_budget]) is not None
     
     def _is_suspicious_user_agent(self, user_agent: str) -> bool:
         """检查是否为可疑User-Agent"""
-        suspicious_agents = [
-            'python-requests',
-            'curl',
-            'wget',
-            'scanner',
-            'bot',
-            'crawler'
-        ]
-        
-        user_agent_lower = user_agent.lower()
-        return any(agent in user_agent_lower for agent in suspicious_agents)
+        return is_suspicious_agent(user_agent[:512])
     
     def _get_risk_level(self, score: int) -> str:
         """根据分数获取风险等级"""
@@ -328,12 +385,9 @@ class OAuth2Provider:
 
 # 装饰器
 def require_security_check(f):
-    """安全检查装饰器"""
+    """安全检查装饰器（使用模块级的 security_manager 和 threat_detector，封禁和威胁分数跨请求保留）"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        security_manager = SecurityManager()
-        threat_detector = ThreatDetector()
-        
         client_ip = security_manager.get_client_ip()
         
         # 检查IP封禁
@@ -377,30 +431,45 @@ def require_api_key(f):
     return decorated_function
 
 class SecurityAuditLog:
-    """安全审计日志"""
+    """安全审计日志
+    
+    事件进入有界队列，由后台线程批量追加到日志文件（fsync策略和轮转见 app_blueprints.audit），
+    请求线程不再同步写文件。
+    """
     
     def __init__(self, log_file: str = 'security_audit.log'):
         self.log_file = log_file
-        self.logger = logging.getLogger('security_audit')
-        handler = logging.FileHandler(log_file)
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
-        self.logger.setLevel(logging.INFO)
+        self.pipeline = get_file_pipeline(log_file)
     
     def log_event(self, event_type: str, details: Dict, ip: str = None, user_id: str = None):
         """记录安全事件"""
         ip = ip or (request.remote_addr if request else 'unknown')
         
+        now = datetime.now()
         event_data = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': now.isoformat(),
             'event_type': event_type,
             'ip': ip,
             'user_id': user_id,
             'details': details
         }
         
-        self.logger.info(json.dumps(event_data, ensure_ascii=False))
+        # 保持原 logging.Formatter 的行格式: asctime - levelname - message
+        asctime = now.strftime('%Y-%m-%d %H:%M:%S') + f',{now.microsecond // 1000:03d}'
+        self.pipeline.submit(f"{asctime} - INFO - {json.dumps(event_data, ensure_ascii=False)}")
+    
+    def flush(self, timeout: float = 5.0) -> bool:
+        """等待已记录的事件写入文件"""
+        return self.pipeline.flush(timeout)
+    
+    def tail(self, count: int = 100) -> List[str]:
+        """最近count条事件（从文件末尾读取）"""
+        self.flush(timeout=1.0)
+        return tail_lines(self.log_file, count)
+    
+    def count(self) -> int:
+        """日志文件中的事件总数（当前文件，不含已轮转的文件）"""
+        return count_lines(self.log_file)
     
     def log_login_attempt(self, username: str, success: bool, ip: str = None):
         """记录登录尝试"""
@@ -285,7 +285,8 @@ class DocumentCache:
         """清除文档相关缓存"""
         patterns = [
             'documents:list*',
-            'documents:categories*'
+            'documents:categories*',
+            'search:facets*'
         ]
         
         if doc_id:
@@ -6,7 +6,7 @@
 
 import os
 import logging
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from . import (
     cache_manager,
     security_manager,
@@ -96,33 +96,107 @@ def register_security_routes(app: Flask):
     @app.route('/api/security/block', methods=['POST'])
     @require_api_key
     def block_ip():
-        """封禁IP"""
-        data = request.get_json()
+        """封禁IP或网段（CIDR）；指定seconds时为单个IP的临时封禁"""
+        data = request.get_json(silent=True) or {}
         ip = data.get('ip')
         
         if not ip:
             return jsonify({'error': '缺少IP地址'}), 400
         
-        security_manager.blocked_ips.add(ip)
-        audit_log.log_event('ip_blocked', {'ip': ip, 'admin': 'api'})
+        try:
+            blocked = security_manager.block_ip(ip, data.get('seconds'), reason=data.get('reason', 'api'),
+                                                created_by='api')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        audit_log.log_event('ip_blocked', {'ip': blocked, 'seconds': data.get('seconds'), 'admin': 'api'})
+        
+        return jsonify({'success': True, 'blocked_ip': blocked})
+    
+    @app.route('/api/security/unblock', methods=['POST'])
+    @require_api_key
+    def unblock_ip():
+        """解除IP或网段的封禁"""
+        data = request.get_json(silent=True) or {}
+        ip = data.get('ip')
+        
+        if not ip:
+            return jsonify({'error': '缺少IP地址'}), 400
+        
+        unblocked = security_manager.unblock_ip(ip)
+        audit_log.log_event('ip_unblocked', {'ip': ip, 'admin': 'api'})
+        
+        return jsonify({'success': unblocked, 'unblocked_ip': ip})
+    
+    @app.route('/api/security/blocklist', methods=['GET'])
+    @require_api_key
+    def export_blocklist():
+        """导出封禁名单（format=text 为名单文件格式，可按 source 过滤）"""
+        blocklist = security_manager.blocklist
+        source = request.args.get('source')
+        if request.args.get('format') == 'text':
+            return Response(blocklist.export_text(source), mimetype='text/plain',
+                            headers={'Content-Disposition': 'attachment; filename=ip_blocklist.txt'})
+        return jsonify({'entries': blocklist.export(source), 'status': blocklist.status()})
+    
+    @app.route('/api/security/blocklist/import', methods=['POST'])
+    @require_api_key
+    def import_blocklist():
+        """
+        批量导入封禁名单：上传文件（file字段）、text/plain请求体，
+        或JSON {"entries": ["1.2.3.0/24", ...] 或 [{"cidr", "reason"}], "text": "..."}；
+        replace=true 时先删除同一来源（source，默认import）的旧条目
+        """
+        data = request.get_json(silent=True) or {}
+        source = data.get('source') or request.values.get('source') or 'import'
+        replace = str(data.get('replace', request.values.get('replace', ''))).lower() in ('1', 'true', 'yes')
+        blocklist = security_manager.blocklist
         
-        return jsonify({'success': True, 'blocked_ip': ip})
+        try:
+            if 'file' in request.files:
+                text = request.files['file'].read().decode('utf-8', errors='replace')
+                result = blocklist.import_text(text, source=source, replace=replace, created_by='api')
+            elif data.get('entries') is not None:
+                entries = [(item.get('cidr'), item.get('reason')) if isinstance(item, dict) else (item, None)
+                           for item in data['entries']]
+                result = blocklist.import_entries(entries, source=source, replace=replace, created_by='api')
+            else:
+                text = data.get('text') if data else request.get_data(as_text=True)
+                result = blocklist.import_text(text or '', source=source, replace=replace, created_by='api')
+        except (ValueError, RuntimeError) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        audit_log.log_event('blocklist_imported', {'source': source, 'replace': replace,
+                                                   'imported': result['imported'], 'removed': result['removed']})
+        return jsonify({
+            'success': True,
+            'imported': result['imported'],
+            'removed': result['removed'],
+            'invalid': result['invalid'][:100],
+            'invalid_count': len(result['invalid'])
+        })
+    
+    @app.route('/api/security/blocklist/check')
+    @require_api_key
+    def check_blocklist():
+        """查询IP是否被封禁以及命中的名单条目"""
+        ip = request.args.get('ip') or security_manager.get_client_ip()
+        return jsonify({
+            'ip': ip,
+            'blocked': security_manager.is_ip_blocked(ip),
+            'blocklist_matches': security_manager.blocklist.match(ip),
+            'blocked_until': security_manager.state.blocked_until(ip)
+        })
     
     @app.route('/api/security/audit', methods=['GET'])
     @require_api_key
     def security_audit():
-        """获取安全审计日志"""
-        try:
-            with open('security_audit.log', 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                recent_logs = lines[-100:]  # 最近100条
-            
-            return jsonify({
-                'logs': [line.strip() for line in recent_logs],
-                'total_count': len(lines)
-            })
-        except FileNotFoundError:
-            return jsonify({'logs': [], 'total_count': 0})
+        """获取安全审计日志（最近N条，默认100，最多1000）"""
+        limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+        return jsonify({
+            'logs': audit_log.tail(limit),
+            'total_count': audit_log.count(),
+            'pipeline': audit_log.pipeline.status()
+        })
 
 def register_oauth_routes(app: Flask):
     """注册OAuth路由"""
@@ -225,10 +299,11 @@ def register_monitoring_routes(app: Flask):
             cache_stats = cache_manager.get_stats()
             
             # 威胁检测统计
+            state_stats = security_manager.security_stats()
             threat_stats = {
-                'active_threats': len(threat_detector.threat_scores),
-                'blocked_ips': len(security_manager.blocked_ips),
-                'failed_attempts': len(security_manager.failed_attempts)
+                'active_threats': state_stats['threat_scores'],
+                'blocked_ips': state_stats['blocked_ips'],
+                'failed_attempts': state_stats['failed_attempts']
             }
             
             return jsonify({
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+权限判断基准测试
+模拟管理员用户列表页：对每一行判断可执行的操作。对比逐行查询目标用户、按ID批量检查（一次IN查询）
+和直接使用已查出的用户行（不查询），统计耗时和数据库查询次数。
+使用方法: python scripts/benchmark_authz.py --users 5000 --rows 500
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+
+from app_blueprints.authz import Authorizer, USER_ROW_PERMISSIONS, decide
+from app_blueprints.principal_cache import PrincipalCache, create_version_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='权限判断基准测试')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--rows', type=int, default=500)
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    path = os.path.join(temp_dir, 'authz.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, email TEXT, '
+                 'is_admin BOOLEAN, is_blacklisted BOOLEAN)')
+    conn.executemany('INSERT INTO users VALUES (?, ?, ?, ?, ?)',
+                     [(i, f'user{i}', f'user{i}@example.com', i % 50 == 1, i % 17 == 0)
+                      for i in range(1, args.users + 1)])
+    conn.commit()
+    conn.close()
+
+    queries = {'count': 0}
+
+    def load_one(user_id):
+        queries['count'] += 1
+        with sqlite3.connect(path) as db:
+            return db.execute('SELECT id, username, email, is_admin, is_blacklisted FROM users WHERE id = ?',
+                              (int(user_id),)).fetchone()
+
+    def load_many(user_ids):
+        queries['count'] += 1
+        with sqlite3.connect(path) as db:
+            return db.execute('SELECT id, username, email, is_admin, is_blacklisted FROM users '
+                              f'WHERE id IN ({",".join("?" * len(user_ids))})', [int(i) for i in user_ids]).fetchall()
+
+    with sqlite3.connect(path) as db:
+        rows = [dict(zip(('id', 'username', 'email', 'is_admin', 'is_blacklisted'), row)) for row in
+                db.execute('SELECT id, username, email, is_admin, is_blacklisted FROM users LIMIT ?', (args.rows,))]
+    ids = [row['id'] for row in rows]
+    admin = rows[0]
+
+    app = Flask(__name__)
+    store_uri = 'sqlite:///' + os.path.join(temp_dir, 'versions.db')
+
+    def run(label, func):
+        decide.cache_clear()
+        queries['count'] = 0
+        with app.test_request_context('/admin/users/'):
+            started = time.perf_counter()
+            result = func()
+            elapsed = (time.perf_counter() - started) * 1000
+        print(f"{label:<30} {elapsed:9.2f} ms  查询 {queries['count']:4d} 次")
+        return result
+
+    print(f"{args.users} 个用户，列表页 {args.rows} 行，每行 {len(USER_ROW_PERMISSIONS)} 种操作")
+    authorizer = Authorizer(PrincipalCache(load_one, store=create_version_store(store_uri)))
+    per_row = run('逐行检查（缓存为空）', lambda: {
+        str(user_id): {permission: authorizer.check(permission, user_id, user=admin)
+                       for permission in USER_ROW_PERMISSIONS} for user_id in ids})
+    run('逐行检查（缓存已预热）', lambda: [authorizer.check(permission, user_id, user=admin)
+                                 for user_id in ids for permission in USER_ROW_PERMISSIONS])
+
+    authorizer = Authorizer(PrincipalCache(load_one, store=create_version_store(store_uri), batch_loader=load_many))
+    by_id = run('按ID批量检查（缓存为空）', lambda: authorizer.check_many(USER_ROW_PERMISSIONS, ids, user=admin))
+    run('按ID批量检查（缓存已预热）', lambda: authorizer.check_many(USER_ROW_PERMISSIONS, ids, user=admin))
+    by_row = run('使用已查出的用户行', lambda: authorizer.check_many(USER_ROW_PERMISSIONS, rows, user=admin))
+    print(f"三种方式结果一致: {per_row == by_id == by_row}")
+
+
+if __name__ == '__main__':
+    main()
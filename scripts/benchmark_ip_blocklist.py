@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+IP封禁名单基准测试
+生成数千条随机IPv4/IPv6网段，测量区间表二分查找的单次判断耗时，并与逐条比较网段的线性扫描对比；
+同时检查两种方式的判断结果一致。
+使用方法: python scripts/benchmark_ip_blocklist.py --networks 5000 --lookups 200000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import ipaddress
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app_blueprints.ip_blocklist import IPBlocklist
+
+
+def random_networks(count, rng):
+    """约80%为IPv4网段（/16-/32），其余为IPv6网段（/32-/64）"""
+    lines = []
+    for _ in range(count):
+        if rng.random() < 0.8:
+            prefix = rng.randint(16, 32)
+            address = ipaddress.IPv4Address(rng.getrandbits(32))
+            lines.append(str(ipaddress.ip_network(f'{address}/{prefix}', strict=False)))
+        else:
+            prefix = rng.randint(32, 64)
+            address = ipaddress.IPv6Address(0x2001 << 112 | rng.getrandbits(112))
+            lines.append(str(ipaddress.ip_network(f'{address}/{prefix}', strict=False)))
+    return lines
+
+
+def random_ips(count, rng):
+    ips = []
+    for _ in range(count):
+        if rng.random() < 0.8:
+            ips.append(str(ipaddress.IPv4Address(rng.getrandbits(32))))
+        else:
+            ips.append(str(ipaddress.IPv6Address(0x2001 << 112 | rng.getrandbits(112))))
+    return ips
+
+
+def main():
+    parser = argparse.ArgumentParser(description='IP封禁名单基准测试')
+    parser.add_argument('--networks', type=int, default=5000)
+    parser.add_argument('--lookups', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    lines = random_networks(args.networks, rng)
+    ips = random_ips(args.lookups, rng)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'blocklist.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        blocklist = IPBlocklist(None, path=path)
+
+        started = time.perf_counter()
+        blocklist.reload(force=True)
+        print(f"加载 {args.networks} 条网段: {(time.perf_counter() - started) * 1000:.1f} ms，{blocklist.status()}")
+
+        started = time.perf_counter()
+        results = [blocklist.is_blocked(ip) for ip in ips]
+        elapsed = time.perf_counter() - started
+        print(f"区间表二分查找: {elapsed / len(ips) * 1e6:.2f} us/次，命中 {sum(results)} 次")
+
+        networks = [ipaddress.ip_network(line) for line in lines]
+        sample = ips[:min(len(ips), 200)]
+        started = time.perf_counter()
+        linear = [any(ipaddress.ip_address(ip) in network for network in networks) for ip in sample]
+        elapsed = time.perf_counter() - started
+        print(f"逐条比较网段:   {elapsed / len(sample) * 1e6:.2f} us/次（{len(sample)} 次抽样）")
+        mismatches = sum(1 for a, b in zip(results, linear) if a != b)
+        print(f"结果不一致: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
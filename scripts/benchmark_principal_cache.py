@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+用户主体缓存基准测试
+模拟已登录请求的 load_user：对比每次新建连接执行 SELECT * 的旧实现，与按版本号命中缓存的耗时；
+并检查拉黑（版本号加一）后下一次读取立即得到新状态。
+使用方法: python scripts/benchmark_principal_cache.py --users 2000 --requests 20000 [--database-url postgresql://...]
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app_blueprints.principal_cache import PrincipalCache, create_version_store
+
+try:
+    import psycopg2
+    HAS_POSTGRESQL = True
+except ImportError:
+    HAS_POSTGRESQL = False
+
+
+def prepare_database(connect, placeholder, users):
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute('DROP TABLE IF EXISTS bench_users')
+    cursor.execute('''
+        CREATE TABLE bench_users (
+            id INTEGER PRIMARY KEY, username TEXT, email TEXT, password_hash TEXT,
+            is_admin BOOLEAN DEFAULT FALSE, is_blacklisted BOOLEAN DEFAULT FALSE,
+            blacklisted_at TIMESTAMP NULL, blacklist_reason TEXT NULL, last_seen TIMESTAMP NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.executemany(
+        f'INSERT INTO bench_users (id, username, email, password_hash, is_admin) '
+        f'VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})',
+        [(i, f'user{i}', f'user{i}@example.com', 'pbkdf2:sha256:600000$' + 'x' * 80, i % 50 == 0)
+         for i in range(1, users + 1)])
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用户主体缓存基准测试')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--database-url', help='PostgreSQL地址，默认使用临时SQLite文件')
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    temp_dir = tempfile.mkdtemp()
+    if args.database_url and HAS_POSTGRESQL:
+        connect = lambda: psycopg2.connect(args.database_url)
+        placeholder = '%s'
+    else:
+        path = os.path.join(temp_dir, 'bench.db')
+        connect = lambda: sqlite3.connect(path)
+        placeholder = '?'
+    prepare_database(connect, placeholder, args.users)
+
+    def legacy_load(user_id):
+        """旧实现：新建连接，SELECT *，按位置取字段"""
+        conn = connect()
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT * FROM bench_users WHERE id = {placeholder}', (user_id,))
+        user = cursor.fetchone()
+        conn.close()
+        return user
+
+    def load_principal(user_id):
+        conn = connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT id, username, email, is_admin, is_blacklisted FROM bench_users '
+                           f'WHERE id = {placeholder}', (int(user_id),))
+            return cursor.fetchone()
+        finally:
+            conn.close()
+
+    # 活跃用户集中在少数账号上（会话反复请求）
+    active = [rng.randint(1, args.users) for _ in range(max(1, args.users // 10))]
+    workload = [rng.choice(active) for _ in range(args.requests)]
+
+    def measure(label, load):
+        started = time.perf_counter()
+        for user_id in workload:
+            load(user_id)
+        per_request = (time.perf_counter() - started) / len(workload) * 1e6
+        print(f"{label:<28} {per_request:9.2f} us/请求")
+        return per_request
+
+    print(f"{args.users} 个用户，{len(set(workload))} 个活跃用户，{len(workload)} 次请求，"
+          f"数据库 {'PostgreSQL' if placeholder == '%s' else 'SQLite'}")
+    legacy = measure('旧实现 (SELECT *)', legacy_load)
+    for uri in ('memory://', 'sqlite:///' + os.path.join(temp_dir, 'versions.db')):
+        store = create_version_store(uri)
+        cache = PrincipalCache(load_principal, store=store)
+        cached = measure(f'主体缓存 ({store.name})', cache.get)
+        print(f"{'':<28} 每请求节省 {legacy - cached:.2f} us，{cache.status()}")
+
+        # 拉黑后下一次读取必须看到新状态
+        user_id = workload[0]
+        conn = connect()
+        conn.cursor().execute(f'UPDATE bench_users SET is_blacklisted = {placeholder} WHERE id = {placeholder}',
+                              (True, user_id))
+        conn.commit()
+        conn.close()
+        store.bump([str(user_id)])
+        print(f"{'':<28} 拉黑后下一次读取: is_blacklisted={bool(cache.get(user_id)[4])}")
+        conn = connect()
+        conn.cursor().execute(f'UPDATE bench_users SET is_blacklisted = {placeholder} WHERE id = {placeholder}',
+                              (False, user_id))
+        conn.commit()
+        conn.close()
+
+    if placeholder == '%s':
+        conn = connect()
+        conn.cursor().execute('DROP TABLE IF EXISTS bench_users')
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
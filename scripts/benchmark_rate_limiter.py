@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+限流引擎基准测试
+用10万个不同IP测量各存储后端每次判断的开销和内存占用，并与旧的时间戳列表实现对比；
+再用多个进程同时访问同一个key，检查共享存储下的总放行次数是否符合限额。
+使用方法: python scripts/benchmark_rate_limiter.py --ips 100000 --hits 500000 [--redis redis://localhost:6379/0]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app_blueprints.ratelimit import MemoryStorage, SQLiteStorage, RedisStorage, RateLimiter, HAS_REDIS
+
+RATE = 60      # 每分钟60次
+PERIOD = 60.0
+
+
+class LegacyListLimiter:
+    """旧实现（security_middleware.RateLimiter）：每个IP保存窗口内全部时间戳，从不淘汰空闲IP"""
+
+    def __init__(self):
+        self.requests = {}
+
+    def is_allowed(self, ip_address, max_requests, window):
+        current_time = time.time()
+        if ip_address in self.requests:
+            self.requests[ip_address] = [t for t in self.requests[ip_address] if current_time - t < window]
+        else:
+            self.requests[ip_address] = []
+        if len(self.requests[ip_address]) >= max_requests:
+            return False
+        self.requests[ip_address].append(current_time)
+        return True
+
+
+def make_traffic(ips, hits, seed):
+    """先让每个IP各访问一次，再按长尾分布生成重复访问（少数IP占大部分请求）"""
+    rng = random.Random(seed)
+    keys = [f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}' for i in range(ips)]
+    repeat = [keys[min(ips - 1, int(rng.paretovariate(1.2)) - 1)] if rng.random() < 0.7 else rng.choice(keys)
+              for _ in range(max(0, hits - ips))]
+    return keys, repeat
+
+
+def measure_memory(make_check, keys, repeat):
+    """单独跑一遍统计内存（tracemalloc会拖慢执行，不和计时放在一起）"""
+    tracemalloc.start()
+    check = make_check()
+    for key in keys:
+        check(key)
+    for key in repeat:
+        check(key)
+    memory = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+    tracemalloc.stop()
+    return memory
+
+
+def run(name, make_check, keys, repeat, with_memory=False):
+    check = make_check()
+    started = time.perf_counter()
+    for key in keys:
+        check(key)
+    first = time.perf_counter() - started
+    started = time.perf_counter()
+    rejected = 0
+    for key in repeat:
+        if not check(key):
+            rejected += 1
+    second = time.perf_counter() - started
+    memory = measure_memory(make_check, keys, repeat) if with_memory else None
+    total = len(keys) + len(repeat)
+    print(f"{name:<22} 新IP {first / len(keys) * 1e6:7.2f} us/次  "
+          f"重复访问 {second / max(1, len(repeat)) * 1e6:7.2f} us/次  "
+          f"{total / (first + second):>10,.0f} 次/秒  拒绝 {rejected:>7}"
+          + (f"  内存 {memory:6.1f} MB" if memory is not None else ''))
+
+
+def shared_worker(path, key, rate, period, hits, queue):
+    limiter = RateLimiter(SQLiteStorage(path))
+    queue.put(sum(1 for _ in range(hits) if limiter.is_allowed(key, rate, period)))
+
+
+def check_shared(path, processes, hits):
+    """多个进程同时访问同一key：10次/小时的限额下总放行次数应为10"""
+    queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=shared_worker, args=(path, 'shared:1.2.3.4', 10, 3600.0, hits, queue))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    allowed = sum(queue.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    print(f"{processes}个进程各请求{hits}次，共享SQLite存储总放行 {allowed} 次（限额10）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='限流引擎基准测试')
+    parser.add_argument('--ips', type=int, default=100000, help='不同IP数量')
+    parser.add_argument('--hits', type=int, default=500000, help='总请求数（含每个IP的首次访问）')
+    parser.add_argument('--max-keys', type=int, default=200000, help='进程内存储的key上限')
+    parser.add_argument('--redis', help='Redis地址，提供时一并测试Redis存储')
+    parser.add_argument('--processes', type=int, default=4, help='共享存储检查的进程数')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    keys, repeat = make_traffic(args.ips, args.hits, args.seed)
+    print(f"{args.ips} 个IP，{len(keys) + len(repeat)} 次请求，限额 {RATE} 次/{PERIOD:.0f}s")
+
+    def legacy_check():
+        legacy = LegacyListLimiter()
+        return lambda k: legacy.is_allowed(k, RATE, PERIOD)
+    run('旧实现(时间戳列表)', legacy_check, keys, repeat, with_memory=True)
+
+    limiters = []
+    def memory_check():
+        limiters.append(RateLimiter(MemoryStorage(max_keys=args.max_keys)))
+        return lambda k, limiter=limiters[-1]: limiter.is_allowed(k, RATE, PERIOD)
+    run('memory (GCRA)', memory_check, keys, repeat, with_memory=True)
+    print(f"{'':<22} 保存 {limiters[0].storage.key_count()} 个key，淘汰 {limiters[0].storage.evicted} 个")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'ratelimit.db')
+        sqlite_limiter = RateLimiter(SQLiteStorage(path))
+        run('sqlite (GCRA)', lambda: lambda k: sqlite_limiter.is_allowed(k, RATE, PERIOD), keys, repeat)
+        print(f"{'':<22} 保存 {sqlite_limiter.storage.key_count()} 个key，"
+              f"文件 {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+        check_shared(os.path.join(temp_dir, 'shared.db'), args.processes, 200)
+
+    if args.redis:
+        if not HAS_REDIS:
+            print("未安装redis模块，跳过Redis测试")
+        else:
+            storage = RedisStorage(args.redis, prefix='ros2_wiki:rl-bench:')
+            redis_limiter = RateLimiter(storage)
+            run('redis (GCRA, Lua)', lambda: lambda k: redis_limiter.is_allowed(k, RATE, PERIOD), keys, repeat)
+            for key in storage.client.scan_iter(match=storage.prefix + '*', count=1000):
+                storage.client.delete(key)
+
+
+if __name__ == '__main__':
+    main()
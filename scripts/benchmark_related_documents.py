@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+相关文档重建基准测试
+生成合成文档库（默认10万篇），测量全量重建、增量更新和近邻查询耗时
+使用方法: python scripts/benchmark_related_documents.py --documents 100000
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app_blueprints.related import RelatedDocumentsEngine, get_related_documents, HAS_NUMPY
+
+TOPICS = ['rclpy', 'rclcpp', 'launch', 'tf2', 'nav2', 'moveit', 'gazebo', 'rviz',
+          'colcon', 'dds', 'qos', 'lifecycle', 'parameters', 'actions', 'services', 'urdf']
+
+
+def build_corpus(db_path, documents, words_per_doc, seed):
+    """生成合成文档：每篇文档以一个主题词表为主，混入少量全局词"""
+    rng = random.Random(seed)
+    topic_words = {topic: [f"{topic}_{i}" for i in range(400)] for topic in TOPICS}
+    common_words = [f"word{i}" for i in range(5000)]
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            author_id INTEGER,
+            category TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    def rows():
+        for i in range(documents):
+            topic = rng.choice(TOPICS)
+            vocab = topic_words[topic]
+            words = [rng.choice(vocab) if rng.random() < 0.7 else rng.choice(common_words)
+                     for _ in range(words_per_doc)]
+            yield (f"{topic} 教程 {i}", ' '.join(words), 1, topic)
+
+    conn.executemany("INSERT INTO documents (title, content, author_id, category) VALUES (?, ?, ?, ?)", rows())
+    conn.commit()
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description='相关文档重建基准测试')
+    parser.add_argument('--documents', type=int, default=100000, help='文档数量')
+    parser.add_argument('--words', type=int, default=120, help='每篇文档词数')
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=512)
+    parser.add_argument('--changed', type=int, default=100, help='增量测试中修改的文档数')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if not HAS_NUMPY:
+        print("需要安装 numpy 和 scipy")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, 'benchmark.db')
+
+        started = time.perf_counter()
+        conn = build_corpus(db_path, args.documents, args.words, args.seed)
+        print(f"生成 {args.documents} 篇文档: {time.perf_counter() - started:.2f}s")
+
+        engine = RelatedDocumentsEngine(conn, top_k=args.top_k, batch_size=args.batch_size)
+        started = time.perf_counter()
+        stats = engine.rebuild()
+        total = time.perf_counter() - started
+        print(f"全量重建: {total:.2f}s "
+              f"(向量化 {stats['vectorize_seconds']:.2f}s, "
+              f"相似度 {stats['similarity_seconds']:.2f}s, "
+              f"写入 {stats['write_seconds']:.2f}s, "
+              f"词表 {stats['features']}, 近邻行 {stats['neighbors']})")
+        print(f"吞吐: {stats['documents'] / total:.0f} 篇/秒")
+
+        # 增量更新：修改部分文档后只重算受影响的行
+        rng = random.Random(args.seed + 1)
+        changed_ids = rng.sample(range(1, args.documents + 1), min(args.changed, args.documents))
+        conn.executemany(
+            "UPDATE documents SET content = content || ' rclpy_1 rclpy_2', "
+            "updated_at = datetime('now', '+1 minute') WHERE id = ?",
+            [(doc_id,) for doc_id in changed_ids]
+        )
+        conn.commit()
+        started = time.perf_counter()
+        result = engine.update_incremental()
+        print(f"增量更新: {time.perf_counter() - started:.2f}s "
+              f"(修改 {result['changed']} 篇, 重算 {result['recomputed']} 篇)")
+
+        # 页面读取路径：单次索引查询
+        lookups = 2000
+        started = time.perf_counter()
+        for _ in range(lookups):
+            get_related_documents(conn, rng.randint(1, args.documents))
+        elapsed = time.perf_counter() - started
+        print(f"近邻查询: {elapsed / lookups * 1e6:.0f}µs/次")
+
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+HTML清理基准测试
+对1MB左右的文档测量白名单清理的耗时（首次清理、流式清理、缓存命中），
+并用成倍增大的文档和恶意构造的输入（深层嵌套、大量不匹配的结束标签）检查耗时是否随长度线性增长。
+使用方法: python scripts/benchmark_sanitizer.py --size-kb 1024
+"""
+import os
+import sys
+import html
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app_blueprints.sanitizer import HTMLSanitizer, CHUNK_SIZE
+
+try:
+    import bleach
+    HAS_BLEACH = True
+except ImportError:
+    HAS_BLEACH = False
+
+SECTION = (
+    '<h2>ROS2 节点与话题</h2>\n'
+    '<p>使用 <code>ros2 topic list</code> 查看话题，<a href="https://docs.ros.org" title="文档">官方文档</a> '
+    '&amp; <strong>示例</strong>：1 &lt; 2 &copy;</p>\n'
+    '<pre><code>ros2 run demo_nodes_cpp talker</code></pre>\n'
+    '<ul><li>发布者</li><li>订阅者 <em>回调</em></li></ul>\n'
+    '<table class="params"><tr><th>参数</th><td colspan="2">值</td></tr></table>\n'
+    '<img src="/static/img/graph.png" alt="graph" onerror="alert(1)">\n'
+    '<p onclick="steal()">评论 <a href="javascript:alert(1)">链接</a><script>alert(document.cookie)</script></p>\n'
+    '<div style="color:red">不在白名单中的标签 <span>保留文字</span></div>\n'
+    '> Markdown 引用\n\n'
+)
+
+
+def make_document(size):
+    return (SECTION * (size // len(SECTION) + 1))[:size]
+
+
+def timed(func, rounds=1):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        result = func()
+    return (time.perf_counter() - started) / rounds * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTML清理基准测试')
+    parser.add_argument('--size-kb', type=int, default=1024)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+    size = args.size_kb * 1024
+    document = make_document(size)
+    sanitizer = HTMLSanitizer()
+
+    print(f"文档 {len(document) / 1024:.0f} KB（{len(document)} 字符）")
+    elapsed, _ = timed(lambda: html.escape(document), args.rounds)
+    print(f"{'html.escape（完全转义）':<28} {elapsed:9.2f} ms")
+    if HAS_BLEACH:
+        elapsed, _ = timed(lambda: bleach.clean(document, tags=list(sanitizer.tags), strip=True), args.rounds)
+        print(f"{'bleach.clean':<28} {elapsed:9.2f} ms")
+    elapsed, output = timed(lambda: sanitizer.sanitize_uncached(document), args.rounds)
+    print(f"{'白名单清理（未缓存）':<28} {elapsed:9.2f} ms  {len(document) / 1024 / 1024 / (elapsed / 1000):.1f} MB/s，"
+          f"输出 {len(output) / 1024:.0f} KB")
+    chunks = [document[i:i + CHUNK_SIZE] for i in range(0, len(document), CHUNK_SIZE)]
+    elapsed, streamed = timed(lambda: ''.join(sanitizer.iter_sanitize(chunks)), args.rounds)
+    print(f"{'流式清理（64KB分块）':<28} {elapsed:9.2f} ms  结果一致: {streamed == output}")
+    sanitizer.sanitize(document)
+    elapsed, cached = timed(lambda: sanitizer.sanitize(document), args.rounds * 10)
+    print(f"{'缓存命中（blake2b哈希）':<28} {elapsed:9.2f} ms  结果一致: {cached == output}")
+    comment = '<p>很好的教程 <strong>谢谢</strong>！<script>x()</script></p>'
+    sanitizer.sanitize(comment)
+    elapsed, _ = timed(lambda: sanitizer.sanitize(comment), 10000)
+    print(f"{'短评论 缓存命中':<28} {elapsed * 1000:9.2f} us")
+    elapsed, _ = timed(lambda: sanitizer.sanitize_uncached(comment), 10000)
+    print(f"{'短评论 未缓存':<28} {elapsed * 1000:9.2f} us")
+
+    print("\n线性检查（每行长度翻倍，耗时应约翻倍）")
+    hostile = {
+        '正常文档': make_document,
+        '深层嵌套': lambda n: '<em>' * (n // 8) + 'x' + '</p>' * (n // 8),
+        '不匹配的结束标签': lambda n: '<p>' * (n // 16) + '</strong>' * (n // 12),
+        '大量实体和尖括号': lambda n: ('&amp;<<&#x41;&nope; a < b > c ' * (n // 28 + 1))[:n],
+        '未闭合的注释': lambda n: '<p>' + '<!--' + 'x' * n,
+    }
+    for label, build in hostile.items():
+        timings = []
+        for factor in (1, 2, 4):
+            text = build(size * factor // 4)
+            elapsed, _ = timed(lambda: sanitizer.sanitize_uncached(text))
+            timings.append(elapsed)
+        ratios = ' '.join(f'{timings[i + 1] / timings[i]:.2f}x' for i in range(len(timings) - 1))
+        print(f"{label:<20} " + ' '.join(f'{t:8.1f}ms' for t in timings) + f"  增长 {ratios}")
+    print(f"\n缓存状态: {sanitizer.status()}")
+
+
+if __name__ == '__main__':
+    main()
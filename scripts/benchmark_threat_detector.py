@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+威胁检测开销基准测试
+在请求上下文中分别调用带 require_security_check 和不带装饰器的视图，差值即为每个请求的安全检查开销；
+同时对比旧实现（每个值逐条 re.search、JSON整体序列化后扫描）的威胁检测耗时。
+使用方法: python scripts/benchmark_threat_detector.py --requests 5000 [--storage memory://]
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def build_requests(count, seed):
+    """请求样本：常见的搜索/分页参数、表单提交、JSON接口、少量攻击载荷和超大请求体"""
+    rng = random.Random(seed)
+    queries = ['rclpy', 'launch file', 'nav2 参数', 'tf2 坐标变换', 'colcon build', 'qos 可靠性']
+    attacks = ["1 union select password from users", "<script>alert(1)</script>", "../../../etc/passwd"]
+    long_text = ' '.join(rng.choice(queries) for _ in range(300))
+    samples = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.55:
+            samples.append(('GET', f'/search?q={rng.choice(queries)}&page={rng.randint(1, 5)}&category=ROS2基础', None, None))
+        elif roll < 0.75:
+            samples.append(('POST', '/create-document', {'title': f'教程 {i % 50}', 'content': long_text,
+                                                         'category': 'ROS2基础'}, None))
+        elif roll < 0.95:
+            samples.append(('POST', '/api/batch', None, {'queries': [{'q': rng.choice(queries), 'limit': 10}
+                                                                     for _ in range(5)], 'debug': False}))
+        elif roll < 0.99:
+            samples.append(('GET', f'/search?q={rng.choice(attacks)}', None, None))
+        else:
+            samples.append(('POST', '/create-document', {'title': 'big', 'content': long_text * 100}, None))
+    return samples
+
+
+class LegacyThreatDetector:
+    """旧实现：每个值先转小写，再对8个模式分别调用 re.search"""
+
+    patterns = [r'<script[^>]*>.*?</script>', r'union.*select', r'drop\s+table', r'insert\s+into',
+                r'update.*set', r'../../../', r'eval\s*\(', r'exec\s*\(']
+    agents = ['python-requests', 'curl', 'wget', 'scanner', 'bot', 'crawler']
+
+    def contains(self, text):
+        text_lower = text.lower()
+        return any(re.search(pattern, text_lower, re.IGNORECASE) for pattern in self.patterns)
+
+    def analyze(self, request):
+        score = 0
+        for value in request.args.values():
+            score += 50 if self.contains(value) else 0
+        if request.method == 'POST':
+            if request.is_json:
+                score += 60 if self.contains(json.dumps(request.get_json())) else 0
+            else:
+                for value in request.form.values():
+                    score += 40 if self.contains(value) else 0
+        agent = request.headers.get('User-Agent', '').lower()
+        return score + (30 if any(a in agent for a in self.agents) else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='威胁检测开销基准测试')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--routes', type=int, default=20, help='使用 require_security_check 的路由数')
+    parser.add_argument('--storage', help='限流存储（RATE_LIMIT_STORAGE），默认沿用环境配置')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    if args.storage:
+        os.environ['RATE_LIMIT_STORAGE'] = args.storage
+
+    from flask import Flask, request
+    from optimizations import advanced_security
+    from optimizations.advanced_security import require_security_check, scan_threat_value
+
+    # 基准测试中不触发限流和封禁，只测量检查本身的开销；攻击样本的告警日志不输出
+    advanced_security.security_manager.max_requests_per_minute = 10 ** 9
+    advanced_security.logger.setLevel(logging.ERROR)
+    app = Flask(__name__)
+
+    def view():
+        return 'ok'
+    protected = [require_security_check(view) for _ in range(args.routes)]
+    samples = build_requests(args.requests, args.seed)
+    legacy = LegacyThreatDetector()
+    ua = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/126.0 Safari/537.36'}
+
+    def contexts():
+        for i, (method, path, form, body) in enumerate(samples):
+            yield i, app.test_request_context(path, method=method, data=form, json=body, headers=ua,
+                                              environ_base={'REMOTE_ADDR': f'10.0.{i % 200}.{i % 250}'})
+
+    def measure(label, call):
+        total = 0.0
+        for i, ctx in contexts():
+            with ctx:
+                # 预先解析请求体，使各项测量只包含检查本身
+                request.args, request.form, request.get_json(silent=True)
+                started = time.perf_counter()
+                call(i)
+                total += time.perf_counter() - started
+        per_request = total / len(samples) * 1e6
+        print(f"{label:<34} {per_request:8.2f} us/请求")
+        return per_request
+
+    print(f"{len(samples)} 个请求，{args.routes} 个路由启用 require_security_check，"
+          f"限流存储 {advanced_security.get_rate_limiter().storage.name}")
+    baseline = measure('无检查的视图', lambda i: view())
+    checked = measure('require_security_check', lambda i: protected[i % args.routes]())
+    measure('旧实现威胁检测（仅analyze）', lambda i: legacy.analyze(request))
+    measure('新实现威胁检测（仅analyze）', lambda i: advanced_security.threat_detector.analyze_request('10.0.0.1'))
+    print(f"每个请求的安全检查开销: {checked - baseline:.2f} us（目标 < 50 us）")
+    print(f"扫描缓存: {scan_threat_value.cache_info()}")
+
+
+if __name__ == '__main__':
+    main()
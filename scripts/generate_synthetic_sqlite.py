@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+生成合成的SQLite数据库，用于测试 migrate_to_postgres.py 的迁移速度、断点续传和校验
+表结构与 app.py 的SQLite结构一致；数据包含NULL、空字符串、引号、换行和中文等边界值。
+使用方法: python scripts/generate_synthetic_sqlite.py synthetic.db --users 50000 --documents 500000 --comments 2000000
+"""
+import os
+import time
+import random
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+WORDS = ['ROS2', 'rclpy', 'launch', 'colcon', 'gazebo', 'rviz', '节点', '话题', '服务', '参数', '"引号"', "it's"]
+CATEGORIES = ['ROS2基础', '导航', '仿真', '机械臂', '感知']
+BATCH_ROWS = 50000
+
+SCHEMA = '''
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        is_admin BOOLEAN DEFAULT 0,
+        is_blacklisted BOOLEAN DEFAULT 0,
+        blacklisted_at TIMESTAMP NULL,
+        blacklist_reason TEXT NULL,
+        last_seen TIMESTAMP NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE documents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        content TEXT NOT NULL,
+        author_id INTEGER,
+        category TEXT DEFAULT 'ROS2基础',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE comments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        document_id INTEGER,
+        user_id INTEGER,
+        content TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE user_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        admin_id INTEGER,
+        target_user_id INTEGER,
+        action TEXT NOT NULL,
+        reason TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE document_views (
+        document_id INTEGER PRIMARY KEY,
+        view_count INTEGER NOT NULL DEFAULT 0
+    );
+'''
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def timestamp(rng, base=datetime(2023, 1, 1)):
+    value = base + timedelta(seconds=rng.randint(0, 60 * 60 * 24 * 700))
+    # 混合SQLite中常见的几种时间格式
+    roll = rng.random()
+    if roll < 0.8:
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if roll < 0.9:
+        return value.isoformat(timespec='microseconds')
+    return value.isoformat()
+
+
+def insert_batches(conn, sql, total, make_row, seed):
+    rng = random.Random(seed)
+    for start in range(1, total + 1, BATCH_ROWS):
+        conn.executemany(sql, [make_row(rng, i) for i in range(start, min(total + 1, start + BATCH_ROWS))])
+        conn.commit()
+
+
+def generate(path, users, documents, comments, logs):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.executescript(SCHEMA)
+
+    insert_batches(conn, 'INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', users, lambda rng, i: (
+        i, f'user{i}', f'user{i}@example.com', f'pbkdf2:sha256:600000${i}$' + 'a' * 64,
+        1 if i == 1 else 0, 1 if i % 97 == 0 else 0,
+        timestamp(rng) if i % 97 == 0 else None, '垃圾信息\n"广告"' if i % 97 == 0 else None,
+        timestamp(rng) if i % 3 else None, timestamp(rng)), seed=1)
+
+    insert_batches(conn, 'INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)', documents, lambda rng, i: (
+        i, f'{rng.choice(WORDS)} 教程 {i}',
+        '\n\n'.join(f'## 第{j}节\n' + sentence(rng, 60) for j in range(rng.randint(1, 6))),
+        rng.randint(1, users) if i % 50 else None, rng.choice(CATEGORIES), timestamp(rng),
+        timestamp(rng)), seed=2)
+
+    insert_batches(conn, 'INSERT INTO comments VALUES (?, ?, ?, ?, ?)', comments, lambda rng, i: (
+        i, rng.randint(1, documents), rng.randint(1, users), sentence(rng, rng.randint(0, 30)),
+        timestamp(rng)), seed=3)
+
+    insert_batches(conn, 'INSERT INTO user_logs VALUES (?, ?, ?, ?, ?, ?)', logs, lambda rng, i: (
+        i, 1, rng.randint(1, users), rng.choice(['BLACKLIST', 'UNBLACKLIST', 'BATCH_BLACKLIST']),
+        sentence(rng, 5) if i % 4 else None, timestamp(rng)), seed=4)
+
+    insert_batches(conn, 'INSERT INTO document_views VALUES (?, ?)', documents // 2, lambda rng, i: (
+        i * 2, rng.randint(0, 100000)), seed=5)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成迁移测试用的合成SQLite数据库')
+    parser.add_argument('path', help='输出的SQLite文件')
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--documents', type=int, default=500000)
+    parser.add_argument('--comments', type=int, default=2000000)
+    parser.add_argument('--logs', type=int, default=200000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generate(args.path, args.users, args.documents, args.comments, args.logs)
+    total = args.users + args.documents + args.comments + args.logs + args.documents // 2
+    print(f"已生成 {args.path}: {total} 行，{os.path.getsize(args.path) / 1024 / 1024:.0f} MB，"
+          f"{time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+enhanced_server.py 本地压测 - 对比单线程模式、并发（线程池+长连接）模式和异步模式
+在临时目录中生成测试数据库，分别以各模式启动服务器子进程，
+用多个客户端线程持续发送混合请求，输出吞吐量和延迟分位数。
+--idle-connections 可在压测期间额外保持一批空闲长连接，模拟大量展示终端在线的场景。
+使用方法: python scripts/load_test_enhanced_server.py --concurrency 16 --duration 10
+         python scripts/load_test_enhanced_server.py --modes threaded async --idle-connections 2000
+"""
+import os
+import sys
+import time
+import random
+import socket
+import signal
+import sqlite3
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import quote
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'enhanced_server.py')
+WORDS = ['ROS2', 'rclpy', 'launch', 'colcon', 'gazebo', 'rviz', '节点', '话题', '服务', '参数']
+
+
+def prepare_database(db_path, documents):
+    """创建enhanced_server所需的表并填充测试文档"""
+    rng = random.Random(0)
+    conn = sqlite3.connect(db_path)
+    conn.executescript('''
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            email TEXT,
+            is_admin BOOLEAN DEFAULT 0
+        );
+        CREATE TABLE documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            category TEXT DEFAULT 'ROS2基础'
+        );
+        CREATE TABLE comments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER,
+            username TEXT,
+            content TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+    conn.executemany(
+        'INSERT INTO documents (title, content) VALUES (?, ?)',
+        [(f"{rng.choice(WORDS)} 教程 {i}",
+          '\n'.join(f"## 第{j}节\n" + ' '.join(rng.choice(WORDS) for _ in range(80)) for j in range(5)))
+         for i in range(documents)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, workdir, port, workers):
+    """以指定模式启动服务器子进程并等待端口可用"""
+    env = dict(os.environ, PORT=str(port), SERVER_MODE=mode, SERVER_WORKERS=str(workers))
+    process = subprocess.Popen([sys.executable, os.path.abspath(SERVER_SCRIPT)], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{mode} 模式服务器启动失败")
+
+
+def open_idle_connections(port, count):
+    """建立一批长连接，每个连接完成一次请求后保持空闲，返回 (socket列表, 成功数)"""
+    sockets = []
+    served = 0
+    for _ in range(count):
+        try:
+            sock = socket.create_connection(('127.0.0.1', port), timeout=10)
+            sockets.append(sock)
+            sock.sendall(b'GET /favicon.ico HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        except OSError:
+            break
+    for sock in sockets:
+        try:
+            if sock.recv(65536).startswith(b'HTTP/1.1 200'):
+                served += 1
+        except OSError:
+            pass
+    return sockets, served
+
+
+def run_clients(port, concurrency, duration, documents):
+    """多个客户端线程持续请求，返回 (延迟列表, 错误数)"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        while time.time() < deadline:
+            roll = rng.random()
+            if roll < 0.4:
+                path = f"/doc/{rng.randint(1, documents)}"
+            elif roll < 0.7:
+                path = '/'
+            elif roll < 0.9:
+                path = '/search?q=' + quote(rng.choice(WORDS))
+            else:
+                path = '/favicon.ico'
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    raise RuntimeError(response.status)
+                local.append(time.perf_counter() - started)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='enhanced_server.py 压测')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发客户端数')
+    parser.add_argument('--duration', type=float, default=10, help='每种模式的压测时长（秒）')
+    parser.add_argument('--documents', type=int, default=2000, help='测试文档数量')
+    parser.add_argument('--workers', type=int, default=16, help='并发模式工作线程数')
+    parser.add_argument('--modes', nargs='+', default=['single', 'threaded', 'async'])
+    parser.add_argument('--idle-connections', type=int, default=0, help='压测期间额外保持的空闲长连接数')
+    args = parser.parse_args()
+
+    print(f"并发 {args.concurrency}，每种模式 {args.duration}s，文档 {args.documents} 篇，"
+          f"空闲长连接 {args.idle_connections}")
+    print(f"{'模式':<10}{'请求数':>8}{'吞吐(req/s)':>14}{'p50(ms)':>10}{'p99(ms)':>10}{'错误':>6}"
+          f"{'空闲连接':>10}{'停止耗时(s)':>12}")
+
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as workdir:
+            prepare_database(os.path.join(workdir, 'simple_wiki.db'), args.documents)
+            port = free_port()
+            process = start_server(mode, workdir, port, args.workers)
+            idle_sockets, idle_served = [], 0
+            try:
+                if args.idle_connections:
+                    idle_sockets, idle_served = open_idle_connections(port, args.idle_connections)
+                latencies, errors = run_clients(port, args.concurrency, args.duration, args.documents)
+            finally:
+                for sock in idle_sockets:
+                    sock.close()
+                started = time.time()
+                process.send_signal(signal.SIGTERM)
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                stop_seconds = time.time() - started
+
+            print(f"{mode:<10}{len(latencies):>8}{len(latencies) / args.duration:>14.1f}"
+                  f"{percentile(latencies, 50) * 1000:>10.1f}{percentile(latencies, 99) * 1000:>10.1f}"
+                  f"{errors:>6}{idle_served:>10}{stop_seconds:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
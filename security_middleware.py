@@ -6,12 +6,12 @@
 
 from flask import request, session, abort, current_app
 from functools import wraps
-import secrets
-import hashlib
-import time
+
+from app_blueprints.ratelimit import get_rate_limiter, rate_limit
+from app_blueprints.security_headers import install_security_headers, get_csrf_signer
 
 class SecurityMiddleware:
-    """安全中间件"""
+    """安全中间件：CSRF校验；安全响应头由 app_blueprints/security_headers.py 统一添加"""
     
     def __init__(self, app=None):
         self.app = app
@@ -21,16 +21,17 @@ class SecurityMiddleware:
     def init_app(self, app):
         """初始化应用"""
         app.before_request(self.before_request)
-        app.after_request(self.after_request)
         
-        # 生成CSRF密钥
-        if not app.config.get('CSRF_SECRET_KEY'):
-            app.config['CSRF_SECRET_KEY'] = secrets.token_hex(32)
+        # CSRF签名密钥：未配置时使用SECRET_KEY，多个worker签发的令牌可以互相验证
+        get_csrf_signer(app)
+        # 预计算的安全响应头（SecurityManager 也会安装同一实例，不会重复添加）
+        install_security_headers(app)
     
     def before_request(self):
         """请求前处理"""
-        # 生成CSRF令牌
-        if 'csrf_token' not in session:
+        # 生成CSRF令牌（没有或已过期时重新签发）
+        token = session.get('csrf_token')
+        if not token or get_csrf_signer(current_app).expired(token):
             session['csrf_token'] = self.generate_csrf_token()
         
         # 检查CSRF令牌（POST/PUT/DELETE请求）
@@ -38,105 +39,22 @@ class SecurityMiddleware:
             if not self.validate_csrf_token():
                 abort(403, "CSRF验证失败")
     
-    def after_request(self, response):
-        """请求后处理 - 添加安全头"""
-        
-        # 基础安全头
-        security_headers = {
-            # 防止XSS攻击
-            'X-Content-Type-Options': 'nosniff',
-            'X-Frame-Options': 'DENY',
-            'X-XSS-Protection': '1; mode=block',
-            
-            # 内容安全策略
-            'Content-Security-Policy': (
-                "default-src 'self'; "
-                "script-src 'self' 'unsafe-inline' 'unsafe-eval'; "
-                "style-src 'self' 'unsafe-inline'; "
-                "img-src 'self' data: https:; "
-                "font-src 'self' https:; "
-                "connect-src 'self';"
-            ),
-            
-            # 推荐安全
-            'Referrer-Policy': 'strict-origin-when-cross-origin',
-            
-            # 权限策略
-            'Permissions-Policy': (
-                "camera=(), microphone=(), geolocation=(), "
-                "payment=(), usb=(), magnetometer=(), accelerometer=()"
-            )
-        }
-        
-        # HTTPS相关头（生产环境）
-        if current_app.config.get('FLASK_ENV') == 'production':
-            security_headers.update({
-                'Strict-Transport-Security': 'max-age=31536000; includeSubDomains; preload',
-                'Content-Security-Policy': security_headers['Content-Security-Policy'] + " upgrade-insecure-requests;"
-            })
-        
-        # 应用安全头
-        for header, value in security_headers.items():
-            response.headers[header] = value
-        
-        return response
-    
     def generate_csrf_token(self):
-        """生成CSRF令牌"""
-        timestamp = str(int(time.time()))
-        random_value = secrets.token_hex(16)
-        
-        # 创建签名
-        secret_key = current_app.config.get('CSRF_SECRET_KEY', 'default-secret')
-        signature_data = f"{timestamp}:{random_value}:{secret_key}"
-        signature = hashlib.sha256(signature_data.encode()).hexdigest()
-        
-        return f"{timestamp}:{random_value}:{signature}"
+        """生成CSRF令牌（时间戳:随机数:HMAC签名）"""
+        return get_csrf_signer(current_app).generate()
     
     def validate_csrf_token(self):
-        """验证CSRF令牌"""
+        """验证CSRF令牌：与会话中的令牌相同，且签名和时效有效（常数时间比较）"""
         # 从表单或头部获取令牌
         token = request.form.get('csrf_token') or request.headers.get('X-CSRF-Token')
-        
-        if not token:
-            return False
-        
-        # 获取会话中的令牌
         session_token = session.get('csrf_token')
-        if not session_token:
-            return False
-        
-        # 简单比较（生产环境应使用更安全的比较）
-        if token != session_token:
+        if not token or not session_token:
             return False
-        
-        # 验证令牌格式和时效性
-        return self.is_token_valid(token)
+        return get_csrf_signer(current_app).verify(token, expected=session_token)
     
     def is_token_valid(self, token, max_age=3600):
         """检查令牌是否有效"""
-        try:
-            parts = token.split(':')
-            if len(parts) != 3:
-                return False
-            
-            timestamp_str, random_value, signature = parts
-            timestamp = int(timestamp_str)
-            
-            # 检查时效性
-            current_time = int(time.time())
-            if current_time - timestamp > max_age:
-                return False
-            
-            # 验证签名
-            secret_key = current_app.config.get('CSRF_SECRET_KEY', 'default-secret')
-            expected_signature_data = f"{timestamp_str}:{random_value}:{secret_key}"
-            expected_signature = hashlib.sha256(expected_signature_data.encode()).hexdigest()
-            
-            return signature == expected_signature
-            
-        except (ValueError, IndexError):
-            return False
+        return get_csrf_signer(current_app).verify(token, max_age=max_age)
 
 def csrf_protect(f):
     """CSRF保护装饰器"""
@@ -147,7 +65,7 @@ def csrf_protect(f):
             token = request.form.get('csrf_token') or request.headers.get('X-CSRF-Token')
             session_token = session.get('csrf_token')
             
-            if not token or not session_token or token != session_token:
+            if not token or not session_token or not get_csrf_signer(current_app).verify(token, expected=session_token):
                 abort(403, "CSRF验证失败")
         
         return f(*args, **kwargs)
@@ -164,49 +82,15 @@ def init_csrf_template_functions(app):
     app.jinja_env.globals['csrf_protect'] = csrf_protect
 
 class RateLimiter:
-    """简单的速率限制器"""
-    
-    def __init__(self):
-        self.requests = {}  # IP -> [timestamp, ...]
+    """速率限制器（兼容旧接口），计数保存在共享的限流引擎中（app_blueprints/ratelimit.py）"""
     
-    def is_allowed(self, ip_address, max_requests=10, window=60):
+    def is_allowed(self, ip_address, max_requests=10, window=60, scope='default'):
         """检查是否允许请求"""
-        current_time = time.time()
-        
-        # 清理过期的请求记录
-        if ip_address in self.requests:
-            self.requests[ip_address] = [
-                timestamp for timestamp in self.requests[ip_address]
-                if current_time - timestamp < window
-            ]
-        else:
-            self.requests[ip_address] = []
-        
-        # 检查请求数量
-        if len(self.requests[ip_address]) >= max_requests:
-            return False
-        
-        # 记录当前请求
-        self.requests[ip_address].append(current_time)
-        return True
+        return get_rate_limiter().is_allowed(f'{scope}:{ip_address}', max_requests, window)
 
-# 全局速率限制器实例
+# 全局速率限制器实例；rate_limit 装饰器来自 app_blueprints.ratelimit（按视图分别计数）
 rate_limiter = RateLimiter()
 
-def rate_limit(max_requests=10, window=60):
-    """速率限制装饰器"""
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
-            
-            if not rate_limiter.is_allowed(client_ip, max_requests, window):
-                abort(429, "请求过于频繁，请稍后再试")
-            
-            return f(*args, **kwargs)
-        return decorated_function
-    return decorator
-
 def setup_security_middleware(app):
     """设置安全中间件"""
     # 初始化安全中间件
@@ -1,7 +1,104 @@
+import os
+import sys
+import sqlite3
+import tempfile
+
 import pytest
-from app import create_app, db
-from app.models import User, Document
-from config import TestingConfig
+from flask.testing import FlaskClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# test_api.py 针对 app/ 包形式的应用工厂（create_app + app.models），当前仓库的应用是单文件 app.py，
+# 没有该包时不收集这些测试（导入 app.models 会直接失败）
+HAS_APP_PACKAGE = os.path.isfile(os.path.join(ROOT, 'app', '__init__.py'))
+if not HAS_APP_PACKAGE:
+    collect_ignore = ['test_api.py']
+
+# app.py 在导入时初始化数据库（相对路径 ros2_wiki.db）并启动后台线程：
+# 测试在临时目录中导入，数据库、限流和主体版本号存储都放在临时目录，后台任务和索引维护不自动运行
+TEST_DIR = tempfile.mkdtemp(prefix='ros2_wiki_test_')
+TEST_DATABASE = os.path.join(TEST_DIR, 'ros2_wiki.db')
+os.environ.pop('DATABASE_URL', None)
+os.environ['SQLITE_DATABASE_URL'] = TEST_DATABASE
+os.environ['RATE_LIMIT_STORAGE'] = 'sqlite:///' + os.path.join(TEST_DIR, 'ratelimit.db')
+os.environ['JOBS_ENABLED'] = 'false'
+os.environ['FTS_MAINTENANCE_ENABLED'] = 'false'
+
+ADMIN_LOGIN = {'username': 'ros2_admin', 'password': 'Admin123!'}
+USER_LOGIN = {'username': 'ros2_user', 'password': 'user123'}
+
+
+class ClosingClient(FlaskClient):
+    """
+    默认读完并关闭响应（与WSGI服务器一致）：准入控制在响应关闭时才释放并发槽位，
+    测试客户端不关闭未缓冲的响应会让槽位一直被占用；需要流式读取时传 buffered=False 并自行 close()
+    """
+
+    def open(self, *args, buffered=True, **kwargs):
+        return super().open(*args, buffered=buffered, **kwargs)
+
+
+@pytest.fixture(scope='session')
+def wiki():
+    """app.py 模块（在临时目录中导入，包含示例用户和文档）；测试期间工作目录保持在临时目录"""
+    cwd = os.getcwd()
+    os.chdir(TEST_DIR)
+    import app as wiki_module
+    wiki_module.app.config.update(TESTING=True, DATABASE=TEST_DATABASE)
+    wiki_module.app.test_client_class = ClosingClient
+    yield wiki_module
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def wiki_client(wiki):
+    return wiki.app.test_client()
+
+
+@pytest.fixture
+def admin_client(wiki):
+    client = wiki.app.test_client()
+    response = client.post('/login', data=ADMIN_LOGIN)
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def wiki_db(wiki):
+    """测试数据库连接"""
+    conn = sqlite3.connect(TEST_DATABASE)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def add_document(wiki_db):
+    """直接写入文档：add_document(标题, 内容, 分类)，返回文档ID"""
+    def add(title, content, category):
+        cursor = wiki_db.execute('INSERT INTO documents (title, content, author_id, category) VALUES (?, ?, 1, ?)',
+                                 (title, content, category))
+        wiki_db.commit()
+        return cursor.lastrowid
+    return add
+
+
+@pytest.fixture
+def add_user(wiki_db):
+    """直接写入普通用户：add_user(用户名)，返回用户ID"""
+    def add(username, is_admin=False):
+        cursor = wiki_db.execute('INSERT INTO users (username, email, password_hash, is_admin) VALUES (?, ?, ?, ?)',
+                                 (username, f'{username}@example.com', 'unused', is_admin))
+        wiki_db.commit()
+        return cursor.lastrowid
+    return add
+
+
+if HAS_APP_PACKAGE:
+    from app import create_app, db
+    from app.models import User, Document
+    from config import TestingConfig
 
 
 @pytest.fixture
@@ -0,0 +1,144 @@
+"""
+准入控制测试：超过并发上限时快速503、按类别隔离、流式响应在生成器结束后才释放槽位
+"""
+import threading
+
+import pytest
+from flask import Flask, Response, jsonify
+
+from app_blueprints.admission import AdmissionController
+
+CONFIG = {
+    'CLASSES': {
+        'critical': {'max_concurrent': None},
+        'expensive': {'max_concurrent': 1, 'max_queue': 0, 'retry_after': 5},
+        'default': {'max_concurrent': 2, 'max_queue': 1, 'queue_timeout': 0.05, 'retry_after': 2},
+    },
+    'ROUTES': {
+        'critical': ['health'],
+        'expensive': ['export', 'search.*'],
+    },
+}
+
+
+@pytest.fixture
+def admission_app():
+    app = Flask(__name__)
+    controller = AdmissionController(CONFIG, app)
+    gate = threading.Event()
+
+    @app.route('/health')
+    def health():
+        return 'ok'
+
+    @app.route('/page')
+    def page():
+        return 'page'
+
+    @app.route('/export')
+    def export():
+        def generate():
+            yield 'id\n'
+            app.in_flight_during_stream = controller.classes['expensive'].in_flight
+            yield '1\n'
+        return Response(generate(), mimetype='text/csv')
+
+    @app.route('/api/hold')
+    def hold():
+        gate.wait(5)
+        return jsonify({'ok': True})
+
+    app.gate = gate
+    return app, controller
+
+
+class TestAdmission:
+
+    def test_classify(self, admission_app):
+        _, controller = admission_app
+        assert controller.classify('health') == 'critical'
+        assert controller.classify('search.batch_search_api') == 'expensive'
+        assert controller.classify('page') == 'default'
+        assert controller.classify(None) == 'default'
+
+    def test_streamed_response_holds_slot(self, admission_app):
+        app, controller = admission_app
+        expensive = controller.classes['expensive']
+        client = app.test_client()
+
+        response = client.get('/export', buffered=False)
+        assert response.status_code == 200
+        assert expensive.in_flight == 1
+        # 生成器尚未结束，同类别的第二个请求被拒绝
+        rejected = client.get('/export', buffered=True)
+        assert rejected.status_code == 503
+        assert rejected.headers['Retry-After'] == '5'
+        assert rejected.headers['Cache-Control'] == 'no-store'
+
+        assert response.get_data(as_text=True) == 'id\n1\n'
+        assert app.in_flight_during_stream == 1
+        response.close()
+        assert expensive.in_flight == 0
+        assert client.get('/export', buffered=True).status_code == 200
+        assert expensive.in_flight == 0
+        assert expensive.snapshot()['rejected_queue_full'] == 1
+
+    def test_full_class_does_not_block_others(self, admission_app):
+        app, controller = admission_app
+        client = app.test_client()
+        held = client.get('/export', buffered=False)
+        assert client.get('/health', buffered=True).status_code == 200
+        assert client.get('/page', buffered=True).status_code == 200
+        assert client.get('/export', buffered=True).status_code == 503
+        held.close()
+        assert controller.status()['totals']['in_flight'] == 0
+
+    def test_queue_timeout_returns_json_503(self, admission_app):
+        app, controller = admission_app
+        default = controller.classes['default']
+        results = []
+
+        def request_hold():
+            results.append(app.test_client().get('/api/hold', buffered=True).status_code)
+
+        threads = [threading.Thread(target=request_hold) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for _ in range(200):
+            if default.in_flight == 2:
+                break
+            threading.Event().wait(0.01)
+        assert default.in_flight == 2
+
+        response = app.test_client().get('/api/hold', buffered=True)
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '2'
+        assert response.get_json()['admission_class'] == 'default'
+        assert default.snapshot()['rejected_timeout'] == 1
+
+        app.gate.set()
+        for thread in threads:
+            thread.join()
+        assert results == [200, 200]
+        assert default.in_flight == 0
+
+    def test_exception_releases_slot(self, admission_app):
+        app, controller = admission_app
+
+        @app.route('/boom')
+        def boom():
+            raise RuntimeError('boom')
+
+        assert app.test_client().get('/boom', buffered=True).status_code == 500
+        assert controller.classes['default'].in_flight == 0
+
+
+def test_audit_export_is_admitted_until_stream_ends(wiki, admin_client):
+    expensive = wiki.admission.classes['expensive']
+    assert wiki.admission.classify('search.batch_search_api') == 'expensive'
+    response = admin_client.get('/admin/users/audit/export', buffered=False)
+    assert response.status_code == 200
+    assert expensive.in_flight == 1
+    response.get_data()
+    response.close()
+    assert expensive.in_flight == 0
@@ -0,0 +1,88 @@
+"""
+权限判断测试：check_many 与逐个 check 的结果一致，用户ID批量读取主体，用户状态接口
+"""
+import pytest
+
+from app_blueprints.authz import (Authorizer, USER_ROW_PERMISSIONS, USER_VIEW, USER_DELETE, USER_BLACKLIST,
+                                  USER_EDIT, COMMENT_CREATE)
+from app_blueprints.principal_cache import PrincipalCache, create_version_store
+
+ADMIN = (1, 'admin', 'admin@example.com', True, False)
+USERS = {
+    '1': ADMIN,
+    '2': (2, 'alice', 'alice@example.com', False, False),
+    '3': (3, 'bob', 'bob@example.com', True, False),
+    '4': (4, 'mallory', 'mallory@example.com', False, True),
+}
+
+
+@pytest.fixture
+def authorizer():
+    loads = []
+
+    def load_many(user_ids):
+        loads.append(list(user_ids))
+        return [USERS[user_id] for user_id in user_ids if user_id in USERS]
+
+    cache = PrincipalCache(USERS.get, store=create_version_store('memory://'), batch_loader=load_many)
+    authorizer = Authorizer(cache)
+    authorizer.loads = loads
+    return authorizer
+
+
+class TestCheckMany:
+
+    def test_matches_single_checks(self, wiki, authorizer):
+        with wiki.app.test_request_context():
+            result = authorizer.check_many(USER_ROW_PERMISSIONS, ['1', 2, 3, 4, 99], user=ADMIN)
+            assert sorted(result) == ['1', '2', '3', '4', '99']
+            for user_id, allowed in result.items():
+                for permission in USER_ROW_PERMISSIONS:
+                    assert allowed[permission] == authorizer.check(permission, user_id, user=ADMIN)
+
+    def test_ids_loaded_in_one_batch(self, wiki, authorizer):
+        with wiki.app.test_request_context():
+            authorizer.check_many(USER_ROW_PERMISSIONS, [2, 3, 4], user=ADMIN)
+            authorizer.check_many(USER_ROW_PERMISSIONS, [2, 3, 4], user=ADMIN)
+        assert authorizer.loads == [['2', '3', '4']]
+
+    def test_rows_need_no_queries(self, wiki, authorizer):
+        rows = [{'id': 2, 'is_admin': False, 'is_blacklisted': False},
+                {'id': 1, 'is_admin': True, 'is_blacklisted': False}]
+        with wiki.app.test_request_context():
+            result = authorizer.check_many((USER_EDIT, USER_DELETE), rows, user=ADMIN)
+        assert result == {'2': {USER_EDIT: True, USER_DELETE: True}, '1': {USER_EDIT: True, USER_DELETE: False}}
+        assert authorizer.loads == []
+
+    def test_not_on_self_and_missing_users(self, wiki, authorizer):
+        with wiki.app.test_request_context():
+            result = authorizer.check_many((USER_VIEW, USER_BLACKLIST), [1, 99], user=ADMIN)
+        assert result['1'] == {USER_VIEW: True, USER_BLACKLIST: False}
+        assert result['99'] == {USER_VIEW: False, USER_BLACKLIST: False}
+
+    def test_non_admin_and_blacklisted_actors(self, wiki, authorizer):
+        with wiki.app.test_request_context():
+            result = authorizer.check_many((USER_VIEW, COMMENT_CREATE), [2, 3], user=USERS['2'])
+            assert all(allowed == {USER_VIEW: False, COMMENT_CREATE: True} for allowed in result.values())
+            loads = len(authorizer.loads)
+            result = authorizer.check_many(COMMENT_CREATE, [5, 6], user=USERS['4'])
+            assert result == {'5': {COMMENT_CREATE: False}, '6': {COMMENT_CREATE: False}}
+        # 被拉黑的用户没有任何权限，用户ID不需要读取主体
+        assert len(authorizer.loads) == loads
+
+
+class TestUserStatusApi:
+
+    def test_status(self, admin_client, add_user):
+        user_id = add_user('statusprobe')
+        admin_client.post(f'/admin/users/api/{user_id}/blacklist', json={'reason': 'spam'})
+        data = admin_client.get(f'/admin/users/api/{user_id}/status').get_json()
+        assert data['success'] is True
+        assert data['user']['username'] == 'statusprobe'
+        assert data['user']['is_blacklisted'] in (1, True)
+        assert data['user']['blacklist_reason'] == 'spam'
+
+    def test_missing_user(self, admin_client):
+        response = admin_client.get('/admin/users/api/987654/status')
+        assert response.status_code == 404
+        assert response.get_json() == {'success': False, 'message': '用户不存在'}
@@ -0,0 +1,43 @@
+"""
+批量导入测试：Markdown文件导入、渲染结果写入 document_renders 缓存
+"""
+import io
+
+from app_blueprints.bulk_import import BulkImporter
+from app_blueprints.render_cache import content_hash, render_markdown
+
+TUTORIAL = b"""---
+title: Importprobe publisher
+category: ImportProbe
+---
+# Importprobe publisher
+
+```python
+node.create_publisher(String, 'topic', 10)
+```
+"""
+
+
+def test_import_stores_rendered_html(admin_client, wiki_db):
+    response = admin_client.post('/admin/documents/import', content_type='multipart/form-data', data={
+        'files': [(io.BytesIO(TUTORIAL), 'importprobe.md'), (io.BytesIO(b'---\ntitle: x\n---\n'), 'empty.md')]})
+    report = response.get_json()['report']
+    assert report['imported'] == 1
+    assert report['failed'] == 1
+    assert report['rendered'] == 1
+
+    doc_id, content = wiki_db.execute(
+        "SELECT id, content FROM documents WHERE title = 'Importprobe publisher'").fetchone()
+    digest, html = wiki_db.execute('SELECT content_hash, html FROM document_renders WHERE document_id = ?',
+                                   (doc_id,)).fetchone()
+    assert digest == content_hash(content)
+    assert html == render_markdown(content)
+    assert 'codehilite' in html
+
+    response = admin_client.post('/admin/documents/import', content_type='multipart/form-data', data={
+        'files': [(io.BytesIO(TUTORIAL), 'importprobe.md')]})
+    assert response.get_json()['report']['skipped'] == 1
+
+
+def test_importer_parses_in_process_by_default(wiki_db):
+    assert BulkImporter(wiki_db).workers == 1
@@ -0,0 +1,105 @@
+"""
+后台任务测试：领取顺序、去重、失败重试、租约过期后重新排队、过期任务清理
+"""
+import os
+
+import pytest
+
+from app_blueprints import jobs
+from app_blueprints.jobs import JobRunner, PRIORITY_HIGH, PRIORITY_LOW
+
+
+@pytest.fixture
+def runner(tmp_path, monkeypatch):
+    calls = []
+
+    def record(context, payload):
+        calls.append((context.job_id, context.attempt, payload))
+        if payload.get('fail_until', 0) >= context.attempt:
+            raise RuntimeError(f"attempt {context.attempt}")
+        return {'echo': payload.get('value')}
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, 'test_record', record)
+    # 失败后立即重新排队，测试中不等待退避
+    monkeypatch.setattr(jobs, 'JOB_RETRY_BASE', 0)
+    runner = JobRunner(str(tmp_path / 'jobs.db'))
+    runner.calls = calls
+    return runner
+
+
+def test_claims_by_priority_and_deduplicates(runner):
+    low = runner.enqueue('test_record', {'value': 'low'}, priority=PRIORITY_LOW)
+    high = runner.enqueue('test_record', {'value': 'high'}, priority=PRIORITY_HIGH)
+    assert runner.enqueue('test_record', {'value': 'again'}, priority=PRIORITY_HIGH, dedupe_key='k') == \
+        runner.enqueue('test_record', {'value': 'again'}, priority=PRIORITY_HIGH, dedupe_key='k')
+
+    assert runner.run_pending(limit=1) == 1
+    assert runner.calls[0][0] == high
+    assert runner.run_pending() == 2
+    assert [call[0] for call in runner.calls][-1] == low
+    assert runner.get_job(high)['result'] == {'echo': 'high'}
+    assert runner.counts()['succeeded'] == 3
+    with pytest.raises(ValueError):
+        runner.enqueue('no_such_kind')
+
+
+def test_failed_jobs_retry_until_max_attempts(runner):
+    recovered = runner.enqueue('test_record', {'fail_until': 2, 'value': 1}, max_attempts=3)
+    exhausted = runner.enqueue('test_record', {'fail_until': 5}, max_attempts=2)
+    runner.run_pending()
+
+    job = runner.get_job(recovered)
+    assert (job['status'], job['attempts'], job['result'], job['error']) == ('succeeded', 3, {'echo': 1}, None)
+    job = runner.get_job(exhausted)
+    assert (job['status'], job['attempts']) == ('failed', 2)
+    assert job['error'] == 'RuntimeError: attempt 2'
+    assert runner.stats['retried'] == 3
+
+    assert runner.retry(exhausted) is True
+    assert runner.get_job(exhausted)['attempts'] == 0
+    assert runner.cancel(exhausted) is True
+    assert runner.run_pending() == 0
+
+
+def test_expired_lease_is_requeued(runner):
+    """领取任务的进程退出后租约过期，其他调度器重新排队执行；重试次数用尽的标记为失败"""
+    crashed = JobRunner(runner.db_key, lease_seconds=-1)
+    job_id = runner.enqueue('test_record', {'value': 'lease'})
+    last_try = runner.enqueue('test_record', {'value': 'last'}, max_attempts=1)
+    assert crashed._claim()['id'] == job_id
+    assert crashed._claim()['id'] == last_try
+    assert runner.get_job(job_id)['status'] == 'running'
+
+    assert runner.run_pending() == 1
+    assert runner.stats['recovered'] == 1
+    job = runner.get_job(job_id)
+    assert (job['status'], job['attempts']) == ('succeeded', 2)
+    job = runner.get_job(last_try)
+    assert (job['status'], job['error']) == ('failed', '执行进程退出，租约过期')
+
+
+def test_purge_removes_export_files(runner, tmp_path, monkeypatch):
+    """清理过期任务时删除导出任务生成的文件，其他任务结果中的路径不受影响"""
+    def export(context, payload):
+        path = tmp_path / f"audit_logs_job{context.job_id}.csv"
+        path.write_text('id\n')
+        return {'path': str(path)}
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, 'audit_export', export)
+    export_id = runner.enqueue('audit_export')
+    kept = tmp_path / 'kept.csv'
+    kept.write_text('id\n')
+    other_id = runner.enqueue('test_record', {'value': str(kept)})
+    assert runner.run_pending() == 2
+    path = runner.get_job(export_id)['result']['path']
+    assert os.path.exists(path)
+
+    runner._purge_finished()  # 保留期内不清理
+    assert runner.get_job(export_id) is not None
+
+    monkeypatch.setattr(jobs, 'JOB_RETENTION_DAYS', -1)
+    runner.last_purge = 0
+    runner._purge_finished()
+    assert runner.get_job(export_id) is None and runner.get_job(other_id) is None
+    assert not os.path.exists(path)
+    assert kept.exists()
@@ -0,0 +1,107 @@
+"""
+密码哈希测试：与werkzeug互相验证、旧sha256哈希验证并升级、成本差异容差
+"""
+import hashlib
+
+import pytest
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app_blueprints.passwords import LEGACY_SALT, PasswordHasher, parse_hash
+
+# 测试使用低成本参数，格式与默认参数相同
+HASHERS = {
+    'pbkdf2': lambda: PasswordHasher('pbkdf2', iterations=1000),
+    'scrypt': lambda: PasswordHasher('scrypt', scrypt_n=2 ** 14),
+}
+WERKZEUG_METHODS = {
+    'pbkdf2': 'pbkdf2:sha256:1000',
+    'scrypt': 'scrypt:16384:8:1',
+}
+
+
+@pytest.fixture(params=sorted(HASHERS))
+def hasher(request):
+    return HASHERS[request.param]()
+
+
+def legacy_hash(password):
+    return hashlib.sha256((password + LEGACY_SALT).encode('utf-8')).hexdigest()
+
+
+class TestWerkzeugCompatibility:
+
+    @pytest.mark.parametrize('password', ['secret', 'pässwörd 密码', ''])
+    def test_werkzeug_accepts_our_hashes(self, hasher, password):
+        stored = hasher.hash(password)
+        assert stored.startswith(hasher.method_string + '$')
+        assert check_password_hash(stored, password)
+        assert not check_password_hash(stored, password + 'x')
+
+    @pytest.mark.parametrize('password', ['secret', 'pässwörd 密码'])
+    def test_we_accept_werkzeug_hashes(self, hasher, password):
+        stored = generate_password_hash(password, method=WERKZEUG_METHODS[hasher.method])
+        assert hasher.verify(stored, password)
+        assert not hasher.verify(stored, password + 'x')
+        assert hasher.verify_and_update(stored, password) == (True, None)
+
+    def test_other_method_is_upgraded(self, hasher):
+        other = 'scrypt' if hasher.method == 'pbkdf2' else 'pbkdf2'
+        stored = generate_password_hash('secret', method=WERKZEUG_METHODS[other])
+        ok, new_hash = hasher.verify_and_update(stored, 'secret')
+        assert ok
+        assert new_hash.startswith(hasher.method_string + '$')
+        assert check_password_hash(new_hash, 'secret')
+
+
+class TestLegacyHashes:
+
+    def test_verify_and_upgrade(self, hasher):
+        stored = legacy_hash('secret')
+        assert parse_hash(stored)[0] == 'legacy'
+        assert hasher.verify(stored, 'secret')
+        assert hasher.verify(stored.upper(), 'secret')
+        assert hasher.needs_rehash(stored)
+        ok, new_hash = hasher.verify_and_update(stored, 'secret')
+        assert ok
+        assert parse_hash(new_hash)[0] == hasher.method
+        assert hasher.verify_and_update(new_hash, 'secret') == (True, None)
+
+    def test_wrong_password_is_not_upgraded(self, hasher):
+        assert hasher.verify_and_update(legacy_hash('secret'), 'wrong') == (False, None)
+
+    @pytest.mark.parametrize('stored', [None, '', 'plaintext', 'abc$def', 'md5$salt$value', 'scrypt:x:8:1$salt$00'])
+    def test_unrecognized_hashes(self, hasher, stored):
+        assert not hasher.verify(stored, 'secret')
+        assert hasher.verify_and_update(stored, 'secret') == (False, None)
+
+
+class TestNeedsRehash:
+
+    @pytest.mark.parametrize('iterations, expected', [
+        (100000, False),
+        (141000, False),
+        (71000, False),
+        (142000, True),
+        (70000, True),
+        (600000, True),
+    ])
+    def test_pbkdf2_cost_tolerance(self, iterations, expected):
+        hasher = PasswordHasher('pbkdf2', iterations=100000)
+        assert hasher.needs_rehash(f'pbkdf2:sha256:{iterations}$salt$00') is expected
+
+    def test_pbkdf2_digest_change(self):
+        hasher = PasswordHasher('pbkdf2', iterations=100000)
+        assert hasher.needs_rehash('pbkdf2:sha512:100000$salt$00')
+
+    @pytest.mark.parametrize('stored, expected', [
+        ('scrypt:32768:8:1$salt$00', False),
+        # n只能取2的幂，相差一倍即超出容差
+        ('scrypt:65536:8:1$salt$00', True),
+        ('scrypt:16384:8:1$salt$00', True),
+        ('scrypt:32768:16:1$salt$00', True),
+        ('scrypt:32768:8:2$salt$00', True),
+        ('pbkdf2:sha256:600000$salt$00', True),
+    ])
+    def test_scrypt_params(self, stored, expected):
+        hasher = PasswordHasher('scrypt', scrypt_n=2 ** 15)
+        assert hasher.needs_rehash(stored) is expected
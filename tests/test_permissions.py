@@ -0,0 +1,100 @@
+"""
+用户管理测试：拉黑/解除拉黑、操作日志读取、批量用户操作
+"""
+from app_blueprints.permissions import get_user_manager
+
+
+class TestUserLogs:
+    """操作日志读取使用 get_db_connection，与拉黑/解除拉黑写入的日志一致"""
+
+    def test_blacklist_cycle_is_logged(self, admin_client, add_user):
+        user_id = add_user('logprobe')
+        response = admin_client.post(f'/admin/users/api/{user_id}/blacklist', json={'reason': 'spam'})
+        assert response.get_json()['success'] is True
+        response = admin_client.post(f'/admin/users/api/{user_id}/unblacklist')
+        assert response.get_json() == {'success': True, 'message': '用户 logprobe 已解除拉黑'}
+
+        timeline = admin_client.get(f'/admin/users/api/audit/timeline/{user_id}').get_json()['timeline']
+        assert sorted(item['action'] for item in timeline) == ['BLACKLIST', 'UNBLACKLIST']
+        assert all(item['target_name'] == 'logprobe' for item in timeline)
+
+        um = get_user_manager()
+        logs = um.get_user_logs(user_id)
+        assert logs['total'] == 2
+        assert {log['admin_name'] for log in logs['logs']} == {'ros2_admin'}
+        filtered = um.get_operation_logs(user_id=user_id, action='BLACKLIST')
+        assert filtered['total'] == 1
+        assert filtered['logs'][0]['reason'] == 'spam'
+        summary = um.get_admin_activity_summary()
+        assert any(stat['action'] == 'UNBLACKLIST' for stat in summary['activity_stats'])
+        assert um.get_security_alerts() == []
+
+        assert admin_client.get(f'/admin/users/{user_id}/logs').status_code == 200
+
+    def test_unblacklist_rejects_active_user(self, admin_client, add_user):
+        user_id = add_user('activeprobe')
+        response = admin_client.post(f'/admin/users/api/{user_id}/unblacklist')
+        assert response.get_json() == {'success': False, 'message': '用户未被拉黑'}
+        assert get_user_manager().get_user_statistics(user_id) == {
+            'comment_count': 0, 'document_count': 0, 'recent_comments': []}
+
+
+class TestBulkUserOperations:
+    """批量用户操作：集合语句一次处理，只有状态实际变化的用户计入结果"""
+
+    def batch(self, client, operation, user_ids, reason=None):
+        return client.post(f'/admin/users/api/batch/{operation}', json={'user_ids': user_ids, 'reason': reason})
+
+    def test_blacklist_skips_unchanged_users(self, admin_client, add_user, wiki_db):
+        ids = [add_user(f'bulkprobe{i}') for i in range(3)]
+        assert self.batch(admin_client, 'blacklist', ids[:1]).get_json()['affected_ids'] == ids[:1]
+
+        data = self.batch(admin_client, 'blacklist', ids + [ids[1]], reason='spam').get_json()
+        assert data['success'] is True
+        assert data['affected_ids'] == ids[1:]
+        assert '1 个用户不存在或无需变更' in data['message']
+        marks = ','.join('?' * len(ids))
+        assert wiki_db.execute(f'SELECT COUNT(*) FROM users WHERE is_blacklisted = 1 AND id IN ({marks})',
+                               ids).fetchone()[0] == 3
+
+        data = self.batch(admin_client, 'unblacklist', ids).get_json()
+        assert data['affected_ids'] == ids
+        assert get_user_manager().get_operation_logs(action='BATCH_UNBLACKLIST')['total'] >= 3
+
+    def test_toggle_admin_and_self_protection(self, admin_client, add_user, wiki_db):
+        user_id = add_user('toggleprobe')
+        assert self.batch(admin_client, 'toggle-admin', [user_id]).get_json()['affected_ids'] == [user_id]
+        assert wiki_db.execute('SELECT is_admin FROM users WHERE id = ?', (user_id,)).fetchone()[0] == 1
+
+        admin_id = wiki_db.execute("SELECT id FROM users WHERE username = 'ros2_admin'").fetchone()[0]
+        response = self.batch(admin_client, 'delete', [user_id, admin_id])
+        assert response.status_code == 400
+        assert response.get_json()['message'] == '不能删除当前登录的用户'
+        assert self.batch(admin_client, 'rename', [user_id]).status_code == 400
+        assert self.batch(admin_client, 'blacklist', ['abc']).get_json()['message'] == '无效的用户ID'
+
+    def test_delete_detaches_dependent_rows(self, admin_client, add_user, wiki_db):
+        """删除用户时评论一并删除，文档和操作日志保留但不再引用已删除的用户（PostgreSQL外键），日志备注保留用户名"""
+        ids = [add_user('deleteprobe_author'), add_user('deleteprobe_admin', is_admin=True)]
+        doc_id = wiki_db.execute("INSERT INTO documents (title, content, author_id) VALUES ('Deleteprobe', 'x', ?)",
+                                 (ids[0],)).lastrowid
+        wiki_db.execute('INSERT INTO comments (document_id, user_id, content) VALUES (?, ?, ?)',
+                        (doc_id, ids[0], 'comment'))
+        log_id = wiki_db.execute("INSERT INTO user_logs (admin_id, target_user_id, action, reason) "
+                                 "VALUES (?, ?, 'BLACKLIST', 'spam')", (ids[1], ids[0])).lastrowid
+        wiki_db.commit()
+        admin_client.post(f'/admin/users/api/{ids[0]}/blacklist', json={'reason': 'spam'})
+
+        data = self.batch(admin_client, 'delete', ids).get_json()
+        assert data['affected_ids'] == ids
+
+        marks = ','.join('?' * len(ids))
+        assert wiki_db.execute(f'SELECT COUNT(*) FROM users WHERE id IN ({marks})', ids).fetchone()[0] == 0
+        assert wiki_db.execute('SELECT author_id FROM documents WHERE id = ?', (doc_id,)).fetchone() == (None,)
+        assert wiki_db.execute('SELECT COUNT(*) FROM comments WHERE document_id = ?', (doc_id,)).fetchone()[0] == 0
+        assert wiki_db.execute(f'SELECT COUNT(*) FROM user_logs WHERE admin_id IN ({marks}) '
+                               f'OR target_user_id IN ({marks})', ids + ids).fetchone()[0] == 0
+        assert wiki_db.execute('SELECT reason FROM user_logs WHERE id = ?', (log_id,)).fetchone() == (
+            f'spam（操作人：deleteprobe_admin，ID {ids[1]}）（目标用户：deleteprobe_author，ID {ids[0]}）',)
+        reasons = [row[0] for row in wiki_db.execute("SELECT reason FROM user_logs WHERE action = 'BATCH_DELETE'")]
+        assert f'批量管理操作：deleteprobe_author (ID {ids[0]})' in reasons
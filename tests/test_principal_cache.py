@@ -0,0 +1,113 @@
+"""
+用户主体缓存测试：版本号未变时使用缓存，失效后下一次读取重新加载
+"""
+import os
+
+import pytest
+
+from app_blueprints.principal_cache import PrincipalCache, create_version_store
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def version_store(request, tmp_path):
+    if request.param == 'memory':
+        return create_version_store('memory://')
+    return create_version_store('sqlite:///' + os.path.join(tmp_path, 'versions.db'))
+
+
+class CountingLoader:
+    """记录数据库读取次数的主体加载函数"""
+
+    def __init__(self, users):
+        self.users = users
+        self.calls = []
+
+    def __call__(self, user_id):
+        self.calls.append(user_id)
+        return self.users.get(user_id)
+
+    def many(self, user_ids):
+        self.calls.extend(user_ids)
+        return [self.users[user_id] for user_id in user_ids if user_id in self.users]
+
+
+class TestPrincipalCache:
+
+    def test_invalidate_reloads_principal(self, version_store):
+        loader = CountingLoader({'1': ('1', 'alice', 'a@example.com', False, False)})
+        cache = PrincipalCache(loader, store=version_store)
+        assert cache.get(1)[1] == 'alice'
+        assert cache.get(1)[4] is False
+        assert loader.calls == ['1']
+
+        loader.users['1'] = ('1', 'alice', 'a@example.com', False, True)
+        cache.invalidate(1)
+        assert cache.get(1)[4] is True
+        assert loader.calls == ['1', '1']
+        assert cache.stats['hits'] == 1 and cache.stats['misses'] == 2
+
+    def test_version_bump_reaches_other_caches(self, version_store):
+        # 两个缓存共用一个版本号存储（模拟两个worker），一个失效后另一个也重新加载
+        loader = CountingLoader({'1': ('1', 'alice', 'a@example.com', False, False)})
+        worker_a = PrincipalCache(loader, store=version_store)
+        worker_b = PrincipalCache(loader, store=version_store)
+        worker_a.get(1)
+        worker_b.get(1)
+
+        loader.users['1'] = ('1', 'alice', 'a@example.com', True, False)
+        version_store.bump(['1'])
+        assert worker_b.get(1)[3] is True
+        assert worker_b.stats['stale'] == 1
+        assert worker_a.get(1)[3] is True
+
+    def test_missing_users_are_cached(self, version_store):
+        loader = CountingLoader({})
+        cache = PrincipalCache(loader, store=version_store)
+        assert cache.get(404) is None
+        assert cache.get(404) is None
+        assert loader.calls == ['404']
+
+    def test_get_many_reloads_only_invalidated(self, version_store):
+        users = {str(i): (str(i), f'user{i}', f'user{i}@example.com', False, False) for i in range(1, 4)}
+        loader = CountingLoader(users)
+        cache = PrincipalCache(loader, store=version_store, batch_loader=loader.many)
+        principals = cache.get_many([1, 2, 3, 99])
+        assert sorted(principals) == ['1', '2', '3', '99']
+        assert principals['99'] is None
+
+        loader.calls.clear()
+        users['2'] = ('2', 'user2', 'user2@example.com', False, True)
+        cache.invalidate(2)
+        principals = cache.get_many([1, 2, 3, 99])
+        assert loader.calls == ['2']
+        assert principals['2'][4] is True
+        assert principals['1'][4] is False
+
+    def test_lru_evicts_oldest(self, version_store):
+        loader = CountingLoader({str(i): (str(i), f'user{i}', '', False, False) for i in range(3)})
+        cache = PrincipalCache(loader, store=version_store, max_entries=2)
+        for user_id in (0, 1, 2):
+            cache.get(user_id)
+        assert cache.status()['cached'] == 2
+        cache.get(0)
+        assert loader.calls == ['0', '1', '2', '0']
+
+
+class TestSessionInvalidation:
+    """拉黑后已登录的会话在下一个请求即失效"""
+
+    def test_blacklist_ends_session(self, wiki, admin_client, add_user):
+        user_id = add_user('sessionprobe')
+        client = wiki.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        assert client.get('/documents').status_code == 200
+        assert client.get('/documents').status_code == 200
+
+        response = admin_client.post(f'/admin/users/api/{user_id}/blacklist', json={'reason': 'spam'})
+        assert response.get_json()['success'] is True
+        assert client.get('/documents').status_code == 302
+
+        admin_client.post(f'/admin/users/api/{user_id}/unblacklist')
+        assert wiki.principal_cache.get(user_id)[4] in (0, False)
@@ -0,0 +1,85 @@
+"""
+限流测试：GCRA判断、各存储后端一致、装饰器返回429、存储出错时放行
+"""
+import pytest
+from flask import Flask
+
+from app_blueprints.ratelimit import RateLimiter, MemoryStorage, SQLiteStorage, gcra, rate_limit
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStorage()
+    return SQLiteStorage(str(tmp_path / 'ratelimit.db'))
+
+
+def test_gcra_allows_burst_then_spaces_requests():
+    tat, results = None, []
+    for _ in range(4):
+        allowed, tat = gcra(tat, 100.0, 1.0, 3)
+        results.append(allowed)
+    assert results == [True, True, True, False]
+    assert gcra(tat, 101.0, 1.0, 3)[0] is True
+
+
+def test_storages_share_gcra_semantics(storage):
+    now = 1000.0
+    # 10秒5次：可以一次性发出5次，之后每2秒恢复1次
+    assert [storage.hit('k', now, 2.0, 5)[0] for _ in range(6)] == [True] * 5 + [False]
+    assert storage.hit('k', now + 1.9, 2.0, 5)[0] is False
+    assert storage.hit('k', now + 2.0, 2.0, 5)[0] is True
+    assert storage.hit('other', now, 2.0, 5)[0] is True
+
+    storage.reset('k')
+    assert storage.hit('k', now + 2.0, 2.0, 5)[0] is True
+    # 进程内存储在访问时已顺带淘汰过期key，sweep只清理剩余的
+    storage.sweep(now + 100)
+    assert storage.key_count() == 0
+
+
+def test_result_reports_remaining_and_retry_after():
+    limiter = RateLimiter(MemoryStorage())
+    results = [limiter.hit('client', 3, 30) for _ in range(4)]
+    assert [r.remaining for r in results] == [2, 1, 0, 0]
+    assert not results[-1].allowed
+    assert 9 < results[-1].retry_after <= 10
+    assert limiter.status()['rejected'] == 1
+
+
+def test_memory_storage_evicts_oldest_keys():
+    storage = MemoryStorage(max_keys=3)
+    for i in range(10):
+        storage.hit(f'k{i}', 1000.0, 1.0, 5)
+    assert storage.key_count() <= 3
+    assert storage.evicted >= 7
+
+
+def test_decorator_returns_429_with_headers():
+    app = Flask(__name__)
+    limiter = RateLimiter(MemoryStorage())
+
+    @app.route('/limited')
+    @rate_limit(max_requests=2, window=60, limiter=limiter)
+    def limited():
+        return 'ok'
+
+    client = app.test_client()
+    assert [client.get('/limited').status_code for _ in range(2)] == [200, 200]
+    response = client.get('/limited')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.headers['X-RateLimit-Remaining'] == '0'
+    # 按客户端IP分别计数
+    assert client.get('/limited', headers={'X-Forwarded-For': '10.0.0.2'}).status_code == 200
+
+
+def test_storage_errors_fail_open():
+    class BrokenStorage(MemoryStorage):
+        def hit(self, *args):
+            raise OSError('disk full')
+
+    limiter = RateLimiter(BrokenStorage())
+    assert limiter.hit('client', 1, 60).allowed
+    assert limiter.is_allowed('client', 1, 60)
+    assert limiter.stats['errors'] == 2
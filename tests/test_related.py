@@ -0,0 +1,57 @@
+"""
+相关文档测试：增量更新处理新增、修改和删除的文档
+"""
+import sqlite3
+
+import pytest
+
+from app_blueprints.related import RelatedDocumentsEngine, HAS_NUMPY
+
+pytestmark = pytest.mark.skipif(not HAS_NUMPY, reason='需要 numpy 和 scipy')
+
+TOPICS = ['publisher subscriber topic message', 'service client request response',
+          'action goal feedback result', 'launch file parameter node']
+
+
+@pytest.fixture
+def engine(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'related.db'))
+    conn.execute('CREATE TABLE documents (id INTEGER PRIMARY KEY, title TEXT, content TEXT, updated_at TEXT)')
+    conn.executemany('INSERT INTO documents (id, title, content) VALUES (?, ?, ?)',
+                     [(i, f'doc {i}', TOPICS[i % len(TOPICS)] + f' ros2 rclpy extra{i % 3}')
+                      for i in range(1, 25)])
+    conn.commit()
+    yield RelatedDocumentsEngine(conn, top_k=5)
+    conn.close()
+
+
+def neighbor_ids(conn):
+    return {row[0] for row in conn.execute('SELECT document_id FROM document_neighbors')} | \
+        {row[0] for row in conn.execute('SELECT neighbor_id FROM document_neighbors')}
+
+
+def test_incremental_update_drops_deleted_documents(engine):
+    engine.rebuild()
+    conn = engine.conn
+    assert 5 in neighbor_ids(conn)
+
+    conn.execute('DELETE FROM documents WHERE id = 5')
+    conn.commit()
+    stats = engine.update_incremental()
+    assert stats['deleted'] == 1
+    assert 5 not in neighbor_ids(conn)
+    assert engine.update_incremental()['recomputed'] == 0
+
+
+def test_empty_updated_at_watermark(engine):
+    """构建时文档都没有修改时间，之后修改的文档仍能被识别"""
+    engine.rebuild()
+    conn = engine.conn
+    assert conn.execute("SELECT value FROM document_neighbors_meta WHERE key = 'max_updated_at'").fetchone()[0] == ''
+    assert engine.update_incremental()['changed'] == 0
+
+    conn.execute("UPDATE documents SET content = 'action goal feedback', updated_at = '2026-01-01 00:00:00' "
+                 "WHERE id = 2")
+    conn.commit()
+    assert engine.update_incremental()['changed'] == 1
+    assert engine.update_incremental()['changed'] == 0
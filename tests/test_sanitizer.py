@@ -0,0 +1,110 @@
+"""
+HTML白名单清理测试：常见XSS写法、畸形标签、实体编码，以及评论的保存和渲染
+"""
+import pytest
+
+from app_blueprints.sanitizer import HTMLSanitizer
+from app_blueprints.security import InputValidator
+from conftest import USER_LOGIN
+
+
+@pytest.fixture
+def sanitizer():
+    return HTMLSanitizer()
+
+
+class TestXSSPayloads:
+
+    @pytest.mark.parametrize('payload, expected', [
+        ('<p>hi<script>alert(1)</script>there</p>', '<p>hithere</p>'),
+        ('<SCRIPT SRC=//evil.js></SCRIPT>ok', 'ok'),
+        ('<p style="color:red">a</p><style>p{}</style>b', '<p>a</p>b'),
+        ('<img src=x onerror=alert(1)>', '<img src="x">'),
+        ('<svg onload=alert(1)><p>x</p></svg>', '<p>x</p>'),
+        ('<div><iframe src=x></iframe><b>bold</b></div>', 'bold'),
+        ('<table class="t" onmouseover=x><tr><td colspan=2 style=x>c</td></tr></table>',
+         '<table class="t"><tr><td colspan="2">c</td></tr></table>'),
+    ])
+    def test_scripts_and_event_handlers(self, sanitizer, payload, expected):
+        assert sanitizer.sanitize(payload) == expected
+
+    @pytest.mark.parametrize('href', [
+        'javascript:alert(1)',
+        ' JaVaScRiPt:alert(1)',
+        'java\tscript:alert(1)',
+        'java&#x0A;script:alert(1)',
+        '&#106;avascript:alert(1)',
+        'vbscript:msgbox(1)',
+        'data:text/html,<script>alert(1)</script>',
+    ])
+    def test_dangerous_urls_removed(self, sanitizer, href):
+        assert sanitizer.sanitize(f'<a href="{href}" onclick="x()">x</a>') == '<a>x</a>'
+        assert sanitizer.sanitize(f'<img src="{href}" alt="x">') == '<img alt="x">'
+
+    @pytest.mark.parametrize('href', ['https://ros.org', 'http://ros.org/x', 'mailto:a@b.c', '/docs/1', '#top'])
+    def test_safe_urls_kept(self, sanitizer, href):
+        assert sanitizer.sanitize(f'<a href="{href}">x</a>') == f'<a href="{href}">x</a>'
+
+    def test_attribute_values_escaped(self, sanitizer):
+        result = sanitizer.sanitize('<a href="/docs?a=1&b=2" title=\'"><script>\'>x</a>')
+        assert result == '<a href="/docs?a=1&amp;b=2" title="&quot;&gt;&lt;script&gt;">x</a>'
+
+    def test_duplicate_attribute_cannot_override(self, sanitizer):
+        result = sanitizer.sanitize('<img src="https://a/b.png" src="javascript:x" alt="a">')
+        assert result == '<img src="https://a/b.png" alt="a">'
+
+    @pytest.mark.parametrize('payload, expected', [
+        ('<!-- <script>alert(1)</script> -->ok', 'ok'),
+        ('<!DOCTYPE html><?php x ?>ok', 'ok'),
+        ('<scr<script>ipt>alert(1)</script>', 'ipt>alert(1)'),
+        ('<em><strong>x</em></strong></p></p>', '<em><strong>x</strong></em>'),
+        ('<ul><li>a<li>b', '<ul><li>a<li>b</li></li></ul>'),
+    ])
+    def test_comments_and_malformed_tags(self, sanitizer, payload, expected):
+        assert sanitizer.sanitize(payload) == expected
+
+    def test_entities(self, sanitizer):
+        # 已编码的标签保持编码；无效实体和裸露的 < 被转义，> 保留（Markdown 引用）
+        encoded = '&lt;script&gt;alert(1)&lt;/script&gt;'
+        assert sanitizer.sanitize(encoded) == encoded
+        assert (sanitizer.sanitize('&bogus; &#0; &#x110000; &amp; 5 < 6 > 4')
+                == '&amp;bogus; &amp;#0; &amp;#x110000; &amp; 5 &lt; 6 > 4')
+
+    def test_streaming_split_inside_tag(self, sanitizer):
+        chunks = ['<p>a<scr', 'ipt>alert(1)</scr', 'ipt>b</p>']
+        assert ''.join(sanitizer.iter_sanitize(chunks)) == '<p>ab</p>'
+
+    def test_cache(self, sanitizer):
+        payload = '<p onclick="x()">a</p>'
+        assert sanitizer.sanitize(payload) == sanitizer.sanitize(payload) == '<p>a</p>'
+        assert sanitizer.stats['hits'] == 1 and sanitizer.stats['misses'] == 1
+        assert sanitizer.sanitize('plain text') == 'plain text'
+
+    def test_input_validator(self):
+        assert InputValidator.sanitize_html('<b>x</b><em>y</em>') == 'x<em>y</em>'
+        assert InputValidator.sanitize_html('<em>y</em>', allow_tags=False) == '&lt;em&gt;y&lt;/em&gt;'
+
+
+class TestComments:
+    """评论保存前清理，渲染时再次清理（覆盖清理功能上线前保存的评论）"""
+
+    def test_comment_is_sanitized(self, wiki, wiki_db, add_document):
+        doc_id = add_document('Sanitizer probe', 'body', 'tutorial')
+        client = wiki.app.test_client()
+        assert client.post('/login', data=USER_LOGIN).status_code == 302
+
+        client.post(f'/document/{doc_id}/comment',
+                    data={'content': '<em>nice</em><script>alert(1)</script><img src=x onerror=alert(2)>'})
+        stored = wiki_db.execute('SELECT content FROM comments WHERE document_id = ?', (doc_id,)).fetchall()
+        assert stored == [('<em>nice</em><img src="x">',)]
+
+        client.post(f'/document/{doc_id}/comment', data={'content': '<script>alert(1)</script>'})
+        assert wiki_db.execute('SELECT COUNT(*) FROM comments WHERE document_id = ?', (doc_id,)).fetchone()[0] == 1
+
+        wiki_db.execute('INSERT INTO comments (content, user_id, document_id) VALUES (?, 1, ?)',
+                        ('<a href="javascript:alert(3)">legacy</a>', doc_id))
+        wiki_db.commit()
+        page = client.get(f'/document/{doc_id}').get_data(as_text=True)
+        assert '<em>nice</em>' in page
+        assert '<a>legacy</a>' in page
+        assert 'alert(' not in page
@@ -0,0 +1,230 @@
+"""
+搜索测试：/search 分面统计、分类筛选、分面缓存失效、拼写纠错和批量搜索
+"""
+import json
+import sqlite3
+
+import pytest
+
+from app_blueprints.fts_maintenance import FTSMaintenance
+from app_blueprints import search
+from app_blueprints.search import SearchEngine
+from app_blueprints.trigram import TrigramIndex
+
+
+def facet_counts(data):
+    return {facet['category']: facet['count'] for facet in data['facets']}
+
+
+class TestFacetedSearch:
+    """分面搜索"""
+
+    def test_search_page_shows_facet_counts(self, wiki_client, add_document):
+        """/search 使用分面搜索：分类计数基于全部命中，结果按所选分类筛选"""
+        add_document('Facetprobe launch files', 'facetprobe launch tutorial', 'FacetLaunch')
+        add_document('Facetprobe parameters', 'facetprobe parameters tutorial', 'FacetLaunch')
+        add_document('Facetprobe topics', 'facetprobe topics tutorial', 'FacetTopics')
+
+        response = wiki_client.get('/search?q=facetprobe&category=FacetTopics')
+        assert response.status_code == 200
+        page = response.get_data(as_text=True)
+        assert 'FacetLaunch (2)' in page
+        assert 'FacetTopics (1)' in page
+        assert '找到 <strong>1</strong> 个结果' in page
+        assert 'Facetprobe topics' in page.replace('<mark class="search-highlight">Facetprobe</mark>',
+                                                    'Facetprobe')
+        assert 'Facetprobe parameters' not in page
+
+    def test_search_api_filters_by_category(self, wiki_client, add_document):
+        add_document('Facetapi nodes', 'facetapi', 'FacetApiA')
+        add_document('Facetapi services', 'facetapi', 'FacetApiA')
+        add_document('Facetapi actions', 'facetapi', 'FacetApiB')
+
+        data = wiki_client.get('/search/api?q=facetapi&category=FacetApiB').get_json()
+        assert facet_counts(data) == {'FacetApiA': 2, 'FacetApiB': 1}
+        assert data['total'] == 1
+        assert data['total_unfiltered'] == 3
+        assert [r['category'] for r in data['results']] == ['FacetApiB']
+        assert {f['category']: f['selected'] for f in data['facets']} == {'FacetApiA': False, 'FacetApiB': True}
+
+    def test_results_are_escaped(self, wiki_client, add_document):
+        add_document('Escapeprobe <script>alert(1)</script>', 'escapeprobe <img src=x onerror=alert(1)>', 'Escape')
+        page = wiki_client.get('/search?q=escapeprobe').get_data(as_text=True)
+        assert '<script>alert(1)</script>' not in page
+        assert 'onerror=alert(1)>' not in page
+
+    def test_document_writes_invalidate_facets(self, admin_client, wiki_client, add_document):
+        """分面缓存按查询词缓存，新建文档后计数和总数立即更新"""
+        add_document('Staleprobe first', 'staleprobe', 'StaleA')
+        assert facet_counts(wiki_client.get('/search/api?q=staleprobe').get_json()) == {'StaleA': 1}
+
+        response = admin_client.post('/create-document', data={
+            'title': 'Staleprobe second', 'content': 'staleprobe', 'category': 'StaleB'})
+        assert response.status_code == 302
+
+        data = wiki_client.get('/search/api?q=staleprobe').get_json()
+        assert facet_counts(data) == {'StaleA': 1, 'StaleB': 1}
+        assert data['total'] == 2
+
+
+class TestDidYouMean:
+    """拼写纠错：查询无结果时按三元组词典纠正，文档修改和删除后词典同步更新"""
+
+    @staticmethod
+    def doc_freq(wiki_db, term):
+        row = wiki_db.execute('SELECT doc_freq FROM search_terms WHERE term = ?', (term,)).fetchone()
+        return row[0] if row else 0
+
+    @pytest.fixture(autouse=True)
+    def dictionary(self, wiki, wiki_client):
+        """词典由后台任务构建：未就绪时第一次零结果搜索提交任务，测试中直接执行"""
+        TrigramIndex._rebuild_requested.pop(wiki.app.config['DATABASE'], None)
+        wiki_client.get('/search/api?q=dictionaryprobe')
+        wiki.job_runner.run_pending()
+
+    def test_dictionary_is_built_in_background(self, wiki, wiki_client, wiki_db, add_document, monkeypatch):
+        add_document('Backgroundprobe', 'node.create_subscription(String, "chatter", callback)', 'Typo')
+        wiki_db.execute('DROP TABLE search_term_trigrams')
+        wiki_db.execute('DROP TABLE search_terms')
+        wiki_db.commit()
+        monkeypatch.setattr(TrigramIndex, '_ready', {})
+        monkeypatch.setattr(TrigramIndex, '_rebuild_requested', {})
+
+        # 请求中不构建词典：没有建议，提交一个重建任务，短时间内重复的零结果搜索不再提交
+        for _ in range(2):
+            data = wiki_client.get('/search/api?q=subscibtion').get_json()
+            assert data['total'] == 0
+            assert data['did_you_mean'] == [] and 'corrected_query' not in data
+        assert len(wiki.job_runner.list_jobs(status='queued', kind='trigram_rebuild')) == 1
+
+        wiki.job_runner.run_pending()
+        data = wiki_client.get('/search/api?q=subscibtion').get_json()
+        assert data['corrected_query'] == 'subscription'
+
+    def test_misspelled_query_is_autocorrected(self, admin_client, wiki_client):
+        response = admin_client.post('/create-document', data={
+            'title': 'Typoprobe node', 'category': 'Typo',
+            'content': 'node.create_subscription(String, "chatter", callback)\nrclpy.spin(node)'})
+        assert response.status_code == 302
+
+        data = wiki_client.get('/search/api?q=subscibtion').get_json()
+        assert data['corrected_query'] == 'subscription'
+        assert data['did_you_mean'][0]['text'] == 'subscription'
+        assert data['total'] >= 1
+
+        data = wiki_client.get('/search/api?q=rclpy.spn').get_json()
+        assert data['corrected_query'] == 'rclpy.spin'
+        assert any(r['title'] == 'Typoprobe node' for r in data['results'])
+
+        page = wiki_client.get('/search?q=subscibtion').get_data(as_text=True)
+        assert 'subscription' in page
+
+    def test_edits_and_deletes_update_dictionary(self, admin_client, wiki_client, wiki_db):
+        """重复保存不会让 doc_freq 增长，删掉的词条从词典中移除"""
+        wiki_client.get('/search/api?q=subscibtion')  # 确保词典已构建
+        admin_client.post('/create-document', data={
+            'title': 'Dictprobe', 'content': 'dictprobe_alpha dictprobe_beta', 'category': 'Dict'})
+        doc_id = wiki_db.execute("SELECT id FROM documents WHERE title = 'Dictprobe'").fetchone()[0]
+        assert self.doc_freq(wiki_db, 'dictprobe_alpha') == 1
+
+        for _ in range(3):
+            admin_client.post(f'/edit-document/{doc_id}', data={
+                'title': 'Dictprobe', 'content': 'dictprobe_alpha dictprobe_beta', 'category': 'Dict'})
+        assert self.doc_freq(wiki_db, 'dictprobe_alpha') == 1
+
+        admin_client.post(f'/edit-document/{doc_id}', data={
+            'title': 'Dictprobe', 'content': 'dictprobe_alpha dictprobe_gamma', 'category': 'Dict'})
+        assert self.doc_freq(wiki_db, 'dictprobe_beta') == 0
+        assert self.doc_freq(wiki_db, 'dictprobe_gamma') == 1
+        orphans = wiki_db.execute('SELECT COUNT(*) FROM search_term_trigrams g '
+                                  'LEFT JOIN search_terms t ON t.id = g.term_id WHERE t.id IS NULL')
+        assert orphans.fetchone()[0] == 0
+
+        admin_client.post(f'/admin/delete_document/{doc_id}')
+        assert self.doc_freq(wiki_db, 'dictprobe_alpha') == 0
+        assert self.doc_freq(wiki_db, 'dictprobe') == 0
+
+
+class TestBatchSearch:
+    """批量搜索：POST /search/batch 相同查询只执行一次，结果按输入顺序返回"""
+
+    def test_duplicate_queries_run_once(self, wiki_client, add_document):
+        add_document('Batchprobe timers', 'batchprobe timers', 'BatchA')
+        add_document('Batchprobe clocks', 'batchprobe clocks', 'BatchB')
+
+        response = wiki_client.post('/search/batch', json={'queries': [
+            {'q': 'batchprobe'},
+            {'q': 'batchprobe', 'categories': ['BatchB']},
+            {'q': '  batchprobe  '},
+            {'q': 'batchprobe', 'categories': 'BatchB'},
+        ]})
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['unique_queries'] == 2
+        assert 'elapsed_ms' in data
+        assert [r['index'] for r in data['results']] == [0, 1, 2, 3]
+        assert [r['deduplicated'] for r in data['results']] == [False, False, True, True]
+        assert [r['total'] for r in data['results']] == [2, 1, 2, 1]
+        assert facet_counts(data['results'][1]) == {'BatchA': 1, 'BatchB': 1}
+        assert all('elapsed_ms' in r for r in data['results'])
+
+    def test_rejects_invalid_batches(self, wiki_client):
+        assert wiki_client.post('/search/batch', json={'queries': []}).status_code == 400
+        assert wiki_client.post('/search/batch', json={'queries': ['batchprobe']}).status_code == 400
+        assert wiki_client.post('/search/batch', json={'queries': [{'q': 'x', 'page': 'a'}]}).status_code == 400
+
+
+class TestFullTextIndex:
+    """存在 documents_fts 时的搜索：前缀匹配，没有命中时回退到LIKE，结果与不使用全文索引时一致"""
+
+    @staticmethod
+    def create_database(path, with_fts):
+        conn = sqlite3.connect(path)
+        conn.execute('''CREATE TABLE documents (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, content TEXT,
+                        category TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        if with_fts:
+            FTSMaintenance(conn).create_index()
+        conn.executemany('INSERT INTO documents (title, content, category) VALUES (?, ?, ?)', [
+            ('ROS2 timers', 'Periodic callbacks with wall timers', 'Timers'),
+            ('Subscribers', 'node.create_subscription(String, "chatter", callback)', 'Topics'),
+            ('Services', 'create_service and call_async', 'Services'),
+        ])
+        conn.commit()
+        conn.close()
+        return SearchEngine(path)
+
+    def test_matches_same_documents_as_like(self, tmp_path):
+        fts_engine = self.create_database(str(tmp_path / 'fts.db'), with_fts=True)
+        like_engine = self.create_database(str(tmp_path / 'like.db'), with_fts=False)
+        for query in ('timer', 'create_subscription', 'scription', 'call_async', 'ROS2 timers'):
+            fts_result = fts_engine.faceted_search(query)
+            like_result = like_engine.faceted_search(query)
+            assert fts_result['total'] == like_result['total'] >= 1, query
+            assert 'corrected_query' not in fts_result, query
+            assert facet_counts(fts_result) == facet_counts(like_result), query
+            # 第二次读取使用缓存的分面，当前页仍然与总数一致
+            assert len(fts_engine.faceted_search(query)['results']) == fts_result['total'], query
+
+    def test_index_changes_are_picked_up(self, tmp_path, monkeypatch):
+        """全文索引的检查结果按时间过期，查询时索引已被删除则改用LIKE"""
+        path = str(tmp_path / 'late.db')
+        engine = self.create_database(path, with_fts=False)
+        assert engine.faceted_search('timer')['total'] == 1
+        assert SearchEngine._fts_available[path][0] is False
+
+        conn = sqlite3.connect(path)
+        FTSMaintenance(conn).create_index()
+        conn.execute("INSERT INTO documents_fts(documents_fts) VALUES ('rebuild')")
+        conn.commit()
+        monkeypatch.setattr(search, 'FTS_CHECK_TTL', 0)
+        assert engine.faceted_search('subscri')['total'] == 1
+        assert SearchEngine._fts_available[path][0] is True
+
+        # 检查结果仍在有效期内时索引被删除：本次查询改用LIKE，检查结果被清除
+        monkeypatch.setattr(search, 'FTS_CHECK_TTL', 3600)
+        conn.execute('DROP TABLE documents_fts')
+        conn.commit()
+        conn.close()
+        result = engine.faceted_search('services')
+        assert result['total'] == 1 and 'error' not in result
+        assert path not in SearchEngine._fts_available
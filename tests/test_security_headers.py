@@ -0,0 +1,165 @@
+"""
+安全响应头和CSRF令牌测试：按路由查找策略、nonce、不覆盖视图设置的头、令牌签名/时效/匹配
+"""
+import time
+
+import pytest
+from flask import Blueprint, Flask, make_response, render_template_string
+
+from app_blueprints import security_headers
+from app_blueprints.security_headers import CSRFSigner, SecurityHeaders, parse_csp
+
+
+@pytest.fixture
+def secured_app():
+    app = Flask(__name__)
+    app.config['SECURITY_ROUTE_POLICIES'] = {
+        'admin': {'csp': {'script-src': ["'self'"]}, 'headers': {'X-Frame-Options': 'SAMEORIGIN'}},
+        'embed': {'csp': {'frame-ancestors': None}, 'headers': {'X-Frame-Options': None}},
+    }
+    admin = Blueprint('admin', __name__, url_prefix='/admin')
+
+    @admin.route('/')
+    def index():
+        return 'admin'
+
+    app.register_blueprint(admin)
+
+    @app.route('/')
+    def home():
+        return 'home'
+
+    @app.route('/embed')
+    def embed():
+        return 'embed'
+
+    @app.route('/inline')
+    def inline():
+        return render_template_string('<script nonce="{{ csp_nonce() }}">1</script>'
+                                      '<style nonce="{{ csp_nonce() }}"></style>')
+
+    @app.route('/custom')
+    def custom():
+        response = make_response('custom')
+        response.headers['X-Frame-Options'] = 'SAMEORIGIN'
+        response.headers['Content-Security-Policy'] = "default-src 'none'"
+        return response
+
+    headers = SecurityHeaders(app)
+    return app, headers
+
+
+class TestSecurityHeaders:
+
+    def test_policy_lookup(self, secured_app):
+        _, headers = secured_app
+        assert headers.policy_for('home') is headers.default
+        assert headers.policy_for('admin.index') is headers.route_policies['admin']
+        assert headers.policy_for('embed') is headers.route_policies['embed']
+        assert headers.policy_for(None) is headers.default
+        headers.add_route_policy('admin.index', headers={'Cache-Control': 'no-store'})
+        assert headers.policy_for('admin.index') is headers.route_policies['admin.index']
+
+    def test_route_headers(self, secured_app):
+        app, _ = secured_app
+        client = app.test_client()
+
+        home = client.get('/')
+        assert home.headers['X-Frame-Options'] == 'DENY'
+        assert home.headers['X-Content-Type-Options'] == 'nosniff'
+        assert 'Strict-Transport-Security' not in home.headers
+        csp = parse_csp(home.headers['Content-Security-Policy'])
+        assert csp['frame-ancestors'] == ["'none'"]
+        assert "'unsafe-inline'" in csp['script-src']
+
+        admin = client.get('/admin/')
+        assert admin.headers['X-Frame-Options'] == 'SAMEORIGIN'
+        assert parse_csp(admin.headers['Content-Security-Policy'])['script-src'] == ["'self'"]
+
+        embed = client.get('/embed')
+        assert 'X-Frame-Options' not in embed.headers
+        assert 'frame-ancestors' not in parse_csp(embed.headers['Content-Security-Policy'])
+
+    def test_nonce_only_when_requested(self, secured_app):
+        app, _ = secured_app
+        client = app.test_client()
+        assert 'nonce-' not in client.get('/').headers['Content-Security-Policy']
+
+        first = client.get('/inline')
+        csp = parse_csp(first.headers['Content-Security-Policy'])
+        nonce = next(source for source in csp['script-src'] if source.startswith("'nonce-"))[7:-1]
+        assert f"'nonce-{nonce}'" in csp['style-src']
+        assert first.get_data(as_text=True).count(f'nonce="{nonce}"') == 2
+        assert nonce not in client.get('/inline').headers['Content-Security-Policy']
+
+    def test_view_headers_not_overwritten(self, secured_app):
+        app, _ = secured_app
+        response = app.test_client().get('/custom')
+        assert response.headers.getlist('X-Frame-Options') == ['SAMEORIGIN']
+        assert response.headers.getlist('Content-Security-Policy') == ["default-src 'none'"]
+        assert response.headers['Referrer-Policy'] == 'strict-origin-when-cross-origin'
+
+    def test_report_only_and_hsts(self):
+        app = Flask(__name__)
+        app.config.update(SECURITY_HSTS=True, SECURITY_CSP_REPORT_ONLY=True)
+        app.route('/')(lambda: 'ok')
+        SecurityHeaders(app)
+        response = app.test_client().get('/')
+        assert response.headers['Strict-Transport-Security'].startswith('max-age=')
+        assert 'Content-Security-Policy' not in response.headers
+        assert 'Content-Security-Policy-Report-Only' in response.headers
+
+
+class TestCSRFSigner:
+
+    def test_valid_token(self):
+        signer = CSRFSigner('secret')
+        token = signer.generate()
+        assert signer.verify(token)
+        assert signer.verify(token, expected=token)
+        assert CSRFSigner(b'secret').verify(token)
+
+    def test_signature(self):
+        signer = CSRFSigner('secret')
+        token = signer.generate()
+        message, _, signature = token.rpartition(':')
+        assert not CSRFSigner('other').verify(token)
+        tampered = signature[:-1] + ('1' if signature[-1] == '0' else '0')
+        assert not signer.verify(f'{message}:{tampered}')
+        timestamp, nonce = message.split(':')
+        assert not signer.verify(f'{timestamp}:{nonce[::-1]}:{signature}')
+
+    def test_expiry(self, monkeypatch):
+        signer = CSRFSigner('secret', max_age=60)
+        token = signer.generate()
+        now = time.time()
+        monkeypatch.setattr(security_headers.time, 'time', lambda: now + 61)
+        assert not signer.verify(token)
+        assert signer.verify(token, max_age=120)
+        assert signer.expired(token)
+        monkeypatch.setattr(security_headers.time, 'time', lambda: now - 2 * security_headers.CLOCK_SKEW)
+        assert not signer.verify(token)
+
+    def test_session_mismatch(self):
+        signer = CSRFSigner('secret')
+        token, other = signer.generate(), signer.generate()
+        assert signer.verify(other)
+        assert not signer.verify(token, expected=other)
+        assert not signer.verify(token, expected='')
+
+    @pytest.mark.parametrize('token', [
+        None, '', 123, 'garbage', ':::', 'abc:def:0123', '{now}:abc',
+        '{now}:é:0123', '{now}:abc:é', '{now}:abc:٣٤',
+    ])
+    def test_malformed_tokens(self, token):
+        signer = CSRFSigner('secret')
+        if isinstance(token, str):
+            token = token.replace('{now}', str(int(time.time())))
+        assert signer.verify(token) is False
+        assert signer.verify(token, expected=signer.generate()) is False
+
+    def test_non_ascii_expected(self):
+        signer = CSRFSigner('secret')
+        token = signer.generate()
+        assert signer.verify(token, expected='é') is False
+        assert signer.verify('é', expected='é') is False
@@ -0,0 +1,71 @@
+"""
+安全状态测试：滑动窗口计数随时间衰减、封禁到期、本进程写入立即可见
+"""
+import pytest
+
+from app_blueprints.security_state import (SecurityState, MemoryStateStorage, SQLiteStateStorage,
+                                           FAILED_LOGINS)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStateStorage()
+    return SQLiteStateStorage(str(tmp_path / 'security.db'))
+
+
+def test_sliding_window_counts_decay(storage):
+    window = 60
+    assert storage.incr(FAILED_LOGINS, '10.0.0.1', 1, window, 600.0) == 1
+    assert storage.incr(FAILED_LOGINS, '10.0.0.1', 2, window, 630.0) == 3
+    # 下一窗口过去1/4：上一窗口的3次按 3/4 计入
+    assert storage.count(FAILED_LOGINS, '10.0.0.1', window, 675.0) == pytest.approx(2.25)
+    assert storage.incr(FAILED_LOGINS, '10.0.0.1', 1, window, 675.0) == pytest.approx(3.25)
+    # 两个窗口之后完全清零
+    assert storage.count(FAILED_LOGINS, '10.0.0.1', window, 800.0) == 0
+    assert storage.count(FAILED_LOGINS, 'unknown', window, 600.0) == 0
+
+    storage.reset(FAILED_LOGINS, '10.0.0.1')
+    assert storage.count(FAILED_LOGINS, '10.0.0.1', window, 675.0) == 0
+    assert storage.count('threat', '10.0.0.1', window, 675.0) == 0
+
+
+def test_blocks_expire(storage):
+    storage.block('10.0.0.9', 1000.0, 'brute force')
+    storage.block('10.0.0.8', 500.0, None)
+    assert [b['key'] for b in storage.list_blocks(400.0, 10)] == ['10.0.0.8', '10.0.0.9']
+    assert storage.stats(600.0)['blocked'] == 1
+    assert storage.blocked_until('10.0.0.9', 900.0) == 1000.0
+    assert storage.blocked_until('10.0.0.8', 900.0) is None
+    assert storage.unblock('10.0.0.9') is True
+    assert storage.unblock('10.0.0.9') is False
+    storage.sweep(600.0)
+    assert storage.list_blocks(0.0, 10) == []
+
+
+def test_security_state_sees_own_writes(storage):
+    state = SecurityState(storage, cache_ttl=60)
+    assert state.is_blocked('10.0.0.5') is False
+    state.block('10.0.0.5', seconds=30, reason='test')
+    assert state.is_blocked('10.0.0.5') is True
+    state.unblock('10.0.0.5')
+    assert state.is_blocked('10.0.0.5') is False
+
+    assert state.count(FAILED_LOGINS, 'alice') == 0
+    assert state.incr(FAILED_LOGINS, 'alice') >= 1
+    assert state.count(FAILED_LOGINS, 'alice') >= 1
+    state.reset(FAILED_LOGINS, 'alice')
+    assert state.count(FAILED_LOGINS, 'alice') == 0
+
+
+def test_storage_errors_are_not_fatal():
+    class BrokenStorage(MemoryStateStorage):
+        def blocked_until(self, key, now):
+            raise OSError('locked')
+
+        def incr(self, *args):
+            raise OSError('locked')
+
+    state = SecurityState(BrokenStorage())
+    assert state.is_blocked('10.0.0.1') is False
+    assert state.incr(FAILED_LOGINS, '10.0.0.1') == 0
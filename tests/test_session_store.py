@@ -0,0 +1,166 @@
+"""
+服务端会话测试：滑动过期与绝对有效期、续期写库合并、多进程共享登出、过期清理、Cookie解析
+"""
+import pytest
+
+from app_blueprints import session_store
+from app_blueprints.session_store import SessionStore, read_session_id, session_cookie_header
+
+
+class FakeClock:
+    """替换 session_store.time：time() 和 monotonic() 由测试推进"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(session_store, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'sessions.db')
+
+
+def stored_expiry(store, session_id):
+    row = store._connection().execute('SELECT expires_at FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+    return row[0] if row else None
+
+
+class TestSessionStore:
+
+    def test_sliding_expiry_capped_by_max_lifetime(self, clock, db_path):
+        store = SessionStore(db_path, idle_ttl=100, max_lifetime=250, touch_interval=10, cache_seconds=0)
+        created = clock.now
+        session_id = store.create('alice', {'role': 'admin'})
+        assert stored_expiry(store, session_id) == created + 100
+
+        clock.advance(90)
+        assert store.get(session_id) == {'role': 'admin', 'username': 'alice'}
+        assert stored_expiry(store, session_id) == created + 190
+        clock.advance(90)
+        assert store.username(session_id) == 'alice'
+        # 继续访问也不会超过创建后 max_lifetime 秒
+        assert stored_expiry(store, session_id) == created + 250
+        clock.advance(65)
+        assert store.username(session_id) == 'alice'
+        assert stored_expiry(store, session_id) == created + 250
+        clock.advance(10)
+        assert store.get(session_id) is None
+        assert stored_expiry(store, session_id) is None
+        assert store.stats['expired'] == 1
+
+    def test_idle_session_expires(self, clock, db_path):
+        store = SessionStore(db_path, idle_ttl=100, max_lifetime=1000, touch_interval=10)
+        session_id = store.create('alice')
+        clock.advance(101)
+        assert store.get(session_id) is None
+
+    def test_touches_are_coalesced(self, clock, db_path):
+        store = SessionStore(db_path, idle_ttl=3600, max_lifetime=86400, touch_interval=60, cache_seconds=1000)
+        created = clock.now
+        session_id = store.create('alice')
+        for _ in range(59):
+            clock.advance(1)
+            assert store.username(session_id) == 'alice'
+        assert store.stats['touches'] == 0
+        assert store.stats['db_reads'] == 0
+        assert stored_expiry(store, session_id) == created + 3600
+
+        clock.advance(1)
+        assert store.username(session_id) == 'alice'
+        assert store.stats['touches'] == 1
+        assert stored_expiry(store, session_id) == clock.now + 3600
+
+    def test_logout_from_another_store(self, clock, db_path):
+        # 两个实例使用同一文件（模拟同一主机上的两个服务器进程）
+        first = SessionStore(db_path, cache_seconds=1.0)
+        second = SessionStore(db_path, cache_seconds=1.0)
+        session_id = first.create('alice')
+        assert second.username(session_id) == 'alice'
+
+        assert first.delete(session_id) is True
+        assert first.get(session_id) is None
+        # 另一个实例的本地缓存最多在 cache_seconds 之后失效
+        assert second.username(session_id) == 'alice'
+        clock.advance(1.0)
+        assert second.get(session_id) is None
+        assert first.delete(session_id) is False
+
+    def test_delete_user(self, clock, db_path):
+        store = SessionStore(db_path)
+        sessions = [store.create('alice'), store.create('alice'), store.create('bob')]
+        assert store.delete_user('alice') == 2
+        assert [store.username(session_id) for session_id in sessions] == [None, None, 'bob']
+
+    def test_purge(self, clock, db_path):
+        store = SessionStore(db_path, idle_ttl=100, purge_interval=1000)
+        expired = store.create('alice')
+        clock.advance(50)
+        active = store.create('bob')
+        clock.advance(60)
+        assert store.count() == 1
+        assert store.purge() == 1
+        assert stored_expiry(store, expired) is None
+        assert store.status()['cached'] == 1
+        assert store.username(active) == 'bob'
+
+        # 超过清理间隔后，下一次访问时顺带清理
+        clock.advance(1000)
+        store.create('carol')
+        assert stored_expiry(store, active) is None
+        assert store.stats['purged'] == 2
+
+    def test_unknown_session(self, clock, db_path):
+        store = SessionStore(db_path)
+        assert store.get(None) is None
+        assert store.get('missing') is None
+        assert store.delete('') is False
+
+
+class TestSessionCookie:
+
+    @pytest.mark.parametrize('header', [
+        'session_id=abc',
+        'a=b; session_id=abc',
+        'session_id="abc"',
+        ' session_id = abc ;theme=dark',
+        'session_id=abc; session_id=def',
+        # 其他Cookie格式不规范时仍能读到会话ID
+        'tracker=a b; session_id=abc',
+        'prefs={"a":1}; session_id=abc',
+        'x="unterminated; session_id=abc',
+        'session_id=abc; tracker=a b',
+        'a=b=c;;; ===; session_id=abc',
+    ])
+    def test_reads_session_id(self, header):
+        assert read_session_id(header) == 'abc'
+
+    @pytest.mark.parametrize('header', [
+        None, '', 'garbage', 'session_id=', 'session_id=""', 'other=1', 'session_id=a b', 'session_id=[abc]',
+        'session_id=abc\r\nSet-Cookie: x=y', '"unterminated', 'xsession_id=abc', '\xff\xfe',
+    ])
+    def test_malformed_headers(self, header):
+        assert read_session_id(header) is None
+
+    def test_cookie_header(self):
+        assert session_cookie_header('abc', 10) == 'session_id=abc; HttpOnly; Max-Age=10; Path=/; SameSite=Lax'
+        assert 'Max-Age=0' in session_cookie_header(None)
+        assert session_cookie_header('abc', secure=True).endswith('; Secure')
+
+    def test_round_trip(self, clock, db_path):
+        session_id = SessionStore(db_path).create('alice')
+        assert read_session_id(session_cookie_header(session_id).split(';')[0]) == session_id
@@ -0,0 +1,21 @@
+"""
+威胁扫描测试：规则命中、只缓存短值
+"""
+from optimizations.advanced_security import scan_threat_value, THREAT_SCAN_CACHE_MAX_LENGTH
+
+
+def test_scan_detects_rules():
+    assert scan_threat_value('1 UNION SELECT password') == 'sql_union'
+    assert scan_threat_value('<script>alert(1)</script>') is not None
+    assert scan_threat_value('rclpy.spin(node)') is None
+
+
+def test_only_short_values_are_cached():
+    scan_threat_value.cache_clear()
+    short = 'x UNION SELECT 1'
+    long_value = 'a' * THREAT_SCAN_CACHE_MAX_LENGTH + ' union select 1'
+    for _ in range(3):
+        assert scan_threat_value(short) == 'sql_union'
+        assert scan_threat_value(long_value) == 'sql_union'
+    info = scan_threat_value.cache_info()
+    assert (info.currsize, info.hits, info.misses) == (1, 2, 1)